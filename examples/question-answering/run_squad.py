@@ -38,14 +38,21 @@ from transformers import (
     AutoModelForQuestionAnswering,
     AutoTokenizer,
     get_linear_schedule_with_warmup,
-    squad_convert_examples_to_features,
+    squad_convert_examples_to_feature_store,
 )
 from transformers.data.metrics.squad_metrics import (
     compute_predictions_log_probs,
     compute_predictions_logits,
     squad_evaluate,
 )
-from transformers.data.processors.squad import SquadResult, SquadV1Processor, SquadV2Processor
+from transformers.data.processors.squad import (
+    SquadFeatureStore,
+    SquadResult,
+    SquadV1Processor,
+    SquadV2Processor,
+    squad_features_to_torch_dataset,
+)
+from transformers.data.tokenized_cache import TokenizedDatasetCache, cache_fingerprint
 from transformers.trainer_utils import is_main_process
 
 
@@ -318,8 +325,7 @@ def evaluate(args, model, tokenizer, prefix=""):
             outputs = model(**inputs)
 
         for i, feature_index in enumerate(feature_indices):
-            eval_feature = features[feature_index.item()]
-            unique_id = int(eval_feature.unique_id)
+            unique_id = features.get_field("unique_id", feature_index.item())
 
             output = [to_list(output[i]) for output in outputs.to_tuple()]
 
@@ -408,24 +414,38 @@ def load_and_cache_examples(args, tokenizer, evaluate=False, output_examples=Fal
 
     # Load data features from cache or dataset file
     input_dir = args.data_dir if args.data_dir else "."
-    cached_features_file = os.path.join(
+    processor = SquadV2Processor() if args.version_2_with_negative else SquadV1Processor()
+    data_file = args.predict_file if evaluate else args.train_file
+    if args.data_dir or data_file:
+        default_file = processor.dev_file if evaluate else processor.train_file
+        data_file = os.path.join(args.data_dir or "", data_file or default_file)
+    # The content of the data file is part of the fingerprint of the cache, or its name if it is not a local file
+    data_files = [data_file] if data_file is not None and os.path.isfile(data_file) else []
+    dataset_args = {} if data_files else {"dataset": data_file or "tensorflow_datasets:squad"}
+    cache = TokenizedDatasetCache(
         input_dir,
         "cached_{}_{}_{}".format(
             "dev" if evaluate else "train",
             list(filter(None, args.model_name_or_path.split("/"))).pop(),
             str(args.max_seq_length),
         ),
+        cache_fingerprint(
+            tokenizer,
+            data_files,
+            evaluate=evaluate,
+            max_seq_length=args.max_seq_length,
+            doc_stride=args.doc_stride,
+            max_query_length=args.max_query_length,
+            version_2_with_negative=args.version_2_with_negative,
+            **dataset_args,
+        ),
     )
 
     # Init features and dataset from cache if it exists
-    if os.path.exists(cached_features_file) and not args.overwrite_cache:
-        logger.info("Loading features from cached file %s", cached_features_file)
-        features_and_dataset = torch.load(cached_features_file)
-        features, dataset, examples = (
-            features_and_dataset["features"],
-            features_and_dataset["dataset"],
-            features_and_dataset["examples"],
-        )
+    if cache.exists() and not args.overwrite_cache:
+        logger.info("Loading features from cached file %s", cache.path)
+        features = SquadFeatureStore.load(cache)
+        examples = cache.load_object("examples") if output_examples else None
     else:
         logger.info("Creating features from dataset file at %s", input_dir)
 
@@ -441,26 +461,27 @@ def load_and_cache_examples(args, tokenizer, evaluate=False, output_examples=Fal
             tfds_examples = tfds.load("squad")
             examples = SquadV1Processor().get_examples_from_dataset(tfds_examples, evaluate=evaluate)
         else:
-            processor = SquadV2Processor() if args.version_2_with_negative else SquadV1Processor()
             if evaluate:
                 examples = processor.get_dev_examples(args.data_dir, filename=args.predict_file)
             else:
                 examples = processor.get_train_examples(args.data_dir, filename=args.train_file)
 
-        features, dataset = squad_convert_examples_to_features(
+        # The features are written to the cache shard by shard as they are created, instead of being all held in
+        # memory, and are then memory-mapped
+        logger.info("Saving features into cached file %s", cache.path)
+        features = squad_convert_examples_to_feature_store(
             examples=examples,
             tokenizer=tokenizer,
             max_seq_length=args.max_seq_length,
             doc_stride=args.doc_stride,
             max_query_length=args.max_query_length,
             is_training=not evaluate,
-            return_dataset="pt",
+            cache=cache,
             threads=args.threads,
+            objects={"examples": examples},
         )
 
-        if args.local_rank in [-1, 0]:
-            logger.info("Saving features into cached file %s", cached_features_file)
-            torch.save({"features": features, "dataset": dataset, "examples": examples}, cached_features_file)
+    dataset = squad_features_to_torch_dataset(features, is_training=not evaluate)
 
     if args.local_rank == 0 and not evaluate:
         # Make sure only the first process in distributed training process the dataset, and the others will use the cache
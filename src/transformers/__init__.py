@@ -25,11 +25,15 @@ from .configuration_utils import PretrainedConfig
 # Data
 from .data import (
     DataProcessor,
+    FeatureStore,
+    FeatureStoreWriter,
     InputExample,
     InputFeatures,
+    InputFeatureStore,
     SingleSentenceClassificationProcessor,
     SquadExample,
     SquadFeatures,
+    SquadFeatureStore,
     SquadV1Processor,
     SquadV2Processor,
     glue_compute_metrics,
@@ -37,6 +41,7 @@ from .data import (
     glue_output_modes,
     glue_processors,
     glue_tasks_num_labels,
+    squad_convert_examples_to_feature_store,
     squad_convert_examples_to_features,
     xnli_compute_metrics,
     xnli_output_modes,
@@ -47,6 +52,7 @@ from .data import (
 # Files and general utilities
 from .file_utils import (
     CONFIG_NAME,
+    MMAP_WEIGHTS_NAME,
     MODEL_CARD_NAME,
     PYTORCH_PRETRAINED_BERT_CACHE,
     PYTORCH_TRANSFORMERS_CACHE,
@@ -54,6 +60,7 @@ from .file_utils import (
     TF2_WEIGHTS_NAME,
     TF_WEIGHTS_NAME,
     TRANSFORMERS_CACHE,
+    WEIGHTS_INDEX_NAME,
     WEIGHTS_NAME,
     add_end_docstrings,
     add_start_docstrings,
@@ -189,6 +196,7 @@ from .tokenization_utils_base import (
     AddedToken,
     BatchEncoding,
     CharSpan,
+    IncrementalDecoder,
     PreTrainedTokenizerBase,
     SpecialTokensMixin,
     TensorType,
@@ -283,6 +291,7 @@ if is_torch_available():
     from .data.data_collator import (
         DataCollator,
         DataCollatorForLanguageModeling,
+        DataCollatorForPackedLanguageModeling,
         DataCollatorForPermutationLanguageModeling,
         DataCollatorForSOP,
         DataCollatorForTokenClassification,
@@ -301,7 +310,8 @@ if is_torch_available():
         TextDataset,
         TextDatasetForNextSentencePrediction,
     )
-    from .generation_beam_search import BeamScorer, BeamSearchScorer
+    from .generation_beam_search import BeamScorer, BeamSearchScorer, TensorizedBeamSearchScorer
+    from .generation_continuous_batching import ContinuousBatchingGenerator
     from .generation_logits_process import (
         LogitsProcessor,
         LogitsProcessorList,
@@ -314,7 +324,10 @@ if is_torch_available():
         TopKLogitsWarper,
         TopPLogitsWarper,
     )
+    from .generation_prefix_cache import PrefixCache
+    from .generation_static_cache import StaticCache
     from .generation_utils import top_k_top_p_filtering
+    from .modeling_mmap_utils import load_mmap_checkpoint, save_mmap_checkpoint
     from .modeling_utils import Conv1D, PreTrainedModel, apply_chunking_to_forward, prune_layer
     from .models.albert import (
         ALBERT_PRETRAINED_MODEL_ARCHIVE_LIST,
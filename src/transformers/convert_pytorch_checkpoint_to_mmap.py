@@ -0,0 +1,97 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Inc. team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Convert the PyTorch weights of a saved model to the memory-mapped checkpoint format."""
+
+
+import argparse
+import json
+import os
+import shutil
+
+from transformers import MMAP_WEIGHTS_NAME, WEIGHTS_INDEX_NAME, WEIGHTS_NAME
+from transformers.modeling_mmap_utils import convert_pytorch_checkpoint_to_mmap
+from transformers.utils import logging
+
+
+logger = logging.get_logger(__name__)
+
+
+def convert_pytorch_model_to_mmap(pytorch_model_path, mmap_dump_path):
+    """
+    Converts the weights of a model directory saved with :obj:`save_pretrained` (sharded or not) and copies its other
+    files, or converts a single checkpoint file. A directory can be converted in place, the converted weights are then
+    written next to the PyTorch ones.
+    """
+    if os.path.isfile(pytorch_model_path):
+        logger.info(f"Converting {pytorch_model_path} to {mmap_dump_path}")
+        convert_pytorch_checkpoint_to_mmap(pytorch_model_path, mmap_dump_path)
+        return
+
+    os.makedirs(mmap_dump_path, exist_ok=True)
+    in_place = os.path.samefile(pytorch_model_path, mmap_dump_path)
+    index_file = os.path.join(pytorch_model_path, WEIGHTS_INDEX_NAME)
+    index = None
+    if os.path.isfile(index_file):
+        with open(index_file, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        shard_names = {name: os.path.splitext(name)[0] + ".mmap" for name in set(index["weight_map"].values())}
+        index["weight_map"] = {key: shard_names[name] for key, name in index["weight_map"].items()}
+    elif os.path.isfile(os.path.join(pytorch_model_path, WEIGHTS_NAME)):
+        shard_names = {WEIGHTS_NAME: MMAP_WEIGHTS_NAME}
+    else:
+        raise ValueError(f"No file named {WEIGHTS_NAME} or {WEIGHTS_INDEX_NAME} found in {pytorch_model_path}")
+
+    for name, mmap_name in sorted(shard_names.items()):
+        logger.info(f"Converting {name} to {mmap_name}")
+        convert_pytorch_checkpoint_to_mmap(
+            os.path.join(pytorch_model_path, name), os.path.join(mmap_dump_path, mmap_name)
+        )
+    # the index is written last, so that it never lists shards that are not converted yet
+    if index is not None:
+        with open(os.path.join(mmap_dump_path, WEIGHTS_INDEX_NAME), "w", encoding="utf-8") as f:
+            f.write(json.dumps(index, indent=2, sort_keys=True) + "\n")
+
+    if in_place:
+        # the other files are already there
+        return
+    converted_names = set(shard_names) | set(shard_names.values()) | {WEIGHTS_INDEX_NAME}
+    for name in os.listdir(pytorch_model_path):
+        if name in converted_names:
+            continue
+        path = os.path.join(pytorch_model_path, name)
+        if os.path.isfile(path):
+            shutil.copy(path, os.path.join(mmap_dump_path, name))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # Required parameters
+    parser.add_argument(
+        "--pytorch_model_path",
+        default=None,
+        type=str,
+        required=True,
+        help="Path to the directory of a model saved with `save_pretrained`, or to a PyTorch checkpoint file.",
+    )
+    parser.add_argument(
+        "--mmap_dump_path",
+        default=None,
+        type=str,
+        required=True,
+        help="Path to the output directory (or output file if a checkpoint file is converted).",
+    )
+    args = parser.parse_args()
+    logging.set_verbosity_info()
+    convert_pytorch_model_to_mmap(args.pytorch_model_path, args.mmap_dump_path)
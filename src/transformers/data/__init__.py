@@ -5,17 +5,22 @@
 from .metrics import glue_compute_metrics, xnli_compute_metrics
 from .processors import (
     DataProcessor,
+    FeatureStore,
+    FeatureStoreWriter,
     InputExample,
     InputFeatures,
+    InputFeatureStore,
     SingleSentenceClassificationProcessor,
     SquadExample,
     SquadFeatures,
+    SquadFeatureStore,
     SquadV1Processor,
     SquadV2Processor,
     glue_convert_examples_to_features,
     glue_output_modes,
     glue_processors,
     glue_tasks_num_labels,
+    squad_convert_examples_to_feature_store,
     squad_convert_examples_to_features,
     xnli_output_modes,
     xnli_processors,
@@ -1,7 +1,8 @@
+import inspect
 import random
 import warnings
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, List, NewType, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NewType, Optional, Tuple, Union
 
 import torch
 from torch.nn.utils.rnn import pad_sequence
@@ -9,6 +10,9 @@ from torch.nn.utils.rnn import pad_sequence
 from ..tokenization_utils_base import BatchEncoding, PaddingStrategy, PreTrainedTokenizerBase
 
 
+if TYPE_CHECKING:
+    from ..modeling_utils import PreTrainedModel
+
 InputDataClass = NewType("InputDataClass", Any)
 
 """
@@ -301,6 +305,144 @@ class DataCollatorForLanguageModeling:
         return inputs, labels
 
 
+@dataclass
+class DataCollatorForPackedLanguageModeling(DataCollatorForLanguageModeling):
+    """
+    Data collator used for language modeling that packs several examples in each row of :obj:`block_size` tokens
+    instead of padding each of them to the longest one, which wastes most of the batch on padding when the examples are
+    much shorter than the block size.
+
+    The examples are concatenated in order, a new row being started when the next one does not fit, and the examples
+    longer than :obj:`block_size` are split in chunks of :obj:`block_size` tokens. So that the examples packed together
+    do not see each other, the batch contains:
+
+        - an :obj:`attention_mask` of shape :obj:`(batch_size, sequence_length, sequence_length)` only letting each
+          token attend to the tokens of its own example (causally if :obj:`mlm=False`), if
+          :obj:`block_diagonal_attention_mask` is set. This 3D mask is only supported by the models relying on
+          :meth:`~transformers.PreTrainedModel.get_extended_attention_mask` (e.g. BERT or RoBERTa). Otherwise, the
+          attention mask only masks the padding.
+        - :obj:`position_ids` starting back from the first position at the beginning of each example, if :obj:`model`
+          is passed and accepts them. The positions of the models that offset them after their padding index (e.g.
+          RoBERTa) are offset the same way.
+
+    The labels are computed with :meth:`~transformers.DataCollatorForLanguageModeling.mask_tokens` if :obj:`mlm=True`.
+    If :obj:`mlm=False`, the first token of each example (but the first one of a row) is ignored (labelled -100) so
+    that it is not predicted from the previous example.
+
+    Args:
+        tokenizer (:class:`~transformers.PreTrainedTokenizer` or :class:`~transformers.PreTrainedTokenizerFast`):
+            The tokenizer used for encoding the data.
+        mlm (:obj:`bool`, `optional`, defaults to :obj:`True`):
+            Whether or not to use masked language modeling.
+        mlm_probability (:obj:`float`, `optional`, defaults to 0.15):
+            The probability with which to (randomly) mask tokens in the input, when :obj:`mlm` is set to :obj:`True`.
+        block_size (:obj:`int`, `optional`, defaults to 128):
+            The maximum number of tokens in each row.
+        block_diagonal_attention_mask (:obj:`bool`, `optional`, defaults to :obj:`True`):
+            Whether or not to return a 3D attention mask preventing the examples packed together from attending to each
+            other. Has to be set to :obj:`False` for the models that don't support it.
+        model (:class:`~transformers.PreTrainedModel`, `optional`):
+            The model being trained. Used to return :obj:`position_ids` matching the ones it expects, none are returned
+            if not set.
+
+    .. note::
+
+        Only the :obj:`"input_ids"` and :obj:`"special_tokens_mask"` of the examples are used, if they are
+        dictionaries.
+    """
+
+    block_size: int = 128
+    block_diagonal_attention_mask: bool = True
+    model: Optional["PreTrainedModel"] = None
+
+    def __post_init__(self):
+        super().__post_init__()
+        self._return_position_ids = (
+            self.model is not None and "position_ids" in inspect.signature(self.model.forward).parameters
+        )
+        # RoBERTa-like models start their positions right after their padding index, which pads the positions
+        embeddings = getattr(self.model.base_model, "embeddings", None) if self.model is not None else None
+        padding_idx = getattr(getattr(embeddings, "position_embeddings", None), "padding_idx", None)
+        self._position_padding_idx = padding_idx if padding_idx is not None else 0
+        self._position_offset = padding_idx + 1 if padding_idx is not None else 0
+
+    def _pack(self, examples) -> List[List[Tuple[torch.Tensor, Optional[torch.Tensor]]]]:
+        rows, row_length = [[]], 0
+        for example in examples:
+            special_tokens_mask = None
+            if isinstance(example, (dict, BatchEncoding)):
+                special_tokens_mask = example.get("special_tokens_mask", None)
+                example = example["input_ids"]
+            input_ids = torch.as_tensor(example, dtype=torch.long)
+            if special_tokens_mask is not None:
+                special_tokens_mask = torch.as_tensor(special_tokens_mask, dtype=torch.bool)
+            for start in range(0, input_ids.shape[0], self.block_size):
+                chunk = input_ids[start : start + self.block_size]
+                chunk_special_tokens_mask = (
+                    special_tokens_mask[start : start + self.block_size] if special_tokens_mask is not None else None
+                )
+                if row_length + chunk.shape[0] > self.block_size and len(rows[-1]) > 0:
+                    rows.append([])
+                    row_length = 0
+                rows[-1].append((chunk, chunk_special_tokens_mask))
+                row_length += chunk.shape[0]
+        return rows
+
+    def __call__(
+        self, examples: List[Union[List[int], torch.Tensor, Dict[str, torch.Tensor]]]
+    ) -> Dict[str, torch.Tensor]:
+        rows = self._pack(examples)
+        row_lengths = [sum(chunk.shape[0] for chunk, _ in row) for row in rows]
+        max_length = max(row_lengths)
+        if any(length < max_length for length in row_lengths) and self.tokenizer._pad_token is None:
+            raise ValueError(
+                "You are attempting to pad samples but the tokenizer you are using"
+                f" ({self.tokenizer.__class__.__name__}) does not have a pad token."
+            )
+
+        pad_token_id = self.tokenizer.pad_token_id if self.tokenizer._pad_token is not None else 0
+        input_ids = torch.full((len(rows), max_length), pad_token_id, dtype=torch.long)
+        position_ids = torch.full((len(rows), max_length), self._position_padding_idx, dtype=torch.long)
+        # index of the example each token comes from in its row, -1 for padding
+        segment_ids = torch.full((len(rows), max_length), -1, dtype=torch.long)
+        special_tokens_mask = torch.ones((len(rows), max_length), dtype=torch.bool)
+        for i, row in enumerate(rows):
+            offset = 0
+            for j, (chunk, chunk_special_tokens_mask) in enumerate(row):
+                end = offset + chunk.shape[0]
+                input_ids[i, offset:end] = chunk
+                position_ids[i, offset:end] = torch.arange(chunk.shape[0]) + self._position_offset
+                segment_ids[i, offset:end] = j
+                if chunk_special_tokens_mask is None:
+                    chunk_special_tokens_mask = torch.tensor(
+                        self.tokenizer.get_special_tokens_mask(chunk.tolist(), already_has_special_tokens=True),
+                        dtype=torch.bool,
+                    )
+                special_tokens_mask[i, offset:end] = chunk_special_tokens_mask
+                offset = end
+
+        if self.block_diagonal_attention_mask:
+            attention_mask = (segment_ids[:, :, None] == segment_ids[:, None, :]) & (segment_ids[:, None, :] != -1)
+            if not self.mlm:
+                attention_mask = attention_mask.tril()
+        else:
+            attention_mask = segment_ids != -1
+        batch = {"input_ids": input_ids, "attention_mask": attention_mask.long()}
+        if self._return_position_ids:
+            batch["position_ids"] = position_ids
+
+        if self.mlm:
+            batch["input_ids"], batch["labels"] = self.mask_tokens(input_ids, special_tokens_mask=special_tokens_mask)
+        else:
+            labels = input_ids.clone()
+            labels[segment_ids == -1] = -100
+            # the first token of an example can't be predicted from the example packed before it
+            labels[position_ids == self._position_offset] = -100
+            labels[:, 0] = input_ids[:, 0]
+            batch["labels"] = labels
+        return batch
+
+
 @dataclass
 class DataCollatorForWholeWordMask(DataCollatorForLanguageModeling):
     """
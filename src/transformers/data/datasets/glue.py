@@ -1,19 +1,18 @@
+import glob
 import os
 import time
 import warnings
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Optional, Union
+from typing import Optional, Union
 
-import torch
 from torch.utils.data.dataset import Dataset
 
-from filelock import FileLock
-
 from ...tokenization_utils_base import PreTrainedTokenizerBase
 from ...utils import logging
 from ..processors.glue import glue_convert_examples_to_features, glue_output_modes, glue_processors
-from ..processors.utils import InputFeatures
+from ..processors.utils import InputFeatures, InputFeatureStore
+from ..tokenized_cache import TokenizedDatasetCache, cache_fingerprint
 
 
 logger = logging.get_logger(__name__)
@@ -60,7 +59,7 @@ class GlueDataset(Dataset):
 
     args: GlueDataTrainingArguments
     output_mode: str
-    features: List[InputFeatures]
+    features: InputFeatureStore
 
     def __init__(
         self,
@@ -84,16 +83,6 @@ class GlueDataset(Dataset):
                 mode = Split[mode]
             except KeyError:
                 raise KeyError("mode is not a valid split name")
-        # Load data features from cache or dataset file
-        cached_features_file = os.path.join(
-            cache_dir if cache_dir is not None else args.data_dir,
-            "cached_{}_{}_{}_{}".format(
-                mode.value,
-                tokenizer.__class__.__name__,
-                str(args.max_seq_length),
-                args.task_name,
-            ),
-        )
         label_list = self.processor.get_labels()
         if args.task_name in ["mnli", "mnli-mm"] and tokenizer.__class__.__name__ in (
             "RobertaTokenizer",
@@ -106,17 +95,33 @@ class GlueDataset(Dataset):
             label_list[1], label_list[2] = label_list[2], label_list[1]
         self.label_list = label_list
 
+        # Load data features from cache or dataset file
+        cache = TokenizedDatasetCache(
+            cache_dir if cache_dir is not None else args.data_dir,
+            "cached_{}_{}_{}_{}".format(
+                mode.value,
+                tokenizer.__class__.__name__,
+                str(args.max_seq_length),
+                args.task_name,
+            ),
+            cache_fingerprint(
+                tokenizer,
+                sorted(glob.glob(os.path.join(args.data_dir, "*.tsv"))),
+                mode=mode.value,
+                max_seq_length=args.max_seq_length,
+                task_name=args.task_name,
+                limit_length=limit_length,
+            ),
+        )
+
         # Make sure only the first process in distributed training processes the dataset,
         # and the others will use the cache.
-        lock_path = cached_features_file + ".lock"
-        with FileLock(lock_path):
+        with cache.lock():
 
-            if os.path.exists(cached_features_file) and not args.overwrite_cache:
+            if cache.exists() and not args.overwrite_cache:
                 start = time.time()
-                self.features = torch.load(cached_features_file)
-                logger.info(
-                    f"Loading features from cached file {cached_features_file} [took %.3f s]", time.time() - start
-                )
+                self.features = InputFeatureStore.load(cache)
+                logger.info(f"Loading features from cached file {cache.path} [took %.3f s]", time.time() - start)
             else:
                 logger.info(f"Creating features from dataset file at {args.data_dir}")
 
@@ -128,7 +133,7 @@ class GlueDataset(Dataset):
                     examples = self.processor.get_train_examples(args.data_dir)
                 if limit_length is not None:
                     examples = examples[:limit_length]
-                self.features = glue_convert_examples_to_features(
+                features = glue_convert_examples_to_features(
                     examples,
                     tokenizer,
                     max_length=args.max_seq_length,
@@ -136,11 +141,9 @@ class GlueDataset(Dataset):
                     output_mode=self.output_mode,
                 )
                 start = time.time()
-                torch.save(self.features, cached_features_file)
-                # ^ This seems to take a lot of time so I want to investigate why and how we can improve.
-                logger.info(
-                    "Saving features into cached file %s [took %.3f s]", cached_features_file, time.time() - start
-                )
+                InputFeatureStore.from_features(features).save(cache)
+                logger.info("Saving features into cached file %s [took %.3f s]", cache.path, time.time() - start)
+                self.features = InputFeatureStore.load(cache)
 
     def __len__(self):
         return len(self.features)
@@ -1,18 +1,28 @@
+import array
+import contextlib
+import hashlib
 import json
+import mmap
 import os
-import pickle
 import random
 import time
 import warnings
-from typing import Dict, List, Optional
+from collections.abc import Sequence
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import torch
 from torch.utils.data.dataset import Dataset
 
-from filelock import FileLock
-
 from ...tokenization_utils import PreTrainedTokenizer
 from ...utils import logging
+from ..tokenized_cache import (
+    RaggedArray,
+    RaggedArrayBuilder,
+    TokenizedDatasetCache,
+    cache_fingerprint,
+    file_fingerprint,
+)
 
 
 logger = logging.get_logger(__name__)
@@ -23,6 +33,107 @@ DEPRECATION_WARNING = (
     "library. You can have a look at this example script for pointers: {0}"
 )
 
+# Number of lines tokenized at once when a dataset is tokenized ahead of time
+TOKENIZATION_CHUNK_SIZE = 1000
+
+
+def _is_blank(line: bytes) -> bool:
+    line = line.strip()
+    # Only lines with non-ASCII characters can be made of Unicode spaces
+    return len(line) == 0 or (not line.isascii() and line.decode("utf-8").isspace())
+
+
+class TextFileLines(Sequence):
+    """
+    The lines of a text file, read from the memory-mapped file when accessed instead of being loaded in memory, so that
+    datasets can be built from corpora larger than the RAM. The byte offsets of the lines are indexed in one pass over
+    the file, and cached in :obj:`cache_dir` if set.
+
+    Lines are separated by ``"\\n"`` or ``"\\r\\n"``, and returned without their line break.
+
+    Args:
+        file_path (:obj:`str`):
+            The text file, encoded in UTF-8.
+        skip_blank_lines (:obj:`bool`, `optional`, defaults to :obj:`True`):
+            Whether or not to leave out the lines that are empty or only made of spaces.
+        cache_dir (:obj:`str`, `optional`):
+            The directory in which to cache the index of the lines. Not cached if not set.
+        overwrite_cache (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            Whether or not to index the lines again even if they are cached.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        skip_blank_lines: bool = True,
+        cache_dir: Optional[str] = None,
+        overwrite_cache: bool = False,
+    ):
+        self.file_path = file_path
+        self.skip_blank_lines = skip_blank_lines
+        self._mmap = None
+        self._cache = None
+        if cache_dir is None:
+            self.starts, self.ends = self._index_lines()
+            return
+
+        state = {"file": file_fingerprint(file_path), "skip_blank_lines": skip_blank_lines}
+        self._cache = TokenizedDatasetCache(
+            cache_dir,
+            f"cached_lines_{os.path.basename(file_path)}",
+            hashlib.sha256(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest(),
+        )
+        with self._cache.lock():
+            if not self._cache.exists() or overwrite_cache:
+                starts, ends = self._index_lines()
+                self._cache.save({"starts": starts, "ends": ends})
+            self._load_index()
+
+    def _index_lines(self) -> Tuple[np.ndarray, np.ndarray]:
+        start = time.time()
+        starts, ends = array.array("q"), array.array("q")
+        offset = 0
+        with open(self.file_path, "rb") as f:
+            for line in f:
+                line_start, offset = offset, offset + len(line)
+                if line.endswith(b"\n"):
+                    line = line[:-2] if line.endswith(b"\r\n") else line[:-1]
+                if self.skip_blank_lines and _is_blank(line):
+                    continue
+                starts.append(line_start)
+                ends.append(line_start + len(line))
+        logger.info(f"Indexed {len(starts)} lines of {self.file_path} [took %.3f s]", time.time() - start)
+        return np.frombuffer(starts, dtype=np.int64), np.frombuffer(ends, dtype=np.int64)
+
+    def _load_index(self):
+        columns = self._cache.load()
+        self.starts, self.ends = columns["starts"], columns["ends"]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        start, end = self.starts[i], self.ends[i]
+        if self._mmap is None:
+            with open(self.file_path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap[start:end].decode("utf-8")
+
+    def __getstate__(self):
+        # The file is mapped again by each process, and a cached index memory-mapped again instead of being copied
+        state = self.__dict__.copy()
+        state["_mmap"] = None
+        if self._cache is not None:
+            state["starts"] = state["ends"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._cache is not None:
+            self._load_index()
+
 
 class TextDataset(Dataset):
     """
@@ -48,27 +159,20 @@ class TextDataset(Dataset):
         block_size = block_size - tokenizer.num_special_tokens_to_add(pair=False)
 
         directory, filename = os.path.split(file_path)
-        cached_features_file = os.path.join(
+        cache = TokenizedDatasetCache(
             cache_dir if cache_dir is not None else directory,
-            "cached_lm_{}_{}_{}".format(
-                tokenizer.__class__.__name__,
-                str(block_size),
-                filename,
-            ),
+            "cached_lm_{}_{}_{}".format(tokenizer.__class__.__name__, str(block_size), filename),
+            cache_fingerprint(tokenizer, file_path, block_size=block_size),
         )
 
         # Make sure only the first process in distributed training processes the dataset,
         # and the others will use the cache.
-        lock_path = cached_features_file + ".lock"
-        with FileLock(lock_path):
+        with cache.lock():
 
-            if os.path.exists(cached_features_file) and not overwrite_cache:
+            if cache.exists() and not overwrite_cache:
                 start = time.time()
-                with open(cached_features_file, "rb") as handle:
-                    self.examples = pickle.load(handle)
-                logger.info(
-                    f"Loading features from cached file {cached_features_file} [took %.3f s]", time.time() - start
-                )
+                self.examples = cache.load()["input_ids"]
+                logger.info(f"Loading features from cached file {cache.path} [took %.3f s]", time.time() - start)
 
             else:
                 logger.info(f"Creating features from dataset file at {directory}")
@@ -88,11 +192,8 @@ class TextDataset(Dataset):
                 # can change this behavior by adding (model specific) padding.
 
                 start = time.time()
-                with open(cached_features_file, "wb") as handle:
-                    pickle.dump(self.examples, handle, protocol=pickle.HIGHEST_PROTOCOL)
-                logger.info(
-                    "Saving features into cached file %s [took %.3f s]", cached_features_file, time.time() - start
-                )
+                cache.save({"input_ids": self.examples})
+                logger.info("Saving features into cached file %s [took %.3f s]", cache.path, time.time() - start)
 
     def __len__(self):
         return len(self.examples)
@@ -104,9 +205,22 @@ class TextDataset(Dataset):
 class LineByLineTextDataset(Dataset):
     """
     This will be superseded by a framework-agnostic approach soon.
+
+    With :obj:`lazy=True`, the lines are only read from the memory-mapped file and tokenized when accessed (see
+    :class:`~transformers.data.datasets.language_modeling.TextFileLines`), so that the dataset can be built from a
+    corpus larger than the RAM and the tokenization is done by the workers of the data loader. Wrap it in a
+    :class:`~transformers.trainer_pt_utils.ShardedIterableDataset` to only go over the lines of the current process.
     """
 
-    def __init__(self, tokenizer: PreTrainedTokenizer, file_path: str, block_size: int):
+    def __init__(
+        self,
+        tokenizer: PreTrainedTokenizer,
+        file_path: str,
+        block_size: int,
+        overwrite_cache=False,
+        cache_dir: Optional[str] = None,
+        lazy: bool = False,
+    ):
         warnings.warn(
             DEPRECATION_WARNING.format(
                 "https://github.com/huggingface/transformers/blob/master/examples/language-modeling/run_mlm.py"
@@ -114,31 +228,74 @@ class LineByLineTextDataset(Dataset):
             FutureWarning,
         )
         assert os.path.isfile(file_path), f"Input file path {file_path} not found"
-        # Here, we do not cache the features, operating under the assumption
-        # that we will soon use fast multithreaded tokenizers from the
-        # `tokenizers` repo everywhere =)
-        logger.info("Creating features from dataset file at %s", file_path)
-
-        with open(file_path, encoding="utf-8") as f:
-            lines = [line for line in f.read().splitlines() if (len(line) > 0 and not line.isspace())]
+        self.tokenizer = tokenizer
+        self.block_size = block_size
+        self.examples = None
+        if lazy:
+            # Only the index of the lines is cached
+            self.lines = TextFileLines(file_path, cache_dir=cache_dir, overwrite_cache=overwrite_cache)
+            return
+
+        # The features are only cached when a `cache_dir` is given
+        cache = None
+        if cache_dir is not None:
+            cache = TokenizedDatasetCache(
+                cache_dir,
+                "cached_line_by_line_{}_{}_{}".format(
+                    tokenizer.__class__.__name__, str(block_size), os.path.basename(file_path)
+                ),
+                cache_fingerprint(tokenizer, file_path, block_size=block_size),
+            )
+
+        with cache.lock() if cache is not None else contextlib.suppress():
+            if cache is not None and cache.exists() and not overwrite_cache:
+                start = time.time()
+                self.examples = cache.load()["input_ids"]
+                logger.info(f"Loading features from cached file {cache.path} [took %.3f s]", time.time() - start)
+            else:
+                logger.info("Creating features from dataset file at %s", file_path)
+
+                lines = TextFileLines(file_path)
+                examples = RaggedArrayBuilder()
+                for i in range(0, len(lines), TOKENIZATION_CHUNK_SIZE):
+                    batch_encoding = tokenizer(
+                        lines[i : i + TOKENIZATION_CHUNK_SIZE],
+                        add_special_tokens=True,
+                        truncation=True,
+                        max_length=block_size,
+                    )
+                    examples.extend(batch_encoding["input_ids"])
+                self.examples = examples.build()
 
-        batch_encoding = tokenizer(lines, add_special_tokens=True, truncation=True, max_length=block_size)
-        self.examples = batch_encoding["input_ids"]
-        self.examples = [{"input_ids": torch.tensor(e, dtype=torch.long)} for e in self.examples]
+                if cache is not None:
+                    start = time.time()
+                    cache.save({"input_ids": self.examples})
+                    logger.info("Saving features into cached file %s [took %.3f s]", cache.path, time.time() - start)
 
     def __len__(self):
-        return len(self.examples)
+        return len(self.examples) if self.examples is not None else len(self.lines)
 
     def __getitem__(self, i) -> Dict[str, torch.tensor]:
-        return self.examples[i]
+        if self.examples is not None:
+            input_ids = self.examples[i]
+        else:
+            input_ids = self.tokenizer(
+                self.lines[i], add_special_tokens=True, truncation=True, max_length=self.block_size
+            )["input_ids"]
+        return {"input_ids": torch.tensor(input_ids, dtype=torch.long)}
 
 
 class LineByLineWithRefDataset(Dataset):
     """
     This will be superseded by a framework-agnostic approach soon.
+
+    With :obj:`lazy=True`, the lines and their references are only read from the memory-mapped files and processed when
+    accessed, like in :class:`~transformers.LineByLineTextDataset`.
     """
 
-    def __init__(self, tokenizer: PreTrainedTokenizer, file_path: str, block_size: int, ref_path: str):
+    def __init__(
+        self, tokenizer: PreTrainedTokenizer, file_path: str, block_size: int, ref_path: str, lazy: bool = False
+    ):
         warnings.warn(
             DEPRECATION_WARNING.format(
                 "https://github.com/huggingface/transformers/blob/master/examples/language-modeling/run_mlm_wwm.py"
@@ -152,27 +309,43 @@ class LineByLineWithRefDataset(Dataset):
         # `tokenizers` repo everywhere =)
         logger.info("Creating features from dataset file at %s", file_path)
         logger.info("Use ref segment results at %s", ref_path)
-        with open(file_path, encoding="utf-8") as f:
-            data = f.readlines()  # use this method to avoid delimiter '\u2029' to split a line
-        data = [line.strip() for line in data if len(line) > 0 and not line.isspace()]
+        self.tokenizer = tokenizer
+        self.block_size = block_size
+        self.lines = TextFileLines(file_path)
         # Get ref inf from file
-        with open(ref_path, encoding="utf-8") as f:
-            ref = [json.loads(line) for line in f.read().splitlines() if (len(line) > 0 and not line.isspace())]
-        assert len(data) == len(ref)
+        self.refs = TextFileLines(ref_path)
+        assert len(self.lines) == len(self.refs)
 
-        batch_encoding = tokenizer(data, add_special_tokens=True, truncation=True, max_length=block_size)
-        self.examples = batch_encoding["input_ids"]
-        self.examples = [{"input_ids": torch.tensor(e, dtype=torch.long)} for e in self.examples]
+        self.examples = self.chinese_refs = None
+        if lazy:
+            return
 
-        n = len(self.examples)
-        for i in range(n):
-            self.examples[i]["chinese_ref"] = torch.tensor(ref[i], dtype=torch.long)
+        examples = RaggedArrayBuilder()
+        for i in range(0, len(self.lines), TOKENIZATION_CHUNK_SIZE):
+            data = [line.strip() for line in self.lines[i : i + TOKENIZATION_CHUNK_SIZE]]
+            batch_encoding = tokenizer(data, add_special_tokens=True, truncation=True, max_length=block_size)
+            examples.extend(batch_encoding["input_ids"])
+        self.examples = examples.build()
+
+        chinese_refs = RaggedArrayBuilder()
+        chinese_refs.extend(json.loads(ref) for ref in self.refs)
+        self.chinese_refs = chinese_refs.build()
 
     def __len__(self):
-        return len(self.examples)
+        return len(self.lines)
 
     def __getitem__(self, i) -> Dict[str, torch.tensor]:
-        return self.examples[i]
+        if self.examples is not None:
+            input_ids, chinese_ref = self.examples[i], self.chinese_refs[i]
+        else:
+            input_ids = self.tokenizer(
+                self.lines[i].strip(), add_special_tokens=True, truncation=True, max_length=self.block_size
+            )["input_ids"]
+            chinese_ref = json.loads(self.refs[i])
+        return {
+            "input_ids": torch.tensor(input_ids, dtype=torch.long),
+            "chinese_ref": torch.tensor(chinese_ref, dtype=torch.long),
+        }
 
 
 class LineByLineWithSOPTextDataset(Dataset):
@@ -322,6 +495,25 @@ class LineByLineWithSOPTextDataset(Dataset):
         return self.examples[i]
 
 
+class _TokenizedDocuments(Sequence):
+    """
+    Documents stored as the flat array of the token ids of their lines, and converted to lists of lists of token ids
+    when accessed.
+    """
+
+    def __init__(self, lines: RaggedArray, offsets: np.ndarray):
+        self.lines = lines
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i) -> List[List[int]]:
+        if not 0 <= i < len(self):
+            raise IndexError(f"Index {i} is out of range for {len(self)} documents")
+        return [line.tolist() for line in self.lines[self.offsets[i] : self.offsets[i + 1]]]
+
+
 class TextDatasetForNextSentencePrediction(Dataset):
     """
     This will be superseded by a framework-agnostic approach soon.
@@ -335,6 +527,7 @@ class TextDatasetForNextSentencePrediction(Dataset):
         overwrite_cache=False,
         short_seq_probability=0.1,
         nsp_probability=0.5,
+        cache_dir: Optional[str] = None,
     ):
         warnings.warn(
             DEPRECATION_WARNING.format(
@@ -349,21 +542,24 @@ class TextDatasetForNextSentencePrediction(Dataset):
         self.nsp_probability = nsp_probability
 
         directory, filename = os.path.split(file_path)
-        cached_features_file = os.path.join(
-            directory,
+        cache = TokenizedDatasetCache(
+            cache_dir if cache_dir is not None else directory,
             "cached_nsp_{}_{}_{}".format(
                 tokenizer.__class__.__name__,
                 str(block_size),
                 filename,
             ),
+            cache_fingerprint(
+                tokenizer,
+                file_path,
+                block_size=block_size,
+                short_seq_probability=short_seq_probability,
+                nsp_probability=nsp_probability,
+            ),
         )
 
         self.tokenizer = tokenizer
 
-        # Make sure only the first process in distributed training processes the dataset,
-        # and the others will use the cache.
-        lock_path = cached_features_file + ".lock"
-
         # Input file format:
         # (1) One sentence per line. These should ideally be actual sentences, not
         # entire paragraphs or arbitrary spans of text. (Because we use the
@@ -377,44 +573,54 @@ class TextDatasetForNextSentencePrediction(Dataset):
         #
         # A new document.
 
-        with FileLock(lock_path):
-            if os.path.exists(cached_features_file) and not overwrite_cache:
+        # Make sure only the first process in distributed training processes the dataset,
+        # and the others will use the cache.
+        with cache.lock():
+            if cache.exists() and not overwrite_cache:
                 start = time.time()
-                with open(cached_features_file, "rb") as handle:
-                    self.examples = pickle.load(handle)
-                logger.info(
-                    f"Loading features from cached file {cached_features_file} [took %.3f s]", time.time() - start
-                )
+                self.columns = cache.load()
+                logger.info(f"Loading features from cached file {cache.path} [took %.3f s]", time.time() - start)
             else:
                 logger.info(f"Creating features from dataset file at {directory}")
 
-                self.documents = [[]]
-                with open(file_path, encoding="utf-8") as f:
-                    while True:
-                        line = f.readline()
-                        if not line:
-                            break
-                        line = line.strip()
-
-                        # Empty lines are used as document delimiters
-                        if not line and len(self.documents[-1]) != 0:
-                            self.documents.append([])
-                        tokens = tokenizer.tokenize(line)
-                        tokens = tokenizer.convert_tokens_to_ids(tokens)
-                        if tokens:
-                            self.documents[-1].append(tokens)
+                # The token ids are kept in flat arrays rather than lists, and the lines read from the memory-mapped
+                # file one at a time, so that large corpora fit in memory
+                lines = RaggedArrayBuilder()
+                document_offsets = array.array("q", [0])
+                for line in TextFileLines(file_path, skip_blank_lines=False):
+                    line = line.strip()
+
+                    # Empty lines are used as document delimiters
+                    if not line and document_offsets[-1] != len(lines):
+                        document_offsets.append(len(lines))
+                    tokens = tokenizer.tokenize(line)
+                    tokens = tokenizer.convert_tokens_to_ids(tokens)
+                    if tokens:
+                        lines.append(tokens)
+                document_offsets.append(len(lines))
+                self.documents = _TokenizedDocuments(lines.build(), np.frombuffer(document_offsets, dtype=np.int64))
 
                 logger.info(f"Creating examples from {len(self.documents)} documents.")
-                self.examples = []
+                self.columns = {
+                    "input_ids": RaggedArrayBuilder(),
+                    "token_type_ids": RaggedArrayBuilder(),
+                    "next_sentence_label": array.array("b"),
+                }
                 for doc_index, document in enumerate(self.documents):
                     self.create_examples_from_document(document, doc_index)
 
                 start = time.time()
-                with open(cached_features_file, "wb") as handle:
-                    pickle.dump(self.examples, handle, protocol=pickle.HIGHEST_PROTOCOL)
-                logger.info(
-                    "Saving features into cached file %s [took %.3f s]", cached_features_file, time.time() - start
+                cache.save(
+                    {
+                        "input_ids": self.columns["input_ids"].build(),
+                        "token_type_ids": self.columns["token_type_ids"].build(),
+                        "next_sentence_label": np.frombuffer(self.columns["next_sentence_label"], dtype=np.int8),
+                    }
                 )
+                # The examples are read from the memory-mapped cache from now on
+                del self.documents
+                self.columns = cache.load()
+                logger.info("Saving features into cached file %s [took %.3f s]", cache.path, time.time() - start)
 
     def create_examples_from_document(self, document: List[List[int]], doc_index: int):
         """Creates examples for a single document."""
@@ -491,13 +697,9 @@ class TextDatasetForNextSentencePrediction(Dataset):
                     # add token type ids, 0 for sentence a, 1 for sentence b
                     token_type_ids = self.tokenizer.create_token_type_ids_from_sequences(tokens_a, tokens_b)
 
-                    example = {
-                        "input_ids": torch.tensor(input_ids, dtype=torch.long),
-                        "token_type_ids": torch.tensor(token_type_ids, dtype=torch.long),
-                        "next_sentence_label": torch.tensor(1 if is_random_next else 0, dtype=torch.long),
-                    }
-
-                    self.examples.append(example)
+                    self.columns["input_ids"].append(input_ids)
+                    self.columns["token_type_ids"].append(token_type_ids)
+                    self.columns["next_sentence_label"].append(1 if is_random_next else 0)
 
                 current_chunk = []
                 current_length = 0
@@ -505,7 +707,11 @@ class TextDatasetForNextSentencePrediction(Dataset):
             i += 1
 
     def __len__(self):
-        return len(self.examples)
+        return len(self.columns["next_sentence_label"])
 
     def __getitem__(self, i):
-        return self.examples[i]
+        return {
+            "input_ids": torch.tensor(self.columns["input_ids"][i], dtype=torch.long),
+            "token_type_ids": torch.tensor(self.columns["token_type_ids"][i], dtype=torch.long),
+            "next_sentence_label": torch.tensor(self.columns["next_sentence_label"][i], dtype=torch.long),
+        }
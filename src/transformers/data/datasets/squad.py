@@ -1,18 +1,24 @@
 import os
 import time
+import warnings
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Dict, List, Optional, Union
+from typing import Dict, Optional, Union
 
 import torch
 from torch.utils.data.dataset import Dataset
 
-from filelock import FileLock
-
 from ...models.auto.modeling_auto import MODEL_FOR_QUESTION_ANSWERING_MAPPING
 from ...tokenization_utils import PreTrainedTokenizer
 from ...utils import logging
-from ..processors.squad import SquadFeatures, SquadV1Processor, SquadV2Processor, squad_convert_examples_to_features
+from ..processors.squad import (
+    SquadFeatureStore,
+    SquadV1Processor,
+    SquadV2Processor,
+    squad_convert_examples_to_feature_store,
+    squad_features_to_torch_dataset,
+)
+from ..tokenized_cache import TokenizedDatasetCache, cache_fingerprint
 
 
 logger = logging.get_logger(__name__)
@@ -90,7 +96,7 @@ class SquadDataset(Dataset):
     """
 
     args: SquadDataTrainingArguments
-    features: List[SquadFeatures]
+    features: SquadFeatureStore
     mode: Split
     is_language_sensitive: bool
 
@@ -102,8 +108,14 @@ class SquadDataset(Dataset):
         mode: Union[str, Split] = Split.train,
         is_language_sensitive: Optional[bool] = False,
         cache_dir: Optional[str] = None,
-        dataset_format: Optional[str] = "pt",
+        dataset_format: Optional[str] = None,
     ):
+        if dataset_format is not None:
+            warnings.warn(
+                "The `dataset_format` argument of SquadDataset is deprecated and will be removed in a future version, "
+                "`SquadDataset.dataset` is always a PyTorch dataset.",
+                FutureWarning,
+            )
         self.args = args
         self.is_language_sensitive = is_language_sensitive
         self.processor = SquadV2Processor() if args.version_2_with_negative else SquadV1Processor()
@@ -115,7 +127,8 @@ class SquadDataset(Dataset):
         self.mode = mode
         # Load data features from cache or dataset file
         version_tag = "v2" if args.version_2_with_negative else "v1"
-        cached_features_file = os.path.join(
+        data_file = self.processor.dev_file if mode == Split.dev else self.processor.train_file
+        self.cache = TokenizedDatasetCache(
             cache_dir if cache_dir is not None else args.data_dir,
             "cached_{}_{}_{}_{}".format(
                 mode.value,
@@ -123,69 +136,71 @@ class SquadDataset(Dataset):
                 str(args.max_seq_length),
                 version_tag,
             ),
+            cache_fingerprint(
+                tokenizer,
+                os.path.join(args.data_dir, data_file),
+                mode=mode.value,
+                max_seq_length=args.max_seq_length,
+                doc_stride=args.doc_stride,
+                max_query_length=args.max_query_length,
+            ),
         )
+        self._examples = None
+        self._dataset = None
 
         # Make sure only the first process in distributed training processes the dataset,
         # and the others will use the cache.
-        lock_path = cached_features_file + ".lock"
-        with FileLock(lock_path):
-            if os.path.exists(cached_features_file) and not args.overwrite_cache:
+        with self.cache.lock():
+            if self.cache.exists() and not args.overwrite_cache:
                 start = time.time()
-                self.old_features = torch.load(cached_features_file)
-
-                # Legacy cache files have only features, while new cache files
-                # will have dataset and examples also.
-                self.features = self.old_features["features"]
-                self.dataset = self.old_features.get("dataset", None)
-                self.examples = self.old_features.get("examples", None)
-                logger.info(
-                    f"Loading features from cached file {cached_features_file} [took %.3f s]", time.time() - start
-                )
-
-                if self.dataset is None or self.examples is None:
-                    logger.warn(
-                        f"Deleting cached file {cached_features_file} will allow dataset and examples to be cached in future run"
-                    )
+                self.features = SquadFeatureStore.load(self.cache)
+                logger.info(f"Loading features from cached file {self.cache.path} [took %.3f s]", time.time() - start)
             else:
                 if mode == Split.dev:
-                    self.examples = self.processor.get_dev_examples(args.data_dir)
+                    examples = self.processor.get_dev_examples(args.data_dir)
                 else:
-                    self.examples = self.processor.get_train_examples(args.data_dir)
+                    examples = self.processor.get_train_examples(args.data_dir)
 
-                self.features, self.dataset = squad_convert_examples_to_features(
-                    examples=self.examples,
+                # The features are written to the cache shard by shard as they are created, and the examples needed
+                # to evaluate the predictions are pickled with them, to be only loaded when accessed
+                self.features = squad_convert_examples_to_feature_store(
+                    examples=examples,
                     tokenizer=tokenizer,
                     max_seq_length=args.max_seq_length,
                     doc_stride=args.doc_stride,
                     max_query_length=args.max_query_length,
                     is_training=mode == Split.train,
+                    cache=self.cache,
                     threads=args.threads,
-                    return_dataset=dataset_format,
+                    objects={"examples": examples},
                 )
+                logger.info(f"Saved features into cached file {self.cache.path}")
+                self._examples = examples
 
-                start = time.time()
-                torch.save(
-                    {"features": self.features, "dataset": self.dataset, "examples": self.examples},
-                    cached_features_file,
-                )
-                # ^ This seems to take a lot of time so I want to investigate why and how we can improve.
-                logger.info(
-                    "Saving features into cached file %s [took %.3f s]", cached_features_file, time.time() - start
-                )
+    @property
+    def dataset(self):
+        if self._dataset is None:
+            self._dataset = squad_features_to_torch_dataset(self.features, self.mode == Split.train)
+        return self._dataset
+
+    @property
+    def examples(self):
+        if self._examples is None:
+            self._examples = self.cache.load_object("examples")
+        return self._examples
 
     def __len__(self):
         return len(self.features)
 
     def __getitem__(self, i) -> Dict[str, torch.Tensor]:
-        # Convert to Tensors and build dataset
-        feature = self.features[i]
-
-        input_ids = torch.tensor(feature.input_ids, dtype=torch.long)
-        attention_mask = torch.tensor(feature.attention_mask, dtype=torch.long)
-        token_type_ids = torch.tensor(feature.token_type_ids, dtype=torch.long)
-        cls_index = torch.tensor(feature.cls_index, dtype=torch.long)
-        p_mask = torch.tensor(feature.p_mask, dtype=torch.float)
-        is_impossible = torch.tensor(feature.is_impossible, dtype=torch.float)
+        # Convert to Tensors, sharing the memory of the features
+        columns = self.features.columns
+        input_ids = torch.as_tensor(columns["input_ids"][i], dtype=torch.long)
+        attention_mask = torch.as_tensor(columns["attention_mask"][i], dtype=torch.long)
+        token_type_ids = torch.as_tensor(columns["token_type_ids"][i], dtype=torch.long)
+        cls_index = torch.as_tensor(columns["cls_index"][i], dtype=torch.long)
+        p_mask = torch.as_tensor(columns["p_mask"][i], dtype=torch.float)
+        is_impossible = torch.as_tensor(columns["is_impossible"][i], dtype=torch.float)
 
         inputs = {
             "input_ids": input_ids,
@@ -204,8 +219,8 @@ class SquadDataset(Dataset):
                 inputs.update({"langs": (torch.ones(input_ids.shape, dtype=torch.int64) * self.args.lang_id)})
 
         if self.mode == Split.train:
-            start_positions = torch.tensor(feature.start_position, dtype=torch.long)
-            end_positions = torch.tensor(feature.end_position, dtype=torch.long)
+            start_positions = torch.as_tensor(columns["start_position"][i], dtype=torch.long)
+            end_positions = torch.as_tensor(columns["end_position"][i], dtype=torch.long)
             inputs.update({"start_positions": start_positions, "end_positions": end_positions})
 
         return inputs
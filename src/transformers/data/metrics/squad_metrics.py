@@ -9,14 +9,19 @@ probability that a question is unanswerable.
 
 
 import collections
+import itertools
 import json
 import math
 import re
 import string
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
-from transformers import BasicTokenizer
+import numpy as np
 
+from ...models.bert.tokenization_bert import BasicTokenizer
 from ...utils import logging
+from ..processors.utils import FeatureStore
 
 
 logger = logging.get_logger(__name__)
@@ -240,6 +245,11 @@ def squad_evaluate(examples, preds, no_answer_probs=None, no_answer_probability_
     return evaluation
 
 
+@lru_cache(maxsize=None)
+def _basic_tokenizer(do_lower_case):
+    return BasicTokenizer(do_lower_case=do_lower_case)
+
+
 def get_final_text(pred_text, orig_text, do_lower_case, verbose_logging=False):
     """Project the tokenized prediction back to the original text."""
 
@@ -283,7 +293,7 @@ def get_final_text(pred_text, orig_text, do_lower_case, verbose_logging=False):
     # and `pred_text`, and check if they are the same length. If they are
     # NOT the same length, the heuristic has failed. If they are the same
     # length, we assume the characters are one-to-one aligned.
-    tokenizer = BasicTokenizer(do_lower_case=do_lower_case)
+    tokenizer = _basic_tokenizer(do_lower_case)
 
     tok_text = " ".join(tokenizer.tokenize(orig_text))
 
@@ -334,18 +344,6 @@ def get_final_text(pred_text, orig_text, do_lower_case, verbose_logging=False):
     return output_text
 
 
-def _get_best_indexes(logits, n_best_size):
-    """Get the n-best logits from a list."""
-    index_and_score = sorted(enumerate(logits), key=lambda x: x[1], reverse=True)
-
-    best_indexes = []
-    for i in range(len(index_and_score)):
-        if i >= n_best_size:
-            break
-        best_indexes.append(index_and_score[i][0])
-    return best_indexes
-
-
 def _compute_softmax(scores):
     """Compute softmax probability over raw logits."""
     if not scores:
@@ -369,6 +367,130 @@ def _compute_softmax(scores):
     return probs
 
 
+def _rank_spans(
+    scores: np.ndarray, valid: np.ndarray, top_k: Optional[int] = None
+) -> Tuple[Tuple[np.ndarray, ...], np.ndarray]:
+    # Returns the indices of the valid spans in `scores` and their scores, by decreasing score. Spans with the same
+    # score stay in the order in which they are in `scores` (row-major), as with a stable sort.
+    indices = np.nonzero(valid)
+    scores = scores[valid]
+    if top_k is not None and top_k < len(scores):
+        order = np.sort(np.argpartition(-scores, top_k - 1)[:top_k])
+        order = order[np.argsort(-scores[order], kind="stable")]
+    else:
+        order = np.argsort(-scores, kind="stable")
+    return tuple(index[order] for index in indices), scores[order]
+
+
+def select_best_spans(
+    start_scores: np.ndarray,
+    end_scores: np.ndarray,
+    max_answer_length: int,
+    n_best_size: Optional[int] = None,
+    top_k: Optional[int] = None,
+    start_mask: Optional[np.ndarray] = None,
+    end_mask: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds the best answer spans in a batch of features, from the scores of each token to start and to end the answer.
+    The score of a span is the sum of the scores of its start and of its end (e.g. of their logits, or of their log
+    probabilities). Spans ending before they start, longer than :obj:`max_answer_length`, or starting or ending on a
+    masked token are discarded. The candidate spans of all the features are scored at once, as an outer sum.
+
+    Used by :func:`compute_predictions_logits` and :class:`~transformers.QuestionAnsweringPipeline`.
+
+    Args:
+        start_scores (:obj:`np.ndarray` of shape :obj:`(batch_size, sequence_length)`):
+            The score of each token to start the answer.
+        end_scores (:obj:`np.ndarray` of shape :obj:`(batch_size, sequence_length)`):
+            The score of each token to end the answer.
+        max_answer_length (:obj:`int`):
+            The maximum number of tokens of an answer.
+        n_best_size (:obj:`int`, `optional`):
+            If set, only the spans starting on one of the :obj:`n_best_size` best starts of their feature and ending on
+            one of its :obj:`n_best_size` best ends (masked tokens included) are candidates. Otherwise all the spans
+            are.
+        top_k (:obj:`int`, `optional`):
+            The number of spans to return. All the valid ones if not set.
+        start_mask (:obj:`np.ndarray` of shape :obj:`(batch_size, sequence_length)`, `optional`):
+            Whether each token can start an answer.
+        end_mask (:obj:`np.ndarray` of shape :obj:`(batch_size, sequence_length)`, `optional`):
+            Whether each token can end an answer.
+
+    Returns:
+        :obj:`Tuple[np.ndarray]`: The index of the feature, the start index, the end index and the score of the spans,
+        by decreasing score. Spans with the same score are in the order of their feature, then of the rank of their
+        start, then of the rank of their end.
+    """
+    start_scores = np.asarray(start_scores)
+    end_scores = np.asarray(end_scores)
+    if start_scores.ndim == 1:
+        start_scores, end_scores = start_scores[None], end_scores[None]
+        start_mask = start_mask[None] if start_mask is not None else None
+        end_mask = end_mask[None] if end_mask is not None else None
+    batch_size, sequence_length = start_scores.shape
+
+    if n_best_size is None:
+        start_indexes = end_indexes = np.broadcast_to(np.arange(sequence_length), (batch_size, sequence_length))
+    else:
+        start_indexes = np.argsort(-start_scores, axis=-1, kind="stable")[:, :n_best_size]
+        end_indexes = np.argsort(-end_scores, axis=-1, kind="stable")[:, :n_best_size]
+    batch_indexes = np.arange(batch_size)[:, None]
+
+    scores = (
+        start_scores[batch_indexes, start_indexes][:, :, None] + end_scores[batch_indexes, end_indexes][:, None, :]
+    )
+    lengths = end_indexes[:, None, :] - start_indexes[:, :, None] + 1
+    valid = (lengths >= 1) & (lengths <= max_answer_length)
+    if start_mask is not None:
+        valid &= np.asarray(start_mask)[batch_indexes, start_indexes][:, :, None]
+    if end_mask is not None:
+        valid &= np.asarray(end_mask)[batch_indexes, end_indexes][:, None, :]
+
+    (feature_indexes, start_ranks, end_ranks), scores = _rank_spans(scores, valid, top_k=top_k)
+    return (
+        feature_indexes,
+        start_indexes[feature_indexes, start_ranks],
+        end_indexes[feature_indexes, end_ranks],
+        scores,
+    )
+
+
+def _stack_scores(rows: List) -> np.ndarray:
+    # Stacks the scores of features of different lengths, padded with -inf
+    rows = [np.asarray(row) for row in rows]
+    dtype = np.result_type(*rows, np.float16)
+    stacked = np.full((len(rows), max(len(row) for row in rows)), -np.inf, dtype=dtype)
+    for i, row in enumerate(rows):
+        stacked[i, : len(row)] = row
+    return stacked
+
+
+def _span_masks(features: List, lengths: List[int], sequence_length: int) -> Tuple[np.ndarray, np.ndarray]:
+    # The tokens that can start and end an answer: those of the context, in their maximum context for the starts
+    start_mask = np.zeros((len(features), sequence_length), dtype=bool)
+    end_mask = np.zeros((len(features), sequence_length), dtype=bool)
+    for i, (feature, length) in enumerate(zip(features, lengths)):
+        length = min(length, len(feature.tokens))
+        indexes = np.fromiter(feature.token_to_orig_map, dtype=np.int64, count=len(feature.token_to_orig_map))
+        end_mask[i, indexes[indexes < length]] = True
+        max_context = [index for index, is_max in feature.token_is_max_context.items() if is_max and index < length]
+        start_mask[i, max_context] = True
+    return start_mask & end_mask, end_mask
+
+
+def _feature_indexes_by_example(all_features) -> "collections.defaultdict":
+    # The features are grouped by index rather than as objects, so that those of a store are only built when needed
+    if isinstance(all_features, FeatureStore):
+        example_indexes = all_features.columns["example_index"].tolist()
+    else:
+        example_indexes = [feature.example_index for feature in all_features]
+    example_index_to_features = collections.defaultdict(list)
+    for feature_index, example_index in enumerate(example_indexes):
+        example_index_to_features[example_index].append(feature_index)
+    return example_index_to_features
+
+
 def compute_predictions_logits(
     all_examples,
     all_features,
@@ -392,9 +514,7 @@ def compute_predictions_logits(
     if output_null_log_odds_file and version_2_with_negative:
         logger.info(f"Writing null_log_odds to: {output_null_log_odds_file}")
 
-    example_index_to_features = collections.defaultdict(list)
-    for feature in all_features:
-        example_index_to_features[feature.example_index].append(feature)
+    example_index_to_features = _feature_indexes_by_example(all_features)
 
     unique_id_to_result = {}
     for result in all_results:
@@ -409,66 +529,66 @@ def compute_predictions_logits(
     scores_diff_json = collections.OrderedDict()
 
     for (example_index, example) in enumerate(all_examples):
-        features = example_index_to_features[example_index]
+        features = [all_features[i] for i in example_index_to_features[example_index]]
+        results = [unique_id_to_result[feature.unique_id] for feature in features]
 
-        prelim_predictions = []
+        prelim_predictions = iter([])
         # keep track of the minimum score of null start+end of position 0
         score_null = 1000000  # large and positive
         min_null_feature_index = 0  # the paragraph slice with min null score
         null_start_logit = 0  # the start logit at the slice with min null score
         null_end_logit = 0  # the end logit at the slice with min null score
-        for (feature_index, feature) in enumerate(features):
-            result = unique_id_to_result[feature.unique_id]
-            start_indexes = _get_best_indexes(result.start_logits, n_best_size)
-            end_indexes = _get_best_indexes(result.end_logits, n_best_size)
+        if features:
+            start_logits = _stack_scores([result.start_logits for result in results])
+            end_logits = _stack_scores([result.end_logits for result in results])
+            start_mask, end_mask = _span_masks(
+                features, [len(result.start_logits) for result in results], start_logits.shape[-1]
+            )
+            # The candidates are the valid spans among the n_best_size best starts and ends of each feature, by
+            # decreasing score
+            feature_indexes, start_indexes, end_indexes, scores = select_best_spans(
+                start_logits,
+                end_logits,
+                max_answer_length,
+                n_best_size=n_best_size,
+                start_mask=start_mask,
+                end_mask=end_mask,
+            )
+            # The predictions are only built as they are needed for the n-best
+            prelim_predictions = (
+                _PrelimPrediction(
+                    feature_index=feature_index,
+                    start_index=start_index,
+                    end_index=end_index,
+                    start_logit=results[feature_index].start_logits[start_index],
+                    end_logit=results[feature_index].end_logits[end_index],
+                )
+                for feature_index, start_index, end_index in zip(
+                    feature_indexes.tolist(), start_indexes.tolist(), end_indexes.tolist()
+                )
+            )
             # if we could have irrelevant answers, get the min score of irrelevant
             if version_2_with_negative:
-                feature_null_score = result.start_logits[0] + result.end_logits[0]
+                feature_index = int(np.argmin(start_logits[:, 0] + end_logits[:, 0]))
+                feature_null_score = results[feature_index].start_logits[0] + results[feature_index].end_logits[0]
                 if feature_null_score < score_null:
                     score_null = feature_null_score
                     min_null_feature_index = feature_index
-                    null_start_logit = result.start_logits[0]
-                    null_end_logit = result.end_logits[0]
-            for start_index in start_indexes:
-                for end_index in end_indexes:
-                    # We could hypothetically create invalid predictions, e.g., predict
-                    # that the start of the span is in the question. We throw out all
-                    # invalid predictions.
-                    if start_index >= len(feature.tokens):
-                        continue
-                    if end_index >= len(feature.tokens):
-                        continue
-                    if start_index not in feature.token_to_orig_map:
-                        continue
-                    if end_index not in feature.token_to_orig_map:
-                        continue
-                    if not feature.token_is_max_context.get(start_index, False):
-                        continue
-                    if end_index < start_index:
-                        continue
-                    length = end_index - start_index + 1
-                    if length > max_answer_length:
-                        continue
-                    prelim_predictions.append(
-                        _PrelimPrediction(
-                            feature_index=feature_index,
-                            start_index=start_index,
-                            end_index=end_index,
-                            start_logit=result.start_logits[start_index],
-                            end_logit=result.end_logits[end_index],
-                        )
-                    )
+                    null_start_logit = results[feature_index].start_logits[0]
+                    null_end_logit = results[feature_index].end_logits[0]
         if version_2_with_negative:
-            prelim_predictions.append(
-                _PrelimPrediction(
-                    feature_index=min_null_feature_index,
-                    start_index=0,
-                    end_index=0,
-                    start_logit=null_start_logit,
-                    end_logit=null_end_logit,
-                )
+            null_prediction = _PrelimPrediction(
+                feature_index=min_null_feature_index,
+                start_index=0,
+                end_index=0,
+                start_logit=null_start_logit,
+                end_logit=null_end_logit,
+            )
+            # The null prediction comes after the spans with the same score
+            null_rank = int(np.count_nonzero(scores >= null_start_logit + null_end_logit)) if features else 0
+            prelim_predictions = itertools.chain(
+                itertools.islice(prelim_predictions, null_rank), [null_prediction], prelim_predictions
             )
-        prelim_predictions = sorted(prelim_predictions, key=lambda x: (x.start_logit + x.end_logit), reverse=True)
 
         _NbestPrediction = collections.namedtuple(  # pylint: disable=invalid-name
             "NbestPrediction", ["text", "start_logit", "end_logit"]
@@ -606,9 +726,7 @@ def compute_predictions_log_probs(
     logger.info("Writing predictions to: %s", output_prediction_file)
     # logger.info("Writing nbest to: %s" % (output_nbest_file))
 
-    example_index_to_features = collections.defaultdict(list)
-    for feature in all_features:
-        example_index_to_features[feature.example_index].append(feature)
+    example_index_to_features = _feature_indexes_by_example(all_features)
 
     unique_id_to_result = {}
     for result in all_results:
@@ -619,59 +737,58 @@ def compute_predictions_log_probs(
     scores_diff_json = collections.OrderedDict()
 
     for (example_index, example) in enumerate(all_examples):
-        features = example_index_to_features[example_index]
+        features = [all_features[i] for i in example_index_to_features[example_index]]
+        results = [unique_id_to_result[feature.unique_id] for feature in features]
 
         prelim_predictions = []
         # keep track of the minimum score of null start+end of position 0
         score_null = 1000000  # large and positive
-
-        for (feature_index, feature) in enumerate(features):
-            result = unique_id_to_result[feature.unique_id]
-
-            cur_null_score = result.cls_logits
-
+        for result in results:
             # if we could have irrelevant answers, get the min score of irrelevant
-            score_null = min(score_null, cur_null_score)
-
-            for i in range(start_n_top):
-                for j in range(end_n_top):
-                    start_log_prob = result.start_logits[i]
-                    start_index = result.start_top_index[i]
-
-                    j_index = i * end_n_top + j
-
-                    end_log_prob = result.end_logits[j_index]
-                    end_index = result.end_top_index[j_index]
-
-                    # We could hypothetically create invalid predictions, e.g., predict
-                    # that the start of the span is in the question. We throw out all
-                    # invalid predictions.
-                    if start_index >= feature.paragraph_len - 1:
-                        continue
-                    if end_index >= feature.paragraph_len - 1:
-                        continue
-
-                    if not feature.token_is_max_context.get(start_index, False):
-                        continue
-                    if end_index < start_index:
-                        continue
-                    length = end_index - start_index + 1
-                    if length > max_answer_length:
-                        continue
-
-                    prelim_predictions.append(
-                        _PrelimPrediction(
-                            feature_index=feature_index,
-                            start_index=start_index,
-                            end_index=end_index,
-                            start_log_prob=start_log_prob,
-                            end_log_prob=end_log_prob,
-                        )
+            score_null = min(score_null, result.cls_logits)
+
+        if features:
+            # The candidates are the start_n_top best starts of each feature, each with its end_n_top best ends
+            num_candidates = start_n_top * end_n_top
+            start_log_probs = np.array([result.start_logits[:start_n_top] for result in results])
+            start_indexes = np.array([result.start_top_index[:start_n_top] for result in results])
+            end_log_probs = np.array([result.end_logits[:num_candidates] for result in results])
+            end_indexes = np.array([result.end_top_index[:num_candidates] for result in results])
+            end_log_probs = end_log_probs.reshape(len(results), start_n_top, end_n_top)
+            end_indexes = end_indexes.reshape(len(results), start_n_top, end_n_top)
+
+            # We could hypothetically create invalid predictions, e.g., predict that the start of the span is in the
+            # question. We throw out all invalid predictions.
+            paragraph_lens = np.array([feature.paragraph_len for feature in features])[:, None, None]
+            is_max_context = np.array(
+                [
+                    [feature.token_is_max_context.get(start_index, False) for start_index in feature_start_indexes]
+                    for feature, feature_start_indexes in zip(features, start_indexes.tolist())
+                ],
+                dtype=bool,
+            )
+            lengths = end_indexes - start_indexes[:, :, None] + 1
+            valid = (
+                (start_indexes[:, :, None] < paragraph_lens - 1)
+                & (end_indexes < paragraph_lens - 1)
+                & is_max_context[:, :, None]
+                & (lengths >= 1)
+                & (lengths <= max_answer_length)
+            )
+            (feature_indexes, i_indexes, j_indexes), _ = _rank_spans(
+                start_log_probs[:, :, None] + end_log_probs, valid
+            )
+            for feature_index, i, j in zip(feature_indexes.tolist(), i_indexes.tolist(), j_indexes.tolist()):
+                result = results[feature_index]
+                prelim_predictions.append(
+                    _PrelimPrediction(
+                        feature_index=feature_index,
+                        start_index=result.start_top_index[i],
+                        end_index=result.end_top_index[i * end_n_top + j],
+                        start_log_prob=result.start_logits[i],
+                        end_log_prob=result.end_logits[i * end_n_top + j],
                     )
-
-        prelim_predictions = sorted(
-            prelim_predictions, key=lambda x: (x.start_log_prob + x.end_log_prob), reverse=True
-        )
+                )
 
         seen_predictions = {}
         nbest = []
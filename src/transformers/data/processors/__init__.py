@@ -3,6 +3,22 @@
 # module, but to preserve other warnings. So, don't check this module at all.
 
 from .glue import glue_convert_examples_to_features, glue_output_modes, glue_processors, glue_tasks_num_labels
-from .squad import SquadExample, SquadFeatures, SquadV1Processor, SquadV2Processor, squad_convert_examples_to_features
-from .utils import DataProcessor, InputExample, InputFeatures, SingleSentenceClassificationProcessor
+from .squad import (
+    SquadExample,
+    SquadFeatures,
+    SquadFeatureStore,
+    SquadV1Processor,
+    SquadV2Processor,
+    squad_convert_examples_to_feature_store,
+    squad_convert_examples_to_features,
+)
+from .utils import (
+    DataProcessor,
+    FeatureStore,
+    FeatureStoreWriter,
+    InputExample,
+    InputFeatures,
+    InputFeatureStore,
+    SingleSentenceClassificationProcessor,
+)
 from .xnli import xnli_output_modes, xnli_processors, xnli_tasks_num_labels
@@ -1,5 +1,6 @@
 import json
 import os
+import time
 from functools import partial
 from multiprocessing import Pool, cpu_count
 
@@ -10,7 +11,7 @@ from ...file_utils import is_tf_available, is_torch_available
 from ...models.bert.tokenization_bert import whitespace_tokenize
 from ...tokenization_utils_base import BatchEncoding, PreTrainedTokenizerBase, TruncationStrategy
 from ...utils import logging
-from .utils import DataProcessor
+from .utils import DataProcessor, FeatureStore, FeatureStoreWriter
 
 
 # Store the tokenizers which insert 2 separators tokens
@@ -19,7 +20,6 @@ MULTI_SEP_TOKENS_TOKENIZERS_SET = {"roberta", "camembert", "bart"}
 
 if is_torch_available():
     import torch
-    from torch.utils.data import TensorDataset
 
 if is_tf_available():
     import tensorflow as tf
@@ -296,11 +296,65 @@ def squad_convert_example_to_features(
     return features
 
 
+def squad_features_to_torch_dataset(features: "SquadFeatureStore", is_training: bool):
+    """
+    Returns a dataset of the tensors of :obj:`features`, sharing their memory. Its items are the tuples
+    :obj:`(input_ids, attention_mask, token_type_ids, feature_index, cls_index, p_mask)` for evaluation, and
+    :obj:`(input_ids, attention_mask, token_type_ids, start_position, end_position, cls_index, p_mask, is_impossible)`
+    for training.
+    """
+    if not is_training:
+        fields = ["input_ids", "attention_mask", "token_type_ids", None, "cls_index", "p_mask"]
+    else:
+        fields = [
+            "input_ids",
+            "attention_mask",
+            "token_type_ids",
+            "start_position",
+            "end_position",
+            "cls_index",
+            "p_mask",
+            "is_impossible",
+        ]
+    return features.to_torch_dataset(fields, dtypes={"p_mask": torch.float, "is_impossible": torch.float})
+
+
 def squad_convert_example_to_features_init(tokenizer_for_convert: PreTrainedTokenizerBase):
     global tokenizer
     tokenizer = tokenizer_for_convert
 
 
+def _squad_convert_example_to_stored_features(example, **kwargs):
+    # The encodings of fast tokenizers are not stored, so they are not sent back from the workers either
+    features = squad_convert_example_to_features(example, **kwargs)
+    for feature in features:
+        feature.encoding = None
+    return features
+
+
+def _squad_convert_examples(examples, tokenizer, threads, tqdm_enabled, convert_function, **kwargs):
+    # Yields the features of the examples as the workers create them, with their example index and unique id
+    threads = min(threads, cpu_count())
+    unique_id = 1000000000
+    example_index = 0
+    with Pool(threads, initializer=squad_convert_example_to_features_init, initargs=(tokenizer,)) as p:
+        annotate_ = partial(convert_function, **kwargs)
+        for example_features in tqdm(
+            p.imap(annotate_, examples, chunksize=32),
+            total=len(examples),
+            desc="convert squad examples to features",
+            disable=not tqdm_enabled,
+        ):
+            if not example_features:
+                continue
+            for example_feature in example_features:
+                example_feature.example_index = example_index
+                example_feature.unique_id = unique_id
+                yield example_feature
+                unique_id += 1
+            example_index += 1
+
+
 def squad_convert_examples_to_features(
     examples,
     tokenizer,
@@ -326,12 +380,14 @@ def squad_convert_examples_to_features(
         is_training: whether to create features for model evaluation or model training.
         padding_strategy: Default to "max_length". Which padding strategy to use
         return_dataset: Default False. Either 'pt' or 'tf'.
-            if 'pt': returns a torch.data.TensorDataset, if 'tf': returns a tf.data.Dataset
+            if 'pt': returns the features in a :class:`~transformers.data.processors.squad.SquadFeatureStore` and a
+            dataset of their tensors (see :func:`squad_features_to_torch_dataset`), if 'tf': returns a tf.data.Dataset
         threads: multiple processing threads.
 
 
     Returns:
-        list of :class:`~transformers.data.processors.squad.SquadFeatures`
+        list of :class:`~transformers.data.processors.squad.SquadFeatures`, or a tuple of a
+        :class:`~transformers.data.processors.squad.SquadFeatureStore` and a dataset if :obj:`return_dataset="pt"`
 
     Example::
 
@@ -347,12 +403,12 @@ def squad_convert_examples_to_features(
             is_training=not evaluate,
         )
     """
-    # Defining helper methods
-    features = []
-
-    threads = min(threads, cpu_count())
-    with Pool(threads, initializer=squad_convert_example_to_features_init, initargs=(tokenizer,)) as p:
-        annotate_ = partial(
+    features = list(
+        _squad_convert_examples(
+            examples,
+            tokenizer,
+            threads,
+            tqdm_enabled,
             squad_convert_example_to_features,
             max_seq_length=max_seq_length,
             doc_stride=doc_stride,
@@ -360,63 +416,14 @@ def squad_convert_examples_to_features(
             padding_strategy=padding_strategy,
             is_training=is_training,
         )
-        features = list(
-            tqdm(
-                p.imap(annotate_, examples, chunksize=32),
-                total=len(examples),
-                desc="convert squad examples to features",
-                disable=not tqdm_enabled,
-            )
-        )
-
-    new_features = []
-    unique_id = 1000000000
-    example_index = 0
-    for example_features in tqdm(
-        features, total=len(features), desc="add example index and unique id", disable=not tqdm_enabled
-    ):
-        if not example_features:
-            continue
-        for example_feature in example_features:
-            example_feature.example_index = example_index
-            example_feature.unique_id = unique_id
-            new_features.append(example_feature)
-            unique_id += 1
-        example_index += 1
-    features = new_features
-    del new_features
+    )
     if return_dataset == "pt":
         if not is_torch_available():
             raise RuntimeError("PyTorch must be installed to return a PyTorch dataset.")
 
-        # Convert to Tensors and build dataset
-        all_input_ids = torch.tensor([f.input_ids for f in features], dtype=torch.long)
-        all_attention_masks = torch.tensor([f.attention_mask for f in features], dtype=torch.long)
-        all_token_type_ids = torch.tensor([f.token_type_ids for f in features], dtype=torch.long)
-        all_cls_index = torch.tensor([f.cls_index for f in features], dtype=torch.long)
-        all_p_mask = torch.tensor([f.p_mask for f in features], dtype=torch.float)
-        all_is_impossible = torch.tensor([f.is_impossible for f in features], dtype=torch.float)
-
-        if not is_training:
-            all_feature_index = torch.arange(all_input_ids.size(0), dtype=torch.long)
-            dataset = TensorDataset(
-                all_input_ids, all_attention_masks, all_token_type_ids, all_feature_index, all_cls_index, all_p_mask
-            )
-        else:
-            all_start_positions = torch.tensor([f.start_position for f in features], dtype=torch.long)
-            all_end_positions = torch.tensor([f.end_position for f in features], dtype=torch.long)
-            dataset = TensorDataset(
-                all_input_ids,
-                all_attention_masks,
-                all_token_type_ids,
-                all_start_positions,
-                all_end_positions,
-                all_cls_index,
-                all_p_mask,
-                all_is_impossible,
-            )
-
-        return features, dataset
+        # The features are stored field by field, and the tensors of the dataset share their memory
+        features = SquadFeatureStore.from_features(features)
+        return features, squad_features_to_torch_dataset(features, is_training)
     elif return_dataset == "tf":
         if not is_tf_available():
             raise RuntimeError("TensorFlow must be installed to return a TensorFlow dataset.")
@@ -525,6 +532,90 @@ def squad_convert_examples_to_features(
         return features
 
 
+def squad_convert_examples_to_feature_store(
+    examples,
+    tokenizer,
+    max_seq_length,
+    doc_stride,
+    max_query_length,
+    is_training,
+    cache,
+    padding_strategy="max_length",
+    threads=1,
+    shard_size=10000,
+    objects=None,
+    tqdm_enabled=True,
+):
+    """
+    Converts a list of examples into features like :func:`squad_convert_examples_to_features`, but writes them to
+    :obj:`cache` as the workers create them instead of returning them, :obj:`shard_size` features at a time (see
+    :class:`~transformers.data.processors.utils.FeatureStoreWriter`). Only one shard of features is held in memory, so
+    datasets with many features per example (long contexts split with a small :obj:`doc_stride`) can be converted
+    whatever their size. The features are then loaded memory-mapped.
+
+    Args:
+        examples: list of :class:`~transformers.data.processors.squad.SquadExample`
+        tokenizer: an instance of a child of :class:`~transformers.PreTrainedTokenizer`
+        max_seq_length: The maximum sequence length of the inputs.
+        doc_stride: The stride used when the context is too large and is split across several features.
+        max_query_length: The maximum length of the query.
+        is_training: whether to create features for model evaluation or model training.
+        cache: The :class:`~transformers.data.tokenized_cache.TokenizedDatasetCache` to write the features to.
+        padding_strategy: Default to "max_length". Which padding strategy to use
+        threads: multiple processing threads.
+        shard_size: Default to 10000. The number of features stored at once.
+        objects: Other objects to pickle with the features, e.g. the examples.
+
+    Returns:
+        :class:`~transformers.data.processors.squad.SquadFeatureStore` of the features, memory-mapped from
+        :obj:`cache`. A dataset of their tensors is given by :func:`squad_features_to_torch_dataset`.
+
+    Example::
+
+        processor = SquadV2Processor()
+        examples = processor.get_dev_examples(data_dir)
+        cache = TokenizedDatasetCache(data_dir, "cached_dev", cache_fingerprint(tokenizer, dev_file))
+
+        features = squad_convert_examples_to_feature_store(
+            examples=examples,
+            tokenizer=tokenizer,
+            max_seq_length=args.max_seq_length,
+            doc_stride=args.doc_stride,
+            max_query_length=args.max_query_length,
+            is_training=False,
+            cache=cache,
+        )
+        dataset = squad_features_to_torch_dataset(features, is_training=False)
+    """
+    start = time.time()
+    writer = FeatureStoreWriter(SquadFeatureStore, cache, shard_size=shard_size)
+    writer.extend(
+        _squad_convert_examples(
+            examples,
+            tokenizer,
+            threads,
+            tqdm_enabled,
+            _squad_convert_example_to_stored_features,
+            max_seq_length=max_seq_length,
+            doc_stride=doc_stride,
+            max_query_length=max_query_length,
+            padding_strategy=padding_strategy,
+            is_training=is_training,
+        )
+    )
+    features = writer.close(objects=objects)
+    elapsed = time.time() - start
+    logger.info(
+        "Converted %d examples into %d features in %.1fs (%.1f examples/s, %.1f features/s)",
+        len(examples),
+        len(features),
+        elapsed,
+        len(examples) / elapsed,
+        len(features) / elapsed,
+    )
+    return features
+
+
 class SquadProcessor(DataProcessor):
     """
     Processor for the SQuAD data set. overridden by SquadV1Processor and SquadV2Processor, used by the version 1.1 and
@@ -808,6 +899,38 @@ class SquadFeatures:
         self.encoding = encoding
 
 
+class SquadFeatureStore(FeatureStore):
+    """
+    :class:`~transformers.data.processors.utils.FeatureStore` of
+    :class:`~transformers.data.processors.squad.SquadFeatures`. The :obj:`token_to_orig_map` and
+    :obj:`token_is_max_context` dictionaries are stored as arrays of their keys and values, the tokens and the ids of
+    the questions as indices in tables of the distinct ones. The encodings of fast tokenizers are not stored.
+
+    The fields used as inputs of the models are stored in the types of the tensors of
+    :func:`~transformers.data.processors.squad.squad_features_to_torch_dataset`, so that they share their memory.
+    """
+
+    feature_class = SquadFeatures
+    field_names = [
+        "input_ids",
+        "attention_mask",
+        "token_type_ids",
+        "cls_index",
+        "p_mask",
+        "example_index",
+        "unique_id",
+        "paragraph_len",
+        "token_is_max_context",
+        "tokens",
+        "token_to_orig_map",
+        "start_position",
+        "end_position",
+        "is_impossible",
+        "qas_id",
+    ]
+    field_dtypes = {"p_mask": np.float32, "is_impossible": np.float32, "token_to_orig_map": np.int32}
+
+
 class SquadResult:
     """
     Constructs a SquadResult which can be used to evaluate a model's output on the SQuAD dataset.
@@ -17,15 +17,25 @@
 import csv
 import dataclasses
 import json
+from collections.abc import Sequence
 from dataclasses import dataclass
-from typing import List, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
 
 from ...file_utils import is_tf_available, is_torch_available
 from ...utils import logging
+from ..tokenized_cache import RaggedArray, TokenizedDatasetCache, TokenizedDatasetCacheWriter
+
 
+if is_torch_available():
+    import torch
 
 logger = logging.get_logger(__name__)
 
+_PYTHON_TYPES = {"bool": bool, "int": int, "float": float}
+_DEFAULT_DTYPES = {"bool": np.bool_, "int": np.int64, "float": np.float64}
+
 
 @dataclass
 class InputExample:
@@ -78,6 +88,353 @@ class InputFeatures:
         return json.dumps(dataclasses.asdict(self)) + "\n"
 
 
+def _python_type(value) -> str:
+    if isinstance(value, (bool, np.bool_)):
+        return "bool"
+    if isinstance(value, (int, np.integer)):
+        return "int"
+    if isinstance(value, (float, np.floating)):
+        return "float"
+    raise ValueError(f"Values of type {type(value)} cannot be stored in a `FeatureStore`.")
+
+
+def _sequence_column(sequences: List, dtype) -> Union[np.ndarray, RaggedArray]:
+    # Sequences of the same length (e.g. padded) are stored in a 2D array, which tensors can share
+    if len(sequences) > 0 and all(len(sequence) == len(sequences[0]) for sequence in sequences):
+        return np.array(sequences, dtype=dtype).reshape(len(sequences), len(sequences[0]))
+    return RaggedArray.from_sequences(sequences, dtype=dtype)
+
+
+class _StringTable(dict):
+    """Index of each distinct string, in the order they are first seen."""
+
+    def __missing__(self, string: str) -> int:
+        index = self[string] = len(self)
+        return index
+
+
+def _field_type(values: List) -> Tuple[str, str]:
+    # How a field is stored, from its values in the features
+    if isinstance(values[0], str):
+        return "string", "int"
+    if isinstance(values[0], dict):
+        return "dict", next((_python_type(v) for value in values for v in value.values()), "int")
+    if np.ndim(values[0]) == 0:
+        return "number", _python_type(values[0])
+    if any(isinstance(value[0], str) for value in values if len(value) > 0):
+        return "strings", "int"
+    return "sequence", next((_python_type(value[0]) for value in values if len(value) > 0), "int")
+
+
+class FeatureStore(Sequence):
+    """
+    Features of a dataset stored field by field in contiguous arrays instead of as one Python object per feature, which
+    takes several times less memory and is saved and loaded without pickling (see :meth:`save` and :meth:`load`):
+
+        - numbers are stored in a 1D array,
+        - sequences of numbers in a 2D array if they all have the same length (e.g. when padded), in a
+          :class:`~transformers.data.tokenized_cache.RaggedArray` otherwise,
+        - strings and sequences of strings as indices in a table of the distinct strings,
+        - dictionaries as the sequences of their keys and of their values.
+
+    Indexing the store builds the features (of class :obj:`feature_class`) on the fly, with the same types as the
+    features the store was created from. :meth:`to_torch_dataset` gives a dataset of tensors sharing the memory of the
+    arrays instead. Stores of more features than fit in memory are written shard by shard with a
+    :class:`~transformers.data.processors.utils.FeatureStoreWriter`.
+
+    Args:
+        columns (:obj:`Dict[str, Union[np.ndarray, RaggedArray]]`):
+            The arrays the fields are stored in. Dictionaries are stored in the :obj:`{field}_keys` and
+            :obj:`{field}_values` columns.
+        fields (:obj:`Dict[str, Tuple[str, str]]`):
+            For each field, how it is stored (:obj:`"number"`, :obj:`"sequence"`, :obj:`"string"`, :obj:`"strings"` or
+            :obj:`"dict"`) and the Python type of its numbers (:obj:`"bool"`, :obj:`"int"` or :obj:`"float"`). Fields
+            of :obj:`field_names` missing from it are :obj:`None` in all features.
+        tables (:obj:`Dict[str, List[str]]`, `optional`):
+            The distinct strings of each field of strings.
+    """
+
+    feature_class = None
+    # The fields of the features to store
+    field_names: List[str] = []
+    # The types in which the fields are stored, if not the default one of their Python type
+    field_dtypes: Dict[str, Any] = {}
+
+    def __init__(
+        self,
+        columns: Dict[str, Union[np.ndarray, RaggedArray]],
+        fields: Dict[str, Tuple[str, str]],
+        tables: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.columns = columns
+        self.fields = fields
+        self.tables = tables if tables is not None else {}
+        self._length = 0
+        if len(columns) > 0:
+            self._length = len(next(iter(columns.values())))
+
+    @classmethod
+    def from_features(cls, features: List) -> "FeatureStore":
+        """
+        Stores :obj:`features` field by field.
+
+        Args:
+            features (:obj:`List`):
+                The features, instances of :obj:`feature_class`.
+
+        Returns:
+            :class:`~transformers.data.processors.utils.FeatureStore`: The store of the features.
+        """
+        fields, tables = {}, {}
+        columns = cls._columns_from_features(features, fields, tables)
+        store = cls(columns, fields, {name: list(table) for name, table in tables.items()})
+        store._length = len(features)
+        return store
+
+    @classmethod
+    def _columns_from_features(
+        cls, features: List, fields: Dict[str, Tuple[str, str]], tables: Dict[str, _StringTable]
+    ) -> Dict[str, Union[np.ndarray, RaggedArray]]:
+        # Fields already in `fields` keep their type, and strings already in `tables` their index, so that the columns
+        # of successive shards of features can be concatenated
+        columns = {}
+        for name in cls.field_names:
+            values = [getattr(feature, name) for feature in features]
+            if name not in fields:
+                if len(values) == 0 or values[0] is None:
+                    continue
+                fields[name] = _field_type(values)
+            kind, value_type = fields[name]
+            dtype = cls.field_dtypes.get(name) or _DEFAULT_DTYPES[value_type]
+            if kind == "string":
+                table = tables.setdefault(name, _StringTable())
+                columns[name] = np.array([table[value] for value in values], dtype=np.int32)
+            elif kind == "strings":
+                table = tables.setdefault(name, _StringTable())
+                offsets = np.zeros(len(values) + 1, dtype=np.int64)
+                np.cumsum([len(value) for value in values], out=offsets[1:])
+                indices = [table[string] for value in values for string in value]
+                columns[name] = RaggedArray(np.array(indices, dtype=np.int32), offsets)
+            elif kind == "dict":
+                columns[f"{name}_keys"] = _sequence_column([list(value.keys()) for value in values], np.int32)
+                columns[f"{name}_values"] = _sequence_column([list(value.values()) for value in values], dtype)
+            elif kind == "number":
+                columns[name] = np.array(values, dtype=dtype)
+            else:
+                columns[name] = _sequence_column(values, dtype)
+        return columns
+
+    def __len__(self):
+        return self._length
+
+    def get_field(self, name: str, i: int):
+        """
+        Returns the value of the field :obj:`name` of the :obj:`i`-th feature, as it was in the features the store was
+        created from.
+        """
+        if name not in self.fields:
+            return None
+        kind, value_type = self.fields[name]
+        to_python = _PYTHON_TYPES[value_type]
+        if kind == "number":
+            return to_python(self.columns[name][i])
+        if kind == "sequence":
+            return self.columns[name][i].astype(to_python).tolist()
+        if kind == "string":
+            return self.tables[name][self.columns[name][i]]
+        if kind == "strings":
+            table = self.tables[name]
+            return [table[j] for j in self.columns[name][i].tolist()]
+        keys = self.columns[f"{name}_keys"][i].tolist()
+        return dict(zip(keys, self.columns[f"{name}_values"][i].astype(to_python).tolist()))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Index {i} is out of range for {len(self)} features")
+        return self.feature_class(**{name: self.get_field(name, i) for name in self.field_names})
+
+    def save(self, cache: TokenizedDatasetCache, objects: Optional[Dict[str, Any]] = None):
+        """
+        Saves the store in :obj:`cache`, to be loaded memory-mapped with :meth:`load`.
+
+        Args:
+            cache (:class:`~transformers.data.tokenized_cache.TokenizedDatasetCache`):
+                The cache to write to.
+            objects (:obj:`Dict[str, Any]`, `optional`):
+                Other objects to pickle with the store.
+        """
+        metadata = {"fields": self.fields, "tables": self.tables, "length": len(self)}
+        cache.save(self.columns, metadata=metadata, objects=objects)
+
+    @classmethod
+    def load(cls, cache: TokenizedDatasetCache) -> "FeatureStore":
+        """
+        Loads a store saved with :meth:`save`, memory-mapped in copy-on-write mode so that tensors can share its
+        memory.
+        """
+        metadata = cache.metadata
+        fields = {name: tuple(field) for name, field in metadata["fields"].items()}
+        store = cls(cache.load(mmap_mode="c"), fields, metadata["tables"])
+        store._length = metadata["length"]
+        return store
+
+    def to_torch_dataset(
+        self, fields: List[Optional[str]], dtypes: Optional[Dict[str, "torch.dtype"]] = None
+    ) -> "FeatureStoreDataset":
+        """
+        Returns a dataset of the tensors of some fields of numbers or sequences, like a
+        :class:`~torch.utils.data.TensorDataset`.
+
+        Args:
+            fields (:obj:`List[Optional[str]]`):
+                The fields each item of the dataset is made of, in that order. :obj:`None` stands for the index of the
+                feature.
+            dtypes (:obj:`Dict[str, torch.dtype]`, `optional`):
+                The type of the tensors of each field. Defaults to :obj:`torch.long` for integers, :obj:`torch.float`
+                for floats and :obj:`torch.bool` for booleans. The tensors share the memory of the store when their
+                type is the one the field is stored in.
+
+        Returns:
+            :class:`~transformers.data.processors.utils.FeatureStoreDataset`: The dataset.
+        """
+        if not is_torch_available():
+            raise RuntimeError("PyTorch must be installed to return a PyTorch dataset.")
+        default_dtypes = {"bool": torch.bool, "int": torch.long, "float": torch.float}
+        dtypes = dtypes if dtypes is not None else {}
+        columns = []
+        for name in fields:
+            if name is None:
+                columns.append((None, torch.long))
+                continue
+            if name not in self.fields or self.fields[name][0] not in ["number", "sequence"]:
+                raise ValueError(f"{name} is not a field of numbers or sequences of numbers of this store.")
+            columns.append((self.columns[name], dtypes.get(name, default_dtypes[self.fields[name][1]])))
+        return FeatureStoreDataset(columns, len(self))
+
+
+class FeatureStoreWriter:
+    """
+    Writes features to a :class:`~transformers.data.tokenized_cache.TokenizedDatasetCache` as they are created, to be
+    loaded as a :class:`~transformers.data.processors.utils.FeatureStore` once they are all written. The features are
+    stored field by field every :obj:`shard_size` features, so that only one shard of them is held in memory at a time.
+
+    Args:
+        store_class (:obj:`type`):
+            The subclass of :class:`~transformers.data.processors.utils.FeatureStore` of the features.
+        cache (:class:`~transformers.data.tokenized_cache.TokenizedDatasetCache`):
+            The cache to write to.
+        shard_size (:obj:`int`, `optional`, defaults to 10000):
+            The number of features stored at once.
+    """
+
+    def __init__(self, store_class: type, cache: TokenizedDatasetCache, shard_size: int = 10000):
+        if shard_size < 1:
+            raise ValueError(f"`shard_size` has to be a strictly positive integer, but is {shard_size}")
+        self.store_class = store_class
+        self.shard_size = shard_size
+        self.fields: Dict[str, Tuple[str, str]] = {}
+        self._tables: Dict[str, _StringTable] = {}
+        self._writer = TokenizedDatasetCacheWriter(cache)
+        self._shard = []
+        self._num_stored = 0
+
+    def __len__(self):
+        return self._num_stored + len(self._shard)
+
+    def add(self, feature):
+        """
+        Adds one feature, an instance of the :obj:`feature_class` of the store.
+        """
+        self._shard.append(feature)
+        if len(self._shard) >= self.shard_size:
+            self.flush()
+
+    def extend(self, features: Iterable):
+        """
+        Adds several features.
+        """
+        for feature in features:
+            self.add(feature)
+
+    def flush(self):
+        """
+        Stores the features added since the last shard.
+        """
+        if len(self._shard) == 0 and self._num_stored > 0:
+            return
+        num_fields = len(self.fields)
+        columns = self.store_class._columns_from_features(self._shard, self.fields, self._tables)
+        if self._num_stored > 0 and len(self.fields) != num_fields:
+            raise ValueError("Fields that were None in all the previous features cannot be set in later ones.")
+        self._writer.write(columns)
+        self._num_stored += len(self._shard)
+        self._shard = []
+
+    def close(self, objects: Optional[Dict[str, Any]] = None) -> "FeatureStore":
+        """
+        Stores the last shard and completes the cache.
+
+        Args:
+            objects (:obj:`Dict[str, Any]`, `optional`):
+                Other objects to pickle with the store.
+
+        Returns:
+            :class:`~transformers.data.processors.utils.FeatureStore`: The store of all the features, loaded from the
+            cache.
+        """
+        self.flush()
+        tables = {name: list(table) for name, table in self._tables.items()}
+        self._writer.close(metadata={"fields": self.fields, "tables": tables, "length": len(self)}, objects=objects)
+        return self.store_class.load(self._writer.cache)
+
+
+class FeatureStoreDataset:
+    """
+    Dataset of the tensors of some fields of a :class:`~transformers.data.processors.utils.FeatureStore`, returned by
+    :meth:`~transformers.data.processors.utils.FeatureStore.to_torch_dataset`. Like a
+    :class:`~torch.utils.data.TensorDataset`, each item is a tuple of tensors, which are views of the arrays of the
+    store when they are of the same type.
+
+    Args:
+        columns (:obj:`List[Tuple[Optional[np.ndarray], torch.dtype]]`):
+            The arrays (:obj:`None` for the index of the item) and the types of their tensors.
+        length (:obj:`int`):
+            The number of items.
+    """
+
+    def __init__(self, columns: List[Tuple[Optional[Union[np.ndarray, RaggedArray]], "torch.dtype"]], length: int):
+        self.columns = columns
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i) -> Tuple["torch.Tensor", ...]:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Index {i} is out of range for {len(self)} items")
+        return tuple(
+            torch.tensor(i, dtype=dtype) if column is None else torch.as_tensor(column[i], dtype=dtype)
+            for column, dtype in self.columns
+        )
+
+
+class InputFeatureStore(FeatureStore):
+    """
+    :class:`~transformers.data.processors.utils.FeatureStore` of
+    :class:`~transformers.data.processors.utils.InputFeatures`.
+    """
+
+    feature_class = InputFeatures
+    field_names = ["input_ids", "attention_mask", "token_type_ids", "label"]
+    field_dtypes = {"input_ids": np.int32, "attention_mask": np.int8, "token_type_ids": np.int32}
+
+
 class DataProcessor:
     """Base class for data converters for sequence classification data sets."""
 
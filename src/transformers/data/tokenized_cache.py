@@ -0,0 +1,478 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Inc. team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""On-disk cache of tokenized datasets, stored as memory-mapped arrays and keyed by a fingerprint of the tokenizer."""
+
+import array
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from filelock import FileLock
+
+from ..tokenization_utils_base import PreTrainedTokenizerBase
+from ..utils import logging
+
+
+logger = logging.get_logger(__name__)
+
+CACHE_METADATA_NAME = "metadata.json"
+
+# Attributes of the tokenizers changing their outputs that can be changed after initialization
+TOKENIZER_ATTRIBUTES = [
+    "do_lower_case",
+    "remove_space",
+    "keep_accents",
+    "strip_accents",
+    "tokenize_chinese_chars",
+    "add_prefix_space",
+    "padding_side",
+    "model_max_length",
+]
+
+
+def _update_with_file(sha, file_path: str, chunk_size: int = 1 << 20):
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+
+
+def file_fingerprint(*file_paths: str) -> str:
+    """
+    Returns a hash of the content of :obj:`file_paths`.
+    """
+    sha = hashlib.sha256()
+    for file_path in file_paths:
+        _update_with_file(sha, file_path)
+    return sha.hexdigest()
+
+
+def tokenizer_fingerprint(tokenizer: PreTrainedTokenizerBase) -> str:
+    """
+    Returns a hash of everything that changes the outputs of :obj:`tokenizer`: its class, the content of its vocabulary
+    files (which includes the merges of BPE tokenizers and the models of SentencePiece tokenizers), its vocabulary with
+    the added tokens, its special tokens and their options, and its normalization flags.
+
+    Args:
+        tokenizer (:class:`~transformers.PreTrainedTokenizerBase`):
+            The tokenizer to fingerprint.
+
+    Returns:
+        :obj:`str`: The fingerprint.
+    """
+    sha = hashlib.sha256()
+    state = {
+        "class": tokenizer.__class__.__name__,
+        "vocab": sorted(tokenizer.get_vocab().items()),
+        "special_tokens": [repr(token) for token in tokenizer.all_special_tokens_extended],
+        "init_kwargs": {
+            key: repr(value)
+            for key, value in sorted(tokenizer.init_kwargs.items())
+            if key not in tokenizer.vocab_files_names and key != "name_or_path"
+        },
+        "attributes": {key: repr(getattr(tokenizer, key, None)) for key in TOKENIZER_ATTRIBUTES},
+    }
+    if getattr(tokenizer, "is_fast", False):
+        # The backend tokenizer holds the whole pipeline: normalizer, pre-tokenizer, model and added tokens
+        state["backend_tokenizer"] = tokenizer.backend_tokenizer.to_str()
+    sha.update(json.dumps(state, sort_keys=True).encode("utf-8"))
+
+    for key in sorted(tokenizer.vocab_files_names):
+        file_path = tokenizer.init_kwargs.get(key)
+        if isinstance(file_path, str) and os.path.isfile(file_path):
+            _update_with_file(sha, file_path)
+    return sha.hexdigest()
+
+
+def cache_fingerprint(
+    tokenizer: PreTrainedTokenizerBase, file_paths: Union[str, List[str]], **processing_args: Any
+) -> str:
+    """
+    Returns the key of the cache of a dataset: a hash of the fingerprint of the tokenizer, of the content of the data
+    files and of the arguments of the processing.
+
+    Args:
+        tokenizer (:class:`~transformers.PreTrainedTokenizerBase`):
+            The tokenizer used to process the dataset.
+        file_paths (:obj:`str` or :obj:`List[str]`):
+            The data files the dataset is built from.
+        processing_args:
+            The arguments changing the processing (maximum length, split...).
+
+    Returns:
+        :obj:`str`: The fingerprint.
+    """
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+    state = {
+        "tokenizer": tokenizer_fingerprint(tokenizer),
+        "files": file_fingerprint(*file_paths),
+        "processing_args": {key: repr(value) for key, value in sorted(processing_args.items())},
+    }
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class RaggedArray(Sequence):
+    """
+    Sequences of different lengths stored in one flat array, with the offsets of each sequence in it. Indexing it
+    returns a view of the flat array, so it does not copy anything when the flat array is memory-mapped.
+
+    Args:
+        values (:obj:`np.ndarray`):
+            The concatenation of all the sequences.
+        offsets (:obj:`np.ndarray`):
+            The start of each sequence in :obj:`values`, followed by the end of the last one.
+    """
+
+    def __init__(self, values: np.ndarray, offsets: np.ndarray):
+        self.values = values
+        self.offsets = offsets
+
+    @classmethod
+    def from_sequences(cls, sequences: Iterable[Iterable[int]], dtype=np.int32) -> "RaggedArray":
+        """
+        Builds a :class:`~transformers.data.tokenized_cache.RaggedArray` from :obj:`sequences`.
+        """
+        sequences = [np.asarray(sequence, dtype=dtype) for sequence in sequences]
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum([len(sequence) for sequence in sequences], out=offsets[1:])
+        values = np.concatenate(sequences) if sequences else np.zeros(0, dtype=dtype)
+        return cls(values, offsets)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """
+        :obj:`np.ndarray`: The length of each sequence.
+        """
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Index {i} is out of range for {len(self)} sequences")
+        return self.values[self.offsets[i] : self.offsets[i + 1]]
+
+
+class RaggedArrayBuilder:
+    """
+    Builds a :class:`~transformers.data.tokenized_cache.RaggedArray` one sequence at a time. The values are appended to
+    a typed array (4 bytes per value for :obj:`np.int32`) instead of being kept as lists of Python integers, so that
+    datasets can be tokenized in chunks without holding all the token ids as Python objects.
+
+    Args:
+        dtype (:obj:`np.dtype`, `optional`, defaults to :obj:`np.int32`):
+            The type of the values.
+    """
+
+    def __init__(self, dtype=np.int32):
+        self.dtype = np.dtype(dtype)
+        self._values = array.array(self.dtype.char)
+        self._offsets = array.array("q", [0])
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def append(self, sequence: Iterable[int]):
+        """
+        Appends one sequence.
+        """
+        self._values.extend(sequence)
+        self._offsets.append(len(self._values))
+
+    def extend(self, sequences: Iterable[Iterable[int]]):
+        """
+        Appends several sequences.
+        """
+        for sequence in sequences:
+            self.append(sequence)
+
+    def build(self) -> RaggedArray:
+        """
+        Returns the :class:`~transformers.data.tokenized_cache.RaggedArray` of the appended sequences, sharing the
+        memory of the builder. No sequence can be appended afterwards.
+        """
+        return RaggedArray(np.frombuffer(self._values, dtype=self.dtype), np.frombuffer(self._offsets, dtype=np.int64))
+
+
+class TokenizedDatasetCache:
+    """
+    Directory caching the columns of a tokenized dataset as ``.npy`` files, memory-mapped when loaded so that reusing a
+    cache takes the same time whatever its size. Ragged columns (token ids, masks...) are stored as
+    :class:`~transformers.data.tokenized_cache.RaggedArray` (one flat array and the offsets of each example in it),
+    scalar columns (labels...) as one array. Other objects can be saved along, pickled, to be loaded only when needed.
+    Datasets too large to be held in memory are written chunk by chunk with a
+    :class:`~transformers.data.tokenized_cache.TokenizedDatasetCacheWriter`.
+
+    The directory is named after a fingerprint of everything the dataset depends on (see :func:`cache_fingerprint`), so
+    changing the tokenizer, the data or the processing creates a new cache instead of reusing a stale one.
+
+    Args:
+        cache_dir (:obj:`str`):
+            The directory in which the cache directory is created.
+        prefix (:obj:`str`):
+            The beginning of the name of the cache directory, to make it readable.
+        fingerprint (:obj:`str`):
+            The fingerprint of the cached dataset.
+    """
+
+    def __init__(self, cache_dir: str, prefix: str, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.path = os.path.join(cache_dir, f"{prefix}_{fingerprint[:16]}")
+
+    def lock(self) -> FileLock:
+        """
+        Returns a lock on the cache, so that only the first process in distributed training processes the dataset and
+        the others load the cache.
+        """
+        return FileLock(self.path + ".lock")
+
+    def exists(self) -> bool:
+        """
+        Whether the cache has been completely written.
+        """
+        return os.path.isfile(os.path.join(self.path, CACHE_METADATA_NAME))
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        """
+        :obj:`Dict[str, Any]`: The metadata saved with the cache.
+        """
+        with open(os.path.join(self.path, CACHE_METADATA_NAME), encoding="utf-8") as f:
+            return json.load(f)["metadata"]
+
+    def save(
+        self,
+        columns: Dict[str, Union[RaggedArray, List[List[int]], List[Union[int, float]]]],
+        metadata: Optional[Dict[str, Any]] = None,
+        objects: Optional[Dict[str, Any]] = None,
+        dtype=np.int32,
+    ):
+        """
+        Writes :obj:`columns` to the cache, replacing the previous one if any.
+
+        Args:
+            columns (:obj:`Dict[str, list]`):
+                The columns of the dataset, all with one value per example. Columns of sequences are saved as
+                :class:`~transformers.data.tokenized_cache.RaggedArray` of :obj:`dtype`, columns of numbers as arrays
+                of their type. Arrays are saved as they are.
+            metadata (:obj:`Dict[str, Any]`, `optional`):
+                JSON-serializable information to save with the columns.
+            objects (:obj:`Dict[str, Any]`, `optional`):
+                Other objects to pickle with the columns, loaded with :meth:`load_object`.
+            dtype (:obj:`np.dtype`, `optional`, defaults to :obj:`np.int32`):
+                The type of the values of the columns of sequences.
+        """
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        column_types = {}
+        for name, column in columns.items():
+            if isinstance(column, np.ndarray):
+                np.save(os.path.join(tmp_path, f"{name}.npy"), column)
+                column_types[name] = "array"
+                continue
+            if not isinstance(column, RaggedArray) and len(column) > 0 and np.ndim(column[0]) == 0:
+                np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(column))
+                column_types[name] = "scalar"
+                continue
+            if not isinstance(column, RaggedArray):
+                column = RaggedArray.from_sequences(column, dtype=dtype)
+            np.save(os.path.join(tmp_path, f"{name}.npy"), column.values)
+            np.save(os.path.join(tmp_path, f"{name}.offsets.npy"), column.offsets)
+            column_types[name] = "ragged"
+        self._complete(tmp_path, column_types, metadata, objects)
+
+    def _complete(
+        self,
+        tmp_path: str,
+        column_types: Dict[str, str],
+        metadata: Optional[Dict[str, Any]],
+        objects: Optional[Dict[str, Any]],
+    ):
+        for name, obj in (objects or {}).items():
+            with open(os.path.join(tmp_path, f"{name}.pkl"), "wb") as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # The metadata file is written last, so a cache is only used once it is complete
+        with open(os.path.join(tmp_path, CACHE_METADATA_NAME), "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": self.fingerprint, "columns": column_types, "metadata": metadata or {}}, f)
+
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        os.replace(tmp_path, self.path)
+
+    def load(self, mmap_mode: str = "r") -> Dict[str, Union[RaggedArray, np.ndarray]]:
+        """
+        Loads the columns of the cache, memory-mapped.
+
+        Args:
+            mmap_mode (:obj:`str`, `optional`, defaults to :obj:`"r"`):
+                The mode in which the files are memory-mapped (see :func:`numpy.load`). With :obj:`"c"`, the arrays can
+                be modified (in memory only), which is needed to share their memory with tensors.
+
+        Returns:
+            :obj:`Dict[str, Union[RaggedArray, np.ndarray]]`: The columns, as
+            :class:`~transformers.data.tokenized_cache.RaggedArray` for columns of sequences and arrays for columns of
+            numbers.
+        """
+        with open(os.path.join(self.path, CACHE_METADATA_NAME), encoding="utf-8") as f:
+            column_types = json.load(f)["columns"]
+
+        columns = {}
+        for name, column_type in column_types.items():
+            values = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode=mmap_mode)
+            if column_type == "ragged":
+                offsets = np.load(os.path.join(self.path, f"{name}.offsets.npy"), mmap_mode=mmap_mode)
+                columns[name] = RaggedArray(values, offsets)
+            else:
+                columns[name] = values
+        return columns
+
+    def load_object(self, name: str) -> Any:
+        """
+        Loads the object saved as :obj:`name` with the columns.
+        """
+        with open(os.path.join(self.path, f"{name}.pkl"), "rb") as f:
+            return pickle.load(f)
+
+
+class _ColumnWriter:
+    """Appends the chunks of one column to a raw file, keeping the length of each row once they differ."""
+
+    def __init__(self, path: str, column: Union[np.ndarray, RaggedArray]):
+        self.path = path
+        self.file = open(path, "wb")
+        self.dtype = column.values.dtype if isinstance(column, RaggedArray) else column.dtype
+        self.num_rows = 0
+        self.num_values = 0
+        # The shape of the rows while all chunks are arrays with the same one, None once the column is ragged
+        self.row_shape = None if isinstance(column, RaggedArray) else column.shape[1:]
+        self.lengths = array.array("q")
+
+    def write(self, column: Union[np.ndarray, RaggedArray]):
+        if isinstance(column, RaggedArray):
+            values, lengths = column.values, column.lengths
+        else:
+            values, lengths = column, np.full(len(column), int(np.prod(column.shape[1:])), dtype=np.int64)
+        if self.row_shape is not None and (isinstance(column, RaggedArray) or column.shape[1:] != self.row_shape):
+            if len(self.row_shape) != 1 or np.ndim(values) > 2:
+                raise ValueError(f"Cannot write chunks of different shapes to the column {self.path}.")
+            # The column is not one array anymore: it is stored as a ragged array of the same values
+            self.lengths.extend([self.row_shape[0]] * self.num_rows)
+            self.row_shape = None
+        if self.row_shape is None:
+            self.lengths.extend(lengths.tolist())
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self.file.write(values.tobytes())
+        self.num_rows += len(column)
+        self.num_values += values.size
+
+    def close(self, npy_path: str) -> str:
+        self.file.close()
+        if self.row_shape is not None:
+            _raw_to_npy(self.path, npy_path, self.dtype, (self.num_rows,) + self.row_shape)
+            return "array"
+        _raw_to_npy(self.path, npy_path, self.dtype, (self.num_values,))
+        offsets = np.zeros(self.num_rows + 1, dtype=np.int64)
+        np.cumsum(np.frombuffer(self.lengths, dtype=np.int64), out=offsets[1:])
+        np.save(npy_path[: -len(".npy")] + ".offsets.npy", offsets)
+        return "ragged"
+
+
+def _raw_to_npy(raw_path: str, npy_path: str, dtype: np.dtype, shape: tuple):
+    # Writes the header of the array and streams the values after it, without loading them
+    header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape}
+    with open(npy_path, "wb") as npy_file, open(raw_path, "rb") as raw_file:
+        np.lib.format.write_array_header_1_0(npy_file, header)
+        shutil.copyfileobj(raw_file, npy_file, 1 << 24)
+    os.remove(raw_path)
+
+
+class TokenizedDatasetCacheWriter:
+    """
+    Writes the columns of a :class:`~transformers.data.tokenized_cache.TokenizedDatasetCache` chunk by chunk, for
+    datasets too large to be held in memory before being saved: each chunk is appended to the files of the columns and
+    can be freed right away. Like :meth:`~transformers.data.tokenized_cache.TokenizedDatasetCache.save`, the cache is
+    written in a temporary directory and only replaces the previous one, if any, when the writer is closed.
+
+    A column is stored as one array if all its chunks are arrays whose rows have the same shape (e.g. padded token
+    ids), as a :class:`~transformers.data.tokenized_cache.RaggedArray` otherwise.
+
+    Args:
+        cache (:class:`~transformers.data.tokenized_cache.TokenizedDatasetCache`):
+            The cache to write.
+    """
+
+    def __init__(self, cache: TokenizedDatasetCache):
+        self.cache = cache
+        self.tmp_path = f"{cache.path}.tmp-{os.getpid()}"
+        if os.path.isdir(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+        os.makedirs(self.tmp_path)
+        self._columns: Dict[str, _ColumnWriter] = {}
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def write(self, columns: Dict[str, Union[np.ndarray, RaggedArray]]):
+        """
+        Appends a chunk of examples to the cache.
+
+        Args:
+            columns (:obj:`Dict[str, Union[np.ndarray, RaggedArray]]`):
+                The columns of the chunk, all with one value per example. The chunks all have the same columns, of the
+                type of the first chunk.
+        """
+        if self.length > 0 and set(columns) != set(self._columns):
+            raise ValueError(
+                f"The chunk has the columns {sorted(columns)} but the previous ones had {sorted(self._columns)}."
+            )
+        for name, column in columns.items():
+            if name not in self._columns:
+                self._columns[name] = _ColumnWriter(os.path.join(self.tmp_path, f"{name}.raw"), column)
+            self._columns[name].write(column)
+        if len(columns) > 0:
+            self.length += len(next(iter(columns.values())))
+
+    def close(self, metadata: Optional[Dict[str, Any]] = None, objects: Optional[Dict[str, Any]] = None):
+        """
+        Completes the cache, which can then be loaded with
+        :meth:`~transformers.data.tokenized_cache.TokenizedDatasetCache.load`.
+
+        Args:
+            metadata (:obj:`Dict[str, Any]`, `optional`):
+                JSON-serializable information to save with the columns.
+            objects (:obj:`Dict[str, Any]`, `optional`):
+                Other objects to pickle with the columns, loaded with
+                :meth:`~transformers.data.tokenized_cache.TokenizedDatasetCache.load_object`.
+        """
+        column_types = {
+            name: column.close(os.path.join(self.tmp_path, f"{name}.npy")) for name, column in self._columns.items()
+        }
+        self.cache._complete(self.tmp_path, column_types, metadata, objects)
@@ -231,6 +231,8 @@ PYTORCH_TRANSFORMERS_CACHE = os.getenv("PYTORCH_TRANSFORMERS_CACHE", PYTORCH_PRE
 TRANSFORMERS_CACHE = os.getenv("TRANSFORMERS_CACHE", PYTORCH_TRANSFORMERS_CACHE)
 
 WEIGHTS_NAME = "pytorch_model.bin"
+WEIGHTS_INDEX_NAME = "pytorch_model.bin.index.json"
+MMAP_WEIGHTS_NAME = "pytorch_model.mmap"
 TF2_WEIGHTS_NAME = "tf_model.h5"
 TF_WEIGHTS_NAME = "model.ckpt"
 CONFIG_NAME = "config.json"
@@ -1216,6 +1218,8 @@ def get_from_cache(
             http_get(url_to_download, temp_file, proxies=proxies, resume_size=resume_size, user_agent=user_agent)
 
         logger.info("storing %s in cache at %s", url, cache_path)
+        # The cached file is replaced, never rewritten in place, so processes that memory-mapped the previous version
+        # (see `load_mmap_checkpoint`) keep reading it safely.
         os.replace(temp_file.name, cache_path)
 
         logger.info("creating metadata file for %s", cache_path)
@@ -18,6 +18,7 @@ from collections import UserDict
 from typing import Optional, Tuple
 
 import torch
+from torch.nn import functional as F
 
 from .file_utils import add_start_docstrings
 
@@ -159,6 +160,7 @@ class BeamSearchScorer(BeamScorer):
         self.length_penalty = length_penalty
         self.do_early_stopping = do_early_stopping
         self.num_beam_hyps_to_keep = num_beam_hyps_to_keep
+        self.batch_size = batch_size
 
         self._is_init = False
         self._beam_hyps = [
@@ -309,6 +311,219 @@ class BeamSearchScorer(BeamScorer):
         return decoded
 
 
+def _sort_descending(scores: torch.FloatTensor, ages: torch.LongTensor) -> torch.LongTensor:
+    """
+    Returns the indices sorting each row of :obj:`scores` in descending order, ties being sorted from the most recent
+    to the oldest according to :obj:`ages`. Rows are short (:obj:`num_beams`), so all the pairs of scores are compared
+    at once.
+    """
+    # ranks_before[b, i, j] is True if score j comes before score i
+    ranks_before = (scores[:, None, :] > scores[:, :, None]) | (
+        (scores[:, None, :] == scores[:, :, None]) & (ages[:, None, :] > ages[:, :, None])
+    )
+    return ranks_before.sum(dim=-1).argsort(dim=-1)
+
+
+class TensorizedBeamSearchScorer(BeamScorer):
+    r"""
+    :class:`transformers.BeamScorer` implementing the same beam search decoding as
+    :class:`~transformers.BeamSearchScorer` with batched tensor operations only.
+
+    The finished hypotheses of all batches are kept in preallocated tensors of shape :obj:`(batch_size, num_beams,
+    max_length)` instead of one :class:`~transformers.generation_beam_search.BeamHypotheses` per batch, so that
+    :meth:`~transformers.TensorizedBeamSearchScorer.process` only loops over the :obj:`num_beams` candidates of a step
+    for all the batches at once, and does not synchronize with the device. This makes a difference for large batches,
+    especially on GPU.
+
+    Args:
+        batch_size (:obj:`int`):
+            Batch Size of :obj:`input_ids` for which beam search decoding is run in parallel.
+        max_length (:obj:`int`):
+            The maximum length of the sequence to be generated.
+        num_beams (:obj:`int`):
+            Number of beams for beam search.
+        device (:obj:`torch.device`):
+            Defines the device type (*e.g.*, :obj:`"cpu"` or :obj:`"cuda"`) on which this instance of
+            :obj:`TensorizedBeamSearchScorer` will be allocated.
+        length_penalty (:obj:`float`, `optional`, defaults to 1.0):
+            Exponential penalty to the length. 1.0 means no penalty. Set to values < 1.0 in order to encourage the
+            model to generate shorter sequences, to a value > 1.0 in order to encourage the model to produce longer
+            sequences.
+        do_early_stopping (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            Whether to stop the beam search when at least ``num_beams`` sentences are finished per batch or not.
+        num_beam_hyps_to_keep (:obj:`int`, `optional`, defaults to 1):
+            The number of beam hypotheses that shall be returned upon calling
+            :meth:`~transformer.TensorizedBeamSearchScorer.finalize`.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        max_length: int,
+        num_beams: int,
+        device: torch.device,
+        length_penalty: Optional[float] = 1.0,
+        do_early_stopping: Optional[bool] = False,
+        num_beam_hyps_to_keep: Optional[int] = 1,
+    ):
+        if not isinstance(num_beams, int) or num_beams <= 1:
+            raise ValueError(
+                f"`num_beams` has to be an integer strictly greater than 1, but is {num_beams}. For `num_beams` == 1, one should make use of `greedy_search` instead."
+            )
+
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.num_beams = num_beams
+        self.device = device
+        self.length_penalty = length_penalty
+        self.do_early_stopping = do_early_stopping
+        self.num_beam_hyps_to_keep = num_beam_hyps_to_keep
+
+        # finished hypotheses in no particular order, empty slots have a score of -inf and an age of -1
+        self._hyp_scores = torch.full((batch_size, num_beams), -float("inf"), device=self.device)
+        self._hyp_ages = torch.full((batch_size, num_beams), -1, dtype=torch.long, device=self.device)
+        self._next_age = 0
+        self._hyp_lengths = torch.zeros((batch_size, num_beams), dtype=torch.long, device=self.device)
+        self._hyp_tokens = None  # allocated on the first call to `process` with the dtype of `input_ids`
+        self._num_hyps = torch.zeros((batch_size,), dtype=torch.long, device=self.device)
+        self._done = torch.zeros((batch_size,), dtype=torch.bool, device=self.device)
+
+    @property
+    def is_done(self) -> bool:
+        return self._done.all()
+
+    def _add_hypotheses(self, hyp_tokens: torch.LongTensor, sum_logprobs: torch.FloatTensor, is_new: torch.BoolTensor):
+        """
+        Adds new hypotheses of shape :obj:`(batch_size, num_new, sequence_length)` to the finished ones, keeping the
+        :obj:`num_beams` best of each batch. Only the hypotheses for which :obj:`is_new` is :obj:`True` are added.
+
+        Like :meth:`~transformers.generation_beam_search.BeamHypotheses.add`, the new hypotheses are added one after
+        the other, and once there are :obj:`num_beams` finished hypotheses a new one is only kept if its score is
+        strictly better than the worst one, in which case it replaces the oldest of the worst hypotheses.
+        """
+        batch_size, num_new, cur_len = hyp_tokens.shape
+        if self._hyp_tokens is None:
+            self._hyp_tokens = hyp_tokens.new_zeros((batch_size, self.num_beams, self.max_length))
+
+        new_scores = (sum_logprobs / (cur_len ** self.length_penalty)).to(self._hyp_scores.dtype)
+        new_tokens = F.pad(hyp_tokens, (0, self.max_length - cur_len))
+        batch_idx = torch.arange(batch_size, device=self._hyp_scores.device)
+        for i in range(num_new):
+            # the slot of the worst hypothesis, the oldest one on ties, which is an empty slot if there is one
+            worst_scores = self._hyp_scores.min(dim=1)[0]
+            is_worst = self._hyp_scores == worst_scores[:, None]
+            slot = self._hyp_ages.masked_fill(~is_worst, self._next_age).argmin(dim=1)
+
+            is_added = is_new[:, i] & ((self._num_hyps < self.num_beams) | (new_scores[:, i] > worst_scores))
+            self._hyp_scores[batch_idx, slot] = torch.where(
+                is_added, new_scores[:, i], self._hyp_scores[batch_idx, slot]
+            )
+            self._hyp_ages[batch_idx, slot] = self._hyp_ages[batch_idx, slot].masked_fill(is_added, self._next_age)
+            self._hyp_lengths[batch_idx, slot] = self._hyp_lengths[batch_idx, slot].masked_fill(is_added, cur_len)
+            self._hyp_tokens[batch_idx, slot] = torch.where(
+                is_added[:, None], new_tokens[:, i], self._hyp_tokens[batch_idx, slot]
+            )
+            self._num_hyps = (self._num_hyps + is_added.long()).clamp(max=self.num_beams)
+            self._next_age += 1
+
+    def process(
+        self,
+        input_ids: torch.LongTensor,
+        next_scores: torch.FloatTensor,
+        next_tokens: torch.LongTensor,
+        next_indices: torch.LongTensor,
+        pad_token_id: Optional[int] = None,
+        eos_token_id: Optional[int] = None,
+    ) -> Tuple[torch.Tensor]:
+        cur_len = input_ids.shape[-1]
+        batch_size = self.batch_size
+        num_candidates = next_tokens.shape[-1]
+        assert batch_size == (input_ids.shape[0] // self.num_beams)
+
+        if eos_token_id is not None:
+            is_eos = next_tokens == eos_token_id
+        else:
+            is_eos = torch.zeros_like(next_tokens, dtype=torch.bool)
+
+        # the next beams are the `num_beams` best candidates that do not end with the eos token
+        candidate_rank = torch.arange(num_candidates, device=next_tokens.device)
+        _, beam_candidates = torch.topk(
+            is_eos.long() * num_candidates + candidate_rank, self.num_beams, dim=1, largest=False, sorted=True
+        )
+        next_beam_scores = next_scores.gather(1, beam_candidates)
+        next_beam_tokens = next_tokens.gather(1, beam_candidates)
+        batch_offset = torch.arange(batch_size, device=next_indices.device)[:, None] * self.num_beams
+        next_beam_indices = next_indices.gather(1, beam_candidates) + batch_offset
+
+        # candidates ending with the eos token are finished if they rank among the `num_beams` best candidates
+        is_new_hyp = is_eos[:, : self.num_beams] & ~self._done[:, None]
+        hyp_tokens = input_ids.view(batch_size, self.num_beams, cur_len).gather(
+            1, next_indices[:, : self.num_beams, None].expand(-1, -1, cur_len)
+        )
+        self._add_hypotheses(hyp_tokens, next_scores[:, : self.num_beams], is_new_hyp)
+
+        # pad the batches that are already done
+        done = self._done[:, None]
+        next_beam_scores = next_beam_scores.masked_fill(done, 0)
+        next_beam_tokens = next_beam_tokens.masked_fill(done, pad_token_id if pad_token_id is not None else 0)
+        next_beam_indices = next_beam_indices.masked_fill(done, 0)
+
+        # check if we are done so that we can save a pad step if all(done)
+        if self.do_early_stopping:
+            is_done = self._num_hyps >= self.num_beams
+        else:
+            cur_score = next_scores.max(dim=1)[0] / (cur_len ** self.length_penalty)
+            is_done = (self._num_hyps >= self.num_beams) & (self._hyp_scores.min(dim=1)[0] >= cur_score)
+        self._done = self._done | is_done
+
+        return UserDict(
+            {
+                "next_beam_scores": next_beam_scores.view(-1),
+                "next_beam_tokens": next_beam_tokens.view(-1),
+                "next_beam_indices": next_beam_indices.view(-1),
+            }
+        )
+
+    def finalize(
+        self,
+        input_ids: torch.LongTensor,
+        final_beam_scores: torch.FloatTensor,
+        final_beam_tokens: torch.LongTensor,
+        final_beam_indices: torch.LongTensor,
+        pad_token_id: Optional[int] = None,
+        eos_token_id: Optional[int] = None,
+    ) -> torch.LongTensor:
+        batch_size = self.batch_size
+        cur_len = input_ids.shape[-1]
+
+        # finalize all open beam hypotheses and add to generated hypotheses
+        self._add_hypotheses(
+            input_ids.view(batch_size, self.num_beams, cur_len),
+            final_beam_scores.view(batch_size, self.num_beams),
+            ~self._done[:, None].expand(-1, self.num_beams),
+        )
+
+        # select the best hypotheses, the most recent one first on ties like `BeamSearchScorer.finalize`
+        best_idx = _sort_descending(self._hyp_scores, self._hyp_ages)[:, : self.num_beam_hyps_to_keep]
+        sent_lengths = self._hyp_lengths.gather(1, best_idx).reshape(-1)
+        best = self._hyp_tokens.gather(1, best_idx[:, :, None].expand(-1, -1, self.max_length))
+        best = best.reshape(-1, self.max_length)
+
+        # prepare for adding eos
+        sent_max_len = min(sent_lengths.max().item() + 1, self.max_length)
+        if sent_lengths.min().item() != sent_lengths.max().item():
+            assert pad_token_id is not None, "`pad_token_id` has to be defined"
+
+        # fill with hypotheses and eos_token_id if the latter fits in
+        positions = torch.arange(sent_max_len, device=best.device)[None]
+        decoded = best[:, :sent_max_len]
+        if pad_token_id is not None:
+            decoded = decoded.masked_fill(positions >= sent_lengths[:, None], pad_token_id)
+        if eos_token_id is not None:
+            decoded = decoded.masked_fill(positions == sent_lengths[:, None], eos_token_id)
+        return decoded
+
+
 class BeamHypotheses:
     def __init__(self, num_beams: int, max_length: int, length_penalty: float, early_stopping: bool):
         """
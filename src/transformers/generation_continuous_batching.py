@@ -0,0 +1,301 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Inc. team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+from collections import deque
+from typing import Hashable, Iterator, List, Optional, Tuple, Union
+
+import torch
+from torch.nn import functional as F
+
+from .generation_logits_process import LogitsProcessorList
+
+
+class ContinuousBatchingGenerator:
+    r"""
+    Greedy or multinomial sampling generation with continuous batching: sequences are removed from the running batch
+    (and from its :obj:`past_key_values` cache) as soon as they are finished, and queued requests are admitted in the
+    freed slots between two decoding steps.
+
+    Running sequences are kept left-padded to a common length, so the model has to build its position ids from the
+    attention mask in :obj:`prepare_inputs_for_generation` and return its cache as a tuple of per-layer tensors with
+    the batch on the second dimension and the sequence on the penultimate one (e.g. GPT-2 or CTRL).
+
+    Args:
+        model (:class:`~transformers.PreTrainedModel`):
+            The decoder-only model used for generation.
+        max_batch_size (:obj:`int`, `optional`, defaults to 8):
+            The maximum number of sequences decoded together.
+        max_length (:obj:`int`, `optional`):
+            The default maximum length (prompt included) of the generated sequences. Defaults to
+            :obj:`model.config.max_length`.
+        do_sample (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            Whether or not to use multinomial sampling ; use greedy decoding otherwise.
+        logits_processor (:obj:`LogitsProcessorList`, `optional`):
+            Instances of :class:`~transformers.LogitsProcessor` used to modify the prediction scores at each step. They
+            are applied to the left-padded running batch.
+        logits_warper (:obj:`LogitsProcessorList`, `optional`):
+            Instances of :class:`~transformers.LogitsWarper` used to warp the prediction score distribution before
+            multinomial sampling.
+        pad_token_id (:obj:`int`, `optional`):
+            The id of the `padding` token, used to left-pad the running sequences.
+        eos_token_id (:obj:`int`, `optional`):
+            The id of the `end-of-sequence` token.
+
+    Examples::
+
+        >>> from transformers import AutoTokenizer, AutoModelForCausalLM, ContinuousBatchingGenerator
+
+        >>> tokenizer = AutoTokenizer.from_pretrained("gpt2")
+        >>> model = AutoModelForCausalLM.from_pretrained("gpt2")
+        >>> generator = ContinuousBatchingGenerator(model, max_batch_size=4, max_length=30)
+
+        >>> for prompt in ["Today is", "My name is", "The capital of France"]:
+        ...     generator.add_request(tokenizer(prompt).input_ids, request_id=prompt)
+
+        >>> # finished sequences are yielded as soon as they are done, while new requests can still be added
+        >>> for request_id, output_ids in generator:
+        ...     print(request_id, tokenizer.decode(output_ids, skip_special_tokens=True))
+    """
+
+    def __init__(
+        self,
+        model,
+        max_batch_size: int = 8,
+        max_length: Optional[int] = None,
+        do_sample: bool = False,
+        logits_processor: Optional[LogitsProcessorList] = None,
+        logits_warper: Optional[LogitsProcessorList] = None,
+        pad_token_id: Optional[int] = None,
+        eos_token_id: Optional[int] = None,
+    ):
+        if model.config.is_encoder_decoder:
+            raise ValueError("`ContinuousBatchingGenerator` only supports decoder-only models.")
+        if max_batch_size < 1:
+            raise ValueError(f"`max_batch_size` has to be a strictly positive integer, but is {max_batch_size}.")
+
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_length = max_length if max_length is not None else model.config.max_length
+        self.do_sample = do_sample
+        self.logits_processor = logits_processor if logits_processor is not None else LogitsProcessorList()
+        self.logits_warper = logits_warper if logits_warper is not None else LogitsProcessorList()
+        self.eos_token_id = eos_token_id if eos_token_id is not None else model.config.eos_token_id
+        pad_token_id = pad_token_id if pad_token_id is not None else model.config.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = self.eos_token_id if self.eos_token_id is not None else 0
+        self.pad_token_id = pad_token_id
+
+        self._request_counter = itertools.count()
+        self._queue = deque()
+
+        # state of the running batch
+        self._request_ids: List[Hashable] = []
+        self._max_lengths: Optional[torch.LongTensor] = None
+        self._input_ids: Optional[torch.LongTensor] = None
+        self._attention_mask: Optional[torch.LongTensor] = None
+        self._past: Optional[Tuple[torch.Tensor]] = None
+
+    @property
+    def num_running(self) -> int:
+        """
+        :obj:`int`: The number of sequences currently being decoded.
+        """
+        return len(self._request_ids)
+
+    @property
+    def num_queued(self) -> int:
+        """
+        :obj:`int`: The number of requests waiting for a free slot.
+        """
+        return len(self._queue)
+
+    @property
+    def has_unfinished_requests(self) -> bool:
+        """
+        :obj:`bool`: Whether or not some requests are still queued or running.
+        """
+        return self.num_running > 0 or self.num_queued > 0
+
+    def add_request(
+        self,
+        input_ids: Union[List[int], torch.LongTensor],
+        request_id: Optional[Hashable] = None,
+        max_length: Optional[int] = None,
+    ) -> Hashable:
+        """
+        Queue a prompt for generation. It is admitted in the running batch at the next step with a free slot.
+
+        Args:
+            input_ids (:obj:`List[int]` or :obj:`torch.LongTensor` of shape :obj:`(sequence_length,)`):
+                The (non-empty) prompt.
+            request_id (:obj:`Hashable`, `optional`):
+                The identifier returned along the generated sequence. Defaults to an increasing integer.
+            max_length (:obj:`int`, `optional`):
+                The maximum length (prompt included) of this sequence. Defaults to :obj:`self.max_length`.
+
+        Returns:
+            The identifier of the request.
+        """
+        if isinstance(input_ids, torch.Tensor):
+            input_ids = input_ids.view(-1).tolist()
+        if len(input_ids) == 0:
+            raise ValueError("`input_ids` should contain at least one token.")
+        if request_id is None:
+            request_id = next(self._request_counter)
+        max_length = max_length if max_length is not None else self.max_length
+        self._queue.append((request_id, list(input_ids), max_length))
+        return request_id
+
+    def step(self) -> List[Tuple[Hashable, torch.LongTensor]]:
+        """
+        Admit queued requests in the free slots, then generate one token for every running sequence.
+
+        Returns:
+            :obj:`List[Tuple[Hashable, torch.LongTensor]]`: The identifier and the tokens (prompt included, padding
+            excluded) of the sequences finished during this step.
+        """
+        finished = []
+        new_requests = []
+        while self._queue and self.num_running + len(new_requests) < self.max_batch_size:
+            request_id, input_ids, max_length = self._queue.popleft()
+            if len(input_ids) >= max_length:
+                finished.append((request_id, torch.tensor(input_ids, dtype=torch.long, device=self.model.device)))
+            else:
+                new_requests.append((request_id, input_ids, max_length))
+
+        with torch.no_grad():
+            next_token_logits = []
+            if self.num_running > 0:
+                running_logits, self._past = self._forward(self._input_ids, self._attention_mask, self._past)
+                next_token_logits.append(running_logits)
+            if new_requests:
+                next_token_logits.append(self._prefill(new_requests))
+
+            if self.num_running == 0:
+                return finished
+            next_token_logits = torch.cat(next_token_logits, dim=0)
+
+            # pre-process distribution
+            scores = self.logits_processor(self._input_ids, next_token_logits)
+            if self.do_sample:
+                scores = self.logits_warper(self._input_ids, scores)
+                probs = F.softmax(scores, dim=-1)
+                next_tokens = torch.multinomial(probs, num_samples=1).squeeze(1)
+            else:
+                next_tokens = torch.argmax(scores, dim=-1)
+
+        self._input_ids = torch.cat([self._input_ids, next_tokens[:, None]], dim=-1)
+        self._attention_mask = torch.cat(
+            [self._attention_mask, self._attention_mask.new_ones((self.num_running, 1))], dim=-1
+        )
+
+        is_finished = self._attention_mask.sum(-1) >= self._max_lengths
+        if self.eos_token_id is not None:
+            is_finished |= next_tokens == self.eos_token_id
+        if is_finished.any():
+            finished.extend(self._remove_finished(is_finished))
+        return finished
+
+    def __iter__(self) -> Iterator[Tuple[Hashable, torch.LongTensor]]:
+        """
+        Run :meth:`step` until all requests are done, yielding each sequence as soon as it is finished. Requests can be
+        added while iterating.
+        """
+        while self.has_unfinished_requests:
+            yield from self.step()
+
+    def _forward(
+        self, input_ids: torch.LongTensor, attention_mask: torch.LongTensor, past: Optional[Tuple[torch.Tensor]]
+    ) -> Tuple[torch.FloatTensor, Tuple[torch.Tensor]]:
+        model_kwargs = {"attention_mask": attention_mask, "past": past, "use_cache": True}
+        model_inputs = self.model.prepare_inputs_for_generation(input_ids, **model_kwargs)
+        outputs = self.model(**model_inputs, return_dict=True)
+        model_kwargs = self.model._update_model_kwargs_for_generation(outputs, model_kwargs)
+        if model_kwargs["past"] is None:
+            raise ValueError(f"{self.model.__class__.__name__} does not return a cache to continue generation from.")
+        return outputs.logits[:, -1, :], model_kwargs["past"]
+
+    def _prefill(self, requests: List[Tuple[Hashable, List[int], int]]) -> torch.FloatTensor:
+        """
+        Run the prompts of the new requests through the model and append them to the running batch.
+        """
+        device = self.model.device
+        prompt_length = max(len(input_ids) for _, input_ids, _ in requests)
+        input_ids = torch.tensor(
+            [[self.pad_token_id] * (prompt_length - len(ids)) + ids for _, ids, _ in requests],
+            dtype=torch.long,
+            device=device,
+        )
+        attention_mask = torch.tensor(
+            [[0] * (prompt_length - len(ids)) + [1] * len(ids) for _, ids, _ in requests],
+            dtype=torch.long,
+            device=device,
+        )
+        max_lengths = torch.tensor([max_length for _, _, max_length in requests], dtype=torch.long, device=device)
+        next_token_logits, past = self._forward(input_ids, attention_mask, None)
+
+        if self.num_running == 0:
+            self._input_ids, self._attention_mask, self._past = input_ids, attention_mask, past
+            self._max_lengths = max_lengths
+        else:
+            # left-pad the shortest of the running batch and the new requests before merging them
+            running_length, new_length = self._input_ids.shape[-1], input_ids.shape[-1]
+            running_pad, new_pad = max(new_length - running_length, 0), max(running_length - new_length, 0)
+            self._input_ids = torch.cat(
+                [
+                    F.pad(self._input_ids, (running_pad, 0), value=self.pad_token_id),
+                    F.pad(input_ids, (new_pad, 0), value=self.pad_token_id),
+                ]
+            )
+            self._attention_mask = torch.cat(
+                [F.pad(self._attention_mask, (running_pad, 0)), F.pad(attention_mask, (new_pad, 0))]
+            )
+            self._past = tuple(
+                torch.cat([F.pad(running_past, (0, 0, running_pad, 0)), F.pad(new_past, (0, 0, new_pad, 0))], dim=1)
+                for running_past, new_past in zip(self._past, past)
+            )
+            self._max_lengths = torch.cat([self._max_lengths, max_lengths])
+
+        self._request_ids.extend(request_id for request_id, _, _ in requests)
+        return next_token_logits
+
+    def _remove_finished(self, is_finished: torch.BoolTensor) -> List[Tuple[Hashable, torch.LongTensor]]:
+        """
+        Drop the finished sequences from the running batch and its cache, and return them without their padding.
+        """
+        finished = [
+            (self._request_ids[idx], self._input_ids[idx][self._attention_mask[idx].bool()])
+            for idx in is_finished.nonzero(as_tuple=False).view(-1).tolist()
+        ]
+
+        keep_idx = (~is_finished).nonzero(as_tuple=False).view(-1)
+        self._request_ids = [self._request_ids[idx] for idx in keep_idx.tolist()]
+        if len(keep_idx) == 0:
+            self._input_ids = self._attention_mask = self._past = self._max_lengths = None
+            return finished
+
+        self._input_ids = self._input_ids.index_select(0, keep_idx)
+        self._attention_mask = self._attention_mask.index_select(0, keep_idx)
+        self._max_lengths = self._max_lengths.index_select(0, keep_idx)
+        self._past = self.model._reorder_cache(self._past, keep_idx)
+
+        # remove the left padding shared by all the remaining sequences
+        num_padding = int(self._attention_mask.any(dim=0).long().argmax())
+        if num_padding > 0:
+            self._input_ids = self._input_ids[:, num_padding:]
+            self._attention_mask = self._attention_mask[:, num_padding:]
+            self._past = tuple(layer_past[..., num_padding:, :] for layer_past in self._past)
+        return finished
@@ -15,7 +15,7 @@
 
 import math
 from abc import ABC
-from typing import Callable, Iterable, List
+from typing import Callable, Iterable, List, Tuple
 
 import numpy as np
 import torch
@@ -243,38 +243,28 @@ class NoRepeatNGramLogitsProcessor(LogitsProcessor):
         self.ngram_size = ngram_size
 
     def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
-        num_batch_hypotheses = scores.shape[0]
         cur_len = input_ids.shape[-1]
-        banned_batch_tokens = self._calc_banned_ngram_tokens(input_ids, num_batch_hypotheses, cur_len)
+        if cur_len < self.ngram_size:
+            # no banned tokens if we haven't generated no_repeat_ngram_size tokens yet
+            return scores
 
-        for i, banned_tokens in enumerate(banned_batch_tokens):
-            scores[i, banned_tokens] = -float("inf")
+        banned_mask = self._calc_banned_ngram_mask(input_ids, scores)
+        return scores.masked_fill(banned_mask, -float("inf"))
 
-        return scores
+    def _calc_banned_ngram_mask(self, prev_input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.BoolTensor:
+        """
+        Tensorized version of the fairseq n-gram blocking: the n-grams of each hypothesis are a view of
+        :obj:`prev_input_ids`, so they always follow the reordering of the hypotheses during beam search.
+        """
+        cur_len = prev_input_ids.shape[-1]
+        # (num_hypos, num_ngrams, ngram_size)
+        generated_ngrams = prev_input_ids.unfold(1, self.ngram_size, 1)
+        # Before decoding the next token, prevent decoding of ngrams that have already appeared
+        current_prefix = prev_input_ids[:, cur_len + 1 - self.ngram_size :]
+        prefix_matches = (generated_ngrams[:, :, :-1] == current_prefix[:, None, :]).all(dim=-1)
 
-    def _calc_banned_ngram_tokens(
-        self, prev_input_ids: torch.Tensor, num_hypos: int, cur_len: int
-    ) -> List[Iterable[int]]:
-        """Copied from fairseq for no_repeat_ngram in beam_search"""
-        if cur_len + 1 < self.ngram_size:
-            # return no banned tokens if we haven't generated no_repeat_ngram_size tokens yet
-            return [[] for _ in range(num_hypos)]
-        generated_ngrams = [{} for _ in range(num_hypos)]
-        for idx in range(num_hypos):
-            gen_tokens = prev_input_ids[idx].tolist()
-            generated_ngram = generated_ngrams[idx]
-            for ngram in zip(*[gen_tokens[i:] for i in range(self.ngram_size)]):
-                prev_ngram_tuple = tuple(ngram[:-1])
-                generated_ngram[prev_ngram_tuple] = generated_ngram.get(prev_ngram_tuple, []) + [ngram[-1]]
-
-        def _get_generated_ngrams(hypo_idx):
-            # Before decoding the next token, prevent decoding of ngrams that have already appeared
-            start_idx = cur_len + 1 - self.ngram_size
-            ngram_idx = tuple(prev_input_ids[hypo_idx, start_idx:cur_len].tolist())
-            return generated_ngrams[hypo_idx].get(ngram_idx, [])
-
-        banned_tokens = [_get_generated_ngrams(hypo_idx) for hypo_idx in range(num_hypos)]
-        return banned_tokens
+        banned_counts = torch.zeros_like(scores).scatter_add_(1, generated_ngrams[:, :, -1], prefix_matches.to(scores))
+        return banned_counts > 0
 
 
 class NoBadWordsLogitsProcessor(LogitsProcessor):
@@ -311,68 +301,52 @@ class NoBadWordsLogitsProcessor(LogitsProcessor):
                 bad_words_ids
             )
 
-    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
-        banned_tokens = self._calc_banned_bad_words_ids(input_ids)
-        scores = self._set_scores_to_inf_for_banned_tokens(scores, banned_tokens)
-
-        return scores
+        # bad words are grouped by length so that all the bad words of the same length are matched at once
+        self._bad_words_by_prefix_length = {}
+        for banned_token_seq in self.bad_words_ids:
+            prefixes, banned_tokens = self._bad_words_by_prefix_length.setdefault(len(banned_token_seq) - 1, ([], []))
+            prefixes.append(banned_token_seq[:-1])
+            banned_tokens.append(banned_token_seq[-1])
+        self._bad_words_tensors = {}
 
-    def _tokens_match(self, prev_tokens: torch.LongTensor, tokens: List[int]) -> bool:
-        if len(tokens) == 0:
-            # if bad word tokens is just one token always ban it
-            return True
-        elif len(tokens) > len(prev_tokens):
-            # if bad word tokens are longer then prev input_ids they can't be equal
-            return False
-        elif prev_tokens[-len(tokens) :].tolist() == tokens:
-            # if tokens match
-            return True
-        else:
-            return False
-
-    def _calc_banned_bad_words_ids(self, prev_input_ids: Iterable[int]) -> Iterable[int]:
-        banned_tokens = []
-        for prev_input_ids_slice in prev_input_ids:
-            banned_tokens_slice = []
-            for banned_token_seq in self.bad_words_ids:
-                if self._tokens_match(prev_input_ids_slice, banned_token_seq[:-1]) is False:
-                    # if tokens do not match continue
-                    continue
-
-                banned_tokens_slice.append(banned_token_seq[-1])
-
-            banned_tokens.append(banned_tokens_slice)
-
-        return banned_tokens
-
-    def _set_scores_to_inf_for_banned_tokens(self, scores: torch.Tensor, banned_tokens: List[List[int]]) -> None:
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        banned_mask = self._calc_banned_bad_words_mask(input_ids, scores)
+        return scores.masked_fill(banned_mask, -float("inf"))
+
+    def _get_bad_words_tensors(self, device: torch.device) -> List[Tuple[int, torch.LongTensor, torch.LongTensor]]:
+        if device not in self._bad_words_tensors:
+            self._bad_words_tensors[device] = [
+                (
+                    prefix_length,
+                    torch.tensor(prefixes, dtype=torch.long, device=device),
+                    torch.tensor(banned_tokens, dtype=torch.long, device=device),
+                )
+                for prefix_length, (prefixes, banned_tokens) in self._bad_words_by_prefix_length.items()
+            ]
+        return self._bad_words_tensors[device]
+
+    def _calc_banned_bad_words_mask(
+        self, prev_input_ids: torch.LongTensor, scores: torch.FloatTensor
+    ) -> torch.BoolTensor:
         """
-        Modifies the scores in place by setting the banned token positions to `-inf`. Banned token is expected to be a
-        list of list of banned tokens to ban in the format [[batch index, vocabulary position],...
-
-        Args:
-            scores: logits distribution of shape (batch size, vocabulary size)
-            banned_tokens: list of list of tokens to ban of length (batch_size)
+        Returns the mask of the tokens that would complete a bad word, of shape :obj:`(batch_size, vocab_size)`. The
+        last tokens of each hypothesis are compared to the prefixes of all the bad words of the same length at once.
         """
-        banned_mask_list = []
-        for idx, batch_banned_tokens in enumerate(banned_tokens):
-            for token in batch_banned_tokens:
-                banned_mask_list.append([idx, token])
-        if not banned_mask_list:
-            return scores
-
-        banned_mask = torch.LongTensor(banned_mask_list)
-        indices = torch.ones(len(banned_mask))
-        # A sparse tensor is generated from a list of coordinates: [[0, 1], [0, 2], [2, 0]]. A conversion to dense tensor generates:
-        # [ 0  1  1 ]
-        # [ 0  0  0 ]
-        # [ 1  0  0 ]
-
-        banned_mask = (
-            torch.sparse.LongTensor(banned_mask.t(), indices, scores.size()).to(scores.device).to_dense().bool()
-        )
-        scores = scores.masked_fill(banned_mask, -float("inf"))
-        return scores
+        num_hypos, cur_len = prev_input_ids.shape
+        prefix_matches, banned_tokens = [], []
+        for prefix_length, prefixes, bad_word_tokens in self._get_bad_words_tensors(prev_input_ids.device):
+            if prefix_length > cur_len:
+                # if bad word tokens are longer then prev input_ids they can't be equal
+                continue
+            # (num_hypos, num_bad_words); a bad word of a single token is always banned
+            last_tokens = prev_input_ids[:, None, cur_len - prefix_length :]
+            prefix_matches.append((last_tokens == prefixes[None]).all(dim=-1))
+            banned_tokens.append(bad_word_tokens[None].expand(num_hypos, -1))
+
+        banned_counts = torch.zeros_like(scores)
+        if prefix_matches:
+            banned_counts.scatter_add_(1, torch.cat(banned_tokens, dim=1), torch.cat(prefix_matches, dim=1).to(scores))
+        return banned_counts > 0
 
 
 class PrefixConstrainedLogitsProcessor(LogitsProcessor):
@@ -0,0 +1,209 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Inc. team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+from typing import Any, Hashable, NamedTuple, Optional, Tuple
+
+import torch
+
+
+def _tensor_key(tensor: torch.Tensor) -> Tuple:
+    return (tuple(tensor.shape), str(tensor.dtype), tensor.detach().cpu().numpy().tobytes())
+
+
+def _num_bytes(value: Any) -> int:
+    if isinstance(value, torch.Tensor):
+        return value.element_size() * value.nelement()
+    if isinstance(value, dict):
+        return sum(_num_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_num_bytes(v) for v in value)
+    return 0
+
+
+def _copy_containers(value: Any) -> Any:
+    # some models update the dicts of their past key values in place, while tensors are never modified in place
+    if isinstance(value, dict):
+        return value.__class__(**{k: _copy_containers(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return value.__class__(_copy_containers(v) for v in value)
+    return value
+
+
+class _PrefixCacheEntry(NamedTuple):
+    input_ids: torch.LongTensor
+    attention_mask: Optional[torch.LongTensor]
+    value: Any
+    num_bytes: int
+
+
+class PrefixCache:
+    r"""
+    Least recently used cache of what :meth:`~transformers.generation_utils.GenerationMixin.generate` computes from the
+    prompt, to reuse it across calls sharing the same inputs:
+
+        - for encoder-decoder models, the :obj:`encoder_outputs` of the encoder inputs, so that generating again from
+          the same document (e.g. with different decoding settings) does not run the encoder again,
+        - for decoder-only models, the :obj:`past_key_values` of the prompt (all its tokens but the last one), which
+          are reused by any later prompt starting with the same tokens, so that only the new tokens are processed.
+
+    It is used by passing it to :meth:`~transformers.generation_utils.GenerationMixin.generate` as :obj:`prefix_cache`.
+    A cache should only be shared by calls to the same model. The cached values are stored and returned as new
+    containers (dicts, lists and tuples) sharing the same tensors, so they can be updated in place.
+
+    Args:
+        max_entries (:obj:`int`, `optional`, defaults to 32):
+            The maximum number of cached prompts. The least recently used ones are evicted first.
+        max_memory (:obj:`int`, `optional`):
+            The maximum number of bytes taken by the cached tensors. The least recently used entries are evicted until
+            the cache fits. No limit if not set.
+
+    Attributes:
+        hits (:obj:`int`):
+            The number of lookups that found a cached entry, including partial prefixes of the prompt.
+        misses (:obj:`int`):
+            The number of lookups that found no cached entry.
+    """
+
+    def __init__(self, max_entries: int = 32, max_memory: Optional[int] = None):
+        if max_entries < 1:
+            raise ValueError(f"`max_entries` has to be a strictly positive integer, but is {max_entries}")
+        self.max_entries = max_entries
+        self.max_memory = max_memory
+        self.hits = 0
+        self.misses = 0
+        self.memory_usage = 0
+        self._entries: "OrderedDict[Hashable, _PrefixCacheEntry]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """
+        Removes all the cached entries. The hit and miss counters are kept.
+        """
+        self._entries.clear()
+        self.memory_usage = 0
+
+    @staticmethod
+    def make_key(kind: str, input_ids: torch.LongTensor, **kwargs) -> Hashable:
+        """
+        Builds the key of the entry computed from :obj:`input_ids` and :obj:`kwargs`. Tensors are compared by value.
+
+        Args:
+            kind (:obj:`str`):
+                What is cached, e.g. :obj:`"encoder_outputs"` or :obj:`"past_key_values"`.
+            input_ids (:obj:`torch.LongTensor`):
+                The input ids the entry is computed from.
+            kwargs:
+                The other inputs the entry depends on.
+
+        Return:
+            :obj:`Hashable`: The key.
+        """
+        key = [kind, _tensor_key(input_ids)]
+        for name, value in sorted(kwargs.items()):
+            if isinstance(value, torch.Tensor):
+                value = _tensor_key(value)
+            key.append((name, value))
+        return tuple(key)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the entry cached under :obj:`key` and marks it as recently used, or :obj:`None` if there is none.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return _copy_containers(entry.value)
+
+    def get_longest_prefix(
+        self, input_ids: torch.LongTensor, attention_mask: Optional[torch.LongTensor] = None
+    ) -> Tuple[int, Optional[Any]]:
+        """
+        Returns the :obj:`past_key_values` entry cached for the longest prefix of :obj:`input_ids` and marks it as
+        recently used.
+
+        Args:
+            input_ids (:obj:`torch.LongTensor` of shape :obj:`(batch_size, sequence_length)`):
+                The prompt to look up.
+            attention_mask (:obj:`torch.LongTensor` of shape :obj:`(batch_size, sequence_length)`, `optional`):
+                The attention mask of the prompt, which has to match the one of the cached prefix too.
+
+        Return:
+            :obj:`Tuple[int, Any]`: The length of the prefix and its cached entry, or :obj:`(0, None)` if no prefix is
+            cached.
+        """
+        best_key, best_length = None, 0
+        for key, entry in self._entries.items():
+            if key[0] != "past_key_values":
+                continue
+            prefix_length = entry.input_ids.shape[-1]
+            if (
+                entry.input_ids.shape[0] != input_ids.shape[0]
+                or not best_length < prefix_length <= input_ids.shape[-1]
+            ):
+                continue
+            if entry.input_ids.device != input_ids.device or not torch.equal(
+                entry.input_ids, input_ids[:, :prefix_length]
+            ):
+                continue
+            if (entry.attention_mask is None) != (attention_mask is None):
+                continue
+            if attention_mask is not None and not torch.equal(entry.attention_mask, attention_mask[:, :prefix_length]):
+                continue
+            best_key, best_length = key, prefix_length
+
+        if best_key is None:
+            self.misses += 1
+            return 0, None
+        self.hits += 1
+        self._entries.move_to_end(best_key)
+        return best_length, _copy_containers(self._entries[best_key].value)
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        input_ids: Optional[torch.LongTensor] = None,
+        attention_mask: Optional[torch.LongTensor] = None,
+    ):
+        """
+        Caches :obj:`value` under :obj:`key` and evicts the least recently used entries if the cache is full.
+
+        Args:
+            key (:obj:`Hashable`):
+                The key, as returned by :meth:`make_key`.
+            value (:obj:`Any`):
+                The tensors to cache.
+            input_ids (:obj:`torch.LongTensor`, `optional`):
+                The input ids :obj:`value` was computed from, needed for the prefix lookups of
+                :meth:`get_longest_prefix`.
+            attention_mask (:obj:`torch.LongTensor`, `optional`):
+                The attention mask :obj:`value` was computed with.
+        """
+        if key in self._entries:
+            self.memory_usage -= self._entries.pop(key).num_bytes
+        entry = _PrefixCacheEntry(input_ids, attention_mask, _copy_containers(value), _num_bytes(value))
+        self._entries[key] = entry
+        self.memory_usage += entry.num_bytes
+        while len(self._entries) > self.max_entries or (
+            self.max_memory is not None and self.memory_usage > self.max_memory and self._entries
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self.memory_usage -= evicted.num_bytes
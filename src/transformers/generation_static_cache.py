@@ -0,0 +1,141 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Inc. team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import List, Optional, Tuple
+
+import torch
+
+
+class StaticCacheLayer:
+    """
+    The part of a :class:`~transformers.StaticCache` used by one layer. Attention layers receive it in place of their
+    :obj:`past_key_value` and write the key and value states of the new positions into it with :meth:`update`.
+
+    Args:
+        cache (:class:`~transformers.StaticCache`):
+            The cache this layer belongs to.
+        layer_idx (:obj:`int`):
+            The index of the layer.
+    """
+
+    def __init__(self, cache: "StaticCache", layer_idx: int):
+        self.cache = cache
+        self.layer_idx = layer_idx
+        self.seq_length = 0
+        # key and value states of cross-attention, computed once from the encoder outputs and kept with shape
+        # (batch_size, num_heads, encoder_sequence_length, head_dim)
+        self.cross_attention_states: Optional[Tuple[torch.Tensor, torch.Tensor]] = None
+
+    def update(self, key_states: torch.Tensor, value_states: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Writes the key and value states of the new positions after the cached ones.
+
+        Args:
+            key_states (:obj:`torch.FloatTensor` of shape :obj:`(batch_size, num_heads, num_new_positions, head_dim)`):
+                The key states of the new positions.
+            value_states (:obj:`torch.FloatTensor` of shape :obj:`(batch_size, num_heads, num_new_positions, head_dim)`):
+                The value states of the new positions.
+
+        Returns:
+            :obj:`Tuple[torch.FloatTensor]`: The key and value states of all the positions, views of shape
+            :obj:`(batch_size, num_heads, seq_length, head_dim)` into the preallocated buffers.
+        """
+        start, end = self.seq_length, self.seq_length + key_states.shape[-2]
+        if end > self.cache.max_length:
+            raise ValueError(
+                f"Cannot cache {end} positions in a `StaticCache` preallocated for {self.cache.max_length} positions."
+            )
+        key_cache = self.cache.key_cache[self.layer_idx]
+        value_cache = self.cache.value_cache[self.layer_idx]
+        key_cache[:, :, start:end] = key_states
+        value_cache[:, :, start:end] = value_states
+        self.seq_length = end
+        return key_cache[:, :, :end], value_cache[:, :, :end]
+
+
+class StaticCache:
+    r"""
+    Key/value cache for decoding preallocated to :obj:`max_length` positions. Attention layers write the states of the
+    new positions in place at each step instead of concatenating them to the previous ones, which allocates and copies
+    the whole cache of every layer at every step.
+
+    It can be used in place of the :obj:`past_key_values` of the models implementing
+    :meth:`~transformers.generation_utils.GenerationMixin._init_static_cache` (GPT-2, BART and T5 for now), which is
+    what :meth:`~transformers.generation_utils.GenerationMixin.generate` does with :obj:`use_static_cache=True`.
+
+    Args:
+        num_layers (:obj:`int`):
+            The number of (decoder) layers of the model.
+        batch_size (:obj:`int`):
+            The number of sequences decoded in parallel, including beams.
+        num_heads (:obj:`int`):
+            The number of attention heads.
+        head_dim (:obj:`int`):
+            The dimension of the key and value states of each head.
+        max_length (:obj:`int`):
+            The maximum number of positions to cache.
+        device (:obj:`torch.device`):
+            The device on which the cache is allocated.
+        dtype (:obj:`torch.dtype`, `optional`, defaults to :obj:`torch.float32`):
+            The dtype of the cached states.
+    """
+
+    def __init__(
+        self,
+        num_layers: int,
+        batch_size: int,
+        num_heads: int,
+        head_dim: int,
+        max_length: int,
+        device: torch.device,
+        dtype: torch.dtype = torch.float32,
+    ):
+        self.max_length = max_length
+        cache_shape = (num_layers, batch_size, num_heads, max_length, head_dim)
+        self.key_cache = torch.zeros(cache_shape, device=device, dtype=dtype)
+        self.value_cache = torch.zeros(cache_shape, device=device, dtype=dtype)
+        self.layers: List[StaticCacheLayer] = [StaticCacheLayer(self, layer_idx) for layer_idx in range(num_layers)]
+
+    @property
+    def seq_length(self) -> int:
+        """
+        :obj:`int`: The number of cached positions.
+        """
+        return self.layers[0].seq_length
+
+    def __len__(self):
+        # like an empty tuple of past key values, an empty cache means that there is nothing to reuse yet
+        return self.seq_length
+
+    def reorder_cache(self, beam_idx: torch.LongTensor) -> "StaticCache":
+        """
+        Reorders the cached sequences in place along :obj:`beam_idx`, as needed after each step of beam search.
+
+        Args:
+            beam_idx (:obj:`torch.LongTensor` of shape :obj:`(batch_size,)`):
+                The index of the sequence each sequence of the batch continues.
+
+        Returns:
+            :class:`~transformers.StaticCache`: The cache itself.
+        """
+        seq_length = self.seq_length
+        for cache in (self.key_cache, self.value_cache):
+            cached_states = cache[:, :, :, :seq_length]
+            cached_states.copy_(cached_states.index_select(1, beam_idx))
+        for layer in self.layers:
+            if layer.cross_attention_states is not None:
+                for states in layer.cross_attention_states:
+                    states.copy_(states.index_select(0, beam_idx))
+        return self
@@ -14,13 +14,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import threading
+from queue import Queue
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import torch
 from torch.nn import functional as F
 
 from .file_utils import ModelOutput
-from .generation_beam_search import BeamScorer, BeamSearchScorer
+from .generation_beam_search import BeamScorer, BeamSearchScorer, TensorizedBeamSearchScorer
 from .generation_logits_process import (
     LogitsProcessorList,
     MinLengthLogitsProcessor,
@@ -32,18 +34,28 @@ from .generation_logits_process import (
     TopKLogitsWarper,
     TopPLogitsWarper,
 )
+from .generation_prefix_cache import PrefixCache
+from .generation_static_cache import StaticCache
 from .utils import logging
 
 
 logger = logging.get_logger(__name__)
 
 
+class _GenerationStreamClosed(Exception):
+    """Raised inside the generation thread of :meth:`GenerationMixin.generate_stream` once its consumer is gone."""
+
+
 class GenerationMixin:
     """
     A class containing all of the functions supporting generation, to be used as a mixin in
     :class:`~transformers.PreTrainedModel`.
     """
 
+    # whether the model predicts the token following each of its input positions from a past of key values cropped with
+    # `_crop_past`, so that `speculative_search` can check several candidate tokens in one forward pass
+    _supports_speculative_decoding = True
+
     def prepare_inputs_for_generation(self, input_ids: torch.LongTensor, **kwargs) -> Dict[str, Any]:
         """
         Implement in subclasses of :class:`~transformers.PreTrainedModel` for custom behavior to prepare inputs in the
@@ -75,16 +87,58 @@ class GenerationMixin:
         return input_ids.new_ones(input_ids.shape)
 
     def _prepare_encoder_decoder_kwargs_for_generation(
-        self, input_ids: torch.LongTensor, model_kwargs
+        self, input_ids: torch.LongTensor, model_kwargs, prefix_cache: Optional[PrefixCache] = None
     ) -> Dict[str, Any]:
         # retrieve encoder hidden states
         encoder = self.get_encoder()
         encoder_kwargs = {
             argument: value for argument, value in model_kwargs.items() if not argument.startswith("decoder_")
         }
-        model_kwargs["encoder_outputs"]: ModelOutput = encoder(input_ids, return_dict=True, **encoder_kwargs)
+        if prefix_cache is None:
+            model_kwargs["encoder_outputs"]: ModelOutput = encoder(input_ids, return_dict=True, **encoder_kwargs)
+            return model_kwargs
+
+        key = prefix_cache.make_key("encoder_outputs", input_ids, **encoder_kwargs)
+        encoder_outputs = prefix_cache.get(key)
+        if encoder_outputs is None:
+            encoder_outputs = encoder(input_ids, return_dict=True, **encoder_kwargs)
+            prefix_cache.put(key, encoder_outputs)
+        model_kwargs["encoder_outputs"]: ModelOutput = encoder_outputs
         return model_kwargs
 
+    def _prepare_past_from_prefix_cache(
+        self, input_ids: torch.LongTensor, prefix_cache: PrefixCache, model_kwargs
+    ) -> Optional[Any]:
+        # the past key values are computed for all the tokens of the prompt but the last one, which is processed by the
+        # first generation step to get the scores of the next token
+        prompt_length = input_ids.shape[-1] - 1
+        if prompt_length == 0:
+            return None
+        prompt_kwargs = {
+            argument: model_kwargs[argument][:, :-1]
+            for argument in ("attention_mask", "token_type_ids", "position_ids")
+            if model_kwargs.get(argument) is not None
+        }
+        attention_mask = prompt_kwargs.get("attention_mask")
+        prefix_length, past = prefix_cache.get_longest_prefix(input_ids[:, :-1], attention_mask)
+        if prefix_length == prompt_length:
+            return past
+
+        # only process the tokens following the cached prefix
+        model_inputs = self._prepare_inputs_after_past(
+            input_ids[:, :-1], past, prefix_length, use_cache=True, **prompt_kwargs
+        )
+        if "past_key_values" not in model_inputs:
+            raise ValueError(f"{self.__class__.__name__} does not support `prefix_cache`.")
+        outputs = self(**model_inputs, return_dict=True)
+        if outputs.get("past_key_values") is None:
+            raise ValueError(f"{self.__class__.__name__} does not support `prefix_cache`.")
+
+        past = outputs.past_key_values
+        key = prefix_cache.make_key("past_key_values", input_ids[:, :-1], attention_mask=attention_mask)
+        prefix_cache.put(key, past, input_ids=input_ids[:, :-1], attention_mask=attention_mask)
+        return past
+
     def _prepare_decoder_input_ids_for_generation(
         self, input_ids: torch.LongTensor, decoder_start_token_id: int = None, bos_token_id: int = None, **model_kwargs
     ) -> torch.LongTensor:
@@ -160,6 +214,45 @@ class GenerationMixin:
             model_kwargs["encoder_outputs"] = encoder_outputs
         return input_ids, model_kwargs
 
+    def _prepare_inputs_after_past(
+        self, input_ids: torch.LongTensor, past: Optional[Any], past_length: int, **model_kwargs
+    ) -> Dict[str, Any]:
+        # unlike `prepare_inputs_for_generation` with `past`, which only keeps the last position, keeps all the positions
+        # of `input_ids` following the `past_length` ones already in `past`
+        model_inputs = self.prepare_inputs_for_generation(input_ids, **model_kwargs)
+        if past is not None:
+            for argument in ("input_ids", "token_type_ids", "position_ids"):
+                if model_inputs.get(argument) is not None:
+                    model_inputs[argument] = model_inputs[argument][:, past_length:]
+            model_inputs["past_key_values"] = past
+        return model_inputs
+
+    def _crop_past(self, past: Any, length: int) -> Any:
+        """
+        Returns :obj:`past` truncated to its first :obj:`length` positions, as needed to discard the positions of the
+        rejected tokens in :meth:`~transformers.generation_utils.GenerationMixin.speculative_search`. The default
+        implementation supports a :class:`~transformers.StaticCache` and nested tuples of tensors with the positions in
+        their second to last dimension, like the past key values of GPT-2. Models with other caches (like the
+        :obj:`mems` of Transformer-XL and XLNet) either override it or set :obj:`_supports_speculative_decoding` to
+        :obj:`False`.
+        """
+        if isinstance(past, StaticCache):
+            for layer in past.layers:
+                layer.seq_length = min(layer.seq_length, length)
+            return past
+        if isinstance(past, torch.Tensor):
+            return past[..., :length, :]
+        if isinstance(past, (list, tuple)):
+            return past.__class__(self._crop_past(layer_past, length) for layer_past in past)
+        raise ValueError(f"{self.__class__.__name__} does not support cropping its past key values.")
+
+    def _expand_past_for_generation(self, past: Any, batch_size: int, expand_size: int = 1) -> Any:
+        # `batch_size` is the size of the expanded batch
+        if expand_size == 1:
+            return past
+        expanded_return_idx = torch.arange(batch_size, device=self.device) // expand_size
+        return self._reorder_cache(past, expanded_return_idx)
+
     @staticmethod
     def _init_sequence_length_for_generation(
         input_ids: torch.LongTensor, max_length: int
@@ -225,8 +318,18 @@ class GenerationMixin:
         For custom re-ordering of :obj:`past_key_values` or :obj:`mems`, the function should be implemented in
         subclasses of :class:`~transformers.PreTrainedModel`.
         """
+        if isinstance(past, StaticCache):
+            return past.reorder_cache(beam_idx)
         return tuple(layer_past.index_select(1, beam_idx) for layer_past in past)
 
+    def _init_static_cache(self, batch_size: int, max_length: int) -> StaticCache:
+        """
+        Returns an empty :class:`~transformers.StaticCache` for :obj:`batch_size` sequences of up to :obj:`max_length`
+        positions, to be passed as :obj:`past_key_values`. Only models whose attention layers write into a
+        :class:`~transformers.StaticCache` implement this method.
+        """
+        raise ValueError(f"{self.__class__.__name__} does not support `use_static_cache=True`.")
+
     def _get_logits_warper(
         self, top_k: int = None, top_p: float = None, temperature: float = None, num_beams: int = None
     ) -> LogitsProcessorList:
@@ -315,6 +418,12 @@ class GenerationMixin:
         decoder_start_token_id: Optional[int] = None,
         use_cache: Optional[bool] = None,
         prefix_allowed_tokens_fn: Optional[Callable[[int, torch.Tensor], List[int]]] = None,
+        streamer: Optional[Callable[[torch.LongTensor], None]] = None,
+        tensorized_beam_search: Optional[bool] = None,
+        use_static_cache: Optional[bool] = None,
+        prefix_cache: Optional[PrefixCache] = None,
+        assistant_model: Optional["GenerationMixin"] = None,
+        num_assistant_tokens: Optional[int] = None,
         **model_kwargs
     ) -> torch.LongTensor:
         r"""
@@ -388,6 +497,30 @@ class GenerationMixin:
                 conditioned on the previously generated tokens :obj:`inputs_ids` and the batch ID :obj:`batch_id`. This
                 argument is useful for constrained generation conditioned on the prefix, as described in
                 `Autoregressive Entity Retrieval <https://arxiv.org/abs/2010.00904>`__.
+            streamer (:obj:`Callable[[torch.LongTensor], None]`, `optional`):
+                If provided, this function is called after every generation step with the sequences generated so far,
+                so that the output can be consumed before the whole generation is done. With beam search, the current
+                best beam of each batch element is streamed. See
+                :meth:`~transformers.generation_utils.GenerationMixin.generate_stream` for a generator interface.
+            tensorized_beam_search (:obj:`bool`, `optional`, defaults to :obj:`False`):
+                Whether or not to use a :class:`~transformers.TensorizedBeamSearchScorer` instead of a
+                :class:`~transformers.BeamSearchScorer` for beam search, which avoids Python loops and device
+                synchronizations over the hypotheses and is faster for large batches.
+            use_static_cache (:obj:`bool`, `optional`, defaults to :obj:`False`):
+                Whether or not to write the past key/values attentions into a :class:`~transformers.StaticCache`
+                preallocated to :obj:`max_length` instead of growing them at each step. Only supported by some models,
+                e.g. GPT-2, BART and T5.
+            prefix_cache (:class:`~transformers.PrefixCache`, `optional`):
+                A cache of the encoder outputs (for encoder-decoder models) or of the past key values of the prompt
+                (for decoder-only models) to reuse across calls to this method with the same prompt or prompt prefix.
+            assistant_model (:class:`~transformers.PreTrainedModel`, `optional`):
+                A smaller model sharing the vocabulary of the model, e.g. a distilled version of it. If set, greedy
+                search and multinomial sampling use speculative decoding with
+                :meth:`~transformers.generation_utils.GenerationMixin.speculative_search`: the assistant model proposes
+                the next tokens and the model checks all of them in a single forward pass, which gives the same outputs
+                with fewer forward passes of the model. Only supported with :obj:`num_beams=1` and a batch size of 1.
+            num_assistant_tokens (:obj:`int`, `optional`, defaults to 5):
+                The number of tokens proposed by :obj:`assistant_model` at each step of speculative decoding.
             model_kwargs:
                 Additional model specific kwargs will be forwarded to the :obj:`forward` function of the model. If the
                 model is an Encoder-Decoder model, encoder specific kwargs should not be prefixed and decoder specific
@@ -478,9 +611,25 @@ class GenerationMixin:
             logger.warning(f"Setting `pad_token_id` to `eos_token_id`:{eos_token_id} for open-end generation.")
             pad_token_id = eos_token_id
 
+        if assistant_model is not None:
+            if num_beams > 1:
+                raise ValueError(f"`assistant_model` can only be used with `num_beams=1`, but is {num_beams}.")
+            if num_return_sequences > 1:
+                raise ValueError(
+                    f"`assistant_model` can only be used with `num_return_sequences=1`, but is {num_return_sequences}."
+                )
+            assistant_model_kwargs = {"attention_mask": model_kwargs["attention_mask"]}
+            if assistant_model.config.is_encoder_decoder:
+                # the assistant model decodes from the outputs of its own encoder
+                assistant_model_kwargs = assistant_model._prepare_encoder_decoder_kwargs_for_generation(
+                    input_ids, assistant_model_kwargs
+                )
+
         if self.config.is_encoder_decoder:
             # add encoder_outputs to model_kwargs
-            model_kwargs = self._prepare_encoder_decoder_kwargs_for_generation(input_ids, model_kwargs)
+            model_kwargs = self._prepare_encoder_decoder_kwargs_for_generation(
+                input_ids, model_kwargs, prefix_cache=prefix_cache
+            )
 
             # set input_ids as decoder_input_ids
             input_ids = self._prepare_decoder_input_ids_for_generation(
@@ -489,15 +638,22 @@ class GenerationMixin:
 
             if "encoder_outputs" not in model_kwargs or not isinstance(model_kwargs["encoder_outputs"], ModelOutput):
                 raise ValueError("Make sure that `model_kwargs` include `encoder_outputs` of type `ModelOutput`.")
+        elif prefix_cache is not None:
+            if use_static_cache:
+                raise ValueError("`prefix_cache` cannot be used with `use_static_cache=True` for decoder-only models.")
+            # reuse the past key values of the longest cached prefix of the prompt
+            model_kwargs["past"] = self._prepare_past_from_prefix_cache(input_ids, prefix_cache, model_kwargs)
 
         # determine generation mode
         is_greedy_gen_mode = (num_beams == 1) and do_sample is False
         is_sample_gen_mode = (num_beams == 1) and do_sample is True
         is_beam_gen_mode = (num_beams > 1) and do_sample is False
         is_beam_sample_gen_mode = (num_beams > 1) and do_sample is True
+        beam_scorer_class = TensorizedBeamSearchScorer if tensorized_beam_search else BeamSearchScorer
 
         # set model_kwargs
         model_kwargs["use_cache"] = use_cache
+        use_static_cache = use_static_cache if use_static_cache is not None else False
 
         # get distribution pre_processing samplers
         logits_processor = self._get_logits_processor(
@@ -510,12 +666,36 @@ class GenerationMixin:
             num_beams=num_beams,
         )
 
-        if is_greedy_gen_mode:
+        if assistant_model is not None:
+            if use_static_cache:
+                model_kwargs["past"] = self._init_static_cache(input_ids.shape[0], max_length)
+
+            # speculative decoding
+            return self.speculative_search(
+                input_ids,
+                assistant_model,
+                num_assistant_tokens=num_assistant_tokens,
+                logits_processor=logits_processor,
+                logits_warper=self._get_logits_warper(top_k=top_k, top_p=top_p, temperature=temperature, num_beams=1)
+                if do_sample
+                else None,
+                max_length=max_length,
+                pad_token_id=pad_token_id,
+                eos_token_id=eos_token_id,
+                streamer=streamer,
+                assistant_model_kwargs=assistant_model_kwargs,
+                **model_kwargs,
+            )
+
+        elif is_greedy_gen_mode:
             if num_return_sequences > 1:
                 raise ValueError(
                     f"num_return_sequences has to be 1, but is {num_return_sequences} when doing greedy search."
                 )
 
+            if use_static_cache:
+                model_kwargs["past"] = self._init_static_cache(input_ids.shape[0], max_length)
+
             # greedy search
             return self.greedy_search(
                 input_ids,
@@ -523,6 +703,7 @@ class GenerationMixin:
                 max_length=max_length,
                 pad_token_id=pad_token_id,
                 eos_token_id=eos_token_id,
+                streamer=streamer,
                 **model_kwargs,
             )
 
@@ -539,6 +720,13 @@ class GenerationMixin:
                 is_encoder_decoder=self.config.is_encoder_decoder,
                 **model_kwargs,
             )
+            if model_kwargs.get("past") is not None:
+                model_kwargs["past"] = self._expand_past_for_generation(
+                    model_kwargs["past"], input_ids.shape[0], expand_size=num_return_sequences
+                )
+
+            if use_static_cache:
+                model_kwargs["past"] = self._init_static_cache(input_ids.shape[0], max_length)
 
             # sample
             return self.sample(
@@ -548,6 +736,7 @@ class GenerationMixin:
                 max_length=max_length,
                 pad_token_id=pad_token_id,
                 eos_token_id=eos_token_id,
+                streamer=streamer,
                 **model_kwargs,
             )
 
@@ -560,7 +749,7 @@ class GenerationMixin:
             if num_return_sequences > num_beams:
                 raise ValueError("`num_return_sequences` has to be smaller or equal to `num_beams`.")
 
-            beam_scorer = BeamSearchScorer(
+            beam_scorer = beam_scorer_class(
                 batch_size=batch_size,
                 max_length=max_length,
                 num_beams=num_beams,
@@ -573,6 +762,13 @@ class GenerationMixin:
             input_ids, model_kwargs = self._expand_inputs_for_generation(
                 input_ids, expand_size=num_beams, is_encoder_decoder=self.config.is_encoder_decoder, **model_kwargs
             )
+            if model_kwargs.get("past") is not None:
+                model_kwargs["past"] = self._expand_past_for_generation(
+                    model_kwargs["past"], input_ids.shape[0], expand_size=num_beams
+                )
+            if use_static_cache:
+                model_kwargs["past"] = self._init_static_cache(input_ids.shape[0], max_length)
+
             return self.beam_search(
                 input_ids,
                 beam_scorer,
@@ -580,6 +776,7 @@ class GenerationMixin:
                 max_length=max_length,
                 pad_token_id=pad_token_id,
                 eos_token_id=eos_token_id,
+                streamer=streamer,
                 **model_kwargs,
             )
 
@@ -591,7 +788,7 @@ class GenerationMixin:
             batch_size = input_ids.shape[0] * num_return_sequences
 
             length_penalty = length_penalty if length_penalty is not None else self.config.length_penalty
-            beam_scorer = BeamSearchScorer(
+            beam_scorer = beam_scorer_class(
                 batch_size=batch_size,
                 max_length=max_length,
                 num_beams=num_beams,
@@ -607,6 +804,13 @@ class GenerationMixin:
                 is_encoder_decoder=self.config.is_encoder_decoder,
                 **model_kwargs,
             )
+            if model_kwargs.get("past") is not None:
+                model_kwargs["past"] = self._expand_past_for_generation(
+                    model_kwargs["past"], input_ids.shape[0], expand_size=num_beams * num_return_sequences
+                )
+
+            if use_static_cache:
+                model_kwargs["past"] = self._init_static_cache(input_ids.shape[0], max_length)
 
             return self.beam_sample(
                 input_ids,
@@ -616,9 +820,83 @@ class GenerationMixin:
                 max_length=max_length,
                 pad_token_id=pad_token_id,
                 eos_token_id=eos_token_id,
+                streamer=streamer,
                 **model_kwargs,
             )
 
+    def generate_stream(self, input_ids: Optional[torch.LongTensor] = None, **kwargs) -> Iterator[torch.LongTensor]:
+        r"""
+        Same as :meth:`~transformers.generation_utils.GenerationMixin.generate`, but returns an iterator that yields
+        the sequences generated so far after every generation step, so that the first tokens can be used while the rest
+        of the sequence is still being generated.
+
+        Generation runs in a background thread and is stopped after the current step when the iterator is closed or
+        garbage collected before the end of generation.
+
+        Parameters:
+
+            input_ids (:obj:`torch.LongTensor` of shape :obj:`(batch_size, sequence_length)`, `optional`):
+                The sequence used as a prompt for the generation.
+            kwargs:
+                All other arguments are passed along to
+                :meth:`~transformers.generation_utils.GenerationMixin.generate`.
+
+        Return:
+            :obj:`Iterator[torch.LongTensor]`: An iterator over :obj:`torch.LongTensor` of shape :obj:`(batch_size,
+            cur_len)`, one per generation step. With beam search, the current best beam of each batch element is
+            yielded, and the final output of :meth:`~transformers.generation_utils.GenerationMixin.generate` is yielded
+            as last item if it differs from the last streamed sequences.
+
+        Examples::
+
+            >>> from transformers import AutoTokenizer, AutoModelForCausalLM
+
+            >>> tokenizer = AutoTokenizer.from_pretrained("gpt2")
+            >>> model = AutoModelForCausalLM.from_pretrained("gpt2")
+            >>> input_ids = tokenizer("Today is a beautiful day, and", return_tensors="pt").input_ids
+
+            >>> detokenizer = tokenizer.incremental_decoder()
+            >>> for sequences in model.generate_stream(input_ids, max_length=30):
+            ...     print(detokenizer.put(sequences[0, -1]), end="")
+            >>> print(detokenizer.end())
+        """
+        if kwargs.get("streamer", None) is not None:
+            raise ValueError("`streamer` cannot be passed to `generate_stream`, iterate over its output instead.")
+
+        queue = Queue()
+        closed = threading.Event()
+
+        def streamer(sequences):
+            if closed.is_set():
+                raise _GenerationStreamClosed()
+            queue.put(("step", sequences))
+
+        def run_generation():
+            try:
+                queue.put(("output", self.generate(input_ids, streamer=streamer, **kwargs)))
+            except _GenerationStreamClosed:
+                pass
+            except Exception as e:
+                queue.put(("error", e))
+
+        thread = threading.Thread(target=run_generation, daemon=True)
+        thread.start()
+        try:
+            last_sequences = None
+            while True:
+                kind, value = queue.get()
+                if kind == "error":
+                    raise value
+                if kind == "output":
+                    if last_sequences is None or not torch.equal(value, last_sequences):
+                        yield value
+                    break
+                last_sequences = value
+                yield value
+        finally:
+            closed.set()
+            thread.join()
+
     def greedy_search(
         self,
         input_ids: torch.LongTensor,
@@ -626,6 +904,7 @@ class GenerationMixin:
         max_length: Optional[int] = None,
         pad_token_id: Optional[int] = None,
         eos_token_id: Optional[int] = None,
+        streamer: Optional[Callable[[torch.LongTensor], None]] = None,
         **model_kwargs
     ):
         r"""
@@ -646,6 +925,9 @@ class GenerationMixin:
                 The id of the `padding` token.
             eos_token_id (:obj:`int`, `optional`):
                 The id of the `end-of-sequence` token.
+            streamer (:obj:`Callable[[torch.LongTensor], None]`, `optional`):
+                If provided, this function is called after every generation step with the sequences generated so far, a
+                :obj:`torch.LongTensor` of shape :obj:`(batch_size, cur_len)`.
             model_kwargs:
                 Additional model specific keyword arguments will be forwarded to the :obj:`forward` function of the
                 model. If model is an encoder-decoder model the kwargs should include :obj:`encoder_outputs`.
@@ -715,6 +997,8 @@ class GenerationMixin:
 
             # add token and increase length by one
             input_ids = torch.cat([input_ids, next_tokens[:, None]], dim=-1)
+            if streamer is not None:
+                streamer(input_ids)
 
             # update sequence length
             if eos_token_id is not None:
@@ -744,6 +1028,7 @@ class GenerationMixin:
         max_length: Optional[int] = None,
         pad_token_id: Optional[int] = None,
         eos_token_id: Optional[int] = None,
+        streamer: Optional[Callable[[torch.LongTensor], None]] = None,
         **model_kwargs
     ):
         r"""
@@ -768,6 +1053,9 @@ class GenerationMixin:
                 The id of the `padding` token.
             eos_token_id (:obj:`int`, `optional`):
                 The id of the `end-of-sequence` token.
+            streamer (:obj:`Callable[[torch.LongTensor], None]`, `optional`):
+                If provided, this function is called after every generation step with the sequences generated so far, a
+                :obj:`torch.LongTensor` of shape :obj:`(batch_size, cur_len)`.
             model_kwargs:
                 Additional model specific kwargs will be forwarded to the :obj:`forward` function of the model. If
                 model is an encoder-decoder model the kwargs should include :obj:`encoder_outputs`.
@@ -848,6 +1136,8 @@ class GenerationMixin:
 
             # add token and increase length by one
             input_ids = torch.cat([input_ids, next_tokens[:, None]], dim=-1)
+            if streamer is not None:
+                streamer(input_ids)
             cur_len = cur_len + 1
 
             # update sequence length
@@ -867,6 +1157,236 @@ class GenerationMixin:
 
         return input_ids
 
+    def speculative_search(
+        self,
+        input_ids: torch.LongTensor,
+        assistant_model: "GenerationMixin",
+        num_assistant_tokens: Optional[int] = None,
+        logits_processor: Optional[LogitsProcessorList] = None,
+        logits_warper: Optional[LogitsProcessorList] = None,
+        max_length: Optional[int] = None,
+        pad_token_id: Optional[int] = None,
+        eos_token_id: Optional[int] = None,
+        streamer: Optional[Callable[[torch.LongTensor], None]] = None,
+        assistant_model_kwargs: Optional[Dict[str, Any]] = None,
+        **model_kwargs
+    ):
+        r"""
+        Generates sequences for models with a language modeling head using speculative decoding: at each step, the
+        smaller :obj:`assistant_model` proposes up to :obj:`num_assistant_tokens` tokens, which the model scores in a
+        single forward pass. The proposed tokens are kept up to the first one the model rejects, which is replaced by a
+        token of the model (or followed by one if none is rejected).
+
+        Without :obj:`logits_warper`, a proposed token is accepted if it is the one the model would choose and the
+        generated sequences are the same as with :meth:`~transformers.generation_utils.GenerationMixin.greedy_search`.
+        With :obj:`logits_warper`, tokens are accepted and resampled so that the generated sequences follow the same
+        distribution as with :meth:`~transformers.generation_utils.GenerationMixin.sample`.
+
+        Only a batch size of 1 is supported. Decoder-only models reuse their past key values across steps and discard
+        those of the rejected tokens. Encoder-decoder models run their decoder on the whole sequence at each step.
+        Models that do not predict every position of their inputs during generation or whose cache cannot be cropped
+        (like XLNet, XLM, Transformer-XL and Reformer) are not supported.
+
+        Parameters:
+
+            input_ids (:obj:`torch.LongTensor` of shape :obj:`(1, sequence_length)`):
+                The sequence used as a prompt for the generation.
+            assistant_model (:class:`~transformers.PreTrainedModel`):
+                A model sharing the vocabulary of the model and cheaper to run, used to propose the next tokens.
+            num_assistant_tokens (:obj:`int`, `optional`, defaults to 5):
+                The number of tokens proposed by :obj:`assistant_model` at each step.
+            logits_processor (:obj:`LogitsProcessorList`, `optional`):
+                An instance of :class:`~transformers.LogitsProcessorList`. List of instances of class derived from
+                :class:`~transformers.LogitsProcessor` used to modify the prediction scores of the language modeling
+                head applied at each generation step.
+            logits_warper (:obj:`LogitsProcessorList`, `optional`):
+                An instance of :class:`~transformers.LogitsProcessorList`. List of instances of class derived from
+                :class:`~transformers.LogitsWarper` used to warp the prediction score distribution of the language
+                modeling head applied before multinomial sampling at each generation step. Tokens are chosen greedily
+                if not set.
+            max_length (:obj:`int`, `optional`, defaults to 20):
+                The maximum length of the sequence to be generated.
+            pad_token_id (:obj:`int`, `optional`):
+                The id of the `padding` token.
+            eos_token_id (:obj:`int`, `optional`):
+                The id of the `end-of-sequence` token.
+            streamer (:obj:`Callable[[torch.LongTensor], None]`, `optional`):
+                If provided, this function is called after every generated token with the sequences generated so far, a
+                :obj:`torch.LongTensor` of shape :obj:`(1, cur_len)`.
+            assistant_model_kwargs (:obj:`Dict[str, Any]`, `optional`):
+                Model specific kwargs forwarded to the :obj:`forward` function of :obj:`assistant_model`, e.g. its own
+                :obj:`encoder_outputs` for encoder-decoder models.
+            model_kwargs:
+                Additional model specific kwargs will be forwarded to the :obj:`forward` function of the model. If
+                model is an encoder-decoder model the kwargs should include :obj:`encoder_outputs`.
+
+        Return:
+            :obj:`torch.LongTensor` of shape :obj:`(1, sequence_length)`: The generated sequence. The second dimension
+            (sequence_length) is either equal to :obj:`max_length` or shorter if it finished early due to the
+            :obj:`eos_token_id`.
+
+        Examples::
+
+            >>> from transformers import AutoTokenizer, AutoModelForCausalLM
+
+            >>> tokenizer = AutoTokenizer.from_pretrained("gpt2-large")
+            >>> model = AutoModelForCausalLM.from_pretrained("gpt2-large")
+            >>> assistant_model = AutoModelForCausalLM.from_pretrained("distilgpt2")
+
+            >>> input_prompt = "Today is a beautiful day, and"
+            >>> input_ids = tokenizer(input_prompt, return_tensors="pt").input_ids
+
+            >>> outputs = model.speculative_search(input_ids, assistant_model, max_length=30)
+
+            >>> print("Generated:", tokenizer.batch_decode(outputs, skip_special_tokens=True))
+        """
+
+        # init values
+        num_assistant_tokens = num_assistant_tokens if num_assistant_tokens is not None else 5
+        logits_processor = logits_processor if logits_processor is not None else LogitsProcessorList()
+        max_length = max_length if max_length is not None else self.config.max_length
+        pad_token_id = pad_token_id if pad_token_id is not None else self.config.pad_token_id
+        eos_token_id = eos_token_id if eos_token_id is not None else self.config.eos_token_id
+        assistant_model_kwargs = dict(assistant_model_kwargs) if assistant_model_kwargs is not None else {}
+        do_sample = logits_warper is not None
+
+        if input_ids.shape[0] != 1:
+            raise ValueError(f"Speculative decoding only supports a batch size of 1, but is {input_ids.shape[0]}.")
+        for model in (self, assistant_model):
+            if not model._supports_speculative_decoding:
+                raise ValueError(f"{model.__class__.__name__} does not support speculative decoding.")
+        if assistant_model.config.vocab_size != self.config.vocab_size:
+            raise ValueError(
+                f"The assistant model has a vocabulary of size {assistant_model.config.vocab_size}, but the model has a "
+                f"vocabulary of size {self.config.vocab_size}."
+            )
+
+        # encoder-decoder models cannot run their decoder on several new positions on top of past key values
+        use_cache = model_kwargs.get("use_cache")
+        use_cache = use_cache if use_cache is not None else getattr(self.config, "use_cache", False)
+        model_kwargs["use_cache"] = use_cache and not self.config.is_encoder_decoder
+        assistant_model_kwargs["use_cache"] = not assistant_model.config.is_encoder_decoder
+        # past key values given by `generate` with `prefix_cache` or `use_static_cache`
+        past = model_kwargs.pop("past", None)
+        if not model_kwargs["use_cache"]:
+            past = None
+        if isinstance(past, StaticCache):
+            past_length = past.seq_length
+        else:
+            past_length = input_ids.shape[-1] - 1 if past is not None else 0
+        assistant_past, assistant_past_length = None, 0
+
+        cur_len = input_ids.shape[-1]
+        while cur_len < max_length:
+            # the assistant proposes the next tokens, leaving room for the token added by the model
+            candidate_ids = input_ids
+            assistant_probs = []
+            for _ in range(min(num_assistant_tokens, max_length - cur_len - 1)):
+                assistant_inputs = assistant_model._prepare_inputs_after_past(
+                    candidate_ids,
+                    assistant_past,
+                    assistant_past_length,
+                    **assistant_model._extend_model_kwargs_for_speculation(
+                        assistant_model_kwargs, candidate_ids.shape[-1]
+                    ),
+                )
+                assistant_outputs = assistant_model(**assistant_inputs, return_dict=True)
+                if assistant_outputs.get("past_key_values") is not None:
+                    assistant_past = assistant_outputs.past_key_values
+                    assistant_past_length = candidate_ids.shape[-1]
+
+                scores = logits_processor(candidate_ids, assistant_outputs.logits[:, -1, :])
+                if do_sample:
+                    probs = F.softmax(logits_warper(candidate_ids, scores), dim=-1)
+                    assistant_probs.append(probs)
+                    candidate_token = torch.multinomial(probs, num_samples=1)
+                else:
+                    candidate_token = torch.argmax(scores, dim=-1, keepdim=True)
+                candidate_ids = torch.cat([candidate_ids, candidate_token], dim=-1)
+                if eos_token_id is not None and candidate_token.item() == eos_token_id:
+                    break
+            num_candidates = candidate_ids.shape[-1] - cur_len
+
+            # the model scores all the candidate tokens in a single forward pass
+            model_inputs = self._prepare_inputs_after_past(
+                candidate_ids,
+                past,
+                past_length,
+                **self._extend_model_kwargs_for_speculation(model_kwargs, candidate_ids.shape[-1]),
+            )
+            outputs = self(**model_inputs, return_dict=True)
+            assert (
+                outputs.logits.shape[1] >= num_candidates + 1
+            ), f"{self.__class__.__name__} returned logits for {outputs.logits.shape[1]} positions, but {num_candidates + 1} candidate positions have to be checked."
+            next_token_logits = outputs.logits[:, -(num_candidates + 1) :, :]
+
+            # keep the candidate tokens up to the first rejected one, which is replaced by a token of the model
+            new_tokens = []
+            for i in range(num_candidates + 1):
+                scores = logits_processor(candidate_ids[:, : cur_len + i], next_token_logits[:, i, :])
+                if do_sample:
+                    probs = F.softmax(logits_warper(candidate_ids[:, : cur_len + i], scores), dim=-1)
+
+                if i < num_candidates:
+                    candidate_token = candidate_ids[:, cur_len + i, None]
+                    if do_sample:
+                        # accept with probability min(1, p(token) / q(token))
+                        accepted = torch.rand(1, device=probs.device) * assistant_probs[i].gather(
+                            -1, candidate_token
+                        ) < probs.gather(-1, candidate_token)
+                    else:
+                        accepted = torch.argmax(scores, dim=-1, keepdim=True) == candidate_token
+                    if accepted.item():
+                        new_tokens.append(candidate_token)
+                        if eos_token_id is not None and candidate_token.item() == eos_token_id:
+                            break
+                        continue
+
+                if do_sample:
+                    if i < num_candidates:
+                        # after a rejection, sample from the normalized max(0, p - q)
+                        probs = (probs - assistant_probs[i]).clamp(min=0)
+                    next_token = torch.multinomial(probs, num_samples=1)
+                else:
+                    next_token = torch.argmax(scores, dim=-1, keepdim=True)
+                new_tokens.append(next_token)
+                break
+
+            for new_token in new_tokens:
+                input_ids = torch.cat([input_ids, new_token], dim=-1)
+                if streamer is not None:
+                    streamer(input_ids)
+            cur_len = input_ids.shape[-1]
+
+            # stop when there is a </s> in the sentence, or if we exceed the maximum length
+            if eos_token_id is not None and new_tokens[-1].item() == eos_token_id:
+                break
+
+            # discard the past key values of the rejected tokens, the last token has not been processed yet
+            if outputs.get("past_key_values") is not None:
+                past = self._crop_past(outputs.past_key_values, cur_len - 1)
+                past_length = cur_len - 1
+            if assistant_past is not None and assistant_past_length > cur_len - 1:
+                assistant_past = assistant_model._crop_past(assistant_past, cur_len - 1)
+                assistant_past_length = cur_len - 1
+
+        return input_ids
+
+    def _extend_model_kwargs_for_speculation(self, model_kwargs: Dict[str, Any], length: int) -> Dict[str, Any]:
+        # the attention mask and token type ids of decoder-only models have to cover the candidate tokens as well
+        if self.config.is_encoder_decoder:
+            return model_kwargs
+        model_kwargs = model_kwargs.copy()
+        attention_mask = model_kwargs.get("attention_mask")
+        if attention_mask is not None and attention_mask.shape[-1] < length:
+            model_kwargs["attention_mask"] = F.pad(attention_mask, (0, length - attention_mask.shape[-1]), value=1)
+        token_type_ids = model_kwargs.get("token_type_ids")
+        if token_type_ids is not None and token_type_ids.shape[-1] < length:
+            model_kwargs["token_type_ids"] = torch.cat(
+                [token_type_ids, token_type_ids[:, -1:].expand(-1, length - token_type_ids.shape[-1])], dim=-1
+            )
+        return model_kwargs
+
     def beam_search(
         self,
         input_ids: torch.LongTensor,
@@ -875,6 +1395,7 @@ class GenerationMixin:
         max_length: Optional[int] = None,
         pad_token_id: Optional[int] = None,
         eos_token_id: Optional[int] = None,
+        streamer: Optional[Callable[[torch.LongTensor], None]] = None,
         **model_kwargs
     ):
         r"""
@@ -899,6 +1420,11 @@ class GenerationMixin:
                 The id of the `padding` token.
             eos_token_id (:obj:`int`, `optional`):
                 The id of the `end-of-sequence` token.
+            streamer (:obj:`Callable[[torch.LongTensor], None]`, `optional`):
+                If provided, this function is called after every generation step with the current best beam of each
+                batch element, a :obj:`torch.LongTensor` of shape :obj:`(batch_size, cur_len)`. The final output of
+                beam search can differ from the last streamed sequences, since a finished hypothesis can outscore the
+                running beams.
             model_kwargs:
                 Additional model specific kwargs will be forwarded to the :obj:`forward` function of the model. If
                 model is an encoder-decoder model the kwargs should include :obj:`encoder_outputs`.
@@ -961,7 +1487,7 @@ class GenerationMixin:
         pad_token_id = pad_token_id if pad_token_id is not None else self.config.pad_token_id
         eos_token_id = eos_token_id if eos_token_id is not None else self.config.eos_token_id
 
-        batch_size = len(beam_scorer._beam_hyps)
+        batch_size = beam_scorer.batch_size
         num_beams = beam_scorer.num_beams
 
         batch_beam_size, cur_len = input_ids.shape
@@ -1014,6 +1540,9 @@ class GenerationMixin:
             beam_idx = beam_outputs["next_beam_indices"]
 
             input_ids = torch.cat([input_ids[beam_idx, :], beam_next_tokens.unsqueeze(-1)], dim=-1)
+            if streamer is not None:
+                # beams are sorted by score, so the first beam of each batch element is the current best one
+                streamer(input_ids[::num_beams])
             cur_len = cur_len + 1
 
             model_kwargs = self._update_model_kwargs_for_generation(
@@ -1040,6 +1569,7 @@ class GenerationMixin:
         max_length: Optional[int] = None,
         pad_token_id: Optional[int] = None,
         eos_token_id: Optional[int] = None,
+        streamer: Optional[Callable[[torch.LongTensor], None]] = None,
         **model_kwargs
     ):
         r"""
@@ -1068,6 +1598,11 @@ class GenerationMixin:
                 The id of the `padding` token.
             eos_token_id (:obj:`int`, `optional`):
                 The id of the `end-of-sequence` token.
+            streamer (:obj:`Callable[[torch.LongTensor], None]`, `optional`):
+                If provided, this function is called after every generation step with the current best beam of each
+                batch element, a :obj:`torch.LongTensor` of shape :obj:`(batch_size, cur_len)`. The final output of
+                beam search can differ from the last streamed sequences, since a finished hypothesis can outscore the
+                running beams.
             model_kwargs:
                 Additional model specific kwargs will be forwarded to the :obj:`forward` function of the model. If
                 model is an encoder-decoder model the kwargs should include :obj:`encoder_outputs`.
@@ -1138,7 +1673,7 @@ class GenerationMixin:
         pad_token_id = pad_token_id if pad_token_id is not None else self.config.pad_token_id
         eos_token_id = eos_token_id if eos_token_id is not None else self.config.eos_token_id
 
-        batch_size = len(beam_scorer._beam_hyps)
+        batch_size = beam_scorer.batch_size
         num_beams = beam_scorer.num_beams
 
         batch_beam_size, cur_len = input_ids.shape
@@ -1191,6 +1726,9 @@ class GenerationMixin:
             beam_idx = beam_outputs["next_beam_indices"]
 
             input_ids = torch.cat([input_ids[beam_idx, :], beam_next_tokens.unsqueeze(-1)], dim=-1)
+            if streamer is not None:
+                # beams are sorted by score, so the first beam of each batch element is the current best one
+                streamer(input_ids[::num_beams])
             cur_len = cur_len + 1
 
             model_kwargs = self._update_model_kwargs_for_generation(
@@ -0,0 +1,188 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Inc. team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Flat checkpoint format that can be memory-mapped and used without copying the weights."""
+
+import json
+import mmap
+import os
+import struct
+import uuid
+from collections import OrderedDict
+from typing import Dict
+
+import numpy as np
+import torch
+
+
+_MAGIC = b"PTMMAP01"
+_ALIGNMENT = 64
+
+# name in the header -> torch dtype and little-endian numpy dtype the data is read with
+_DTYPES = {
+    "float64": (torch.float64, "<f8"),
+    "float32": (torch.float32, "<f4"),
+    "float16": (torch.float16, "<f2"),
+    "bfloat16": (torch.bfloat16, "<i2"),
+    "int64": (torch.int64, "<i8"),
+    "int32": (torch.int32, "<i4"),
+    "int16": (torch.int16, "<i2"),
+    "int8": (torch.int8, "i1"),
+    "uint8": (torch.uint8, "u1"),
+    "bool": (torch.bool, "?"),
+}
+_DTYPE_NAMES = {dtype: name for name, (dtype, _) in _DTYPES.items()}
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _to_numpy(tensor: torch.Tensor) -> np.ndarray:
+    tensor = tensor.detach().cpu().contiguous()
+    if tensor.dtype == torch.bfloat16:
+        # numpy has no bfloat16, the bytes are written as they are
+        tensor = tensor.view(torch.int16)
+    array = tensor.numpy()
+    return array.astype(array.dtype.newbyteorder("<"), copy=False)
+
+
+def is_mmap_checkpoint(checkpoint_file: str) -> bool:
+    """
+    Returns whether :obj:`checkpoint_file` was saved with :func:`~transformers.save_mmap_checkpoint`.
+    """
+    with open(checkpoint_file, "rb") as f:
+        return f.read(len(_MAGIC)) == _MAGIC
+
+
+def save_mmap_checkpoint(state_dict: Dict[str, torch.Tensor], checkpoint_file: str):
+    """
+    Saves a state dictionary in a flat file that :func:`~transformers.load_mmap_checkpoint` memory-maps, with no
+    pickle.
+
+    The file starts with 8 magic bytes and the size of the header as a little-endian unsigned 64-bit integer. The
+    header is a JSON dictionary with the dtype, shape and begin and end offsets (from the end of the header) of each
+    tensor, and the :obj:`_metadata` of the state dictionary under :obj:`"__metadata__"`. The data of the tensors
+    follows, contiguous, little-endian and aligned on 64 bytes so that it can be used in place. Tensors sharing their
+    memory (like tied weights) are stored once. An existing file is replaced, never rewritten in place, so the
+    processes that have it memory-mapped keep reading the previous version.
+
+    Args:
+        state_dict (:obj:`Dict[str, torch.Tensor]`):
+            The state dictionary to save.
+        checkpoint_file (:obj:`str`):
+            The path of the file to write.
+    """
+    header = OrderedDict()
+    metadata = getattr(state_dict, "_metadata", None)
+    if metadata is not None:
+        header["__metadata__"] = {"_metadata": metadata}
+
+    tensors = []
+    tensor_offsets = {}
+    size = 0
+    for key, tensor in state_dict.items():
+        if tensor.dtype not in _DTYPE_NAMES:
+            raise ValueError(f"Cannot save {key} of dtype {tensor.dtype} in a memory-mapped checkpoint.")
+        tensor_id = (tensor.device, tensor.data_ptr(), tensor.dtype, tensor.shape, tensor.stride())
+        if tensor_id not in tensor_offsets:
+            begin = _align(size)
+            size = begin + tensor.numel() * tensor.element_size()
+            tensor_offsets[tensor_id] = (begin, size)
+            tensors.append((begin, tensor))
+        header[key] = {
+            "dtype": _DTYPE_NAMES[tensor.dtype],
+            "shape": list(tensor.shape),
+            "offsets": list(tensor_offsets[tensor_id]),
+        }
+
+    header = json.dumps(header).encode("utf-8")
+    # pad the header so that the data starts aligned
+    header += b" " * (_align(len(_MAGIC) + 8 + len(header)) - len(_MAGIC) - 8 - len(header))
+    # The tensors may be mapped from the file being overwritten (when a loaded model is saved back to the same place),
+    # so the file is written next to it and replaces it once complete, instead of being truncated and rewritten.
+    temp_file = f"{checkpoint_file}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temp_file, "wb") as f:
+            f.write(_MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            data_start = f.tell()
+            for begin, tensor in tensors:
+                f.write(b"\0" * (data_start + begin - f.tell()))
+                f.write(_to_numpy(tensor).data)
+        os.replace(temp_file, checkpoint_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def load_mmap_checkpoint(checkpoint_file: str) -> Dict[str, torch.Tensor]:
+    """
+    Loads a state dictionary saved with :func:`~transformers.save_mmap_checkpoint`. The file is memory-mapped and its
+    tensors are views on the mapping, so nothing is read or copied before the tensors are used, and the processes
+    loading the same file share its pages in the page cache. The mapping is copy-on-write: modifying the tensors (e.g.
+    when training) copies the modified pages in the memory of the process and never changes the file.
+
+    Args:
+        checkpoint_file (:obj:`str`):
+            The path of the file to load.
+
+    Returns:
+        :obj:`Dict[str, torch.Tensor]`: The state dictionary.
+    """
+    with open(checkpoint_file, "rb") as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"{checkpoint_file} is not a memory-mapped checkpoint.")
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size).decode("utf-8"), object_pairs_hook=OrderedDict)
+        data_start = f.tell()
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    state_dict = OrderedDict()
+    metadata = header.pop("__metadata__", {}).get("_metadata")
+    if metadata is not None:
+        state_dict._metadata = metadata
+    for key, entry in header.items():
+        dtype, numpy_dtype = _DTYPES[entry["dtype"]]
+        begin, end = entry["offsets"]
+        if begin == end:
+            state_dict[key] = torch.empty(entry["shape"], dtype=dtype)
+            continue
+        numpy_dtype = np.dtype(numpy_dtype)
+        array = np.frombuffer(
+            buffer, dtype=numpy_dtype, count=(end - begin) // numpy_dtype.itemsize, offset=data_start + begin
+        )
+        if not array.dtype.isnative:
+            array = array.astype(array.dtype.newbyteorder("="))
+        tensor = torch.from_numpy(array)
+        if dtype == torch.bfloat16:
+            tensor = tensor.view(torch.bfloat16)
+        state_dict[key] = tensor.view(entry["shape"])
+    return state_dict
+
+
+def convert_pytorch_checkpoint_to_mmap(pytorch_checkpoint_file: str, mmap_checkpoint_file: str):
+    """
+    Converts a PyTorch checkpoint saved with :obj:`torch.save` to the format of
+    :func:`~transformers.save_mmap_checkpoint`.
+
+    Args:
+        pytorch_checkpoint_file (:obj:`str`):
+            The path of the PyTorch checkpoint.
+        mmap_checkpoint_file (:obj:`str`):
+            The path of the file to write.
+    """
+    state_dict = torch.load(pytorch_checkpoint_file, map_location="cpu")
+    save_mmap_checkpoint(state_dict, mmap_checkpoint_file)
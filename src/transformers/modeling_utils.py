@@ -15,9 +15,15 @@
 # limitations under the License.
 
 import inspect
+import itertools
+import json
 import os
 import re
 import warnings
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
@@ -30,8 +36,10 @@ from .activations import get_activation
 from .configuration_utils import PretrainedConfig
 from .file_utils import (
     DUMMY_INPUTS,
+    MMAP_WEIGHTS_NAME,
     TF2_WEIGHTS_NAME,
     TF_WEIGHTS_NAME,
+    WEIGHTS_INDEX_NAME,
     WEIGHTS_NAME,
     ModelOutput,
     cached_path,
@@ -41,6 +49,7 @@ from .file_utils import (
     replace_return_docstrings,
 )
 from .generation_utils import GenerationMixin
+from .modeling_mmap_utils import is_mmap_checkpoint, load_mmap_checkpoint, save_mmap_checkpoint
 from .utils import logging
 
 
@@ -60,6 +69,222 @@ except ImportError:
             return input
 
 
+# Whether `init_weights` initializes the weights of the model, disabled by `no_init_weights`
+_init_weights = True
+
+# The functions of `torch.nn.init` the PyTorch modules initialize their weights with when they are created
+_TORCH_INIT_FUNCTIONS = [
+    "uniform_",
+    "normal_",
+    "trunc_normal_",
+    "constant_",
+    "ones_",
+    "zeros_",
+    "eye_",
+    "dirac_",
+    "xavier_uniform_",
+    "xavier_normal_",
+    "kaiming_uniform_",
+    "kaiming_normal_",
+    "orthogonal_",
+    "sparse_",
+    "uniform",
+    "normal",
+    "constant",
+    "xavier_uniform",
+    "xavier_normal",
+    "kaiming_uniform",
+    "kaiming_normal",
+    "orthogonal",
+    "sparse",
+]
+
+
+@contextmanager
+def no_init_weights():
+    """
+    Context manager in which the models are created without initializing their weights: the :obj:`torch.nn.init`
+    functions called by the PyTorch modules do nothing and :meth:`~transformers.PreTrainedModel.init_weights` only
+    prunes and ties the weights. The parameters are allocated but keep whatever the memory held, so they have to be
+    loaded or initialized afterwards, as :meth:`~transformers.PreTrainedModel.from_pretrained` does with
+    :obj:`low_cpu_mem_usage=True`.
+
+    Returns:
+        :obj:`List[Tuple]`: The skipped initializations (yielded by the context manager), in order, as a reference to
+        the initialized tensor, the initialization function and its other arguments and keyword arguments.
+        :meth:`~transformers.PreTrainedModel._init_missing_weights` replays them for the weights it initializes.
+    """
+    global _init_weights
+    previous_init_weights = _init_weights
+    init_functions = {name: getattr(nn.init, name) for name in _TORCH_INIT_FUNCTIONS if hasattr(nn.init, name)}
+    skipped_inits = []
+
+    def skip_init(function):
+        def skipped_init(tensor, *args, **kwargs):
+            # the tensor is only referenced weakly, not to keep alive the weights replaced while building the model
+            skipped_inits.append((weakref.ref(tensor), function, args, kwargs))
+            return tensor
+
+        return skipped_init
+
+    _init_weights = False
+    for name, function in init_functions.items():
+        setattr(nn.init, name, skip_init(function))
+    try:
+        yield skipped_inits
+    finally:
+        _init_weights = previous_init_weights
+        for name, function in init_functions.items():
+            setattr(nn.init, name, function)
+
+
+_SHARD_NAME_PATTERN = re.compile(r"pytorch_model-\d{5}-of-\d{5}\.(bin|mmap)")
+
+
+def _size_to_bytes(size: Union[int, str]) -> int:
+    """
+    Converts a size given as a number of bytes or as a string with a unit (e.g. :obj:`"200MB"` or :obj:`"2GiB"`) to a
+    number of bytes.
+    """
+    if isinstance(size, int):
+        return size
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(I?)B?\s*", size.upper())
+    if match is None:
+        raise ValueError(f"`{size}` is not a valid size, expected e.g. 200MB or 2GB.")
+    number, unit, binary = match.groups()
+    base = 1024 if binary else 1000
+    return int(float(number) * base ** "_KMGT".index(unit or "_"))
+
+
+def shard_checkpoint(
+    state_dict: Dict[str, torch.Tensor], max_shard_size: Union[int, str] = "10GB", weights_name: str = WEIGHTS_NAME
+) -> Tuple[Dict[str, Dict[str, torch.Tensor]], Optional[Dict[str, Any]]]:
+    """
+    Splits a state dictionary in shards of at most :obj:`max_shard_size`, keeping the order of its weights. A weight
+    bigger than :obj:`max_shard_size` gets a shard of its own, and tied weights are put in the same shard.
+
+    Args:
+        state_dict (:obj:`Dict[str, torch.Tensor]`):
+            The state dictionary of a model.
+        max_shard_size (:obj:`int` or :obj:`str`, `optional`, defaults to :obj:`"10GB"`):
+            The maximum size of each shard, in bytes or as a string with a unit (like :obj:`"5GB"`).
+        weights_name (:obj:`str`, `optional`, defaults to :obj:`"pytorch_model.bin"`):
+            The name of the checkpoint file, which the names of the shards are derived from.
+
+    Returns:
+        :obj:`Tuple[Dict[str, Dict[str, torch.Tensor]], Optional[Dict[str, Any]]]`: The shards by file name and the
+        index mapping the name of each weight to the file of its shard, or :obj:`None` if the state dictionary fits in
+        one :obj:`weights_name` file.
+    """
+    max_shard_size = _size_to_bytes(max_shard_size)
+    metadata = getattr(state_dict, "_metadata", None)
+    shards = [OrderedDict()]
+    shard_size = 0
+    total_size = 0
+    # tied weights go in the same shard, to be saved only once
+    tensor_shards = {}
+    for key, tensor in state_dict.items():
+        tensor_id = (tensor.device, tensor.data_ptr(), tensor.dtype, tensor.shape, tensor.stride())
+        if tensor_id in tensor_shards:
+            tensor_shards[tensor_id][key] = tensor
+            continue
+        size = tensor.numel() * tensor.element_size()
+        if shard_size + size > max_shard_size and len(shards[-1]) > 0:
+            shards.append(OrderedDict())
+            shard_size = 0
+        shards[-1][key] = tensor
+        tensor_shards[tensor_id] = shards[-1]
+        shard_size += size
+        total_size += size
+
+    if metadata is not None:
+        for shard in shards:
+            shard._metadata = metadata
+    if len(shards) == 1:
+        return {weights_name: shards[0]}, None
+
+    shard_files = {}
+    weight_map = {}
+    for i, shard in enumerate(shards):
+        name, extension = os.path.splitext(weights_name)
+        shard_file = f"{name}-{i + 1:05d}-of-{len(shards):05d}{extension}"
+        shard_files[shard_file] = shard
+        weight_map.update((key, shard_file) for key in shard)
+    index = {"metadata": {"total_size": total_size}, "weight_map": weight_map}
+    return shard_files, index
+
+
+def _rename_legacy_keys(state_dict: Dict[str, Any]):
+    """
+    Renames in place the :obj:`gamma` and :obj:`beta` weights of the checkpoints in the old format to :obj:`weight` and
+    :obj:`bias`.
+    """
+    old_keys = []
+    new_keys = []
+    for key in state_dict.keys():
+        new_key = None
+        if "gamma" in key:
+            new_key = key.replace("gamma", "weight")
+        if "beta" in key:
+            new_key = key.replace("beta", "bias")
+        if new_key:
+            old_keys.append(key)
+            new_keys.append(new_key)
+    for old_key, new_key in zip(old_keys, new_keys):
+        state_dict[new_key] = state_dict.pop(old_key)
+
+
+def _assign_weights(
+    module: nn.Module, state_dict: Dict[str, torch.Tensor], prefix: str, assigned_parameters: Dict[int, Tuple]
+) -> List[str]:
+    """
+    Replaces the parameters and buffers of :obj:`module` (not the ones of its submodules) by the tensors of
+    :obj:`state_dict` with the same shape and dtype, and removes these tensors from :obj:`state_dict`. A parameter
+    shared by several modules is replaced by the same new parameter everywhere, :obj:`assigned_parameters` maps the id
+    of each replaced parameter to the parameter and its replacement.
+
+    Returns:
+        :obj:`List[str]`: The keys of the assigned tensors.
+    """
+    assigned_keys = []
+    for name, weight in list(itertools.chain(module._parameters.items(), module._buffers.items())):
+        key = prefix + name
+        if weight is None or key not in state_dict:
+            continue
+        tensor = state_dict[key]
+        if tensor.shape != weight.shape or tensor.dtype != weight.dtype:
+            # left to `_load_from_state_dict`, which reports or converts it
+            continue
+        if name in module._parameters:
+            if id(weight) not in assigned_parameters:
+                # the replaced parameter is kept so that its id is not reused
+                assigned_parameters[id(weight)] = (weight, nn.Parameter(tensor, requires_grad=weight.requires_grad))
+            module._parameters[name] = assigned_parameters[id(weight)][1]
+        else:
+            module._buffers[name] = tensor
+        del state_dict[key]
+        assigned_keys.append(key)
+    return assigned_keys
+
+
+def _load_checkpoint(checkpoint_file: str, mmap: bool = False) -> Dict[str, torch.Tensor]:
+    """
+    Loads a PyTorch checkpoint on CPU. Checkpoints saved with :func:`~transformers.save_mmap_checkpoint` are always
+    memory-mapped. With :obj:`mmap=True`, the other ones are memory-mapped when PyTorch supports it (from PyTorch 2.1
+    for checkpoints saved in the zipfile format), so that the tensors are only read from the disk when they are copied
+    in the model.
+    """
+    if is_mmap_checkpoint(checkpoint_file):
+        return load_mmap_checkpoint(checkpoint_file)
+    if mmap and "mmap" in inspect.signature(torch.load).parameters:
+        try:
+            return torch.load(checkpoint_file, map_location="cpu", mmap=True)
+        except RuntimeError:
+            # checkpoints saved in the legacy format cannot be memory-mapped
+            pass
+    return torch.load(checkpoint_file, map_location="cpu")
+
+
 def find_pruneable_heads_and_indices(
     heads: List[int], n_heads: int, head_size: int, already_pruned_heads: Set[int]
 ) -> Tuple[Set[int], torch.LongTensor]:
@@ -671,7 +896,8 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin):
         Initializes and prunes weights if needed.
         """
         # Initialize weights
-        self.apply(self._init_weights)
+        if _init_weights:
+            self.apply(self._init_weights)
 
         # Prune heads if needed
         if self.config.pruned_heads:
@@ -680,6 +906,44 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin):
         # Tie weights if needed
         self.tie_weights()
 
+    def _init_missing_weights(self, missing_keys: List[str], skipped_inits: List[Tuple]):
+        """
+        Initializes the weights of a model created with :func:`~transformers.modeling_utils.no_init_weights` that are
+        not loaded from a checkpoint, as they would have been if the model was created normally: the initializations
+        skipped while creating the model are replayed for them, then the modules holding them and their parent modules
+        are initialized as in :meth:`init_weights`. This is done before the checkpoint is loaded, since it may
+        overwrite some of the loaded weights.
+
+        Args:
+            missing_keys (:obj:`List[str]`):
+                The names of the weights in the state dictionary of the model that are not in the checkpoint.
+            skipped_inits (:obj:`List[Tuple]`):
+                The initializations skipped while creating the model, as yielded by
+                :func:`~transformers.modeling_utils.no_init_weights`.
+        """
+        state_dict = self.state_dict(keep_vars=True)
+        missing_tensors = {id(state_dict[key]) for key in missing_keys}
+        for tensor_ref, init_function, args, kwargs in skipped_inits:
+            tensor = tensor_ref()
+            if tensor is not None and id(tensor) in missing_tensors:
+                init_function(tensor, *args, **kwargs)
+
+        modules = dict(self.named_modules())
+        modules_to_init = set()
+        for key in missing_keys:
+            module_name = key
+            while module_name:
+                module_name = module_name.rsplit(".", 1)[0] if "." in module_name else ""
+                if module_name in modules:
+                    modules_to_init.add(modules[module_name])
+
+        def init_module(module):
+            if module in modules_to_init:
+                self._init_weights(module)
+
+        # children first, like `init_weights`
+        self.apply(init_module)
+
     def prune_heads(self, heads_to_prune: Dict[int, List[int]]):
         """
         Prunes heads of the base model.
@@ -697,7 +961,13 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin):
 
         self.base_model._prune_heads(heads_to_prune)
 
-    def save_pretrained(self, save_directory: Union[str, os.PathLike]):
+    def save_pretrained(
+        self,
+        save_directory: Union[str, os.PathLike],
+        max_shard_size: Optional[Union[int, str]] = None,
+        num_threads: int = 1,
+        mmap_format: bool = False,
+    ):
         """
         Save a model and its configuration file to a directory, so that it can be re-loaded using the
         `:func:`~transformers.PreTrainedModel.from_pretrained`` class method.
@@ -705,6 +975,18 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin):
         Arguments:
             save_directory (:obj:`str` or :obj:`os.PathLike`):
                 Directory to which to save. Will be created if it doesn't exist.
+            max_shard_size (:obj:`int` or :obj:`str`, `optional`):
+                If set, the weights bigger than this size (in bytes or as a string with a unit, like :obj:`"5GB"`) are
+                split in several checkpoint files of at most this size, listed in a :obj:`pytorch_model.bin.index.json`
+                file mapping each weight to its file. The weights are saved in a single :obj:`pytorch_model.bin` file
+                by default.
+            num_threads (:obj:`int`, `optional`, defaults to 1):
+                The number of checkpoint files written concurrently when the weights are sharded.
+            mmap_format (:obj:`bool`, `optional`, defaults to :obj:`False`):
+                Whether or not to save the weights in a :obj:`pytorch_model.mmap` file with
+                :func:`~transformers.save_mmap_checkpoint` instead of pickling them with :obj:`torch.save`.
+                :func:`~transformers.PreTrainedModel.from_pretrained` memory-maps such a file and uses its weights in
+                place, without copying them.
         """
         if os.path.isfile(save_directory):
             logger.error("Provided path ({}) should be a directory, not a file".format(save_directory))
@@ -721,24 +1003,67 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin):
 
         # Handle the case where some state_dict keys shouldn't be saved
         if self._keys_to_ignore_on_save is not None:
-            state_dict = {k: v for k, v in state_dict.items() if k not in self._keys_to_ignore_on_save}
+            metadata = getattr(state_dict, "_metadata", None)
+            state_dict = OrderedDict((k, v) for k, v in state_dict.items() if k not in self._keys_to_ignore_on_save)
+            if metadata is not None:
+                state_dict._metadata = metadata
 
         # If we save using the predefined names, we can load using `from_pretrained`
-        output_model_file = os.path.join(save_directory, WEIGHTS_NAME)
+        weights_name = MMAP_WEIGHTS_NAME if mmap_format else WEIGHTS_NAME
+        if max_shard_size is None:
+            shards, index = {weights_name: state_dict}, None
+        else:
+            shards, index = shard_checkpoint(state_dict, max_shard_size, weights_name=weights_name)
+        save_function = save_mmap_checkpoint if mmap_format else torch.save
 
+        is_master = True
         if getattr(self.config, "xla_device", False) and is_torch_tpu_available():
             import torch_xla.core.xla_model as xm
 
-            if xm.is_master_ordinal():
-                # Save configuration file
-                model_to_save.config.save_pretrained(save_directory)
-            # xm.save takes care of saving only from master
-            xm.save(state_dict, output_model_file)
+            is_master = xm.is_master_ordinal()
+            for shard_file, shard in shards.items():
+                if not mmap_format:
+                    # xm.save takes care of saving only from master
+                    xm.save(shard, os.path.join(save_directory, shard_file))
+                elif is_master:
+                    save_mmap_checkpoint(shard, os.path.join(save_directory, shard_file))
+        elif num_threads > 1 and len(shards) > 1:
+            with ThreadPoolExecutor(num_threads) as executor:
+                futures = [
+                    executor.submit(save_function, shard, os.path.join(save_directory, shard_file))
+                    for shard_file, shard in shards.items()
+                ]
+                for future in futures:
+                    future.result()
         else:
+            for shard_file, shard in shards.items():
+                save_function(shard, os.path.join(save_directory, shard_file))
+
+        if is_master:
+            # Save configuration file
             model_to_save.config.save_pretrained(save_directory)
-            torch.save(state_dict, output_model_file)
 
-        logger.info("Model weights saved in {}".format(output_model_file))
+            # Remove the weights of a previous save that are not overwritten, they could be loaded instead
+            for filename in os.listdir(save_directory):
+                is_weights_file = (
+                    filename in (WEIGHTS_NAME, MMAP_WEIGHTS_NAME)
+                    or _SHARD_NAME_PATTERN.fullmatch(filename) is not None
+                )
+                if (is_weights_file and filename not in shards) or (filename == WEIGHTS_INDEX_NAME and index is None):
+                    os.remove(os.path.join(save_directory, filename))
+
+            if index is not None:
+                with open(os.path.join(save_directory, WEIGHTS_INDEX_NAME), "w", encoding="utf-8") as f:
+                    f.write(json.dumps(index, indent=2, sort_keys=True) + "\n")
+
+        if index is None:
+            logger.info("Model weights saved in {}".format(os.path.join(save_directory, weights_name)))
+        else:
+            logger.info(
+                "Model weights saved in {} files, listed in {}".format(
+                    len(shards), os.path.join(save_directory, WEIGHTS_INDEX_NAME)
+                )
+            )
 
     @classmethod
     def from_pretrained(cls, pretrained_model_name_or_path: Optional[Union[str, os.PathLike]], *model_args, **kwargs):
@@ -821,6 +1146,12 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin):
                 Mirror source to accelerate downloads in China. If you are from China and have an accessibility
                 problem, you can set this option to resolve it. Note that we do not guarantee the timeliness or safety.
                 Please refer to the mirror site for more information.
+            low_cpu_mem_usage(:obj:`bool`, `optional`, defaults to :obj:`False`):
+                Whether or not to limit the CPU memory used while loading the model. The model is created without
+                initializing its weights (only the ones missing from the checkpoint are initialized), the checkpoint is
+                memory-mapped when PyTorch supports it and its tensors are released as soon as they are copied in the
+                model, so that the memory peaks at about one copy of the weights instead of two. Not supported with
+                :obj:`from_tf=True`.
             kwargs (remaining dictionary of keyword arguments, `optional`):
                 Can be used to update the configuration object (after it being loaded) and initiate the model (e.g.,
                 :obj:`output_attentions=True`). Behaves differently depending on whether a ``config`` is provided or
@@ -860,6 +1191,10 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin):
         local_files_only = kwargs.pop("local_files_only", False)
         revision = kwargs.pop("revision", None)
         mirror = kwargs.pop("mirror", None)
+        low_cpu_mem_usage = kwargs.pop("low_cpu_mem_usage", False)
+
+        if low_cpu_mem_usage and from_tf:
+            raise ValueError("`low_cpu_mem_usage=True` is not supported when loading a TensorFlow checkpoint.")
 
         # Load config if we don't provide a configuration
         if not isinstance(config, PretrainedConfig):
@@ -880,6 +1215,10 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin):
             model_kwargs = kwargs
 
         # Load model
+        fallback_archive_files = []
+        is_sharded = False
+        shard_files = []
+        is_mmap_format = False
         if pretrained_model_name_or_path is not None:
             pretrained_model_name_or_path = str(pretrained_model_name_or_path)
             if os.path.isdir(pretrained_model_name_or_path):
@@ -889,13 +1228,25 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin):
                 elif from_tf and os.path.isfile(os.path.join(pretrained_model_name_or_path, TF2_WEIGHTS_NAME)):
                     # Load from a TF 2.0 checkpoint in priority if from_tf
                     archive_file = os.path.join(pretrained_model_name_or_path, TF2_WEIGHTS_NAME)
+                elif os.path.isfile(os.path.join(pretrained_model_name_or_path, MMAP_WEIGHTS_NAME)):
+                    # Load from a memory-mapped PyTorch checkpoint
+                    archive_file = os.path.join(pretrained_model_name_or_path, MMAP_WEIGHTS_NAME)
                 elif os.path.isfile(os.path.join(pretrained_model_name_or_path, WEIGHTS_NAME)):
                     # Load from a PyTorch checkpoint
                     archive_file = os.path.join(pretrained_model_name_or_path, WEIGHTS_NAME)
+                elif os.path.isfile(os.path.join(pretrained_model_name_or_path, WEIGHTS_INDEX_NAME)):
+                    # Load from a sharded PyTorch checkpoint
+                    archive_file = os.path.join(pretrained_model_name_or_path, WEIGHTS_INDEX_NAME)
                 else:
                     raise EnvironmentError(
                         "Error no file named {} found in directory {} or `from_tf` set to False".format(
-                            [WEIGHTS_NAME, TF2_WEIGHTS_NAME, TF_WEIGHTS_NAME + ".index"],
+                            [
+                                WEIGHTS_NAME,
+                                MMAP_WEIGHTS_NAME,
+                                WEIGHTS_INDEX_NAME,
+                                TF2_WEIGHTS_NAME,
+                                TF_WEIGHTS_NAME + ".index",
+                            ],
                             pretrained_model_name_or_path,
                         )
                     )
@@ -915,23 +1266,53 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin):
                     revision=revision,
                     mirror=mirror,
                 )
+                if not from_tf:
+                    fallback_archive_files = [
+                        hf_bucket_url(
+                            pretrained_model_name_or_path, filename=filename, revision=revision, mirror=mirror
+                        )
+                        for filename in [MMAP_WEIGHTS_NAME, WEIGHTS_INDEX_NAME]
+                    ]
 
+            download_kwargs = dict(
+                cache_dir=cache_dir,
+                force_download=force_download,
+                proxies=proxies,
+                resume_download=resume_download,
+                local_files_only=local_files_only,
+            )
             try:
                 # Load from URL or cache if already cached
-                resolved_archive_file = cached_path(
-                    archive_file,
-                    cache_dir=cache_dir,
-                    force_download=force_download,
-                    proxies=proxies,
-                    resume_download=resume_download,
-                    local_files_only=local_files_only,
-                )
+                for fallback_archive_file in fallback_archive_files + [None]:
+                    try:
+                        resolved_archive_file = cached_path(archive_file, **download_kwargs)
+                        break
+                    except EnvironmentError:
+                        # There is no pickled weights file, the weights may be memory-mapped or sharded
+                        if fallback_archive_file is None:
+                            raise
+                        archive_file = fallback_archive_file
+
+                is_sharded = not from_tf and archive_file.endswith(".index.json") and state_dict is None
+                if is_sharded:
+                    # The shards are next to their index
+                    with open(resolved_archive_file, encoding="utf-8") as f:
+                        shard_index = json.load(f)
+                    for shard_file in sorted(set(shard_index["weight_map"].values())):
+                        if is_remote_url(archive_file):
+                            shard_archive_file = archive_file.rsplit("/", 1)[0] + "/" + shard_file
+                        else:
+                            shard_archive_file = os.path.join(os.path.dirname(archive_file), shard_file)
+                        shard_files.append(cached_path(shard_archive_file, **download_kwargs))
+
+                if not from_tf and state_dict is None:
+                    is_mmap_format = is_mmap_checkpoint(shard_files[0] if is_sharded else resolved_archive_file)
             except EnvironmentError as err:
                 logger.error(err)
                 msg = (
                     f"Can't load weights for '{pretrained_model_name_or_path}'. Make sure that:\n\n"
                     f"- '{pretrained_model_name_or_path}' is a correct model identifier listed on 'https://huggingface.co/models'\n\n"
-                    f"- or '{pretrained_model_name_or_path}' is the correct path to a directory containing a file named one of {WEIGHTS_NAME}, {TF2_WEIGHTS_NAME}, {TF_WEIGHTS_NAME}.\n\n"
+                    f"- or '{pretrained_model_name_or_path}' is the correct path to a directory containing a file named one of {WEIGHTS_NAME}, {MMAP_WEIGHTS_NAME}, {WEIGHTS_INDEX_NAME}, {TF2_WEIGHTS_NAME}, {TF_WEIGHTS_NAME}.\n\n"
                 )
                 raise EnvironmentError(msg)
 
@@ -944,12 +1325,21 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin):
 
         config.name_or_path = pretrained_model_name_or_path
 
+        if is_mmap_format:
+            # The weights of the checkpoint replace the ones of the model, so there is no need to initialize them
+            low_cpu_mem_usage = True
+
         # Instantiate model.
-        model = cls(config, *model_args, **model_kwargs)
+        if low_cpu_mem_usage:
+            # the weights are loaded from the checkpoint, the missing ones are initialized before loading it
+            with no_init_weights() as skipped_inits:
+                model = cls(config, *model_args, **model_kwargs)
+        else:
+            model = cls(config, *model_args, **model_kwargs)
 
-        if state_dict is None and not from_tf:
+        if state_dict is None and not from_tf and not is_sharded:
             try:
-                state_dict = torch.load(resolved_archive_file, map_location="cpu")
+                state_dict = _load_checkpoint(resolved_archive_file, mmap=low_cpu_mem_usage)
             except Exception:
                 raise OSError(
                     f"Unable to load weights from pytorch checkpoint file for '{pretrained_model_name_or_path}' "
@@ -978,54 +1368,89 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin):
                     )
                     raise
         else:
-            # Convert old format to new format if needed from a PyTorch state_dict
-            old_keys = []
-            new_keys = []
-            for key in state_dict.keys():
-                new_key = None
-                if "gamma" in key:
-                    new_key = key.replace("gamma", "weight")
-                if "beta" in key:
-                    new_key = key.replace("beta", "bias")
-                if new_key:
-                    old_keys.append(key)
-                    new_keys.append(new_key)
-            for old_key, new_key in zip(old_keys, new_keys):
-                state_dict[new_key] = state_dict.pop(old_key)
-
-            # copy state_dict so _load_from_state_dict can modify it
-            metadata = getattr(state_dict, "_metadata", None)
-            state_dict = state_dict.copy()
-            if metadata is not None:
-                state_dict._metadata = metadata
+            if is_sharded:
+                checkpoint_keys = dict.fromkeys(shard_index["weight_map"])
+                _rename_legacy_keys(checkpoint_keys)
+            else:
+                _rename_legacy_keys(state_dict)
+                checkpoint_keys = dict.fromkeys(state_dict)
+
+                # copy state_dict so _load_from_state_dict can modify it
+                metadata = getattr(state_dict, "_metadata", None)
+                state_dict = state_dict.copy()
+                if metadata is not None:
+                    state_dict._metadata = metadata
 
             # PyTorch's `_load_from_state_dict` does not copy parameters in a module's descendants
             # so we need to apply the function recursively.
-            def load(module: nn.Module, prefix=""):
+            def load(module: nn.Module, state_dict, missing_keys, unexpected_keys, prefix=""):
+                metadata = getattr(state_dict, "_metadata", None)
                 local_metadata = {} if metadata is None else metadata.get(prefix[:-1], {})
+                assigned_keys = []
+                if is_mmap_format:
+                    # the memory-mapped tensors become the weights of the module instead of being copied in them
+                    assigned_keys = _assign_weights(module, state_dict, prefix, assigned_parameters)
+                module_missing_keys = []
                 module._load_from_state_dict(
                     state_dict,
                     prefix,
                     local_metadata,
                     True,
-                    missing_keys,
+                    module_missing_keys,
                     unexpected_keys,
                     error_msgs,
                 )
+                missing_keys.extend(key for key in module_missing_keys if key not in assigned_keys)
+                if low_cpu_mem_usage or is_sharded:
+                    # the tensors of the module are copied in it, release them right away
+                    for name in itertools.chain(module._parameters, module._buffers):
+                        state_dict.pop(prefix + name, None)
                 for name, child in module._modules.items():
                     if child is not None:
-                        load(child, prefix + name + ".")
+                        load(child, state_dict, missing_keys, unexpected_keys, prefix + name + ".")
+
+            assigned_parameters = {}
 
             # Make sure we are able to load base models as well as derived models (with heads)
             start_prefix = ""
             model_to_load = model
-            has_prefix_module = any(s.startswith(cls.base_model_prefix) for s in state_dict.keys())
+            has_prefix_module = any(s.startswith(cls.base_model_prefix) for s in checkpoint_keys)
             if not hasattr(model, cls.base_model_prefix) and has_prefix_module:
                 start_prefix = cls.base_model_prefix + "."
             if hasattr(model, cls.base_model_prefix) and not has_prefix_module:
                 model_to_load = getattr(model, cls.base_model_prefix)
 
-            load(model_to_load, prefix=start_prefix)
+            if low_cpu_mem_usage:
+                base_prefix = cls.base_model_prefix + "."
+                weights_to_init = []
+                for key in model.state_dict().keys():
+                    if model_to_load is model:
+                        checkpoint_key = start_prefix + key
+                    elif key.startswith(base_prefix):
+                        checkpoint_key = key[len(base_prefix) :]
+                    else:
+                        checkpoint_key = None
+                    if checkpoint_key not in checkpoint_keys:
+                        weights_to_init.append(key)
+                model._init_missing_weights(weights_to_init, skipped_inits)
+                del skipped_inits
+
+            if is_sharded:
+                # The shards are loaded one at a time and released once copied in the model. Each of them only holds
+                # some of the weights, so the missing keys are the ones missing from all of them.
+                for i, shard_file in enumerate(shard_files):
+                    shard_state_dict = _load_checkpoint(shard_file, mmap=low_cpu_mem_usage)
+                    _rename_legacy_keys(shard_state_dict)
+                    shard_missing_keys = []
+                    load(model_to_load, shard_state_dict, shard_missing_keys, unexpected_keys, prefix=start_prefix)
+                    if i == 0:
+                        missing_keys = shard_missing_keys
+                    else:
+                        shard_missing_keys = set(shard_missing_keys)
+                        missing_keys = [key for key in missing_keys if key in shard_missing_keys]
+                    del shard_state_dict
+            else:
+                load(model_to_load, state_dict, missing_keys, unexpected_keys, prefix=start_prefix)
 
             if model.__class__.__name__ != model_to_load.__class__.__name__:
                 base_model_state_dict = model_to_load.state_dict().keys()
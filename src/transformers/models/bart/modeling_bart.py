@@ -31,6 +31,7 @@ from ...file_utils import (
     add_start_docstrings_to_model_forward,
     replace_return_docstrings,
 )
+from ...generation_static_cache import StaticCache, StaticCacheLayer
 from ...modeling_outputs import (
     BaseModelOutput,
     BaseModelOutputWithPastAndCrossAttentions,
@@ -591,7 +592,10 @@ class BartDecoder(nn.Module):
             if self.training and (dropout_probability < self.layerdrop):
                 continue
 
-            layer_state = past_key_values[idx] if past_key_values is not None else None
+            if isinstance(past_key_values, StaticCache):
+                layer_state = past_key_values.layers[idx]
+            else:
+                layer_state = past_key_values[idx] if past_key_values is not None else None
 
             x, layer_self_attn, layer_past, layer_cross_attn = decoder_layer(
                 x,
@@ -603,7 +607,7 @@ class BartDecoder(nn.Module):
                 output_attentions=output_attentions,
             )
 
-            if use_cache:
+            if use_cache and isinstance(layer_past, dict):
                 next_decoder_cache.append(layer_past.copy())
 
             if output_attentions:
@@ -623,7 +627,10 @@ class BartDecoder(nn.Module):
         x = x.transpose(0, 1)
         encoder_hidden_states = encoder_hidden_states.transpose(0, 1)
 
-        next_cache = next_decoder_cache if use_cache else None
+        if isinstance(past_key_values, StaticCache):
+            next_cache = past_key_values if use_cache else None
+        else:
+            next_cache = next_decoder_cache if use_cache else None
         if not return_dict:
             return tuple(
                 v for v in [x, next_cache, all_hidden_states, all_self_attns, all_cross_attentions] if v is not None
@@ -686,7 +693,11 @@ class Attention(nn.Module):
         static_kv: bool = self.encoder_decoder_attention
         tgt_len, bsz, embed_dim = query.size()
         # get here for encoder decoder cause of static_kv
-        if layer_state is not None:  # reuse k,v and encoder_padding_mask
+        if isinstance(layer_state, StaticCacheLayer):
+            saved_state = None
+            if static_kv and layer_state.cross_attention_states is not None:
+                key = None
+        elif layer_state is not None:  # reuse k,v and encoder_padding_mask
             saved_state = layer_state.get(self.cache_key, {})
             if "prev_key" in saved_state and static_kv:
                 # previous time steps are cached - no need to recompute key and value if they are static
@@ -715,7 +726,9 @@ class Attention(nn.Module):
             k, v = self._concat_saved_state(k, v, saved_state, static_kv, bsz)
 
         # Update cache
-        if isinstance(layer_state, dict):
+        if isinstance(layer_state, StaticCacheLayer):
+            k, v = self._update_static_cache(k, v, layer_state, static_kv, bsz)
+        elif isinstance(layer_state, dict):
             cached_shape = (bsz, self.num_heads, -1, self.head_dim)  # bsz must be first for reorder_cache
             layer_state[self.cache_key] = dict(prev_key=k.view(*cached_shape), prev_value=v.view(*cached_shape))
 
@@ -763,6 +776,17 @@ class Attention(nn.Module):
         new_V = prev_V if static_kv else torch.cat([prev_V, v], dim=1)
         return new_K, new_V
 
+    def _update_static_cache(self, k, v, cache_layer, static_kv, bsz) -> Tuple[Tensor]:
+        # cached states are stored with shape (bsz, num_heads, seq_len, head_dim)
+        cached_shape = (bsz, self.num_heads, -1, self.head_dim)
+        if not static_kv:
+            k, v = cache_layer.update(k.view(*cached_shape), v.view(*cached_shape))
+        elif k is None:
+            k, v = cache_layer.cross_attention_states
+        else:
+            cache_layer.cross_attention_states = (k.view(*cached_shape), v.view(*cached_shape))
+        return k.view(bsz * self.num_heads, -1, self.head_dim), v.view(bsz * self.num_heads, -1, self.head_dim)
+
 
 class BartClassificationHead(nn.Module):
     """Head for sentence-level classification tasks."""
@@ -1092,8 +1116,21 @@ class BartForConditionalGeneration(PretrainedBartModel):
         """force one of token_ids to be generated by setting prob of all other tokens to 0 (logprob=-float("inf"))"""
         scores[:, [x for x in range(scores.shape[1]) if x != token_id]] = -float("inf")
 
+    def _init_static_cache(self, batch_size, max_length):
+        return StaticCache(
+            self.config.decoder_layers,
+            batch_size,
+            self.config.decoder_attention_heads,
+            self.config.d_model // self.config.decoder_attention_heads,
+            max_length,
+            self.device,
+            dtype=self.dtype,
+        )
+
     @staticmethod
     def _reorder_cache(past, beam_idx):
+        if isinstance(past, StaticCache):
+            return past.reorder_cache(beam_idx)
         reordered_past = []
         for layer_past in past:
             # get the correct batch idx from decoder layer's batch dim for cross and self-attn
@@ -20,7 +20,7 @@ import os
 import unicodedata
 from typing import List, Optional, Tuple
 
-from ...tokenization_utils import PreTrainedTokenizer, _is_control, _is_punctuation, _is_whitespace
+from ...tokenization_utils import PreTrainedTokenizer, Trie, _is_control, _is_punctuation, _is_whitespace
 from ...utils import logging
 
 
@@ -114,6 +114,73 @@ def whitespace_tokenize(text):
     return tokens
 
 
+def _is_chinese_char(cp):
+    """Checks whether CP is the codepoint of a CJK character."""
+    # This defines a "chinese character" as anything in the CJK Unicode block:
+    #   https://en.wikipedia.org/wiki/CJK_Unified_Ideographs_(Unicode_block)
+    #
+    # Note that the CJK Unicode block is NOT all Japanese and Korean characters,
+    # despite its name. The modern Korean Hangul alphabet is a different block,
+    # as is Japanese Hiragana and Katakana. Those alphabets are used to write
+    # space-separated words, so they are not treated specially and handled
+    # like the all of the other languages.
+    if (
+        (cp >= 0x4E00 and cp <= 0x9FFF)
+        or (cp >= 0x3400 and cp <= 0x4DBF)  #
+        or (cp >= 0x20000 and cp <= 0x2A6DF)  #
+        or (cp >= 0x2A700 and cp <= 0x2B73F)  #
+        or (cp >= 0x2B740 and cp <= 0x2B81F)  #
+        or (cp >= 0x2B820 and cp <= 0x2CEAF)  #
+        or (cp >= 0xF900 and cp <= 0xFAFF)
+        or (cp >= 0x2F800 and cp <= 0x2FA1F)  #
+    ):  #
+        return True
+
+    return False
+
+
+def _clean_char(char):
+    """Removes invalid and control characters and replaces whitespace characters by a space."""
+    cp = ord(char)
+    if cp == 0 or cp == 0xFFFD or _is_control(char):
+        return None
+    if _is_whitespace(char):
+        return " "
+    return char
+
+
+def _clean_and_split_chinese_char(char):
+    """Cleans the character like :func:`_clean_char`, then adds whitespace around it if it is a CJK character."""
+    cleaned = _clean_char(char)
+    if cleaned == char and _is_chinese_char(ord(char)):
+        return " " + char + " "
+    return cleaned
+
+
+class _CharTable(dict):
+    """
+    Table of the replacement of each character for :meth:`str.translate`, so that texts are processed in one pass at C
+    speed instead of character by character in Python. The class of each character is computed the first time it is
+    met, so the table covers all of Unicode while only holding the characters actually seen.
+    """
+
+    def __init__(self, replace_char):
+        super().__init__()
+        self.replace_char = replace_char
+
+    def __missing__(self, cp):
+        replacement = self.replace_char(chr(cp))
+        self[cp] = replacement
+        return replacement
+
+
+_CLEAN_TABLE = _CharTable(_clean_char)
+_SPLIT_CHINESE_TABLE = _CharTable(lambda char: " " + char + " " if _is_chinese_char(ord(char)) else char)
+_CLEAN_AND_SPLIT_CHINESE_TABLE = _CharTable(_clean_and_split_chinese_char)
+_SPLIT_PUNCTUATION_TABLE = _CharTable(lambda char: " " + char + " " if _is_punctuation(char) else char)
+_STRIP_ACCENTS_TABLE = _CharTable(lambda char: None if unicodedata.category(char) == "Mn" else char)
+
+
 class BertTokenizer(PreTrainedTokenizer):
     r"""
     Construct a BERT tokenizer. Based on WordPiece.
@@ -392,7 +459,6 @@ class BasicTokenizer(object):
         """
         # union() returns a new set by concatenating the two sets.
         never_split = self.never_split.union(set(never_split)) if never_split else self.never_split
-        text = self._clean_text(text)
 
         # This was added on November 1st, 2018 for the multilingual and Chinese
         # models. This is also applied to the English models now, but it doesn't
@@ -400,11 +466,13 @@ class BasicTokenizer(object):
         # and generally don't have any Chinese data in them (there are Chinese
         # characters in the vocabulary because Wikipedia does have some Chinese
         # words in the English Wikipedia.).
+        # Cleaning the text and adding whitespace around CJK characters is done in the same pass.
         if self.tokenize_chinese_chars:
-            text = self._tokenize_chinese_chars(text)
-        orig_tokens = whitespace_tokenize(text)
+            text = text.translate(_CLEAN_AND_SPLIT_CHINESE_TABLE)
+        else:
+            text = self._clean_text(text)
         split_tokens = []
-        for token in orig_tokens:
+        for token in whitespace_tokenize(text):
             if token not in never_split:
                 if self.do_lower_case:
                     token = token.lower()
@@ -412,21 +480,18 @@ class BasicTokenizer(object):
                         token = self._run_strip_accents(token)
                 elif self.strip_accents:
                     token = self._run_strip_accents(token)
-            split_tokens.extend(self._run_split_on_punc(token, never_split))
+            # Punctuation is split from the rest by adding whitespace around it, as tokens have none left
+            if token in never_split:
+                if token:
+                    split_tokens.append(token)
+            else:
+                split_tokens.extend(token.translate(_SPLIT_PUNCTUATION_TABLE).split())
 
-        output_tokens = whitespace_tokenize(" ".join(split_tokens))
-        return output_tokens
+        return split_tokens
 
     def _run_strip_accents(self, text):
         """Strips accents from a piece of text."""
-        text = unicodedata.normalize("NFD", text)
-        output = []
-        for char in text:
-            cat = unicodedata.category(char)
-            if cat == "Mn":
-                continue
-            output.append(char)
-        return "".join(output)
+        return unicodedata.normalize("NFD", text).translate(_STRIP_ACCENTS_TABLE)
 
     def _run_split_on_punc(self, text, never_split=None):
         """Splits punctuation on a piece of text."""
@@ -452,53 +517,15 @@ class BasicTokenizer(object):
 
     def _tokenize_chinese_chars(self, text):
         """Adds whitespace around any CJK character."""
-        output = []
-        for char in text:
-            cp = ord(char)
-            if self._is_chinese_char(cp):
-                output.append(" ")
-                output.append(char)
-                output.append(" ")
-            else:
-                output.append(char)
-        return "".join(output)
+        return text.translate(_SPLIT_CHINESE_TABLE)
 
     def _is_chinese_char(self, cp):
         """Checks whether CP is the codepoint of a CJK character."""
-        # This defines a "chinese character" as anything in the CJK Unicode block:
-        #   https://en.wikipedia.org/wiki/CJK_Unified_Ideographs_(Unicode_block)
-        #
-        # Note that the CJK Unicode block is NOT all Japanese and Korean characters,
-        # despite its name. The modern Korean Hangul alphabet is a different block,
-        # as is Japanese Hiragana and Katakana. Those alphabets are used to write
-        # space-separated words, so they are not treated specially and handled
-        # like the all of the other languages.
-        if (
-            (cp >= 0x4E00 and cp <= 0x9FFF)
-            or (cp >= 0x3400 and cp <= 0x4DBF)  #
-            or (cp >= 0x20000 and cp <= 0x2A6DF)  #
-            or (cp >= 0x2A700 and cp <= 0x2B73F)  #
-            or (cp >= 0x2B740 and cp <= 0x2B81F)  #
-            or (cp >= 0x2B820 and cp <= 0x2CEAF)  #
-            or (cp >= 0xF900 and cp <= 0xFAFF)
-            or (cp >= 0x2F800 and cp <= 0x2FA1F)  #
-        ):  #
-            return True
-
-        return False
+        return _is_chinese_char(cp)
 
     def _clean_text(self, text):
         """Performs invalid character removal and whitespace cleanup on text."""
-        output = []
-        for char in text:
-            cp = ord(char)
-            if cp == 0 or cp == 0xFFFD or _is_control(char):
-                continue
-            if _is_whitespace(char):
-                output.append(" ")
-            else:
-                output.append(char)
-        return "".join(output)
+        return text.translate(_CLEAN_TABLE)
 
 
 class WordpieceTokenizer(object):
@@ -508,6 +535,28 @@ class WordpieceTokenizer(object):
         self.vocab = vocab
         self.unk_token = unk_token
         self.max_input_chars_per_word = max_input_chars_per_word
+        self._tries = None
+        self._tries_vocab_size = None
+
+    def _get_tries(self):
+        """
+        Returns the tries of the word pieces starting a word and of those continuing one (without their "##" prefix),
+        built the first time they are needed and again if the vocabulary changed size.
+        """
+        if getattr(self, "_tries", None) is None or self._tries_vocab_size != len(self.vocab):
+            start_trie, continuation_trie = Trie(), Trie()
+            for piece in self.vocab:
+                start_trie.add(piece)
+                if piece.startswith("##"):
+                    continuation_trie.add(piece[2:])
+            self._tries = (start_trie, continuation_trie)
+            self._tries_vocab_size = len(self.vocab)
+        return self._tries
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_tries"] = None
+        return state
 
     def tokenize(self, text):
         """
@@ -525,33 +574,31 @@ class WordpieceTokenizer(object):
         """
 
         output_tokens = []
+        start_trie, continuation_trie = None, None
         for token in whitespace_tokenize(text):
-            chars = list(token)
-            if len(chars) > self.max_input_chars_per_word:
+            if len(token) > self.max_input_chars_per_word:
                 output_tokens.append(self.unk_token)
                 continue
+            if token in self.vocab:
+                output_tokens.append(token)
+                continue
 
-            is_bad = False
+            # The longest piece of the vocabulary starting at each position is found by walking down a trie
+            if start_trie is None:
+                start_trie, continuation_trie = self._get_tries()
             start = 0
             sub_tokens = []
-            while start < len(chars):
-                end = len(chars)
-                cur_substr = None
-                while start < end:
-                    substr = "".join(chars[start:end])
-                    if start > 0:
-                        substr = "##" + substr
-                    if substr in self.vocab:
-                        cur_substr = substr
-                        break
-                    end -= 1
-                if cur_substr is None:
-                    is_bad = True
+            while start < len(token):
+                if start == 0:
+                    end = start_trie.longest_match(token, start)
+                else:
+                    end = continuation_trie.longest_match(token, start)
+                if end is None:
                     break
-                sub_tokens.append(cur_substr)
+                sub_tokens.append(token[start:end] if start == 0 else "##" + token[start:end])
                 start = end
 
-            if is_bad:
+            if start < len(token):
                 output_tokens.append(self.unk_token)
             else:
                 output_tokens.extend(sub_tokens)
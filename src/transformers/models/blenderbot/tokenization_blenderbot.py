@@ -21,7 +21,7 @@ from typing import Dict, List, Optional, Tuple
 
 import regex as re
 
-from ...tokenization_utils import PreTrainedTokenizer
+from ...tokenization_utils import BPECache, PreTrainedTokenizer, bpe_merge
 from ...utils import logging
 from ..roberta.tokenization_roberta import RobertaTokenizer
 
@@ -146,7 +146,7 @@ class BlenderbotSmallTokenizer(PreTrainedTokenizer):
             merges = merges_handle.read().split("\n")[1:-1]
         merges = [tuple(merge.split()) for merge in merges]
         self.bpe_ranks = dict(zip(merges, range(len(merges))))
-        self.cache = {}
+        self.cache = BPECache()
 
     @property
     def vocab_size(self) -> int:
@@ -156,8 +156,9 @@ class BlenderbotSmallTokenizer(PreTrainedTokenizer):
         return dict(self.encoder, **self.added_tokens_encoder)
 
     def bpe(self, token: str) -> str:
-        if token in self.cache:
-            return self.cache[token]
+        cached = self.cache.get(token)
+        if cached is not None:
+            return cached
         token = re.sub("([.,!?()])", r" \1", token)
         token = re.sub("(')", r" \1 ", token)
         token = re.sub(r"\s{2,}", " ", token)
@@ -179,35 +180,7 @@ class BlenderbotSmallTokenizer(PreTrainedTokenizer):
                 words.append(token)
                 continue
 
-            while True:
-                bigram = min(pairs, key=lambda pair: self.bpe_ranks.get(pair, float("inf")))
-                if bigram not in self.bpe_ranks:
-                    break
-                first, second = bigram
-                new_word = []
-                i = 0
-
-                while i < len(word):
-                    try:
-                        j = word.index(first, i)
-                        new_word.extend(word[i:j])
-                        i = j
-                    except ValueError:
-                        new_word.extend(word[i:])
-                        break
-
-                    if word[i] == first and i < len(word) - 1 and word[i + 1] == second:
-                        new_word.append(first + second)
-                        i += 2
-                    else:
-                        new_word.append(word[i])
-                        i += 1
-                new_word = tuple(new_word)
-                word = new_word
-                if len(word) == 1:
-                    break
-                else:
-                    pairs = get_pairs(word)
+            word = bpe_merge(word, self.bpe_ranks)
             word = "@@ ".join(word)
             word = word[:-4]
 
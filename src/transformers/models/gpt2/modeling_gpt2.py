@@ -31,6 +31,7 @@ from ...file_utils import (
     add_start_docstrings_to_model_forward,
     replace_return_docstrings,
 )
+from ...generation_static_cache import StaticCache, StaticCacheLayer
 from ...modeling_outputs import (
     BaseModelOutputWithPastAndCrossAttentions,
     CausalLMOutputWithPastAndCrossAttentions,
@@ -226,15 +227,21 @@ class Attention(nn.Module):
         query = self.split_heads(query)
         key = self.split_heads(key, k=True)
         value = self.split_heads(value)
-        if layer_past is not None:
-            past_key, past_value = layer_past[0].transpose(-2, -1), layer_past[1]  # transpose back cf below
-            key = torch.cat((past_key, key), dim=-1)
-            value = torch.cat((past_value, value), dim=-2)
-
-        if use_cache is True:
-            present = torch.stack((key.transpose(-2, -1), value))  # transpose to have same shapes for stacking
+        if isinstance(layer_past, StaticCacheLayer):
+            # the new positions are written in place in the preallocated cache, which is returned as present
+            key, value = layer_past.update(key.transpose(-2, -1), value)
+            key = key.transpose(-2, -1)
+            present = layer_past
         else:
-            present = (None,)
+            if layer_past is not None:
+                past_key, past_value = layer_past[0].transpose(-2, -1), layer_past[1]  # transpose back cf below
+                key = torch.cat((past_key, key), dim=-1)
+                value = torch.cat((past_value, value), dim=-2)
+
+            if use_cache is True:
+                present = torch.stack((key.transpose(-2, -1), value))  # transpose to have same shapes for stacking
+            else:
+                present = (None,)
 
         attn_outputs = self._attn(query, key, value, attention_mask, head_mask, output_attentions)
         a = attn_outputs[0]
@@ -631,9 +638,13 @@ class GPT2Model(GPT2PreTrainedModel):
         if position_ids is not None:
             position_ids = position_ids.view(-1, input_shape[-1])
 
+        static_cache = past_key_values if isinstance(past_key_values, StaticCache) else None
         if past_key_values is None:
             past_length = 0
             past_key_values = [None] * len(self.h)
+        elif static_cache is not None:
+            past_length = static_cache.seq_length
+            past_key_values = static_cache.layers
         else:
             past_length = past_key_values[0][0].size(-2)
         if position_ids is None:
@@ -700,7 +711,7 @@ class GPT2Model(GPT2PreTrainedModel):
             if self.model_parallel:
                 torch.cuda.set_device(hidden_states.device)
                 # Ensure layer_past is on same device as hidden_states (might not be correct)
-                if layer_past is not None:
+                if layer_past is not None and static_cache is None:
                     layer_past = layer_past.to(hidden_states.device)
                 # Ensure that attention_mask is always on the same device as hidden_states
                 if attention_mask is not None:
@@ -755,6 +766,9 @@ class GPT2Model(GPT2PreTrainedModel):
                     if i == v[-1] and "cuda:" + str(k) != self.last_device:
                         hidden_states = hidden_states.to("cuda:" + str(k + 1))
 
+        if static_cache is not None and use_cache is True:
+            presents = static_cache
+
         hidden_states = self.ln_f(hidden_states)
 
         hidden_states = hidden_states.view(*output_shape)
@@ -816,6 +830,17 @@ class GPT2LMHeadModel(GPT2PreTrainedModel):
     def get_output_embeddings(self):
         return self.lm_head
 
+    def _init_static_cache(self, batch_size, max_length):
+        return StaticCache(
+            self.config.n_layer,
+            batch_size,
+            self.config.n_head,
+            self.config.n_embd // self.config.n_head,
+            max_length,
+            self.device,
+            dtype=self.dtype,
+        )
+
     def prepare_inputs_for_generation(self, input_ids, past=None, **kwargs):
         token_type_ids = kwargs.get("token_type_ids", None)
         # only last token for inputs_ids if past is defined in kwargs
@@ -945,6 +970,17 @@ class GPT2DoubleHeadsModel(GPT2PreTrainedModel):
     def get_output_embeddings(self):
         return self.lm_head
 
+    def _init_static_cache(self, batch_size, max_length):
+        return StaticCache(
+            self.config.n_layer,
+            batch_size,
+            self.config.n_head,
+            self.config.n_embd // self.config.n_head,
+            max_length,
+            self.device,
+            dtype=self.dtype,
+        )
+
     def prepare_inputs_for_generation(self, input_ids, past=None, **kwargs):
         token_type_ids = kwargs.get("token_type_ids", None)
         # only last token for inputs_ids if past is defined in kwargs
@@ -1877,6 +1877,9 @@ class ProphetNetForConditionalGeneration(ProphetNetPreTrainedModel):
     PROPHETNET_START_DOCSTRING,
 )
 class ProphetNetForCausalLM(ProphetNetPreTrainedModel):
+    # the past key values are stored in nested dicts, that can't be cropped after a rejection
+    _supports_speculative_decoding = False
+
     def __init__(self, config):
         super().__init__(config)
         # set config for CLM
@@ -32,6 +32,7 @@ from ...file_utils import (
     add_start_docstrings_to_model_forward,
     replace_return_docstrings,
 )
+from ...generation_static_cache import StaticCache, StaticCacheLayer
 from ...modeling_outputs import (
     BaseModelOutput,
     BaseModelOutputWithPastAndCrossAttentions,
@@ -422,7 +423,10 @@ class T5Attention(nn.Module):
 
         real_seq_length = seq_length
 
-        if past_key_value is not None:
+        static_cache_layer = past_key_value if isinstance(past_key_value, StaticCacheLayer) else None
+        if static_cache_layer is not None:
+            real_seq_length += static_cache_layer.seq_length if query_length is None else query_length
+        elif past_key_value is not None:
             assert (
                 len(past_key_value) == 2
             ), "past_key_value should have 2 past states: keys and values. Got {} past states".format(
@@ -465,12 +469,26 @@ class T5Attention(nn.Module):
         query_states = shape(self.q(hidden_states))  # (batch_size, n_heads, seq_length, dim_per_head)
 
         # get key/value states
-        key_states = project(
-            hidden_states, self.k, key_value_states, past_key_value[0] if past_key_value is not None else None
-        )
-        value_states = project(
-            hidden_states, self.v, key_value_states, past_key_value[1] if past_key_value is not None else None
-        )
+        if static_cache_layer is None:
+            key_states = project(
+                hidden_states, self.k, key_value_states, past_key_value[0] if past_key_value is not None else None
+            )
+            value_states = project(
+                hidden_states, self.v, key_value_states, past_key_value[1] if past_key_value is not None else None
+            )
+        elif key_value_states is None:
+            # self-attn: write the new positions in place in the preallocated cache
+            key_states, value_states = static_cache_layer.update(
+                shape(self.k(hidden_states)), shape(self.v(hidden_states))
+            )
+        else:
+            # cross-attn: project the encoder outputs only once
+            if static_cache_layer.cross_attention_states is None:
+                static_cache_layer.cross_attention_states = (
+                    shape(self.k(key_value_states)),
+                    shape(self.v(key_value_states)),
+                )
+            key_states, value_states = static_cache_layer.cross_attention_states
 
         # compute scores
         scores = torch.matmul(
@@ -508,7 +526,10 @@ class T5Attention(nn.Module):
         attn_output = unshape(torch.matmul(attn_weights, value_states))  # (batch_size, seq_length, dim)
         attn_output = self.o(attn_output)
 
-        present_key_value_state = (key_states, value_states) if (self.is_decoder and use_cache) else None
+        if static_cache_layer is not None:
+            present_key_value_state = static_cache_layer if (self.is_decoder and use_cache) else None
+        else:
+            present_key_value_state = (key_states, value_states) if (self.is_decoder and use_cache) else None
         outputs = (attn_output,) + (present_key_value_state,) + (position_bias,)
 
         if output_attentions:
@@ -610,7 +631,11 @@ class T5Block(nn.Module):
         return_dict=True,
     ):
 
-        if past_key_value is not None:
+        if isinstance(past_key_value, StaticCacheLayer):
+            assert self.is_decoder, "Only decoder can use `past_key_values`"
+            # the same layer of the cache holds the self-attention and cross-attention states
+            self_attn_past_key_value = cross_attn_past_key_value = past_key_value
+        elif past_key_value is not None:
             assert self.is_decoder, "Only decoder can use `past_key_values`"
             expected_num_past_key_values = 2 if encoder_hidden_states is None else 4
 
@@ -642,7 +667,9 @@ class T5Block(nn.Module):
         if do_cross_attention:
             # the actual query length is unknown for cross attention
             # if using past key value states. Need to inject it here
-            if present_key_value_state is not None:
+            if isinstance(present_key_value_state, StaticCacheLayer):
+                query_length = present_key_value_state.seq_length
+            elif present_key_value_state is not None:
                 query_length = present_key_value_state[0].shape[2]
             else:
                 query_length = None
@@ -660,7 +687,7 @@ class T5Block(nn.Module):
             )
             hidden_states = cross_attention_outputs[0]
             # Combine self attn and cross attn key value states
-            if present_key_value_state is not None:
+            if present_key_value_state is not None and not isinstance(present_key_value_state, StaticCacheLayer):
                 present_key_value_state = present_key_value_state + cross_attention_outputs[1]
 
             # Keep cross-attention outputs and relative position weights
@@ -865,7 +892,13 @@ class T5Stack(T5PreTrainedModel):
         batch_size, seq_length = input_shape
 
         # required mask seq length can be calculated via length of past
-        mask_seq_length = past_key_values[0][0].shape[2] + seq_length if past_key_values is not None else seq_length
+        static_cache = past_key_values if isinstance(past_key_values, StaticCache) else None
+        if static_cache is not None:
+            mask_seq_length = static_cache.seq_length + seq_length
+        else:
+            mask_seq_length = (
+                past_key_values[0][0].shape[2] + seq_length if past_key_values is not None else seq_length
+            )
 
         if use_cache is True:
             assert self.is_decoder, ":obj:`use_cache` can only be set to `True` if {} is used as a decoder".format(
@@ -883,6 +916,8 @@ class T5Stack(T5PreTrainedModel):
         # initialize past_key_values with `None` if past does not exist
         if past_key_values is None:
             past_key_values = [None] * len(self.block)
+        elif static_cache is not None:
+            past_key_values = static_cache.layers
 
         # ourselves in which case we just need to make it broadcastable to all heads.
         extended_attention_mask = self.get_extended_attention_mask(attention_mask, input_shape, inputs_embeds.device)
@@ -958,6 +993,9 @@ class T5Stack(T5PreTrainedModel):
                     if i == v[-1] and "cuda:" + str(k) != self.last_device:
                         hidden_states = hidden_states.to("cuda:" + str(k + 1))
 
+        if static_cache is not None and use_cache:
+            present_key_value_states = static_cache
+
         hidden_states = self.final_layer_norm(hidden_states)
         hidden_states = self.dropout(hidden_states)
 
@@ -1534,6 +1572,17 @@ class T5ForConditionalGeneration(T5PreTrainedModel):
             "use_cache": use_cache,
         }
 
+    def _init_static_cache(self, batch_size, max_length):
+        return StaticCache(
+            self.config.num_decoder_layers,
+            batch_size,
+            self.config.num_heads,
+            self.config.d_kv,
+            max_length,
+            self.device,
+            dtype=self.dtype,
+        )
+
     def _reorder_cache(self, past, beam_idx):
         # if decoder past is not included in output
         # speedy decoding is disabled and no need to reorder
@@ -1541,6 +1590,9 @@ class T5ForConditionalGeneration(T5PreTrainedModel):
             logger.warning("You might want to consider setting `use_cache=True` to speed up decoding")
             return past
 
+        if isinstance(past, StaticCache):
+            return past.reorder_cache(beam_idx)
+
         reordered_decoder_past = ()
         for layer_past_states in past:
             # get the correct batch idx from layer past batch dim
@@ -973,6 +973,9 @@ class TransfoXLModel(TransfoXLPreTrainedModel):
     TRANSFO_XL_START_DOCSTRING,
 )
 class TransfoXLLMHeadModel(TransfoXLPreTrainedModel):
+    # its `mems` cannot be cropped to the accepted tokens
+    _supports_speculative_decoding = False
+
     def __init__(self, config):
         super().__init__(config)
         self.transformer = TransfoXLModel(config)
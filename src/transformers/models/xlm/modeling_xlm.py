@@ -678,6 +678,9 @@ class XLMPredLayer(nn.Module):
     XLM_START_DOCSTRING,
 )
 class XLMWithLMHeadModel(XLMPreTrainedModel):
+    # predicts the next token at a mask token appended to the inputs, with bidirectional attention by default
+    _supports_speculative_decoding = False
+
     def __init__(self, config):
         super().__init__(config)
         self.transformer = XLMModel(config)
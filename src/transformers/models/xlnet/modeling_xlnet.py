@@ -871,6 +871,9 @@ XLNET_INPUTS_DOCSTRING = r"""
             - 1 for tokens that are **not masked**,
             - 0 for tokens that are **masked**.
 
+            When :obj:`mems` are given, the mask can also cover the tokens held in memory, in which case its sequence
+            length should be the length of the memory plus :obj:`sequence_length`.
+
             `What are attention masks? <../glossary.html#attention-mask>`__
         mems (:obj:`List[torch.FloatTensor]` of length :obj:`config.n_layers`):
             Contains pre-computed hidden-states (see :obj:`mems` output below) . Can be used to speed up sequential
@@ -1147,6 +1150,10 @@ class XLNetModel(XLNetPreTrainedModel):
         "or attention_mask (uses 0 for padding, added for compatibility with BERT). Please choose one."
         if input_mask is None and attention_mask is not None:
             input_mask = 1.0 - attention_mask
+        mems_input_mask = None
+        if input_mask is not None and mlen > 0 and input_mask.shape[0] == klen:
+            # the mask also covers the memory, e.g. for batch generation with padded prompts
+            mems_input_mask, input_mask = input_mask[:mlen], input_mask[mlen:]
         if input_mask is not None and perm_mask is not None:
             data_mask = input_mask[None] + perm_mask
         elif input_mask is not None and perm_mask is None:
@@ -1157,9 +1164,12 @@ class XLNetModel(XLNetPreTrainedModel):
             data_mask = None
 
         if data_mask is not None:
-            # all mems can be attended to
             if mlen > 0:
-                mems_mask = torch.zeros([data_mask.shape[0], mlen, bsz]).to(data_mask)
+                if mems_input_mask is not None:
+                    mems_mask = mems_input_mask[None].expand(data_mask.shape[0], -1, -1).to(data_mask)
+                else:
+                    # all mems can be attended to
+                    mems_mask = torch.zeros([data_mask.shape[0], mlen, bsz]).to(data_mask)
                 data_mask = torch.cat([mems_mask, data_mask], dim=1)
             if attn_mask is None:
                 attn_mask = data_mask[:, :, :, None]
@@ -1299,6 +1309,9 @@ class XLNetModel(XLNetPreTrainedModel):
     XLNET_START_DOCSTRING,
 )
 class XLNetLMHeadModel(XLNetPreTrainedModel):
+    # only predicts the last position during generation, with `mems` instead of past key values
+    _supports_speculative_decoding = False
+
     def __init__(self, config):
         super().__init__(config)
         self.attn_type = config.attn_type
@@ -1352,6 +1365,15 @@ class XLNetLMHeadModel(XLNetPreTrainedModel):
         if past:
             inputs["mems"] = tuple(layer_past[:-offset, :, :] for layer_past in past)
 
+        attention_mask = kwargs.get("attention_mask", None)
+        if attention_mask is not None:
+            # for batch generation, the mask covers the tokens kept in memory as well as the current ones
+            if past:
+                mlen = inputs["mems"][0].shape[0]
+                attention_mask = attention_mask[:, attention_mask.shape[1] - offset - mlen :]
+            dummy_mask = attention_mask.new_ones((effective_batch_size, 1))
+            inputs["attention_mask"] = torch.cat([attention_mask, dummy_mask], dim=1)
+
         return inputs
 
     @add_start_docstrings_to_model_forward(XLNET_INPUTS_DOCSTRING.format("batch_size, sequence_length"))
@@ -32,13 +32,14 @@ import numpy as np
 
 from .configuration_utils import PretrainedConfig
 from .data import SquadExample, SquadFeatures, squad_convert_examples_to_features
+from .data.metrics.squad_metrics import select_best_spans
 from .file_utils import add_end_docstrings, is_tf_available, is_torch_available
 from .modelcard import ModelCard
 from .models.auto.configuration_auto import AutoConfig
 from .models.auto.tokenization_auto import AutoTokenizer
 from .models.bert.tokenization_bert import BasicTokenizer
 from .tokenization_utils import PreTrainedTokenizer
-from .tokenization_utils_base import PaddingStrategy
+from .tokenization_utils_base import BatchEncoding, PaddingStrategy
 from .utils import logging
 
 
@@ -477,6 +478,12 @@ PIPELINE_INIT_ARGS = r"""
             the associated CUDA device id.
         binary_output (:obj:`bool`, `optional`, defaults to :obj:`False`):
             Flag indicating if the output the pipeline should happen in a binary format (i.e., pickle) or as raw text.
+        batch_size (:obj:`int`, `optional`):
+            When set, inputs are sorted by tokenized length and sent through the model in micro-batches of at most this
+            many sequences, each one padded only to the length of its longest member. Predictions are returned in the
+            original input order. Pipelines that do not support micro-batches raise a :obj:`ValueError`.
+        max_tokens_per_batch (:obj:`int`, `optional`):
+            When set, caps the number of (padded) tokens of each micro-batch. Can be combined with :obj:`batch_size`.
 """
 
 
@@ -500,6 +507,9 @@ class Pipeline(_ScikitCompat):
     """
 
     default_input_names = None
+    # Whether `__call__` sends the inputs through the model in micro-batches when `batch_size` or
+    # `max_tokens_per_batch` is set
+    _supports_micro_batches = True
 
     def __init__(
         self,
@@ -511,11 +521,24 @@ class Pipeline(_ScikitCompat):
         args_parser: ArgumentHandler = None,
         device: int = -1,
         binary_output: bool = False,
+        batch_size: Optional[int] = None,
+        max_tokens_per_batch: Optional[int] = None,
     ):
 
         if framework is None:
             framework = get_framework(model)
 
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("`batch_size` should be a strictly positive integer, got {}".format(batch_size))
+        if max_tokens_per_batch is not None and max_tokens_per_batch < 1:
+            raise ValueError(
+                "`max_tokens_per_batch` should be a strictly positive integer, got {}".format(max_tokens_per_batch)
+            )
+        if (batch_size is not None or max_tokens_per_batch is not None) and not self._supports_micro_batches:
+            raise ValueError(
+                "{} does not support `batch_size` nor `max_tokens_per_batch`.".format(self.__class__.__name__)
+            )
+
         self.task = task
         self.model = model
         self.tokenizer = tokenizer
@@ -523,6 +546,8 @@ class Pipeline(_ScikitCompat):
         self.framework = framework
         self.device = device if framework == "tf" else torch.device("cpu" if device < 0 else "cuda:{}".format(device))
         self.binary_output = binary_output
+        self.batch_size = batch_size
+        self.max_tokens_per_batch = max_tokens_per_batch
 
         # Special handling
         if self.framework == "pt" and self.device.type == "cuda":
@@ -633,7 +658,79 @@ class Pipeline(_ScikitCompat):
 
     def __call__(self, *args, **kwargs):
         inputs = self._parse_and_tokenize(*args, **kwargs)
-        return self._forward(inputs)
+        if self.batch_size is None and self.max_tokens_per_batch is None:
+            return self._forward(inputs)
+        return self._forward_micro_batches(inputs)
+
+    def _micro_batches(self, lengths: np.ndarray) -> List[np.ndarray]:
+        """
+        Group the indices of the inputs in micro-batches of similar lengths, respecting :obj:`self.batch_size` and
+        :obj:`self.max_tokens_per_batch`.
+
+        Args:
+            lengths (:obj:`np.ndarray`): The number of (non-padding) tokens of each input.
+
+        Returns:
+            :obj:`List[np.ndarray]`: The indices of the inputs in each micro-batch.
+        """
+        # Longest first: the first micro-batch is the most expensive one, so out-of-memory errors surface early
+        order = np.argsort(-lengths, kind="stable")
+        batches, current = [], []
+        for index in order:
+            if current:
+                # Inputs are sorted by decreasing length, so the first one sets the padded length of the batch
+                batch_full = self.batch_size is not None and len(current) >= self.batch_size
+                over_budget = (
+                    self.max_tokens_per_batch is not None
+                    and (len(current) + 1) * lengths[current[0]] > self.max_tokens_per_batch
+                )
+                if batch_full or over_budget:
+                    batches.append(np.array(current))
+                    current = []
+            current.append(index)
+        if current:
+            batches.append(np.array(current))
+        return batches
+
+    def _forward_micro_batches(self, inputs):
+        """
+        Run :meth:`_forward` on length-sorted micro-batches of :obj:`inputs`, each one trimmed to the length of its
+        longest member, and gather the predictions back in the original order.
+
+        Args:
+            inputs: dict holding all the padded keyword arguments for required by the model forward method.
+
+        Returns:
+            Numpy array, with the same shape as the one :meth:`_forward` would return on the full batch.
+        """
+        padded_length = inputs["input_ids"].shape[-1]
+        if "attention_mask" in inputs:
+            lengths = np.asarray(inputs["attention_mask"]).sum(-1)
+        else:
+            lengths = np.full(inputs["input_ids"].shape[0], padded_length)
+        left_padded = self.tokenizer.padding_side == "left"
+
+        predictions = None
+        for indices in self._micro_batches(lengths):
+            max_length = int(lengths[indices].max())
+            window = slice(padded_length - max_length, padded_length) if left_padded else slice(0, max_length)
+            if self.framework == "tf":
+                batch = {name: tf.gather(tensor, indices)[:, window] for name, tensor in inputs.items()}
+            else:
+                batch = {name: tensor[torch.as_tensor(indices)][:, window] for name, tensor in inputs.items()}
+            batch_predictions = self._forward(BatchEncoding(batch))
+
+            # Token-level predictions get padded back to the length of the full batch
+            if batch_predictions.ndim > 2 and max_length < padded_length and batch_predictions.shape[1] == max_length:
+                pad_width = [(0, 0)] * batch_predictions.ndim
+                pad_width[1] = (padded_length - max_length, 0) if left_padded else (0, padded_length - max_length)
+                batch_predictions = np.pad(batch_predictions, pad_width)
+
+            if predictions is None:
+                predictions = np.zeros((len(lengths),) + batch_predictions.shape[1:], dtype=batch_predictions.dtype)
+            predictions[indices] = batch_predictions
+
+        return predictions
 
     def _forward(self, inputs, return_tensors=False):
         """
@@ -698,6 +795,12 @@ class FeatureExtractionPipeline(Pipeline):
         device (:obj:`int`, `optional`, defaults to -1):
             Device ordinal for CPU/GPU supports. Setting this to -1 will leverage CPU, a positive will run the model on
             the associated CUDA device id.
+        batch_size (:obj:`int`, `optional`):
+            When set, inputs are sorted by tokenized length and sent through the model in micro-batches of at most this
+            many sequences, each one padded only to the length of its longest member. Features are returned in the
+            original input order, padded to the length of the longest input.
+        max_tokens_per_batch (:obj:`int`, `optional`):
+            When set, caps the number of (padded) tokens of each micro-batch. Can be combined with :obj:`batch_size`.
     """
 
     def __init__(
@@ -709,6 +812,8 @@ class FeatureExtractionPipeline(Pipeline):
         args_parser: ArgumentHandler = None,
         device: int = -1,
         task: str = "",
+        batch_size: Optional[int] = None,
+        max_tokens_per_batch: Optional[int] = None,
     ):
         super().__init__(
             model=model,
@@ -719,6 +824,8 @@ class FeatureExtractionPipeline(Pipeline):
             device=device,
             binary_output=True,
             task=task,
+            batch_size=batch_size,
+            max_tokens_per_batch=max_tokens_per_batch,
         )
 
     def __call__(self, *args, **kwargs):
@@ -746,6 +853,12 @@ class TextGenerationPipeline(Pipeline):
     The models that this pipeline can use are models that have been trained with an autoregressive language modeling
     objective, which includes the uni-directional models in the library (e.g. gpt2). See the list of available
     community models on `huggingface.co/models <https://huggingface.co/models?filter=causal-lm>`__.
+
+    When created with a :obj:`batch_size` (or :obj:`max_tokens_per_batch`), prompts of similar lengths are left-padded
+    and completed by a single call to :obj:`generate`. :obj:`max_length` still applies to each prompt on its own, and
+    prompts shorter than :obj:`min_length` are only batched with prompts of the same length, so that greedy decoding
+    gives the same outputs with or without batching. Models that can't attend around padding (e.g. Transformer-XL) only
+    batch prompts of the same length.
     """
 
     # Prefix text to help Transformer-XL and XLNet with short prompts as proposed by Aman Rusia
@@ -776,6 +889,14 @@ class TextGenerationPipeline(Pipeline):
         "TFCTRLLMHeadModel",
     ]
 
+    # Models able to generate from left-padded prompts, using the attention mask to skip the padding
+    LEFT_PADDING_MODELS = [
+        "XLNetLMHeadModel",
+        "GPT2LMHeadModel",
+        "OpenAIGPTLMHeadModel",
+        "CTRLLMHeadModel",
+    ]
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -839,87 +960,179 @@ class TextGenerationPipeline(Pipeline):
 
         if isinstance(text_inputs, str):
             text_inputs = [text_inputs]
-        results = []
+
+        prefix = prefix if prefix is not None else self.model.config.prefix
+        if prefix is None and self.model.__class__.__name__ in [
+            "XLNetLMHeadModel",
+            "TransfoXLLMHeadModel",
+            "TFXLNetLMHeadModel",
+            "TFTransfoXLLMHeadModel",
+        ]:
+            # For XLNet and TransformerXL we add an article to the prompt to give more state to the model.
+            prefix = self.XL_PREFIX
+
+        if prefix:
+            prefix_inputs = self._parse_and_tokenize(prefix, padding=False, add_special_tokens=False)
+            # This impacts max_length and min_length argument that need adjusting.
+            prefix_length = prefix_inputs["input_ids"].shape[-1]
+            if generate_kwargs.get("max_length", None) is not None:
+                generate_kwargs["max_length"] += prefix_length
+            if generate_kwargs.get("min_length", None) is not None:
+                generate_kwargs["min_length"] += prefix_length
+
+        prefix = prefix or ""
+        prompts_ids = []
         for prompt_text in text_inputs:
+            inputs = self._parse_and_tokenize(prefix + prompt_text, padding=False, add_special_tokens=False)
+            prompts_ids.append(inputs["input_ids"][0].numpy().tolist())
+
+        max_length = generate_kwargs.get("max_length", None)
+        if max_length is None:
+            max_length = self.model.config.max_length
+        min_length = generate_kwargs.get("min_length", None)
+        if min_length is None:
+            min_length = self.model.config.min_length
+        eos_token_id = generate_kwargs.get("eos_token_id", None)
+        if eos_token_id is None:
+            eos_token_id = self.model.config.eos_token_id
+
+        results = [None] * len(text_inputs)
+        for indices in self._generation_batches(prompts_ids, min_length=min_length):
+            prompts_lengths = [len(prompts_ids[i]) for i in indices]
+            max_prompt_length = max(prompts_lengths)
+            # The length budget of each prompt is shifted by its padding, the sequences are cut back to it afterwards
+            batch_generate_kwargs = generate_kwargs.copy()
+            batch_generate_kwargs["max_length"] = max_length + max_prompt_length - min(prompts_lengths)
+
             # Manage correct placement of the tensors
             with self.device_placement():
-                prefix = prefix if prefix is not None else self.model.config.prefix
-                if prefix is None and self.model.__class__.__name__ in [
-                    "XLNetLMHeadModel",
-                    "TransfoXLLMHeadModel",
-                    "TFXLNetLMHeadModel",
-                    "TFTransfoXLLMHeadModel",
-                ]:
-                    # For XLNet and TransformerXL we add an article to the prompt to give more state to the model.
-                    prefix = self.XL_PREFIX
-
-                if prefix:
-                    prefix_inputs = self._parse_and_tokenize(prefix, padding=False, add_special_tokens=False)
-                    # This impacts max_length and min_length argument that need adjusting.
-                    prefix_length = prefix_inputs["input_ids"].shape[-1]
-                    if generate_kwargs.get("max_length", None) is not None:
-                        generate_kwargs["max_length"] += prefix_length
-                    if generate_kwargs.get("min_length", None) is not None:
-                        generate_kwargs["min_length"] += prefix_length
-
-                prefix = prefix or ""
-                inputs = self._parse_and_tokenize(prefix + prompt_text, padding=False, add_special_tokens=False)
-
                 # set input_ids to None to allow empty prompt
-                if inputs["input_ids"].shape[-1] == 0:
-                    inputs["input_ids"] = None
-                    inputs["attention_mask"] = None
-
-                if self.framework == "pt" and inputs["input_ids"] is not None:
-                    inputs = self.ensure_tensor_on_device(**inputs)
-
-                input_ids = inputs["input_ids"]
-
-                # Ensure that batch size = 1 (batch generation not allowed for now)
-                assert (
-                    input_ids is None or input_ids.shape[0] == 1
-                ), "Batch generation is currently not supported. See https://github.com/huggingface/transformers/issues/3021 for more information."
+                if max_prompt_length == 0:
+                    input_ids = None
+                    output_sequences = self.model.generate(input_ids=input_ids, **batch_generate_kwargs)  # BS x SL
+                else:
+                    # Prompts are left-padded so that generation starts right after the last token of each of them
+                    pad_token_id = self.tokenizer.pad_token_id
+                    if pad_token_id is None:
+                        pad_token_id = self.tokenizer.eos_token_id if self.tokenizer.eos_token_id is not None else 0
+                    input_ids = [
+                        [pad_token_id] * (max_prompt_length - len(prompts_ids[i])) + prompts_ids[i] for i in indices
+                    ]
+                    attention_mask = [[0] * (max_prompt_length - length) + [1] * length for length in prompts_lengths]
+                    if self.framework == "pt":
+                        input_ids = torch.tensor(input_ids, dtype=torch.long, device=self.device)
+                        attention_mask = torch.tensor(attention_mask, dtype=torch.long, device=self.device)
+                    else:
+                        input_ids = tf.constant(input_ids, dtype=tf.int32)
+                        attention_mask = tf.constant(attention_mask, dtype=tf.int32)
 
-                output_sequences = self.model.generate(input_ids=input_ids, **generate_kwargs)  # BS x SL
+                    if min(prompts_lengths) < max_prompt_length:
+                        output_sequences = self.model.generate(
+                            input_ids=input_ids, attention_mask=attention_mask, **batch_generate_kwargs
+                        )
+                    else:
+                        output_sequences = self.model.generate(input_ids=input_ids, **batch_generate_kwargs)
 
-            result = []
-            for generated_sequence in output_sequences:
-                if self.framework == "pt" and generated_sequence is not None:
-                    generated_sequence = generated_sequence.cpu()
-                generated_sequence = generated_sequence.numpy().tolist()
-                record = {}
-                if return_tensors:
-                    record["generated_token_ids"] = generated_sequence
-                if return_text:
-                    # Decode text
-                    text = self.tokenizer.decode(
-                        generated_sequence,
-                        skip_special_tokens=True,
-                        clean_up_tokenization_spaces=clean_up_tokenization_spaces,
-                    )
+            if self.framework == "pt":
+                output_sequences = output_sequences.cpu()
+            output_sequences = output_sequences.numpy()
+            num_return_sequences = output_sequences.shape[0] // len(indices)
+            for batch_idx, index in enumerate(indices):
+                prompt_text = text_inputs[index]
+                padding_length = max_prompt_length - prompts_lengths[batch_idx]
+                sequences = output_sequences[batch_idx * num_return_sequences : (batch_idx + 1) * num_return_sequences]
+                sequences = sequences[:, padding_length : padding_length + max_length]
+                if len(indices) > 1:
+                    sequences = sequences[:, : self._generated_length(sequences, prompts_lengths[batch_idx], eos_token_id)]
+
+                result = []
+                for generated_sequence in sequences:
+                    generated_sequence = generated_sequence.tolist()
+                    record = {}
+                    if return_tensors:
+                        record["generated_token_ids"] = generated_sequence
+                    if return_text:
+                        # Decode text
+                        text = self.tokenizer.decode(
+                            generated_sequence,
+                            skip_special_tokens=True,
+                            clean_up_tokenization_spaces=clean_up_tokenization_spaces,
+                        )
 
-                    # Remove PADDING prompt of the sequence if XLNet or Transfo-XL model is used
-                    if input_ids is None:
-                        prompt_length = 0
-                    else:
+                        # Remove PADDING prompt of the sequence if XLNet or Transfo-XL model is used
                         prompt_length = len(
                             self.tokenizer.decode(
-                                input_ids[0],
+                                prompts_ids[index],
                                 skip_special_tokens=True,
                                 clean_up_tokenization_spaces=clean_up_tokenization_spaces,
                             )
                         )
 
-                    record["generated_text"] = prompt_text + text[prompt_length:]
+                        record["generated_text"] = prompt_text + text[prompt_length:]
 
-                result.append(record)
-            results += [result]
+                    result.append(record)
+                results[index] = result
 
         if len(results) == 1:
             return results[0]
 
         return results
 
+    def _generation_batches(self, prompts_ids: List[List[int]], min_length: int = 0) -> List[np.ndarray]:
+        """
+        Group the prompts in batches sent together to :obj:`generate`. Without :obj:`batch_size` nor
+        :obj:`max_tokens_per_batch`, each prompt is generated on its own.
+
+        Args:
+            prompts_ids (:obj:`List[List[int]]`): The token ids of each prompt.
+            min_length (:obj:`int`, `optional`, defaults to 0):
+                The :obj:`min_length` passed to :obj:`generate`. Padding would change how long the end of sequence
+                token is held back for prompts shorter than that, so those are only batched with prompts of the same
+                length.
+
+        Returns:
+            :obj:`List[np.ndarray]`: The indices of the prompts in each batch.
+        """
+        lengths = np.array([len(ids) for ids in prompts_ids])
+        if self.batch_size is None and self.max_tokens_per_batch is None:
+            return [np.array([index]) for index in range(len(lengths))]
+
+        batches = []
+        for indices in self._micro_batches(lengths):
+            # Empty prompts are generated on their own
+            batches.extend(np.array([index]) for index in indices[lengths[indices] == 0])
+            indices = indices[lengths[indices] > 0]
+            if self.framework == "pt" and self.model.__class__.__name__ in self.LEFT_PADDING_MODELS:
+                batches.append(indices[lengths[indices] >= min_length])
+                indices = indices[lengths[indices] < min_length]
+            # Only prompts of the same length are batched together when padding would change the outputs
+            batches.extend(indices[lengths[indices] == length] for length in np.unique(lengths[indices]))
+        return [indices for indices in batches if len(indices) > 0]
+
+    @staticmethod
+    def _generated_length(sequences: np.ndarray, prompt_length: int, eos_token_id: Optional[int]) -> int:
+        """
+        The length :obj:`generate` would have returned for :obj:`sequences` on their own: generation stops once all of
+        them produced an end of sequence token.
+
+        Args:
+            sequences (:obj:`np.ndarray`): The (unpadded) sequences generated for one prompt.
+            prompt_length (:obj:`int`): The number of tokens of the prompt.
+            eos_token_id (:obj:`int`, `optional`): The id of the end of sequence token.
+
+        Returns:
+            :obj:`int`: The length of the sequences.
+        """
+        if eos_token_id is None:
+            return sequences.shape[-1]
+        length = prompt_length
+        for sequence in sequences:
+            eos_positions = np.nonzero(sequence[prompt_length:] == eos_token_id)[0]
+            if len(eos_positions) == 0:
+                return sequences.shape[-1]
+            length = max(length, prompt_length + eos_positions[0] + 1)
+        return length
+
 
 @add_end_docstrings(
     PIPELINE_INIT_ARGS,
@@ -1182,6 +1395,8 @@ class FillMaskPipeline(Pipeline):
         device: int = -1,
         top_k=5,
         task: str = "",
+        batch_size: Optional[int] = None,
+        max_tokens_per_batch: Optional[int] = None,
     ):
         super().__init__(
             model=model,
@@ -1192,6 +1407,8 @@ class FillMaskPipeline(Pipeline):
             device=device,
             binary_output=True,
             task=task,
+            batch_size=batch_size,
+            max_tokens_per_batch=max_tokens_per_batch,
         )
 
         self.check_model_type(TF_MODEL_WITH_LM_HEAD_MAPPING if self.framework == "tf" else MODEL_FOR_MASKED_LM_MAPPING)
@@ -1235,7 +1452,11 @@ class FillMaskPipeline(Pipeline):
             - **token** (:obj:`str`) -- The predicted token (to replace the masked one).
         """
         inputs = self._parse_and_tokenize(*args, **kwargs)
-        outputs = self._forward(inputs, return_tensors=True)
+        if self.batch_size is None and self.max_tokens_per_batch is None:
+            outputs = self._forward(inputs, return_tensors=True)
+        else:
+            outputs = self._forward_micro_batches(inputs)
+            outputs = tf.constant(outputs) if self.framework == "tf" else torch.from_numpy(outputs)
 
         results = []
         batch_size = outputs.shape[0] if self.framework == "tf" else outputs.size(0)
@@ -1668,6 +1889,7 @@ class QuestionAnsweringPipeline(Pipeline):
     """
 
     default_input_names = "question,context"
+    _supports_micro_batches = False
 
     def __init__(
         self,
@@ -1876,37 +2098,44 @@ class QuestionAnsweringPipeline(Pipeline):
 
             min_null_score = 1000000  # large and positive
             answers = []
-            for (feature, start_, end_) in zip(features, start, end):
-                # Ensure padded tokens & question tokens cannot belong to the set of candidate answers.
-                undesired_tokens = np.abs(np.array(feature.p_mask) - 1) & feature.attention_mask
+            # Ensure padded tokens & question tokens cannot belong to the set of candidate answers.
+            undesired_tokens = np.abs(np.array([feature.p_mask for feature in features]) - 1) & np.array(
+                [feature.attention_mask for feature in features]
+            )
 
-                # Generate mask
-                undesired_tokens_mask = undesired_tokens == 0.0
+            # Generate mask
+            undesired_tokens_mask = undesired_tokens == 0.0
 
-                # Make sure non-context indexes in the tensor cannot contribute to the softmax
-                start_ = np.where(undesired_tokens_mask, -10000.0, start_)
-                end_ = np.where(undesired_tokens_mask, -10000.0, end_)
+            # Make sure non-context indexes in the tensor cannot contribute to the softmax
+            start = np.where(undesired_tokens_mask, -10000.0, start)
+            end = np.where(undesired_tokens_mask, -10000.0, end)
 
-                # Normalize logits and spans to retrieve the answer
-                start_ = np.exp(start_ - np.log(np.sum(np.exp(start_), axis=-1, keepdims=True)))
-                end_ = np.exp(end_ - np.log(np.sum(np.exp(end_), axis=-1, keepdims=True)))
+            # Normalize logits and spans to retrieve the answer
+            start = np.exp(start - np.log(np.sum(np.exp(start), axis=-1, keepdims=True)))
+            end = np.exp(end - np.log(np.sum(np.exp(end), axis=-1, keepdims=True)))
 
-                if kwargs["handle_impossible_answer"]:
-                    min_null_score = min(min_null_score, (start_[0] * end_[0]).item())
+            if kwargs["handle_impossible_answer"]:
+                min_null_score = min(min_null_score, (start[:, 0] * end[:, 0]).min().item())
 
-                # Mask CLS
-                start_[0] = end_[0] = 0.0
+            # Mask CLS
+            start[:, 0] = end[:, 0] = 0.0
 
-                starts, ends, scores = self.decode(start_, end_, kwargs["topk"], kwargs["max_answer_len"])
-                if not self.tokenizer.is_fast:
-                    char_to_word = np.array(example.char_to_word_offset)
+            # The best spans of all the features of the example at once
+            feature_indexes, starts, ends, scores = self._decode_features(
+                start, end, kwargs["topk"], kwargs["max_answer_len"]
+            )
+            if not self.tokenizer.is_fast:
+                char_to_word = np.array(example.char_to_word_offset)
 
+            for feature_index, s, e, score in zip(feature_indexes.tolist(), starts.tolist(), ends.tolist(), scores):
+                feature = features[feature_index]
+                if not self.tokenizer.is_fast:
                     # Convert the answer (tokens) back to the original text
                     # Score: score from the model
                     # Start: Index of the first character of the answer in the context string
                     # End: Index of the character following the last character of the answer in the context string
                     # Answer: Plain text of the answer
-                    answers += [
+                    answers.append(
                         {
                             "score": score.item(),
                             "start": np.where(char_to_word == feature.token_to_orig_map[s])[0][0].item(),
@@ -1915,8 +2144,7 @@ class QuestionAnsweringPipeline(Pipeline):
                                 example.doc_tokens[feature.token_to_orig_map[s] : feature.token_to_orig_map[e] + 1]
                             ),
                         }
-                        for s, e, score in zip(starts, ends, scores)
-                    ]
+                    )
                 else:
                     # Convert the answer (tokens) back to the original text
                     # Score: score from the model
@@ -1929,25 +2157,17 @@ class QuestionAnsweringPipeline(Pipeline):
                     # Sometimes the max probability token is in the middle of a word so:
                     # - we start by finding the right word containing the token with `token_to_word`
                     # - then we convert this word in a character span with `word_to_chars`
-                    answers += [
+                    sequence_index = 1 if question_first else 0
+                    char_start = enc.word_to_chars(enc.token_to_word(s), sequence_index=sequence_index)[0]
+                    char_end = enc.word_to_chars(enc.token_to_word(e), sequence_index=sequence_index)[1]
+                    answers.append(
                         {
                             "score": score.item(),
-                            "start": enc.word_to_chars(
-                                enc.token_to_word(s), sequence_index=1 if question_first else 0
-                            )[0],
-                            "end": enc.word_to_chars(enc.token_to_word(e), sequence_index=1 if question_first else 0)[
-                                1
-                            ],
-                            "answer": example.context_text[
-                                enc.word_to_chars(enc.token_to_word(s), sequence_index=1 if question_first else 0)[
-                                    0
-                                ] : enc.word_to_chars(enc.token_to_word(e), sequence_index=1 if question_first else 0)[
-                                    1
-                                ]
-                            ],
+                            "start": char_start,
+                            "end": char_end,
+                            "answer": example.context_text[char_start:char_end],
                         }
-                        for s, e, score in zip(starts, ends, scores)
-                    ]
+                    )
 
             if kwargs["handle_impossible_answer"]:
                 answers.append({"score": min_null_score, "start": 0, "end": 0, "answer": ""})
@@ -1981,24 +2201,18 @@ class QuestionAnsweringPipeline(Pipeline):
         if end.ndim == 1:
             end = end[None]
 
-        # Compute the score of each tuple(start, end) to be the real answer
-        outer = np.matmul(np.expand_dims(start, -1), np.expand_dims(end, 1))
-
-        # Remove candidate with end < start and end - start > max_answer_len
-        candidates = np.tril(np.triu(outer), max_answer_len - 1)
-
-        #  Inspired by Chen & al. (https://github.com/facebookresearch/DrQA)
-        scores_flat = candidates.flatten()
-        if topk == 1:
-            idx_sort = [np.argmax(scores_flat)]
-        elif len(scores_flat) < topk:
-            idx_sort = np.argsort(-scores_flat)
-        else:
-            idx = np.argpartition(-scores_flat, topk)[0:topk]
-            idx_sort = idx[np.argsort(-scores_flat[idx])]
+        _, starts, ends, scores = self._decode_features(start[:1], end[:1], topk, max_answer_len)
+        return starts, ends, scores
 
-        start, end = np.unravel_index(idx_sort, candidates.shape)[1:]
-        return start, end, candidates[0, start, end]
+    def _decode_features(self, start: np.ndarray, end: np.ndarray, topk: int, max_answer_len: int) -> Tuple:
+        # Like `decode`, for the spans of all the features of an example: the best ones are selected among all the
+        # spans of positive probability with `select_best_spans`, ranked by the sum of the log probabilities of their
+        # start and end, which is the log of the score of `decode`
+        with np.errstate(divide="ignore"):
+            feature_indexes, starts, ends, _ = select_best_spans(
+                np.log(start), np.log(end), max_answer_len, top_k=topk, start_mask=start > 0, end_mask=end > 0
+            )
+        return feature_indexes, starts, ends, start[feature_indexes, starts] * end[feature_indexes, ends]
 
     def span_to_answer(self, text: str, start: int, end: int) -> Dict[str, Union[str, int]]:
         """
@@ -2067,6 +2281,8 @@ class SummarizationPipeline(Pipeline):
         summarizer("Sam Shleifer writes the best docstring examples in the whole world.", min_length=5, max_length=20)
     """
 
+    _supports_micro_batches = False
+
     def __init__(self, *args, **kwargs):
         kwargs.update(task="summarization")
         super().__init__(*args, **kwargs)
@@ -2188,6 +2404,8 @@ class TranslationPipeline(Pipeline):
         en_fr_translator("How old are you?")
     """
 
+    _supports_micro_batches = False
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -2297,6 +2515,8 @@ class Text2TextGenerationPipeline(Pipeline):
         text2text_generator("question: What is 42 ? context: 42 is the answer to life, the universe and everything")
     """
 
+    _supports_micro_batches = False
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -2522,6 +2742,8 @@ class ConversationalPipeline(Pipeline):
         conversational_pipeline([conversation_1, conversation_2])
     """
 
+    _supports_micro_batches = False
+
     def __init__(self, min_length_for_response=32, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -16,10 +16,14 @@
  Tokenization classes for python tokenizers. For fast tokenizers (provided by HuggingFace's tokenizers library) see
  tokenization_utils_fast.py
 """
+import heapq
 import itertools
+import math
 import re
 import unicodedata
-from typing import Any, Dict, List, Optional, Tuple, Union, overload
+from collections import OrderedDict
+from multiprocessing import Pool
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union, overload
 
 from .file_utils import add_end_docstrings
 from .tokenization_utils_base import (
@@ -49,6 +53,9 @@ SPECIAL_TOKENS_MAP_FILE = "special_tokens_map.json"
 ADDED_TOKENS_FILE = "added_tokens.json"
 TOKENIZER_CONFIG_FILE = "tokenizer_config.json"
 
+# Batches are only encoded with several processes if each of them gets at least this number of examples
+MIN_EXAMPLES_PER_PROCESS = 64
+
 
 def _is_whitespace(char):
     """Checks whether `char` is a whitespace character."""
@@ -101,6 +108,188 @@ def _is_start_of_word(text):
     return bool(_is_control(first_char) | _is_punctuation(first_char) | _is_whitespace(first_char))
 
 
+class Trie:
+    """
+    Trie over the added tokens of a :class:`~transformers.PreTrainedTokenizer`, to find them in a text in one pass
+    whatever their number. Also used by :class:`~transformers.WordpieceTokenizer` to find the longest word piece
+    starting at each position.
+
+    Args:
+        tokens (:obj:`Iterable[str]`, `optional`):
+            The tokens to add to the trie.
+    """
+
+    def __init__(self, tokens: Iterable[str] = ()):
+        # nested dictionaries of characters, the "" key marking the end of a token
+        self.data = {}
+        for token in tokens:
+            self.add(token)
+
+    def add(self, token: str):
+        """
+        Adds :obj:`token` to the trie. Empty tokens are ignored.
+        """
+        if not token:
+            return
+        ref = self.data
+        for char in token:
+            ref = ref.setdefault(char, {})
+        ref[""] = True
+
+    def longest_match(self, text: str, start: int) -> Optional[int]:
+        """
+        Returns the end of the longest token of the trie starting at position :obj:`start` of :obj:`text`, or
+        :obj:`None` if no token starts there.
+        """
+        ref = self.data.get(text[start])
+        end = None
+        position = start + 1
+        while ref is not None:
+            if "" in ref:
+                end = position
+            if position == len(text):
+                break
+            ref = ref.get(text[position])
+            position += 1
+        return end
+
+
+class BPECache:
+    """
+    Least recently used cache of the result of the BPE merges of each word, used by the BPE tokenizers implemented in
+    Python (GPT-2, RoBERTa, CTRL, OpenAI GPT, XLM, FSMT...). Unlike a plain dictionary, its size is bounded, so that
+    tokenizing an open vocabulary (URLs, hashes...) for a long time does not use ever more memory.
+
+    A cache can be shared by several tokenizers with the same merges by assigning it to their :obj:`cache` attribute.
+
+    Args:
+        max_size (:obj:`int`, `optional`, defaults to 10000):
+            The maximum number of cached words. The least recently used ones are evicted first.
+
+    Attributes:
+        hits (:obj:`int`):
+            The number of lookups that found a cached word.
+        misses (:obj:`int`):
+            The number of lookups that found no cached word.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        if max_size < 1:
+            raise ValueError(f"`max_size` has to be a strictly positive integer, but is {max_size}")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._entries
+
+    def __getitem__(self, word: str) -> Any:
+        return self._entries[word]
+
+    def __setitem__(self, word: str, value: Any):
+        self._entries[word] = value
+        self._entries.move_to_end(word)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        :obj:`float`: The proportion of lookups that found a cached word.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def get(self, word: str) -> Optional[Any]:
+        """
+        Returns the value cached for :obj:`word` and marks it as recently used, or :obj:`None` if there is none.
+        """
+        value = self._entries.get(word)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(word)
+        return value
+
+    def clear(self):
+        """
+        Removes all the cached words. The hit and miss counters are reset.
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def bpe_merge(word: Sequence[str], bpe_ranks: Dict[Tuple[str, str], int]) -> Tuple[str, ...]:
+    """
+    Applies the BPE merges to the symbols of :obj:`word`, the pair with the lowest rank being merged first (and the
+    leftmost one among equal pairs).
+
+    The candidate pairs are kept in a priority queue by rank and the symbols in a linked list, so that each merge only
+    updates the pairs around it instead of scanning the whole word again, which makes long words much faster to
+    process.
+
+    Args:
+        word (:obj:`Sequence[str]`):
+            The initial symbols of the word.
+        bpe_ranks (:obj:`Dict[Tuple[str, str], int]`):
+            The rank of each merge.
+
+    Returns:
+        :obj:`Tuple[str]`: The symbols of the word after the merges.
+    """
+    symbols = list(word)
+    if len(symbols) < 2:
+        return tuple(symbols)
+    # Linked list of the symbols left, merged symbols are set to None
+    next_index = list(range(1, len(symbols))) + [-1]
+    prev_index = list(range(-1, len(symbols) - 1))
+
+    queue = []
+    for i in range(len(symbols) - 1):
+        rank = bpe_ranks.get((symbols[i], symbols[i + 1]))
+        if rank is not None:
+            queue.append((rank, i, symbols[i], symbols[i + 1]))
+    heapq.heapify(queue)
+
+    while queue:
+        _, i, first, second = heapq.heappop(queue)
+        j = next_index[i]
+        # Skip the pairs which are not there anymore because one of their symbols was merged with another one
+        if j == -1 or symbols[i] != first or symbols[j] != second:
+            continue
+        symbols[i] = first + second
+        symbols[j] = None
+        k = next_index[j]
+        next_index[i] = k
+        if k != -1:
+            prev_index[k] = i
+            rank = bpe_ranks.get((symbols[i], symbols[k]))
+            if rank is not None:
+                heapq.heappush(queue, (rank, i, symbols[i], symbols[k]))
+        h = prev_index[i]
+        if h != -1:
+            rank = bpe_ranks.get((symbols[h], symbols[i]))
+            if rank is not None:
+                heapq.heappush(queue, (rank, h, symbols[h], symbols[i]))
+
+    return tuple(symbol for symbol in symbols if symbol is not None)
+
+
+def batch_encode_init(tokenizer_for_encode: "PreTrainedTokenizer"):
+    global tokenizer
+    tokenizer = tokenizer_for_encode
+
+
+def batch_encode_shard(batch_text_or_text_pairs, encode_kwargs: Dict[str, Any]) -> Dict[str, List[Any]]:
+    return tokenizer._batch_encode_plus(batch_text_or_text_pairs, **encode_kwargs).data
+
+
 @add_end_docstrings(INIT_TOKENIZER_DOCSTRING, """    .. automethod:: __call__""")
 class PreTrainedTokenizer(PreTrainedTokenizerBase):
     """
@@ -123,6 +312,9 @@ class PreTrainedTokenizer(PreTrainedTokenizerBase):
         self.added_tokens_encoder: Dict[str, int] = {}
         self.added_tokens_decoder: Dict[int, str] = {}
         self.unique_no_split_tokens: List[str] = []
+        self._no_split_trie = Trie()
+        self._no_split_trie_tokens: List[str] = []
+        self._lower_case_pattern = None
 
     @property
     def is_fast(self) -> bool:
@@ -203,9 +395,29 @@ class PreTrainedTokenizer(PreTrainedTokenizerBase):
         else:
             # Or on the newly added tokens
             self.unique_no_split_tokens = sorted(set(self.unique_no_split_tokens).union(set(tokens_to_add)))
+        self._build_no_split_trie()
 
         return len(tokens_to_add)
 
+    def _build_no_split_trie(self):
+        self._no_split_trie = Trie(self.unique_no_split_tokens)
+        self._no_split_trie_tokens = list(self.unique_no_split_tokens)
+
+    def _get_no_split_trie(self) -> Trie:
+        # Some tokenizers update `unique_no_split_tokens` directly, in which case the trie is built again
+        if self._no_split_trie_tokens != self.unique_no_split_tokens:
+            self._build_no_split_trie()
+        return self._no_split_trie
+
+    def _lower_case_non_special_tokens(self, text: str) -> str:
+        special_tokens = tuple(self.all_special_tokens)
+        if self._lower_case_pattern is None or self._lower_case_pattern[0] != special_tokens:
+            escaped_special_toks = [re.escape(s_tok) for s_tok in special_tokens]
+            self._lower_case_pattern = (special_tokens, re.compile(r"(" + r"|".join(escaped_special_toks) + r")"))
+        # the odd elements of the split are the special tokens
+        split_text = self._lower_case_pattern[1].split(text)
+        return "".join(sub_text if i % 2 else sub_text.lower() for i, sub_text in enumerate(split_text))
+
     def num_special_tokens_to_add(self, pair: bool = False) -> int:
         """
         Returns the number of added tokens when encoding a sequence with special tokens.
@@ -258,91 +470,58 @@ class PreTrainedTokenizer(PreTrainedTokenizerBase):
         # TODO: should this be in the base class?
         if hasattr(self, "do_lower_case") and self.do_lower_case:
             # convert non-special tokens to lowercase
-            escaped_special_toks = [re.escape(s_tok) for s_tok in self.all_special_tokens]
-            pattern = r"(" + r"|".join(escaped_special_toks) + r")|" + r"(.+?)"
-            text = re.sub(pattern, lambda m: m.groups()[0] or m.groups()[1].lower(), text)
-
-        def split_on_token(tok, text):
-            result = []
+            text = self._lower_case_non_special_tokens(text)
+
+        if not text.strip():
+            return []
+
+        # Split on the added tokens in one pass, the longest one being kept when several of them start at the same
+        # position, and tokenize the text between them.
+        no_split_trie = self._get_no_split_trie()
+        tokenized_text = []
+        start = position = 0
+        # Whether the text after the last added token found should be stripped on the left
+        strip_next = False
+        while position < len(text):
+            end = no_split_trie.longest_match(text, position)
+            if end is None:
+                position += 1
+                continue
+            tok = text[position:end]
             tok_extended = all_special_tokens_extended.get(tok, None)
-            split_text = text.split(tok)
-            full_word = ""
-            for i, sub_text in enumerate(split_text):
-                # AddedToken can control whitespace stripping around them.
+            if isinstance(tok_extended, AddedToken):
+                # AddedToken can control whitespace stripping around them and whether they match inside words.
                 # We use them for GPT2 and Roberta to have different behavior depending on the special token
                 # Cf. https://github.com/huggingface/transformers/pull/2778
                 # and https://github.com/huggingface/transformers/issues/3788
-                if isinstance(tok_extended, AddedToken):
-                    if tok_extended.single_word:
-                        # Try to avoid splitting on token
-                        if (
-                            i < len(split_text) - 1
-                            and not _is_end_of_word(sub_text)
-                            and not _is_start_of_word(split_text[i + 1])
-                        ):
-                            # Don't extract the special token
-                            full_word += sub_text + tok
-                        elif full_word:
-                            full_word += sub_text
-                            result.append(full_word)
-                            full_word = ""
-                            continue
-                    # Strip white spaces on the right
-                    if tok_extended.rstrip and i > 0:
-                        # A bit counter-intuitive but we strip the left of the string
-                        # since tok_extended.rstrip means the special token is eating all white spaces on its right
-                        sub_text = sub_text.lstrip()
-                    # Strip white spaces on the left
-                    if tok_extended.lstrip and i < len(split_text) - 1:
-                        sub_text = sub_text.rstrip()  # Opposite here
-                else:
-                    # We strip left and right by default
-                    if i < len(split_text) - 1:
-                        sub_text = sub_text.rstrip()
-                    if i > 0:
-                        sub_text = sub_text.lstrip()
-
-                if i == 0 and not sub_text:
-                    result.append(tok)
-                elif i == len(split_text) - 1:
-                    if sub_text:
-                        result.append(sub_text)
-                    else:
-                        pass
-                else:
-                    if sub_text:
-                        result.append(sub_text)
-                    result.append(tok)
-            return result
-
-        def split_on_tokens(tok_list, text):
-            if not text.strip():
-                return []
-            if not tok_list:
-                return self._tokenize(text)
-
-            tokenized_text = []
-            text_list = [text]
-            for tok in tok_list:
-                tokenized_text = []
-                for sub_text in text_list:
-                    if sub_text not in self.unique_no_split_tokens:
-                        tokenized_text.extend(split_on_token(tok, sub_text))
-                    else:
-                        tokenized_text.append(sub_text)
-                text_list = tokenized_text
-
-            return list(
-                itertools.chain.from_iterable(
-                    (
-                        self._tokenize(token) if token not in self.unique_no_split_tokens else [token]
-                        for token in tokenized_text
-                    )
-                )
-            )
-
-        no_split_token = self.unique_no_split_tokens
-        tokenized_text = split_on_tokens(no_split_token, text)
+                if tok_extended.single_word and not (
+                    (position == 0 or _is_end_of_word(text[position - 1]))
+                    and (end == len(text) or _is_start_of_word(text[end]))
+                ):
+                    # Don't extract the special token
+                    position += 1
+                    continue
+                lstrip, rstrip = tok_extended.lstrip, tok_extended.rstrip
+            else:
+                # We strip left and right by default
+                lstrip = rstrip = True
+
+            sub_text = text[start:position]
+            if strip_next:
+                sub_text = sub_text.lstrip()
+            if lstrip:
+                sub_text = sub_text.rstrip()
+            if sub_text:
+                tokenized_text.extend(self._tokenize(sub_text))
+            tokenized_text.append(tok)
+            strip_next = rstrip
+            start = position = end
+
+        sub_text = text[start:]
+        if strip_next:
+            sub_text = sub_text.lstrip()
+        if sub_text:
+            tokenized_text.extend(self._tokenize(sub_text))
         return tokenized_text
 
     def _tokenize(self, text, **kwargs):
@@ -488,6 +667,7 @@ class PreTrainedTokenizer(PreTrainedTokenizerBase):
         return_offsets_mapping: bool = False,
         return_length: bool = False,
         verbose: bool = True,
+        num_proc: Optional[int] = None,
         **kwargs
     ) -> BatchEncoding:
         def get_input_ids(text):
@@ -516,6 +696,48 @@ class PreTrainedTokenizer(PreTrainedTokenizerBase):
                 "transformers.PreTrainedTokenizerFast."
             )
 
+        if num_proc is not None:
+            num_proc = min(num_proc, len(batch_text_or_text_pairs) // MIN_EXAMPLES_PER_PROCESS)
+        if num_proc is not None and num_proc > 1:
+            # Each process encodes a contiguous shard without padding, the whole batch is padded at the end
+            shard_size = math.ceil(len(batch_text_or_text_pairs) / num_proc)
+            shards = [
+                batch_text_or_text_pairs[i : i + shard_size]
+                for i in range(0, len(batch_text_or_text_pairs), shard_size)
+            ]
+            encode_kwargs = dict(
+                add_special_tokens=add_special_tokens,
+                truncation_strategy=truncation_strategy,
+                max_length=max_length,
+                stride=stride,
+                is_split_into_words=is_split_into_words,
+                return_token_type_ids=return_token_type_ids,
+                return_attention_mask=return_attention_mask,
+                return_overflowing_tokens=return_overflowing_tokens,
+                return_special_tokens_mask=return_special_tokens_mask,
+                return_length=return_length,
+                verbose=verbose,
+                **kwargs,
+            )
+            with Pool(num_proc, initializer=batch_encode_init, initargs=(self,)) as p:
+                shard_outputs = p.starmap(batch_encode_shard, [(shard, encode_kwargs) for shard in shards])
+
+            batch_outputs = {}
+            for outputs in shard_outputs:
+                for key, value in outputs.items():
+                    if key not in batch_outputs:
+                        batch_outputs[key] = []
+                    batch_outputs[key].extend(value)
+
+            batch_outputs = self.pad(
+                batch_outputs,
+                padding=padding_strategy.value,
+                max_length=max_length,
+                pad_to_multiple_of=pad_to_multiple_of,
+                return_attention_mask=return_attention_mask,
+            )
+            return BatchEncoding(batch_outputs, tensor_type=return_tensors)
+
         input_ids = []
         for ids_or_pair_ids in batch_text_or_text_pairs:
             if not isinstance(ids_or_pair_ids, (list, tuple)):
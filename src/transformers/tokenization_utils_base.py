@@ -19,6 +19,7 @@ of output with special method for the Fast tokenizers)
 """
 
 import copy
+import itertools
 import json
 import os
 import warnings
@@ -83,6 +84,9 @@ else:
         def __getstate__(self):
             return self.__dict__
 
+        def __str__(self):
+            return self.content
+
     @dataclass
     class EncodingFast:
         """ This is dummy class because without the `tokenizers` library we don't have these objects anyway """
@@ -780,6 +784,95 @@ class BatchEncoding(UserDict):
         return self
 
 
+class IncrementalDecoder:
+    """
+    Turns a stream of token ids into a stream of text deltas, as returned by
+    :meth:`~transformers.tokenization_utils_base.PreTrainedTokenizerBase.incremental_decoder`.
+
+    At each step, only the tokens since the last emitted text and the tokens that produced it are decoded, so the cost
+    of a step does not grow with the length of the sequence. The previous tokens are needed to get word boundaries
+    right (e.g. the leading space of a SentencePiece token). Text is held back while it is not final yet: when it ends
+    with an incomplete character (a byte-level BPE token can hold only part of the bytes of a UTF-8 character) or when
+    the last token is merged with the next one (e.g. the ``@@`` continuation marker of some BPE tokenizers).
+
+    Args:
+        tokenizer (:class:`~transformers.tokenization_utils_base.PreTrainedTokenizerBase`):
+            The tokenizer used to decode the token ids.
+        skip_special_tokens (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            Whether or not to remove special tokens in the decoding.
+        kwargs (additional keyword arguments, `optional`):
+            Will be passed to :meth:`~transformers.tokenization_utils_base.PreTrainedTokenizerBase.decode`.
+    """
+
+    def __init__(self, tokenizer: "PreTrainedTokenizerBase", skip_special_tokens: bool = False, **kwargs):
+        self.tokenizer = tokenizer
+        self.skip_special_tokens = skip_special_tokens
+        self.decode_kwargs = kwargs
+        self.token_ids = []
+        # tokens in [prefix_offset, read_offset) produced the last emitted text, tokens after read_offset are pending
+        self.prefix_offset = 0
+        self.read_offset = 0
+
+    def _decode(self, start: int, end: int) -> str:
+        return self.tokenizer.decode(
+            self.token_ids[start:end],
+            skip_special_tokens=self.skip_special_tokens,
+            clean_up_tokenization_spaces=False,
+            **self.decode_kwargs,
+        )
+
+    def _emit(self, force: bool = False) -> str:
+        prefix_text = self._decode(self.prefix_offset, self.read_offset)
+        new_text = self._decode(self.prefix_offset, len(self.token_ids))
+        if len(new_text) > len(prefix_text) and (force or self._is_complete(new_text)):
+            self.prefix_offset = self.read_offset
+            self.read_offset = len(self.token_ids)
+            return new_text[len(prefix_text) :]
+        return ""
+
+    def _is_complete(self, text: str) -> bool:
+        if text.endswith("\ufffd"):
+            return False
+        # some tokenizers join a token with the next one (e.g. BPE continuation markers like "@@"), which changes the
+        # text of the last token: check this by decoding the pending tokens followed by another token
+        probe_token_id = self.tokenizer.unk_token_id
+        if probe_token_id is None:
+            return True
+        pending_ids = self.token_ids[self.prefix_offset :]
+        pending_text = self.tokenizer.decode(pending_ids, clean_up_tokenization_spaces=False, **self.decode_kwargs)
+        probe_text = self.tokenizer.decode(
+            pending_ids + [probe_token_id], clean_up_tokenization_spaces=False, **self.decode_kwargs
+        )
+        return probe_text.startswith(pending_text)
+
+    def put(self, token_ids: Union[int, List[int], "np.ndarray", "torch.Tensor", "tf.Tensor"]) -> str:
+        """
+        Adds new token ids to the stream.
+
+        Args:
+            token_ids (:obj:`Union[int, List[int], np.ndarray, torch.Tensor, tf.Tensor]`):
+                The new token id(s) of the sequence.
+
+        Returns:
+            :obj:`str`: The text added by those tokens, possibly empty if the tokens do not end on a complete character
+            yet.
+        """
+        token_ids = to_py_obj(token_ids)
+        if isinstance(token_ids, int):
+            token_ids = [token_ids]
+        self.token_ids.extend(token_ids)
+        return self._emit()
+
+    def end(self) -> str:
+        """
+        Flushes the text held back by :meth:`put`, if any.
+
+        Returns:
+            :obj:`str`: The remaining text of the stream.
+        """
+        return self._emit(force=True)
+
+
 class SpecialTokensMixin:
     """
     A mixin derived by :class:`~transformers.PreTrainedTokenizer` and :class:`~transformers.PreTrainedTokenizerFast` to
@@ -2271,6 +2364,7 @@ class PreTrainedTokenizerBase(SpecialTokensMixin):
         return_offsets_mapping: bool = False,
         return_length: bool = False,
         verbose: bool = True,
+        num_proc: Optional[int] = None,
         **kwargs
     ) -> BatchEncoding:
         """
@@ -2286,6 +2380,10 @@ class PreTrainedTokenizerBase(SpecialTokensMixin):
                 The sequence or batch of sequences to be encoded. Each sequence can be a string or a list of strings
                 (pretokenized string). If the sequences are provided as list of strings (pretokenized), you must set
                 :obj:`is_split_into_words=True` (to lift the ambiguity with a batch of sequences).
+            num_proc (:obj:`int`, `optional`):
+                The number of processes to encode a batch of sequences with, for tokenizers implemented in Python only
+                (fast tokenizers already encode batches in parallel). See
+                :meth:`~transformers.tokenization_utils_base.PreTrainedTokenizerBase.batch_encode_plus`.
         """
         # Input type checking for clearer error
         assert isinstance(text, str) or (
@@ -2349,6 +2447,7 @@ class PreTrainedTokenizerBase(SpecialTokensMixin):
                 return_offsets_mapping=return_offsets_mapping,
                 return_length=return_length,
                 verbose=verbose,
+                num_proc=num_proc,
                 **kwargs,
             )
         else:
@@ -2492,6 +2591,7 @@ class PreTrainedTokenizerBase(SpecialTokensMixin):
         return_offsets_mapping: bool = False,
         return_length: bool = False,
         verbose: bool = True,
+        num_proc: Optional[int] = None,
         **kwargs
     ) -> BatchEncoding:
         """
@@ -2505,6 +2605,11 @@ class PreTrainedTokenizerBase(SpecialTokensMixin):
                 Batch of sequences or pair of sequences to be encoded. This can be a list of
                 string/string-sequences/int-sequences or a list of pair of string/string-sequences/int-sequence (see
                 details in ``encode_plus``).
+            num_proc (:obj:`int`, `optional`):
+                The number of processes to encode the batch with, for tokenizers implemented in Python only. The batch
+                is split in contiguous shards encoded by a pool of processes, each receiving a copy of the tokenizer
+                once, and the results are gathered in order. Batches too small to be worth it are encoded in the
+                current process. Ignored by fast tokenizers, which already encode batches in parallel.
         """
 
         # Backward compatibility for 'truncation_strategy', 'pad_to_max_length'
@@ -2517,6 +2622,12 @@ class PreTrainedTokenizerBase(SpecialTokensMixin):
             **kwargs,
         )
 
+        if num_proc is not None:
+            if self.is_fast:
+                logger.warning("`num_proc` is ignored by fast tokenizers, which already encode batches in parallel.")
+            else:
+                kwargs["num_proc"] = num_proc
+
         return self._batch_encode_plus(
             batch_text_or_text_pairs=batch_text_or_text_pairs,
             add_special_tokens=add_special_tokens,
@@ -2589,6 +2700,9 @@ class PreTrainedTokenizerBase(SpecialTokensMixin):
         Padding side (left/right) padding token ids are defined at the tokenizer level (with ``self.padding_side``,
         ``self.pad_token_id`` and ``self.pad_token_type_id``)
 
+        A batch is padded at once: the padded ``input_ids``, ``attention_mask``, ``token_type_ids`` and
+        ``special_tokens_mask`` are built directly as NumPy arrays rather than padding each example separately.
+
         .. note::
 
             If the ``encoded_inputs`` passed are dictionary of numpy arrays, PyTorch tensors or TensorFlow tensors, the
@@ -2697,6 +2811,21 @@ class PreTrainedTokenizerBase(SpecialTokensMixin):
             max_length = max(len(inputs) for inputs in encoded_inputs["input_ids"])
             padding_strategy = PaddingStrategy.MAX_LENGTH
 
+        if padding_strategy == PaddingStrategy.MAX_LENGTH:
+            batch_outputs = self._batch_pad(
+                encoded_inputs,
+                max_length=max_length,
+                pad_to_multiple_of=pad_to_multiple_of,
+                return_attention_mask=return_attention_mask,
+            )
+            if batch_outputs is not None:
+                if return_tensors is None:
+                    batch_outputs = {
+                        key: value.tolist() if isinstance(value, np.ndarray) else value
+                        for key, value in batch_outputs.items()
+                    }
+                return BatchEncoding(batch_outputs, tensor_type=return_tensors)
+
         batch_outputs = {}
         for i in range(batch_size):
             inputs = dict((k, v[i]) for k, v in encoded_inputs.items())
@@ -2936,21 +3065,42 @@ class PreTrainedTokenizerBase(SpecialTokensMixin):
 
         overflowing_tokens = []
         if truncation_strategy == TruncationStrategy.LONGEST_FIRST:
-            for _ in range(num_tokens_to_remove):
-                if pair_ids is None or len(ids) > len(pair_ids):
-                    if not overflowing_tokens:
-                        window_len = min(len(ids), stride + 1)
-                    else:
-                        window_len = 1
-                    overflowing_tokens.extend(ids[-window_len:])
-                    ids = ids[:-1]
-                else:
-                    if not overflowing_tokens:
-                        window_len = min(len(pair_ids), stride + 1)
-                    else:
-                        window_len = 1
-                    overflowing_tokens.extend(pair_ids[-window_len:])
-                    pair_ids = pair_ids[:-1]
+            # Tokens are removed one at a time from the end of the longest sequence (the second one in case of a tie):
+            # first from one of them until it is the shortest one, then from both in turn. The number of tokens removed
+            # from each sequence and the order they are removed in are computed directly instead.
+            len_ids = len(ids)
+            len_pair = len(pair_ids) if pair_ids is not None else 0
+            ids_first = pair_ids is None or len_ids > len_pair
+            if ids_first:
+                first_ids, second_ids = ids, pair_ids if pair_ids is not None else []
+                num_first = min(num_tokens_to_remove, len_ids - len_pair)
+            else:
+                first_ids, second_ids = pair_ids, ids
+                num_first = min(num_tokens_to_remove, len_pair - len_ids + 1, len_pair)
+            len_first, len_second = len(first_ids), len(second_ids)
+            num_in_turn = num_tokens_to_remove - num_first
+            num_second = min((num_in_turn + 1) // 2, len_second)
+            num_first_in_turn = min(num_in_turn // 2, len_first - num_first)
+
+            # The first token removed comes with the `stride` tokens before it
+            if num_first > 0:
+                window_len = min(len_first, stride + 1)
+                overflowing_tokens = list(first_ids[len_first - window_len :])
+                overflowing_tokens.extend(first_ids[len_first - num_first : len_first - 1][::-1])
+            removed_in_turn = [None] * (num_second + num_first_in_turn)
+            removed_in_turn[::2] = second_ids[len_second - num_second :][::-1]
+            len_first -= num_first
+            removed_in_turn[1::2] = first_ids[len_first - num_first_in_turn : len_first][::-1]
+            overflowing_tokens.extend(removed_in_turn)
+
+            first_ids = first_ids[: len_first - num_first_in_turn]
+            second_ids = second_ids[: len_second - num_second]
+            if ids_first:
+                ids = first_ids
+                if pair_ids is not None:
+                    pair_ids = second_ids
+            else:
+                ids, pair_ids = second_ids, first_ids
         elif truncation_strategy == TruncationStrategy.ONLY_FIRST:
             if len(ids) > num_tokens_to_remove:
                 window_len = min(len(ids), stride + num_tokens_to_remove)
@@ -2978,6 +3128,78 @@ class PreTrainedTokenizerBase(SpecialTokensMixin):
 
         return (ids, pair_ids, overflowing_tokens)
 
+    def _batch_pad(
+        self,
+        encoded_inputs: Dict[str, List[EncodedInput]],
+        max_length: int,
+        pad_to_multiple_of: Optional[int] = None,
+        return_attention_mask: Optional[bool] = None,
+    ) -> Optional[dict]:
+        """
+        Pad a batch of encoded inputs to :obj:`max_length` at once, building the padded ``input_ids``,
+        ``attention_mask``, ``token_type_ids`` and ``special_tokens_mask`` directly as NumPy arrays instead of padding
+        each example with :meth:`_pad`. The other inputs are returned as they are, like :meth:`_pad` does.
+
+        Args:
+            encoded_inputs: Dictionary of batches of tokenized inputs (`List[List[int]]`).
+            max_length: length of the returned sequences.
+            pad_to_multiple_of: (optional) Integer if set will pad the sequences to a multiple of the provided value.
+            return_attention_mask: (optional) Set to False to avoid returning attention mask (default: set to model specifics)
+
+        Returns:
+            :obj:`dict`: The padded inputs, or :obj:`None` if the batch can only be padded with :meth:`_pad` (a
+            subclass overrides it, some sequences are longer than :obj:`max_length` or some inputs don't have the
+            length of their ``input_ids``).
+        """
+        if type(self)._pad is not PreTrainedTokenizerBase._pad or self.padding_side not in ["left", "right"]:
+            return None
+        if self.pad_token_id is None or max_length is None:
+            return None
+
+        # Load from model defaults
+        if return_attention_mask is None:
+            return_attention_mask = "attention_mask" in self.model_input_names
+
+        if pad_to_multiple_of is not None and (max_length % pad_to_multiple_of != 0):
+            max_length = ((max_length // pad_to_multiple_of) + 1) * pad_to_multiple_of
+
+        input_ids = encoded_inputs["input_ids"]
+        lengths = np.fromiter(map(len, input_ids), dtype=np.int64, count=len(input_ids))
+        if lengths.max() > max_length:
+            return None
+
+        pad_values = {
+            "input_ids": self.pad_token_id,
+            "token_type_ids": self.pad_token_type_id,
+            "special_tokens_mask": 1,
+        }
+        pad_values = {key: value for key, value in pad_values.items() if key in encoded_inputs}
+        for key in pad_values:
+            if key != "input_ids" and not np.array_equal(
+                np.fromiter(map(len, encoded_inputs[key]), dtype=np.int64, count=len(lengths)), lengths
+            ):
+                return None
+
+        # Positions of the tokens in the padded batch
+        positions = np.arange(max_length)
+        if self.padding_side == "right":
+            mask = positions < lengths[:, None]
+        else:
+            mask = positions >= (max_length - lengths)[:, None]
+
+        num_tokens = int(lengths.sum())
+        outputs = dict(encoded_inputs)
+        for key, pad_value in pad_values.items():
+            padded = np.full(mask.shape, pad_value, dtype=np.int64)
+            padded[mask] = np.fromiter(
+                itertools.chain.from_iterable(encoded_inputs[key]), dtype=np.int64, count=num_tokens
+            )
+            outputs[key] = padded
+        if return_attention_mask:
+            outputs["attention_mask"] = mask.astype(np.int64)
+
+        return outputs
+
     def _pad(
         self,
         encoded_inputs: Union[Dict[str, EncodedInput], BatchEncoding],
@@ -3140,6 +3362,26 @@ class PreTrainedTokenizerBase(SpecialTokensMixin):
     ) -> str:
         raise NotImplementedError
 
+    def incremental_decoder(self, skip_special_tokens: bool = False, **kwargs) -> IncrementalDecoder:
+        """
+        Returns an :class:`~transformers.tokenization_utils_base.IncrementalDecoder` turning token ids generated one
+        step at a time (for instance by :meth:`~transformers.generation_utils.GenerationMixin.generate_stream`) into
+        text deltas, without decoding the whole sequence again at each step.
+
+        The concatenation of the text deltas is the same as ``self.decode(token_ids,
+        clean_up_tokenization_spaces=False)`` on all the token ids of the stream.
+
+        Args:
+            skip_special_tokens (:obj:`bool`, `optional`, defaults to :obj:`False`):
+                Whether or not to remove special tokens in the decoding.
+            kwargs (additional keyword arguments, `optional`):
+                Will be passed to the underlying model specific decode method.
+
+        Returns:
+            :class:`~transformers.tokenization_utils_base.IncrementalDecoder`: The incremental decoder.
+        """
+        return IncrementalDecoder(self, skip_special_tokens=skip_special_tokens, **kwargs)
+
     def get_special_tokens_mask(
         self, token_ids_0: List[int], token_ids_1: Optional[List[int]] = None, already_has_special_tokens: bool = False
     ) -> List[int]:
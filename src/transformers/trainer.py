@@ -18,6 +18,7 @@ The Trainer class, to easily train a 🤗 Transformers from scratch or finetune
 
 import collections
 import inspect
+import itertools
 import math
 import os
 import re
@@ -67,14 +68,20 @@ from .trainer_callback import (
     TrainerState,
 )
 from .trainer_pt_utils import (
+    DistributedLengthGroupedSampler,
     DistributedTensorGatherer,
+    LengthGroupedSampler,
     SequentialDistributedSampler,
+    ShardedIterableDataset,
+    TokenBudgetBatchSampler,
     distributed_broadcast_scalars,
     distributed_concat,
+    find_batch_size,
     get_tpu_sampler,
     nested_concat,
     nested_detach,
     nested_numpify,
+    nested_reorder,
     nested_xla_mesh_reduce,
     reissue_pt_warnings,
 )
@@ -296,6 +303,8 @@ class Trainer:
         # Internal variable for total_flos used to count as tensors (for distributed + TPU), will be sent in the
         # state at each call to self.log.
         self._total_flos = None
+        # Average number of samples in the training batches built by a token budget, used to weigh their losses
+        self._average_train_batch_size = None
         if self.args.fp16 and _use_native_amp:
             self.scaler = torch.cuda.amp.GradScaler()
         self.hp_search_backend = None
@@ -369,6 +378,11 @@ class Trainer:
             return None
         elif is_torch_tpu_available():
             return get_tpu_sampler(self.train_dataset)
+        elif self.args.group_by_length:
+            if self.args.local_rank == -1:
+                return LengthGroupedSampler(self.train_dataset, self.args.train_batch_size)
+            else:
+                return DistributedLengthGroupedSampler(self.train_dataset, self.args.train_batch_size)
         else:
             return (
                 RandomSampler(self.train_dataset)
@@ -376,17 +390,63 @@ class Trainer:
                 else DistributedSampler(self.train_dataset)
             )
 
+    def _get_token_budget_batch_sampler(
+        self, dataset: Dataset, shuffle: bool
+    ) -> Optional[torch.utils.data.sampler.Sampler]:
+        if (
+            self.args.max_tokens_per_batch is None
+            or isinstance(dataset, torch.utils.data.IterableDataset)
+            or not isinstance(dataset, collections.abc.Sized)
+        ):
+            return None
+        if is_torch_tpu_available():
+            logger.warning("`max_tokens_per_batch` is not supported on TPU, batches of a fixed size will be used.")
+            return None
+        if self.args.local_rank == -1:
+            return TokenBudgetBatchSampler(
+                dataset,
+                self.args.max_tokens_per_batch,
+                shuffle=shuffle,
+                seed=self.args.seed,
+                drop_last=self.args.dataloader_drop_last,
+            )
+        if not shuffle:
+            # The predictions of the processes are gathered at each step, so they need batches of the same size.
+            logger.warning(
+                "`max_tokens_per_batch` is not supported for distributed evaluation, batches of a fixed size will be "
+                "used."
+            )
+            return None
+        return TokenBudgetBatchSampler(
+            dataset,
+            self.args.max_tokens_per_batch,
+            num_replicas=torch.distributed.get_world_size(),
+            rank=torch.distributed.get_rank(),
+            seed=self.args.seed,
+            drop_last=self.args.dataloader_drop_last,
+        )
+
     def get_train_dataloader(self) -> DataLoader:
         """
         Returns the training :class:`~torch.utils.data.DataLoader`.
 
         Will use no sampler if :obj:`self.train_dataset` does not implement :obj:`__len__`, a random sampler (adapted
-        to distributed training if necessary) otherwise.
+        to distributed training if necessary) otherwise, grouping samples of similar lengths if
+        :obj:`args.group_by_length` is set. If :obj:`args.max_tokens_per_batch` is set, batches are instead built to
+        fit that number of tokens with a :class:`~transformers.trainer_pt_utils.TokenBudgetBatchSampler`.
 
         Subclass and override this method if you want to inject some custom behavior.
         """
         if self.train_dataset is None:
             raise ValueError("Trainer: training requires a train_dataset.")
+        train_batch_sampler = self._get_token_budget_batch_sampler(self.train_dataset, shuffle=True)
+        if train_batch_sampler is not None:
+            return DataLoader(
+                self.train_dataset,
+                batch_sampler=train_batch_sampler,
+                collate_fn=self.data_collator,
+                num_workers=self.args.dataloader_num_workers,
+            )
         train_sampler = self._get_train_sampler()
 
         return DataLoader(
@@ -424,6 +484,14 @@ class Trainer:
         elif is_datasets_available() and isinstance(eval_dataset, datasets.Dataset):
             self._remove_unused_columns(eval_dataset, description="evaluation")
         eval_dataset = eval_dataset if eval_dataset is not None else self.eval_dataset
+        eval_batch_sampler = self._get_token_budget_batch_sampler(eval_dataset, shuffle=False)
+        if eval_batch_sampler is not None:
+            return DataLoader(
+                eval_dataset,
+                batch_sampler=eval_batch_sampler,
+                collate_fn=self.data_collator,
+                num_workers=self.args.dataloader_num_workers,
+            )
         eval_sampler = self._get_eval_sampler(eval_dataset)
 
         return DataLoader(
@@ -450,6 +518,14 @@ class Trainer:
             raise ValueError("test_dataset must implement __len__")
         elif is_datasets_available() and isinstance(test_dataset, datasets.Dataset):
             self._remove_unused_columns(test_dataset, description="test")
+        test_batch_sampler = self._get_token_budget_batch_sampler(test_dataset, shuffle=False)
+        if test_batch_sampler is not None:
+            return DataLoader(
+                test_dataset,
+                batch_sampler=test_batch_sampler,
+                collate_fn=self.data_collator,
+                num_workers=self.args.dataloader_num_workers,
+            )
         test_sampler = self._get_eval_sampler(test_dataset)
 
         # We use the same batch_size as for eval.
@@ -459,6 +535,7 @@ class Trainer:
             batch_size=self.args.eval_batch_size,
             collate_fn=self.data_collator,
             drop_last=self.args.dataloader_drop_last,
+            num_workers=self.args.dataloader_num_workers,
         )
 
     def create_optimizer_and_scheduler(self, num_training_steps: int):
@@ -593,6 +670,14 @@ class Trainer:
 
         # Data loader and number of training steps
         train_dataloader = self.get_train_dataloader()
+        token_budget_batch_sampler = (
+            train_dataloader.batch_sampler
+            if isinstance(train_dataloader.batch_sampler, TokenBudgetBatchSampler)
+            else None
+        )
+        self._average_train_batch_size = (
+            token_budget_batch_sampler.average_batch_size if token_budget_batch_sampler is not None else None
+        )
 
         # Setting up training control variables:
         # number of training epochs: num_train_epochs
@@ -667,8 +752,17 @@ class Trainer:
         logger.info("***** Running training *****")
         logger.info("  Num examples = %d", num_examples)
         logger.info("  Num Epochs = %d", num_train_epochs)
-        logger.info("  Instantaneous batch size per device = %d", self.args.per_device_train_batch_size)
-        logger.info("  Total train batch size (w. parallel, distributed & accumulation) = %d", total_train_batch_size)
+        if token_budget_batch_sampler is not None:
+            logger.info("  Max tokens per batch per device = %d", self.args.max_tokens_per_batch)
+            logger.info(
+                "  Total max tokens per batch (w. parallel, distributed & accumulation) = %d",
+                total_train_batch_size // self.args.train_batch_size * self.args.max_tokens_per_batch,
+            )
+        else:
+            logger.info("  Instantaneous batch size per device = %d", self.args.per_device_train_batch_size)
+            logger.info(
+                "  Total train batch size (w. parallel, distributed & accumulation) = %d", total_train_batch_size
+            )
         logger.info("  Gradient Accumulation steps = %d", self.args.gradient_accumulation_steps)
         logger.info("  Total optimization steps = %d", max_steps)
 
@@ -715,6 +809,14 @@ class Trainer:
         for epoch in range(epochs_trained, num_train_epochs):
             if isinstance(train_dataloader, DataLoader) and isinstance(train_dataloader.sampler, DistributedSampler):
                 train_dataloader.sampler.set_epoch(epoch)
+            elif isinstance(train_dataloader, DataLoader) and isinstance(
+                train_dataloader.batch_sampler, TokenBudgetBatchSampler
+            ):
+                train_dataloader.batch_sampler.set_epoch(epoch)
+            elif isinstance(train_dataloader, DataLoader) and isinstance(
+                train_dataloader.dataset, ShardedIterableDataset
+            ):
+                train_dataloader.dataset.set_epoch(epoch)
 
             if is_torch_tpu_available():
                 parallel_loader = pl.ParallelLoader(train_dataloader, [self.args.device]).per_device_loader(
@@ -1083,6 +1185,11 @@ class Trainer:
         if self.args.n_gpu > 1:
             loss = loss.mean()  # mean() to average on multi-gpu parallel training
 
+        if self._average_train_batch_size is not None:
+            # Batches built by a token budget hold a variable number of samples, weigh their loss accordingly so that
+            # each sample contributes as much to the gradients
+            loss = loss * find_batch_size(inputs) / self._average_train_batch_size
+
         if self.args.gradient_accumulation_steps > 1:
             loss = loss / self.args.gradient_accumulation_steps
 
@@ -1158,7 +1265,9 @@ class Trainer:
             state_dict = self.model.state_dict()
             xm.save(state_dict, os.path.join(output_dir, WEIGHTS_NAME))
         else:
-            self.model.save_pretrained(output_dir)
+            self.model.save_pretrained(
+                output_dir, max_shard_size=self.args.save_max_shard_size, num_threads=self.args.save_num_threads
+            )
         if self.tokenizer is not None and self.is_world_process_zero():
             self.tokenizer.save_pretrained(output_dir)
 
@@ -1173,7 +1282,9 @@ class Trainer:
             state_dict = self.model.state_dict()
             torch.save(state_dict, os.path.join(output_dir, WEIGHTS_NAME))
         else:
-            self.model.save_pretrained(output_dir)
+            self.model.save_pretrained(
+                output_dir, max_shard_size=self.args.save_max_shard_size, num_threads=self.args.save_num_threads
+            )
         if self.tokenizer is not None and self.is_world_process_zero():
             self.tokenizer.save_pretrained(output_dir)
 
@@ -1335,10 +1446,17 @@ class Trainer:
         # inside a DistributedDataParallel as we'll be under `no_grad` anyways.
 
         batch_size = dataloader.batch_size
+        # batches are built by a token budget and sorted by length, their predictions are put back in order at the end
+        token_budget_batch_sampler = (
+            dataloader.batch_sampler if isinstance(dataloader.batch_sampler, TokenBudgetBatchSampler) else None
+        )
         num_examples = self.num_examples(dataloader)
         logger.info("***** Running %s *****", description)
         logger.info("  Num examples = %d", num_examples)
-        logger.info("  Batch size = %d", batch_size)
+        if token_budget_batch_sampler is not None:
+            logger.info("  Max tokens per batch = %d", token_budget_batch_sampler.max_tokens)
+        else:
+            logger.info("  Batch size = %d", batch_size)
         losses_host: torch.Tensor = None
         preds_host: Union[torch.Tensor, List[torch.Tensor]] = None
         labels_host: Union[torch.Tensor, List[torch.Tensor]] = None
@@ -1368,7 +1486,7 @@ class Trainer:
         for step, inputs in enumerate(dataloader):
             loss, logits, labels = self.prediction_step(model, inputs, prediction_loss_only, ignore_keys=ignore_keys)
             if loss is not None:
-                losses = loss.repeat(batch_size)
+                losses = loss.repeat(batch_size if batch_size is not None else find_batch_size(inputs))
                 losses_host = losses if losses_host is None else torch.cat((losses_host, losses), dim=0)
             if logits is not None:
                 preds_host = logits if preds_host is None else nested_concat(preds_host, logits, padding_index=-100)
@@ -1400,6 +1518,12 @@ class Trainer:
         preds = preds_gatherer.finalize() if not prediction_loss_only else None
         label_ids = labels_gatherer.finalize() if not prediction_loss_only else None
 
+        if token_budget_batch_sampler is not None:
+            order = np.argsort(list(itertools.chain.from_iterable(token_budget_batch_sampler.batches)))
+            eval_loss = nested_reorder(eval_loss, order) if eval_loss is not None else None
+            preds = nested_reorder(preds, order) if preds is not None else None
+            label_ids = nested_reorder(label_ids, order) if label_ids is not None else None
+
         if self.compute_metrics is not None and preds is not None and label_ids is not None:
             metrics = self.compute_metrics(EvalPrediction(predictions=preds, label_ids=label_ids))
         else:
@@ -19,11 +19,12 @@ Torch utilities for the Trainer class.
 import math
 import warnings
 from contextlib import contextmanager
-from typing import List, Optional, Union
+from typing import Iterator, List, Optional, Union
 
 import numpy as np
 import torch
 from packaging import version
+from torch.utils.data.dataset import Dataset, IterableDataset
 from torch.utils.data.distributed import DistributedSampler
 from torch.utils.data.sampler import RandomSampler, Sampler
 
@@ -223,6 +224,330 @@ def get_tpu_sampler(dataset: torch.utils.data.dataset.Dataset):
     return DistributedSampler(dataset, num_replicas=xm.xrt_world_size(), rank=xm.get_ordinal())
 
 
+def get_length_grouped_indices(lengths, batch_size, mega_batch_mult=None, generator=None):
+    """
+    Return a list of indices so that each slice of :obj:`batch_size` consecutive indices correspond to elements of
+    similar lengths. To do this, the indices are:
+
+    - randomly permuted
+    - grouped in mega-batches of size :obj:`mega_batch_mult * batch_size`
+    - sorted by length in each mega-batch
+
+    The result is the concatenation of all mega-batches, with the batch of :obj:`batch_size` containing the element of
+    maximum length placed first, so that an OOM happens sooner rather than later.
+    """
+    # Default for mega_batch_mult: 50 or the number to get 4 megabatches, whichever is smaller.
+    if mega_batch_mult is None:
+        mega_batch_mult = min(len(lengths) // (batch_size * 4), 50)
+        # Just in case, for tiny datasets
+        if mega_batch_mult == 0:
+            mega_batch_mult = 1
+
+    # We need to use torch for the random part as a distributed sampler will set the random seed for torch.
+    indices = torch.randperm(len(lengths), generator=generator)
+    megabatch_size = mega_batch_mult * batch_size
+    megabatches = [indices[i : i + megabatch_size].tolist() for i in range(0, len(lengths), megabatch_size)]
+    megabatches = [list(sorted(megabatch, key=lambda i: lengths[i], reverse=True)) for megabatch in megabatches]
+
+    # The rest is to get the biggest batch first.
+    # Since each megabatch is sorted by descending length, the longest element is the first
+    megabatch_maximums = [lengths[megabatch[0]] for megabatch in megabatches]
+    max_idx = torch.argmax(torch.tensor(megabatch_maximums)).item()
+    # Switch to put the longest element in first position
+    megabatches[0][0], megabatches[max_idx][0] = megabatches[max_idx][0], megabatches[0][0]
+
+    return sum(megabatches, [])
+
+
+def _get_dataset_lengths(dataset, model_input_name="input_ids"):
+    """Computes the length of each element of :obj:`dataset` from its :obj:`model_input_name` entry."""
+    lengths = []
+    for i in range(len(dataset)):
+        item = dataset[i]
+        if not isinstance(item, dict) or model_input_name not in item:
+            raise ValueError(
+                "Can only automatically infer lengths for datasets whose items are dictionaries with an "
+                f"'{model_input_name}' key. Pass the lengths of the elements of the dataset with `lengths`."
+            )
+        lengths.append(len(item[model_input_name]))
+    return lengths
+
+
+class LengthGroupedSampler(Sampler):
+    r"""
+    Sampler that samples indices in a way that groups together features of the dataset of roughly the same length while
+    keeping a bit of randomness, to minimize the amount of padding in each batch.
+
+    The lengths are computed from the :obj:`input_ids` of each element of the dataset the first time the sampler is
+    iterated over (and cached for the next epochs), unless they are passed with :obj:`lengths`.
+    """
+
+    def __init__(self, dataset: Dataset, batch_size: int, lengths: Optional[List[int]] = None):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __iter__(self):
+        if self.lengths is None:
+            self.lengths = _get_dataset_lengths(self.dataset)
+        indices = get_length_grouped_indices(self.lengths, self.batch_size)
+        return iter(indices)
+
+
+class DistributedLengthGroupedSampler(DistributedSampler):
+    r"""
+    Distributed Sampler that samples indices in a way that groups together features of the dataset of roughly the same
+    length while keeping a bit of randomness, to minimize the amount of padding in each batch.
+
+    Like :class:`~torch.utils.data.distributed.DistributedSampler`, it uses a seed depending on the epoch (set with
+    :obj:`set_epoch`) so that all processes shuffle the dataset the same way, and it adds extra samples to make the
+    number of samples evenly divisible by the number of processes. The lengths are computed the same way as in
+    :class:`~transformers.trainer_pt_utils.LengthGroupedSampler`.
+    """
+
+    # Copied and adapted from PyTorch DistributedSampler.
+    def __init__(
+        self,
+        dataset: Dataset,
+        batch_size: int,
+        num_replicas: Optional[int] = None,
+        rank: Optional[int] = None,
+        seed: int = 0,
+        lengths: Optional[List[int]] = None,
+    ):
+        if num_replicas is None:
+            if not torch.distributed.is_available():
+                raise RuntimeError("Requires distributed package to be available")
+            num_replicas = torch.distributed.get_world_size()
+        if rank is None:
+            if not torch.distributed.is_available():
+                raise RuntimeError("Requires distributed package to be available")
+            rank = torch.distributed.get_rank()
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+        self.num_samples = int(math.ceil(len(self.dataset) * 1.0 / self.num_replicas))
+        self.total_size = self.num_samples * self.num_replicas
+        self.seed = seed
+        self.lengths = lengths
+
+    def __iter__(self) -> Iterator:
+        if self.lengths is None:
+            self.lengths = _get_dataset_lengths(self.dataset)
+        # Deterministically shuffle based on epoch and seed
+        g = torch.Generator()
+        g.manual_seed(self.seed + self.epoch)
+        indices = get_length_grouped_indices(self.lengths, self.batch_size * self.num_replicas, generator=g)
+
+        # add extra samples to make it evenly divisible
+        indices += indices[: (self.total_size - len(indices))]
+        assert len(indices) == self.total_size
+
+        # subsample: each consecutive group of num_replicas indices is split across the processes, so the batches of
+        # all the processes at a given step have similar lengths
+        indices = indices[self.rank : self.total_size : self.num_replicas]
+        assert len(indices) == self.num_samples
+
+        return iter(indices)
+
+
+class TokenBudgetBatchSampler(Sampler):
+    r"""
+    Batch sampler that yields batches of indices whose padded size (number of samples times the length of the longest
+    one) fits in :obj:`max_tokens`, instead of batches of a fixed number of samples. Short samples are thus batched by
+    many and long samples by few, which keeps the memory used by each batch roughly constant.
+
+    The batches are built once from the samples sorted by length, so that each batch needs as little padding as
+    possible, and only their order is shuffled at each epoch (with a seed depending on the epoch set with
+    :obj:`set_epoch`, like :class:`~torch.utils.data.distributed.DistributedSampler`). The number of batches is then
+    the same for all epochs. A sample longer than :obj:`max_tokens` gets a batch of its own.
+
+    In distributed training, each process gets every :obj:`num_replicas`-th batch, the first batches being repeated if
+    necessary so that all processes get the same number of batches (or the last ones being dropped with
+    :obj:`drop_last`).
+
+    Args:
+        dataset (:obj:`torch.utils.data.dataset.Dataset`):
+            The dataset to sample from.
+        max_tokens (:obj:`int`):
+            The maximum number of tokens (padding included) in a batch.
+        lengths (:obj:`List[int]`, `optional`):
+            The lengths of the samples of the dataset. Will be computed from the :obj:`input_ids` of each sample the
+            first time the sampler is iterated over if not set.
+        shuffle (:obj:`bool`, `optional`, defaults to :obj:`True`):
+            Whether or not to shuffle the order of the batches. If :obj:`False`, the batches are yielded by increasing
+            length of their samples.
+        num_replicas (:obj:`int`, `optional`, defaults to 1):
+            The number of processes in distributed training.
+        rank (:obj:`int`, `optional`, defaults to 0):
+            The rank of the current process.
+        seed (:obj:`int`, `optional`, defaults to 0):
+            The random seed used to shuffle the batches.
+        drop_last (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            Whether or not to drop the batch of the longest samples when it has room left for another one of them (the
+            only batch that is not full), and the batches in excess in distributed training instead of repeating some.
+    """
+
+    def __init__(
+        self,
+        dataset: Dataset,
+        max_tokens: int,
+        lengths: Optional[List[int]] = None,
+        shuffle: bool = True,
+        num_replicas: int = 1,
+        rank: int = 0,
+        seed: int = 0,
+        drop_last: bool = False,
+    ):
+        if max_tokens <= 0:
+            raise ValueError(f"`max_tokens` has to be a strictly positive integer, but is {max_tokens}")
+        self.dataset = dataset
+        self.max_tokens = max_tokens
+        self.lengths = lengths
+        self.shuffle = shuffle
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+        self._batches = None
+
+    @property
+    def batches(self) -> List[List[int]]:
+        """
+        :obj:`List[List[int]]`: The batches of indices, by increasing length of their samples.
+        """
+        if self._batches is None:
+            if self.lengths is None:
+                self.lengths = _get_dataset_lengths(self.dataset)
+            self._batches = []
+            batch, batch_max_length = [], 0
+            for idx in np.argsort(self.lengths, kind="stable").tolist():
+                max_length = max(batch_max_length, self.lengths[idx])
+                if len(batch) > 0 and max_length * (len(batch) + 1) > self.max_tokens:
+                    self._batches.append(batch)
+                    batch, max_length = [], self.lengths[idx]
+                batch.append(idx)
+                batch_max_length = max_length
+            is_full = batch_max_length * (len(batch) + 1) > self.max_tokens
+            if len(batch) > 0 and (is_full or not self.drop_last):
+                self._batches.append(batch)
+        return self._batches
+
+    @property
+    def average_batch_size(self) -> float:
+        """
+        :obj:`float`: The average number of samples in a batch.
+        """
+        batches = self.batches
+        return sum(len(batch) for batch in batches) / max(len(batches), 1)
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.batches) // self.num_replicas
+        return int(math.ceil(len(self.batches) / self.num_replicas))
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = self.batches
+        if self.shuffle:
+            # Deterministically shuffle based on epoch and seed, so that all processes get the same order
+            g = torch.Generator()
+            g.manual_seed(self.seed + self.epoch)
+            batches = [batches[i] for i in torch.randperm(len(batches), generator=g).tolist()]
+
+        total_size = len(self) * self.num_replicas
+        if self.drop_last:
+            # remove tail of batches to make it evenly divisible
+            batches = batches[:total_size]
+        else:
+            # add extra batches to make it evenly divisible
+            batches = batches + batches[: (total_size - len(batches))]
+        return iter(batches[self.rank : total_size : self.num_replicas])
+
+
+class ShardedIterableDataset(IterableDataset):
+    r"""
+    Iterable dataset going over the samples of a map-style dataset that belong to the current process in distributed
+    training, split again between the workers of the :class:`~torch.utils.data.DataLoader`. Only the samples of the
+    shard of each worker are accessed, which is when a lazy dataset (like :class:`~transformers.LineByLineTextDataset`
+    with :obj:`lazy=True`) reads and tokenizes them.
+
+    Like with :class:`~torch.utils.data.distributed.DistributedSampler`, the samples are shuffled with a seed depending
+    on the epoch set with :obj:`set_epoch`, and each process gets every :obj:`num_replicas`-th sample, the first
+    samples being repeated if necessary so that all processes get the same number of samples.
+
+    Args:
+        dataset (:obj:`torch.utils.data.dataset.Dataset`):
+            The map-style dataset to iterate over.
+        shuffle (:obj:`bool`, `optional`, defaults to :obj:`True`):
+            Whether or not to shuffle the samples.
+        num_replicas (:obj:`int`, `optional`):
+            The number of processes in distributed training. Defaults to the world size if :obj:`torch.distributed` is
+            initialized, 1 otherwise.
+        rank (:obj:`int`, `optional`):
+            The rank of the current process. Defaults to the rank in :obj:`torch.distributed` if it is initialized, 0
+            otherwise.
+        seed (:obj:`int`, `optional`, defaults to 0):
+            The random seed used to shuffle the samples.
+    """
+
+    def __init__(
+        self,
+        dataset: Dataset,
+        shuffle: bool = True,
+        num_replicas: Optional[int] = None,
+        rank: Optional[int] = None,
+        seed: int = 0,
+    ):
+        distributed = torch.distributed.is_available() and torch.distributed.is_initialized()
+        if num_replicas is None:
+            num_replicas = torch.distributed.get_world_size() if distributed else 1
+        if rank is None:
+            rank = torch.distributed.get_rank() if distributed else 0
+        if not 0 <= rank < num_replicas:
+            raise ValueError(f"`rank` should be between 0 and {num_replicas - 1}, but is {rank}")
+        self.dataset = dataset
+        self.shuffle = shuffle
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.epoch = 0
+        self.num_samples = int(math.ceil(len(self.dataset) / self.num_replicas))
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.num_samples
+
+    def __iter__(self):
+        if self.shuffle:
+            # Deterministically shuffle based on epoch and seed, so that all processes get the same order
+            g = torch.Generator()
+            g.manual_seed(self.seed + self.epoch)
+            indices = torch.randperm(len(self.dataset), generator=g).numpy()
+        else:
+            indices = np.arange(len(self.dataset))
+
+        # add extra samples to make it evenly divisible
+        total_size = self.num_samples * self.num_replicas
+        indices = np.resize(indices, total_size)[self.rank : total_size : self.num_replicas]
+
+        worker_info = torch.utils.data.get_worker_info()
+        if worker_info is not None:
+            indices = indices[worker_info.id :: worker_info.num_workers]
+        for i in indices:
+            yield self.dataset[int(i)]
+
+
 def nested_new_like(arrays, num_samples, padding_index=-100):
     """ Create the same nested structure as `arrays` with a first dimension always at `num_samples`."""
     if isinstance(arrays, (list, tuple)):
@@ -247,6 +572,30 @@ def nested_truncate(tensors, limit):
     return tensors[:limit]
 
 
+def find_batch_size(tensors):
+    "Find the batch size of the first tensor found in `tensors` (even if it's a nested list/tuple/dict of tensors)."
+    if isinstance(tensors, (list, tuple)):
+        for t in tensors:
+            result = find_batch_size(t)
+            if result is not None:
+                return result
+    elif isinstance(tensors, dict):
+        for value in tensors.values():
+            result = find_batch_size(value)
+            if result is not None:
+                return result
+    elif isinstance(tensors, (torch.Tensor, np.ndarray)):
+        return tensors.shape[0] if len(tensors.shape) >= 1 else None
+    return None
+
+
+def nested_reorder(tensors, indices):
+    "Reorder `tensors` along their first axis following `indices` (even if it's a nested list/tuple of tensors)."
+    if isinstance(tensors, (list, tuple)):
+        return type(tensors)(nested_reorder(t, indices) for t in tensors)
+    return tensors[indices]
+
+
 def _get_first_shape(arrays):
     """Return the shape of the first array found in the nested struct `arrays`."""
     if isinstance(arrays, (list, tuple)):
@@ -119,6 +119,11 @@ class TrainingArguments:
         save_total_limit (:obj:`int`, `optional`):
             If a value is passed, will limit the total amount of checkpoints. Deletes the older checkpoints in
             :obj:`output_dir`.
+        save_max_shard_size (:obj:`str`, `optional`):
+            If a value is passed (like :obj:`"2GB"`), the weights of the checkpoints bigger than this size are split in
+            several files of at most this size. See :meth:`~transformers.PreTrainedModel.save_pretrained`.
+        save_num_threads (:obj:`int`, `optional`, defaults to 1):
+            The number of files of a sharded checkpoint written concurrently.
         no_cuda (:obj:`bool`, `optional`, defaults to :obj:`False`):
             Whether to not use CUDA even when it is available or not.
         seed (:obj:`int`, `optional`, defaults to 42):
@@ -189,6 +194,16 @@ class TrainingArguments:
         model_parallel (:obj:`bool`, `optional`, defaults to :obj:`False`):
             If there are more than one devices, whether to use model parallelism to distribute the model's modules
             across devices or not.
+        group_by_length (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            Whether or not to group together samples of roughly the same length in the training dataset (to minimize
+            padding applied and be more efficient). Only useful if applying dynamic padding. The lengths are computed
+            from the :obj:`input_ids` of each sample the first time the training dataset is iterated over.
+        max_tokens_per_batch (:obj:`int`, `optional`):
+            If set, the batches of training, evaluation and prediction are built to contain at most this number of
+            tokens (padding included) per device instead of a fixed number of samples, grouping samples of similar
+            lengths. The lengths are computed from the :obj:`input_ids` of each sample. The training loss of each batch
+            is weighted by its number of samples, so that all samples weigh the same. Not supported on TPU and for
+            distributed evaluation, where the batch sizes are used.
     """
 
     output_dir: str = field(
@@ -283,6 +298,13 @@ class TrainingArguments:
             )
         },
     )
+    save_max_shard_size: Optional[str] = field(
+        default=None,
+        metadata={"help": "Split the weights of the checkpoints bigger than this size (like 2GB) in several files."},
+    )
+    save_num_threads: int = field(
+        default=1, metadata={"help": "Number of files of a sharded checkpoint written concurrently."}
+    )
     no_cuda: bool = field(default=False, metadata={"help": "Do not use CUDA even when it is available"})
     seed: int = field(default=42, metadata={"help": "random seed for initialization"})
 
@@ -350,6 +372,17 @@ class TrainingArguments:
     greater_is_better: Optional[bool] = field(
         default=None, metadata={"help": "Whether the `metric_for_best_model` should be maximized or not."}
     )
+    group_by_length: bool = field(
+        default=False,
+        metadata={"help": "Whether or not to group samples of roughly the same length together when batching."},
+    )
+    max_tokens_per_batch: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": "If set, build batches of at most this number of tokens (padding included) per device instead of "
+            "batches of a fixed number of samples."
+        },
+    )
 
     def __post_init__(self):
         if self.disable_tqdm is None:
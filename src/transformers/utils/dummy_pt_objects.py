@@ -26,6 +26,15 @@ class DataCollatorForLanguageModeling:
         requires_pytorch(self)
 
 
+class DataCollatorForPackedLanguageModeling:
+    def __init__(self, *args, **kwargs):
+        requires_pytorch(self)
+
+    @classmethod
+    def from_pretrained(self, *args, **kwargs):
+        requires_pytorch(self)
+
+
 class DataCollatorForPermutationLanguageModeling:
     def __init__(self, *args, **kwargs):
         requires_pytorch(self)
@@ -118,6 +127,16 @@ class BeamSearchScorer:
         requires_pytorch(self)
 
 
+class TensorizedBeamSearchScorer:
+    def __init__(self, *args, **kwargs):
+        requires_pytorch(self)
+
+
+class ContinuousBatchingGenerator:
+    def __init__(self, *args, **kwargs):
+        requires_pytorch(self)
+
+
 class LogitsProcessor:
     def __init__(self, *args, **kwargs):
         requires_pytorch(self)
@@ -168,10 +187,28 @@ class TopPLogitsWarper:
         requires_pytorch(self)
 
 
+class PrefixCache:
+    def __init__(self, *args, **kwargs):
+        requires_pytorch(self)
+
+
+class StaticCache:
+    def __init__(self, *args, **kwargs):
+        requires_pytorch(self)
+
+
 def top_k_top_p_filtering(*args, **kwargs):
     requires_pytorch(top_k_top_p_filtering)
 
 
+def load_mmap_checkpoint(*args, **kwargs):
+    requires_pytorch(load_mmap_checkpoint)
+
+
+def save_mmap_checkpoint(*args, **kwargs):
+    requires_pytorch(save_mmap_checkpoint)
+
+
 class Conv1D:
     def __init__(self, *args, **kwargs):
         requires_pytorch(self)
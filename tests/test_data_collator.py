@@ -3,7 +3,7 @@ import shutil
 import tempfile
 import unittest
 
-from transformers import BertTokenizer, is_torch_available, set_seed
+from transformers import BertConfig, BertTokenizer, DistilBertConfig, RobertaConfig, is_torch_available, set_seed
 from transformers.testing_utils import require_torch
 
 
@@ -11,10 +11,14 @@ if is_torch_available():
     import torch
 
     from transformers import (
+        BertForMaskedLM,
         DataCollatorForLanguageModeling,
+        DataCollatorForPackedLanguageModeling,
         DataCollatorForPermutationLanguageModeling,
         DataCollatorForTokenClassification,
         DataCollatorWithPadding,
+        DistilBertForMaskedLM,
+        RobertaForMaskedLM,
         default_data_collator,
     )
 
@@ -171,6 +175,66 @@ class DataCollatorIntegrationTest(unittest.TestCase):
         self.assertTrue(torch.any(masked_tokens))
         self.assertTrue(all(x == -100 for x in batch["labels"][~masked_tokens].tolist()))
 
+    def test_data_collator_for_packed_language_modeling(self):
+        tokenizer = BertTokenizer(self.vocab_file)
+        features = [{"input_ids": [1, 5, 6, 2]}, {"input_ids": [1, 7, 2]}, {"input_ids": [1, 8, 9, 10, 2]}]
+
+        model = BertForMaskedLM(BertConfig(vocab_size=11, hidden_size=16, num_attention_heads=2, intermediate_size=32))
+        data_collator = DataCollatorForPackedLanguageModeling(tokenizer, mlm=False, block_size=8, model=model)
+        batch = data_collator(features)
+        self.assertEqual(batch["input_ids"].tolist(), [[1, 5, 6, 2, 1, 7, 2], [1, 8, 9, 10, 2, 3, 3]])
+        self.assertEqual(batch["position_ids"].tolist(), [[0, 1, 2, 3, 0, 1, 2], [0, 1, 2, 3, 4, 0, 0]])
+        # The first token of the second example is not predicted from the first one
+        self.assertEqual(batch["labels"].tolist(), [[1, 5, 6, 2, -100, 7, 2], [1, 8, 9, 10, 2, -100, -100]])
+        attention_mask = batch["attention_mask"]
+        self.assertEqual(attention_mask.shape, torch.Size((2, 7, 7)))
+        self.assertEqual(attention_mask[0, 5].tolist(), [0, 0, 0, 0, 1, 1, 0])
+        self.assertEqual(attention_mask[1, 4].tolist(), [1, 1, 1, 1, 1, 0, 0])
+        model(**batch)
+
+        # Examples longer than the block size are split
+        batch = data_collator([{"input_ids": list(range(5, 15))}])
+        self.assertEqual(batch["input_ids"].tolist(), [list(range(5, 13)), [13, 14] + [3] * 6])
+
+        data_collator = DataCollatorForPackedLanguageModeling(
+            tokenizer, mlm=False, block_size=8, block_diagonal_attention_mask=False
+        )
+        batch = data_collator(features)
+        self.assertEqual(batch["attention_mask"].tolist(), [[1] * 7, [1] * 5 + [0] * 2])
+        # Without a model, the positions are left to the model
+        self.assertNotIn("position_ids", batch)
+
+        # RoBERTa positions start after its padding index
+        config = RobertaConfig(
+            vocab_size=11, hidden_size=16, num_attention_heads=2, intermediate_size=32, pad_token_id=3
+        )
+        model = RobertaForMaskedLM(config)
+        data_collator = DataCollatorForPackedLanguageModeling(tokenizer, mlm=False, block_size=8, model=model)
+        batch = data_collator(features)
+        self.assertEqual(batch["position_ids"].tolist(), [[4, 5, 6, 7, 4, 5, 6], [4, 5, 6, 7, 8, 3, 3]])
+        self.assertEqual(batch["labels"].tolist(), [[1, 5, 6, 2, -100, 7, 2], [1, 8, 9, 10, 2, -100, -100]])
+        model(**batch)
+
+        # DistilBERT does not accept position ids, nor a 3D attention mask
+        model = DistilBertForMaskedLM(DistilBertConfig(vocab_size=11, dim=16, n_heads=2, hidden_dim=32))
+        data_collator = DataCollatorForPackedLanguageModeling(
+            tokenizer, mlm=False, block_size=8, block_diagonal_attention_mask=False, model=model
+        )
+        batch = data_collator(features)
+        self.assertNotIn("position_ids", batch)
+        model(**batch)
+
+        set_seed(42)  # For reproducibility
+        data_collator = DataCollatorForPackedLanguageModeling(tokenizer, mlm_probability=0.5, block_size=8)
+        batch = data_collator(features * 4)
+        self.assertEqual(batch["attention_mask"][0, 0].tolist(), [1, 1, 1, 1, 0, 0, 0])
+        masked_tokens = batch["input_ids"] == tokenizer.mask_token_id
+        self.assertTrue(torch.any(masked_tokens))
+        # Special tokens and padding are never masked
+        self.assertTrue(torch.all(batch["labels"] != tokenizer.cls_token_id))
+        self.assertTrue(torch.all(batch["labels"] != tokenizer.sep_token_id))
+        self.assertTrue(torch.all(batch["labels"] != tokenizer.pad_token_id))
+
     def test_plm(self):
         tokenizer = BertTokenizer(self.vocab_file)
         no_pad_features = [{"input_ids": list(range(10))}, {"input_ids": list(range(10))}]
@@ -0,0 +1,173 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Team Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a clone of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from transformers import (
+    BertTokenizer,
+    FeatureStoreWriter,
+    InputFeatures,
+    InputFeatureStore,
+    SquadExample,
+    SquadFeatures,
+    SquadFeatureStore,
+    is_torch_available,
+    squad_convert_examples_to_feature_store,
+    squad_convert_examples_to_features,
+)
+from transformers.data.tokenized_cache import RaggedArray, TokenizedDatasetCache
+from transformers.testing_utils import require_torch
+
+
+if is_torch_available():
+    import torch
+
+    from transformers.data.processors.squad import squad_features_to_torch_dataset
+
+
+def get_squad_features(num_features, seq_length=8):
+    features = []
+    for i in range(num_features):
+        features.append(
+            SquadFeatures(
+                input_ids=[101 + i] + [5] * (seq_length - 2) + [102],
+                attention_mask=[1] * seq_length,
+                token_type_ids=[0, 0] + [1] * (seq_length - 2),
+                cls_index=0,
+                p_mask=[1, 1] + [0] * (seq_length - 3) + [1],
+                example_index=i // 2,
+                unique_id=1000000000 + i,
+                paragraph_len=i % 3 + 1,
+                token_is_max_context={2 + j: j % 2 == 0 for j in range(i % 3 + 1)},
+                tokens=["[CLS]", "who"] + ["the"] * (i % 3 + 1),
+                token_to_orig_map={2 + j: i + j for j in range(i % 3 + 1)},
+                start_position=i,
+                end_position=i + 1,
+                is_impossible=i % 2 == 1,
+                qas_id=f"question_{i // 2}",
+            )
+        )
+    return features
+
+
+class FeatureStoreTest(unittest.TestCase):
+    def assertFeaturesEqual(self, features, store):
+        self.assertEqual(len(features), len(store))
+        for feature, stored_feature in zip(features, store):
+            for name, value in vars(feature).items():
+                self.assertEqual(value, getattr(stored_feature, name))
+                self.assertEqual(type(value), type(getattr(stored_feature, name)))
+
+    def test_input_feature_store(self):
+        features = [
+            InputFeatures(input_ids=[1, 2, 3], attention_mask=[1, 1, 1], label=0.5),
+            InputFeatures(input_ids=[1, 2], attention_mask=[1, 1], label=1.25),
+        ]
+        store = InputFeatureStore.from_features(features)
+        self.assertIsInstance(store.columns["input_ids"], RaggedArray)
+        self.assertEqual(store.columns["input_ids"].values.dtype, np.int32)
+        self.assertNotIn("token_type_ids", store.columns)
+        self.assertListEqual(store[:], features)
+        self.assertEqual(store[-1], features[-1])
+        with self.assertRaises(IndexError):
+            store[2]
+
+    def test_squad_feature_store(self):
+        features = get_squad_features(5)
+        store = SquadFeatureStore.from_features(features)
+        # Padded sequences are stored in 2D arrays, dictionaries and strings in flat arrays of indices
+        self.assertEqual(store.columns["input_ids"].shape, (5, 8))
+        self.assertEqual(store.columns["p_mask"].dtype, np.float32)
+        self.assertIsInstance(store.columns["token_to_orig_map_keys"], RaggedArray)
+        self.assertListEqual(store.tables["qas_id"], ["question_0", "question_1", "question_2"])
+        self.assertListEqual(store.tables["tokens"], ["[CLS]", "who", "the"])
+        self.assertFeaturesEqual(features, store)
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            cache = TokenizedDatasetCache(tmpdirname, "cached_squad", "0" * 64)
+            store.save(cache)
+            self.assertFeaturesEqual(features, SquadFeatureStore.load(cache))
+
+    @require_torch
+    def test_squad_torch_dataset(self):
+        features = get_squad_features(5)
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            cache = TokenizedDatasetCache(tmpdirname, "cached_squad", "0" * 64)
+            SquadFeatureStore.from_features(features).save(cache)
+            store = SquadFeatureStore.load(cache)
+
+            dataset = squad_features_to_torch_dataset(store, is_training=True)
+            input_ids, _, _, start_position, _, _, p_mask, is_impossible = dataset[3]
+            self.assertListEqual(input_ids.tolist(), features[3].input_ids)
+            self.assertEqual(start_position.item(), 3)
+            self.assertEqual(p_mask.dtype, torch.float)
+            self.assertEqual(is_impossible.item(), 1.0)
+            # The tensors share the memory of the store
+            input_ids[0] = 0
+            self.assertEqual(store.columns["input_ids"][3, 0], 0)
+
+            dataset = squad_features_to_torch_dataset(store, is_training=False)
+            self.assertEqual(len(dataset), 5)
+            self.assertEqual(dataset[-1][3].item(), 4)
+
+    def test_feature_store_writer(self):
+        features = get_squad_features(7)
+        # The sequences of the last shard are longer, so the sequence columns end up ragged
+        for feature in features[4:]:
+            feature.input_ids = feature.input_ids + [0]
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            cache = TokenizedDatasetCache(tmpdirname, "cached_squad", "0" * 64)
+            writer = FeatureStoreWriter(SquadFeatureStore, cache, shard_size=2)
+            writer.extend(features[:3])
+            self.assertFalse(cache.exists())
+            writer.extend(features[3:])
+            self.assertEqual(len(writer), 7)
+            store = writer.close(objects={"a": [1]})
+
+            self.assertTrue(cache.exists())
+            self.assertIsInstance(store.columns["input_ids"], RaggedArray)
+            self.assertEqual(store.columns["attention_mask"].shape, (7, 8))
+            self.assertListEqual(store.tables["qas_id"], [f"question_{i}" for i in range(4)])
+            self.assertFeaturesEqual(features, store)
+            self.assertEqual(cache.load_object("a"), [1])
+
+    def test_squad_convert_examples_to_feature_store(self):
+        context = " ".join(["the cat sat on a mat"] * 6)
+        examples = [
+            SquadExample(f"id_{i}", "where the cat sat", context, "a mat", 16 + 4 * i, "title", is_impossible=i == 3)
+            for i in range(4)
+        ]
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            vocab_file = os.path.join(tmpdirname, "vocab.txt")
+            with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+                vocab = ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "the", "cat", "sat", "on", "a", "mat", "where"]
+                vocab_writer.write("".join(x + "\n" for x in vocab))
+            tokenizer = BertTokenizer(vocab_file)
+
+            kwargs = dict(max_seq_length=24, doc_stride=8, max_query_length=8, is_training=True, tqdm_enabled=False)
+            features = squad_convert_examples_to_features(examples, tokenizer, **kwargs)
+            cache = TokenizedDatasetCache(tmpdirname, "cached_squad", "0" * 64)
+            store = squad_convert_examples_to_feature_store(examples, tokenizer, cache=cache, shard_size=3, **kwargs)
+
+            # The contexts are split in several features
+            self.assertGreater(len(features), len(examples))
+            self.assertEqual(store.columns["input_ids"].shape, (len(features), 24))
+            for feature in features:
+                feature.encoding = None
+            self.assertFeaturesEqual(features, store)
@@ -25,7 +25,7 @@ from .test_modeling_common import floats_tensor, ids_tensor
 if is_torch_available():
     import torch
 
-    from transformers.generation_beam_search import BeamHypotheses, BeamSearchScorer
+    from transformers.generation_beam_search import BeamHypotheses, BeamSearchScorer, TensorizedBeamSearchScorer
 
 
 class BeamSearchTester:
@@ -220,6 +220,73 @@ class BeamSearchTester:
         )
         self.parent.assertListEqual(list(decoded.shape), [self.num_beams * self.batch_size, max_length])
 
+    def check_tensorized_beam_scorer(self, prompt_ids, *args):
+        for do_early_stopping in [True, False]:
+            kwargs = {
+                "batch_size": self.batch_size,
+                "max_length": self.max_length,
+                "num_beams": self.num_beams,
+                "device": torch_device,
+                "length_penalty": self.length_penalty,
+                "do_early_stopping": do_early_stopping,
+                "num_beam_hyps_to_keep": self.num_beam_hyps_to_keep,
+            }
+            beam_scorer = BeamSearchScorer(**kwargs)
+            tensorized_beam_scorer = TensorizedBeamSearchScorer(**kwargs)
+
+            input_ids = prompt_ids
+            beam_scores = torch.zeros((self.batch_size * self.num_beams,), device=torch_device)
+            for _ in range(self.max_length - self.sequence_length):
+                _, next_tokens, next_indices, next_scores = self.prepare_inputs()
+                next_scores = next_scores + beam_scores.view(self.batch_size, self.num_beams).max(dim=-1)[0][:, None]
+                # end about one hypothesis out of four
+                next_tokens.masked_fill_(floats_tensor(next_tokens.shape).to(torch_device) < 0.25, self.eos_token_id)
+                next_tokens[:, self.num_beams :] = ids_tensor((self.batch_size, self.num_beams), self.vocab_size)
+
+                beam_outputs = beam_scorer.process(
+                    input_ids,
+                    next_scores,
+                    next_tokens,
+                    next_indices,
+                    pad_token_id=self.pad_token_id,
+                    eos_token_id=self.eos_token_id,
+                )
+                tensorized_beam_outputs = tensorized_beam_scorer.process(
+                    input_ids,
+                    next_scores,
+                    next_tokens,
+                    next_indices,
+                    pad_token_id=self.pad_token_id,
+                    eos_token_id=self.eos_token_id,
+                )
+                for key in ["next_beam_tokens", "next_beam_indices"]:
+                    self.parent.assertListEqual(beam_outputs[key].tolist(), tensorized_beam_outputs[key].tolist())
+                self.parent.assertTrue(
+                    torch.allclose(beam_outputs["next_beam_scores"], tensorized_beam_outputs["next_beam_scores"])
+                )
+                self.parent.assertListEqual(beam_scorer._done.tolist(), tensorized_beam_scorer._done.tolist())
+
+                beam_scores = beam_outputs["next_beam_scores"]
+                input_ids = torch.cat(
+                    [input_ids[beam_outputs["next_beam_indices"]], beam_outputs["next_beam_tokens"][:, None]], dim=-1
+                )
+                if beam_scorer.is_done:
+                    break
+
+            finalize_args = (
+                input_ids,
+                beam_scores,
+                beam_outputs["next_beam_tokens"],
+                beam_outputs["next_beam_indices"],
+            )
+            decoded = beam_scorer.finalize(
+                *finalize_args, pad_token_id=self.pad_token_id, eos_token_id=self.eos_token_id
+            )
+            tensorized_decoded = tensorized_beam_scorer.finalize(
+                *finalize_args, pad_token_id=self.pad_token_id, eos_token_id=self.eos_token_id
+            )
+            self.parent.assertListEqual(decoded.tolist(), tensorized_decoded.tolist())
+
 
 @require_torch
 class BeamSearchTest(unittest.TestCase):
@@ -237,3 +304,48 @@ class BeamSearchTest(unittest.TestCase):
     def test_beam_scorer_finalize(self):
         inputs = self.beam_search_tester.prepare_inputs()
         self.beam_search_tester.check_beam_scores_finalize(*inputs)
+
+    def test_tensorized_beam_scorer(self):
+        inputs = self.beam_search_tester.prepare_inputs()
+        self.beam_search_tester.check_tensorized_beam_scorer(*inputs)
+
+    def test_tensorized_beam_scorer_ties(self):
+        eos_token_id, pad_token_id = 0, 1
+        kwargs = {"batch_size": 1, "max_length": 4, "num_beams": 2, "device": torch_device}
+        beam_scorer = BeamSearchScorer(**kwargs)
+        tensorized_beam_scorer = TensorizedBeamSearchScorer(**kwargs)
+
+        input_ids = torch.tensor([[5], [6]], device=torch_device)
+        steps = [
+            # the two best candidates end, with scores -1 and -2
+            ([[-1.0, -2.0, -3.0, -4.0]], [[eos_token_id, eos_token_id, 7, 8]], [[0, 1, 0, 1]]),
+            # the best candidate ends with a score of -4 / 2, equal to the worst finished hypothesis, so it is not kept
+            ([[-4.0, -4.5, -5.0, -6.0]], [[eos_token_id, 7, 8, 9]], [[0, 0, 1, 1]]),
+        ]
+        for next_scores, next_tokens, next_indices in steps:
+            args = (
+                input_ids,
+                torch.tensor(next_scores, device=torch_device),
+                torch.tensor(next_tokens, device=torch_device),
+                torch.tensor(next_indices, device=torch_device),
+            )
+            beam_outputs = beam_scorer.process(*args, pad_token_id=pad_token_id, eos_token_id=eos_token_id)
+            tensorized_beam_scorer.process(*args, pad_token_id=pad_token_id, eos_token_id=eos_token_id)
+            input_ids = torch.cat(
+                [input_ids[beam_outputs["next_beam_indices"]], beam_outputs["next_beam_tokens"][:, None]], dim=-1
+            )
+
+        for scorer in [beam_scorer, tensorized_beam_scorer]:
+            scorer.num_beam_hyps_to_keep = 2
+        finalize_args = (
+            input_ids,
+            beam_outputs["next_beam_scores"],
+            beam_outputs["next_beam_tokens"],
+            beam_outputs["next_beam_indices"],
+        )
+        decoded = beam_scorer.finalize(*finalize_args, pad_token_id=pad_token_id, eos_token_id=eos_token_id)
+        tensorized_decoded = tensorized_beam_scorer.finalize(
+            *finalize_args, pad_token_id=pad_token_id, eos_token_id=eos_token_id
+        )
+        self.assertListEqual(decoded.tolist(), [[5, eos_token_id], [6, eos_token_id]])
+        self.assertListEqual(tensorized_decoded.tolist(), decoded.tolist())
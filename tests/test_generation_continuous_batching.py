@@ -0,0 +1,125 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Team Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a clone of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+
+from transformers import is_torch_available
+from transformers.testing_utils import require_torch, torch_device
+
+from .test_modeling_common import ids_tensor
+
+
+if is_torch_available():
+    import torch
+
+    from transformers import BartConfig, BartForConditionalGeneration, GPT2Config, GPT2LMHeadModel
+    from transformers.generation_continuous_batching import ContinuousBatchingGenerator
+
+
+@require_torch
+class ContinuousBatchingGeneratorTest(unittest.TestCase):
+    vocab_size = 12
+    eos_token_id = 3
+
+    def get_model(self):
+        torch.manual_seed(0)
+        config = GPT2Config(
+            vocab_size=self.vocab_size,
+            n_embd=16,
+            n_layer=2,
+            n_head=2,
+            n_positions=64,
+            n_ctx=64,
+            eos_token_id=self.eos_token_id,
+            pad_token_id=self.eos_token_id,
+        )
+        return GPT2LMHeadModel(config).to(torch_device).eval()
+
+    def get_requests(self, num_requests=7):
+        torch.manual_seed(1)
+        requests = []
+        for idx in range(num_requests):
+            prompt = ids_tensor((1 + idx % 4,), self.vocab_size).tolist()
+            requests.append((f"request_{idx}", prompt, 8 + 3 * (idx % 3)))
+        return requests
+
+    def test_greedy_matches_generate(self):
+        model = self.get_model()
+        generator = ContinuousBatchingGenerator(model, max_batch_size=3)
+
+        requests = self.get_requests()
+        # requests are added while generating to exercise admissions in a running batch
+        for request_id, prompt, max_length in requests[:2]:
+            generator.add_request(prompt, request_id=request_id, max_length=max_length)
+        outputs = {}
+        for request_id, output_ids in generator:
+            outputs[request_id] = output_ids.tolist()
+            if len(requests) > 2 + len(outputs) - 1:
+                request_id, prompt, max_length = requests[2 + len(outputs) - 1]
+                generator.add_request(prompt, request_id=request_id, max_length=max_length)
+
+        self.assertEqual(len(outputs), len(requests))
+        self.assertFalse(generator.has_unfinished_requests)
+        for request_id, prompt, max_length in requests:
+            expected = model.generate(
+                torch.tensor([prompt], device=torch_device), max_length=max_length, do_sample=False
+            )[0]
+            self.assertListEqual(outputs[request_id], expected.tolist())
+
+    def test_running_batch_is_bounded(self):
+        model = self.get_model()
+        generator = ContinuousBatchingGenerator(model, max_batch_size=2, max_length=10)
+        for _, prompt, _ in self.get_requests(5):
+            generator.add_request(prompt)
+
+        num_finished = 0
+        while generator.has_unfinished_requests:
+            num_finished += len(generator.step())
+            self.assertLessEqual(generator.num_running, 2)
+            if generator.num_running > 0:
+                # past_key_values only hold the running sequences
+                self.assertEqual(generator._past[0].shape[1], generator.num_running)
+                self.assertEqual(generator._past[0].shape[-2], generator._input_ids.shape[-1] - 1)
+        self.assertEqual(num_finished, 5)
+
+    def test_sample(self):
+        model = self.get_model()
+        generator = ContinuousBatchingGenerator(model, max_batch_size=2, max_length=10, do_sample=True)
+        request_ids = [generator.add_request(prompt) for _, prompt, _ in self.get_requests(4)]
+        outputs = dict(generator)
+        self.assertListEqual(sorted(outputs.keys()), request_ids)
+        for output_ids in outputs.values():
+            self.assertLessEqual(len(output_ids), 10)
+
+    def test_prompt_longer_than_max_length(self):
+        model = self.get_model()
+        generator = ContinuousBatchingGenerator(model, max_length=3)
+        generator.add_request([1, 2, 4, 5], request_id="long")
+        self.assertListEqual([(request_id, ids.tolist()) for request_id, ids in generator], [("long", [1, 2, 4, 5])])
+
+    def test_encoder_decoder_not_supported(self):
+        config = BartConfig(
+            vocab_size=self.vocab_size,
+            d_model=16,
+            encoder_layers=1,
+            decoder_layers=1,
+            encoder_attention_heads=2,
+            decoder_attention_heads=2,
+            encoder_ffn_dim=16,
+            decoder_ffn_dim=16,
+        )
+        with self.assertRaises(ValueError):
+            ContinuousBatchingGenerator(BartForConditionalGeneration(config))
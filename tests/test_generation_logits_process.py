@@ -207,6 +207,28 @@ class LogitsProcessorTest(unittest.TestCase):
             torch.isinf(filtered_scores_3_gram).tolist(), [[False, False, False], [True, False, False]]
         )
 
+    def test_no_repeat_ngram_dist_processor_random(self):
+        vocab_size = 4
+        batch_size = 8
+
+        for ngram_size in range(1, 5):
+            for sequence_length in range(0, 12):
+                input_ids = ids_tensor((batch_size, sequence_length), vocab_size)
+                scores = self._get_uniform_logits(batch_size, vocab_size)
+                filtered_scores = NoRepeatNGramLogitsProcessor(ngram_size)(input_ids, scores.clone())
+
+                # a token is banned if it completes an n-gram that already appeared in the hypothesis
+                for hypo, hypo_scores in zip(input_ids.tolist(), filtered_scores):
+                    prefix = hypo[len(hypo) + 1 - ngram_size :] if ngram_size > 1 else []
+                    banned = {
+                        hypo[i + ngram_size - 1]
+                        for i in range(len(hypo) + 1 - ngram_size)
+                        if len(hypo) + 1 >= ngram_size and hypo[i : i + ngram_size - 1] == prefix
+                    }
+                    self.assertListEqual(
+                        torch.isinf(hypo_scores).tolist(), [token in banned for token in range(vocab_size)]
+                    )
+
     def test_no_bad_words_dist_processor(self):
         vocab_size = 5
         batch_size = 2
@@ -232,6 +254,14 @@ class LogitsProcessorTest(unittest.TestCase):
         filtered_scores = no_bad_words_dist_proc(input_ids, scores.clone())
         self.assertTrue(torch.allclose(scores, filtered_scores, atol=1e-3))
 
+        # check bad words longer than the input
+        no_bad_words_dist_proc = NoBadWordsLogitsProcessor(bad_words_ids=[[0, 1, 0, 1, 2], [0, 2]], eos_token_id=4)
+        filtered_scores = no_bad_words_dist_proc(input_ids[:, :1], scores.clone())
+        self.assertListEqual(
+            torch.isinf(filtered_scores).tolist(),
+            [[False, False, True, False, False], [False, False, True, False, False]],
+        )
+
     def test_processor_list(self):
         batch_size = 4
         sequence_length = 10
@@ -0,0 +1,99 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Team Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a clone of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+
+from transformers import is_torch_available
+from transformers.testing_utils import require_torch, torch_device
+
+from .test_modeling_common import ids_tensor
+
+
+if is_torch_available():
+    import torch
+
+    from transformers import GPT2Config, GPT2LMHeadModel
+    from transformers.generation_prefix_cache import PrefixCache
+
+
+@require_torch
+class PrefixCacheTest(unittest.TestCase):
+    def test_lru_eviction(self):
+        prefix_cache = PrefixCache(max_entries=2)
+        keys = [PrefixCache.make_key("encoder_outputs", torch.tensor([[i]])) for i in range(3)]
+
+        prefix_cache.put(keys[0], torch.zeros(4))
+        prefix_cache.put(keys[1], torch.zeros(4))
+        self.assertIsNotNone(prefix_cache.get(keys[0]))
+        # keys[1] is now the least recently used entry
+        prefix_cache.put(keys[2], torch.zeros(4))
+
+        self.assertEqual(len(prefix_cache), 2)
+        self.assertIsNone(prefix_cache.get(keys[1]))
+        self.assertIsNotNone(prefix_cache.get(keys[0]))
+        self.assertIsNotNone(prefix_cache.get(keys[2]))
+        self.assertEqual((prefix_cache.hits, prefix_cache.misses), (3, 1))
+
+    def test_max_memory(self):
+        prefix_cache = PrefixCache(max_memory=80)
+        keys = [PrefixCache.make_key("encoder_outputs", torch.tensor([[i]])) for i in range(3)]
+
+        prefix_cache.put(keys[0], torch.zeros(10, dtype=torch.float32))
+        prefix_cache.put(keys[1], (torch.zeros(5, dtype=torch.float32),))
+        self.assertEqual(prefix_cache.memory_usage, 60)
+        prefix_cache.put(keys[2], {"a": torch.zeros(10, dtype=torch.float32)})
+
+        self.assertEqual(prefix_cache.memory_usage, 60)
+        self.assertIsNone(prefix_cache.get(keys[0]))
+
+        prefix_cache.clear()
+        self.assertEqual(len(prefix_cache), 0)
+        self.assertEqual(prefix_cache.memory_usage, 0)
+
+    def test_make_key(self):
+        input_ids = torch.tensor([[1, 2, 3]])
+        key = PrefixCache.make_key("encoder_outputs", input_ids, attention_mask=torch.ones_like(input_ids))
+
+        self.assertEqual(
+            key, PrefixCache.make_key("encoder_outputs", input_ids.clone(), attention_mask=torch.ones_like(input_ids))
+        )
+        self.assertNotEqual(key, PrefixCache.make_key("encoder_outputs", input_ids))
+        self.assertNotEqual(key, PrefixCache.make_key("past_key_values", input_ids, attention_mask=torch.ones(1, 3)))
+
+    def test_longest_prefix(self):
+        torch.manual_seed(0)
+        config = GPT2Config(vocab_size=20, n_embd=16, n_layer=2, n_head=2, n_positions=32)
+        model = GPT2LMHeadModel(config).to(torch_device).eval()
+        prefix_cache = PrefixCache()
+
+        prompt_ids = ids_tensor((2, 6), config.vocab_size)
+        first_ids = torch.cat([prompt_ids, ids_tensor((2, 3), config.vocab_size)], dim=-1)
+        second_ids = torch.cat([prompt_ids, ids_tensor((2, 4), config.vocab_size)], dim=-1)
+
+        # caches the past of the prompt only
+        model.generate(prompt_ids, max_length=prompt_ids.shape[-1] + 1, prefix_cache=prefix_cache)
+        for input_ids in (first_ids, second_ids):
+            output_ids = model.generate(input_ids, max_length=16)
+            output_ids_cached = model.generate(input_ids, max_length=16, prefix_cache=prefix_cache)
+            self.assertListEqual(output_ids.tolist(), output_ids_cached.tolist())
+
+        prefix_length, _ = prefix_cache.get_longest_prefix(second_ids, torch.ones_like(second_ids))
+        self.assertEqual(prefix_length, second_ids.shape[-1] - 1)
+        prefix_length, _ = prefix_cache.get_longest_prefix(
+            torch.cat([first_ids[:, :-1], second_ids[:, -3:]], dim=-1), torch.ones(2, 11, dtype=torch.long)
+        )
+        self.assertEqual(prefix_length, first_ids.shape[-1] - 1)
+        self.assertEqual((prefix_cache.hits, prefix_cache.misses), (4, 1))
@@ -35,6 +35,8 @@ if is_torch_available():
         TopKLogitsWarper,
         TopPLogitsWarper,
     )
+    from transformers.generation_prefix_cache import PrefixCache
+    from transformers.generation_utils import GenerationMixin
 
 
 class GenerationTesterMixin:
@@ -390,6 +392,166 @@ class GenerationTesterMixin:
                 )
             self.assertListEqual(output_ids_generate.tolist(), output_ids_beam_sample.tolist())
 
+    def test_generate_stream(self):
+        for model_class in self.all_generative_model_classes:
+            config, input_ids, attention_mask, max_length = self._get_input_ids_and_config()
+
+            model = model_class(config).to(torch_device)
+            model.eval()
+
+            if model.config.is_encoder_decoder:
+                max_length = 4
+            generate_kwargs = {"attention_mask": attention_mask, "do_sample": False, "max_length": max_length}
+
+            output_ids_generate = model.generate(input_ids, num_beams=1, **generate_kwargs)
+
+            # check that the streamer gets the sequences generated so far after each step
+            streamed_ids = []
+            output_ids_streamer = model.generate(
+                input_ids, num_beams=1, streamer=streamed_ids.append, **generate_kwargs
+            )
+            self.assertListEqual(output_ids_streamer.tolist(), output_ids_generate.tolist())
+            self.assertListEqual(streamed_ids[-1].tolist(), output_ids_generate.tolist())
+            for previous_ids, current_ids in zip(streamed_ids[:-1], streamed_ids[1:]):
+                self.assertListEqual(current_ids[:, :-1].tolist(), previous_ids.tolist())
+
+            # check that `generate_stream()` yields the same sequences
+            stream = list(model.generate_stream(input_ids, num_beams=1, **generate_kwargs))
+            self.assertListEqual([ids.tolist() for ids in stream], [ids.tolist() for ids in streamed_ids])
+
+            # with beam search, the best beams are streamed and the final output of `generate()` is yielded last
+            output_ids_generate = model.generate(input_ids, num_beams=2, **generate_kwargs)
+            stream = list(model.generate_stream(input_ids, num_beams=2, **generate_kwargs))
+            self.assertEqual(stream[0].shape[0], input_ids.shape[0])
+            self.assertListEqual(stream[-1].tolist(), output_ids_generate.tolist())
+
+            # closing the stream early stops generation
+            stream = model.generate_stream(input_ids, num_beams=1, **generate_kwargs)
+            next(stream)
+            stream.close()
+
+    def test_tensorized_beam_search_generate(self):
+        for model_class in self.all_generative_model_classes:
+            config, input_ids, attention_mask, max_length = self._get_input_ids_and_config()
+            logits_process_kwargs, _ = self._get_logits_processor_and_kwargs(input_ids.shape[-1], config.eos_token_id)
+
+            model = model_class(config).to(torch_device)
+            model.eval()
+
+            if model.config.is_encoder_decoder:
+                max_length = 4
+            generate_kwargs = {
+                "attention_mask": attention_mask,
+                "do_sample": False,
+                "max_length": max_length,
+                "num_beams": 2,
+                "num_return_sequences": 2,
+                "length_penalty": 2.0,
+                **logits_process_kwargs,
+            }
+
+            output_ids_generate = model.generate(input_ids, **generate_kwargs)
+            output_ids_tensorized = model.generate(input_ids, tensorized_beam_search=True, **generate_kwargs)
+            self.assertListEqual(output_ids_generate.tolist(), output_ids_tensorized.tolist())
+
+    def test_static_cache_generate(self):
+        for model_class in self.all_generative_model_classes:
+            config, input_ids, attention_mask, max_length = self._get_input_ids_and_config()
+
+            model = model_class(config).to(torch_device)
+            model.eval()
+
+            if model.config.is_encoder_decoder:
+                max_length = 4
+
+            if model_class._init_static_cache is GenerationMixin._init_static_cache:
+                with self.assertRaises(ValueError):
+                    model.generate(input_ids, max_length=max_length, use_static_cache=True)
+                continue
+
+            for num_beams in (1, 2):
+                generate_kwargs = {
+                    "attention_mask": attention_mask,
+                    "do_sample": False,
+                    "max_length": max_length,
+                    "num_beams": num_beams,
+                }
+                output_ids_generate = model.generate(input_ids, **generate_kwargs)
+                output_ids_static = model.generate(input_ids, use_static_cache=True, **generate_kwargs)
+                self.assertListEqual(output_ids_generate.tolist(), output_ids_static.tolist())
+
+    def test_prefix_cache_generate(self):
+        for model_class in self.all_generative_model_classes:
+            config, input_ids, attention_mask, max_length = self._get_input_ids_and_config()
+
+            model = model_class(config).to(torch_device)
+            model.eval()
+
+            if model.config.is_encoder_decoder:
+                max_length = 4
+            generate_kwargs = {"attention_mask": attention_mask, "do_sample": False, "max_length": max_length}
+            output_ids_generate = model.generate(input_ids, **generate_kwargs)
+
+            prefix_cache = PrefixCache()
+            try:
+                output_ids_miss = model.generate(input_ids, prefix_cache=prefix_cache, **generate_kwargs)
+            except ValueError:
+                # decoder-only models without past key values cannot use a prefix cache
+                self.assertFalse(model.config.is_encoder_decoder)
+                continue
+            output_ids_hit = model.generate(input_ids, prefix_cache=prefix_cache, num_beams=2, **generate_kwargs)
+            output_ids_beam = model.generate(input_ids, num_beams=2, **generate_kwargs)
+
+            self.assertEqual((prefix_cache.hits, prefix_cache.misses), (1, 1))
+            self.assertListEqual(output_ids_generate.tolist(), output_ids_miss.tolist())
+            self.assertListEqual(output_ids_beam.tolist(), output_ids_hit.tolist())
+
+    def test_speculative_generate(self):
+        for model_class in self.all_generative_model_classes:
+            config, input_ids, attention_mask, max_length = self._get_input_ids_and_config()
+            # speculative decoding only supports a batch size of 1
+            input_ids, attention_mask = input_ids[:1], attention_mask[:1]
+
+            torch.manual_seed(0)
+            model = model_class(config).to(torch_device)
+            model.eval()
+            assistant_model = model_class(config).to(torch_device)
+            assistant_model.eval()
+
+            if model.config.is_encoder_decoder:
+                max_length = 4
+            generate_kwargs = {"attention_mask": attention_mask, "max_length": max_length}
+            output_ids_greedy = model.generate(input_ids, do_sample=False, num_beams=1, **generate_kwargs)
+
+            if not model_class._supports_speculative_decoding:
+                with self.assertRaises(ValueError):
+                    model.generate(input_ids, assistant_model=assistant_model, **generate_kwargs)
+                continue
+
+            output_ids_speculative = model.generate(
+                input_ids,
+                do_sample=False,
+                num_beams=1,
+                assistant_model=assistant_model,
+                num_assistant_tokens=2,
+                **generate_kwargs,
+            )
+            self.assertListEqual(output_ids_greedy.tolist(), output_ids_speculative.tolist())
+
+            output_ids_sample = model.generate(
+                input_ids,
+                do_sample=True,
+                num_beams=1,
+                assistant_model=assistant_model,
+                num_assistant_tokens=2,
+                **generate_kwargs,
+            )
+            self.assertEqual(output_ids_sample.shape[0], 1)
+            self.assertLessEqual(output_ids_sample.shape[-1], max_length)
+
+            with self.assertRaises(ValueError):
+                model.generate(input_ids, num_beams=2, assistant_model=assistant_model, **generate_kwargs)
+
         def test_generate_without_input_ids(self):
             config, _, _, max_length = self._get_input_ids_and_config()
 
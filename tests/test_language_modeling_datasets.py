@@ -0,0 +1,84 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Team Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a clone of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import pickle
+import tempfile
+import unittest
+
+from transformers import is_torch_available
+from transformers.testing_utils import require_torch
+
+from .test_tokenized_cache import PATH_SAMPLE_TEXT, get_tokenizer
+
+
+if is_torch_available():
+    from transformers import LineByLineTextDataset, LineByLineWithRefDataset, TextDatasetForNextSentencePrediction
+    from transformers.data.datasets.language_modeling import TextFileLines
+
+
+@require_torch
+class LanguageModelingDatasetsTest(unittest.TestCase):
+    def test_text_file_lines(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            file_path = os.path.join(tmpdirname, "text.txt")
+            with open(file_path, "w", encoding="utf-8", newline="") as f:
+                f.write("first line\r\n\n  \nsecond línea\n　\nthird")
+
+            lines = TextFileLines(file_path)
+            self.assertListEqual(list(lines), ["first line", "second línea", "third"])
+            self.assertEqual(lines[-1], "third")
+            self.assertListEqual(pickle.loads(pickle.dumps(lines))[1:], ["second línea", "third"])
+            self.assertEqual(len(TextFileLines(file_path, skip_blank_lines=False)), 6)
+
+            cached_lines = TextFileLines(file_path, cache_dir=tmpdirname)
+            cached_lines = TextFileLines(file_path, cache_dir=tmpdirname)
+            self.assertListEqual(list(pickle.loads(pickle.dumps(cached_lines))), list(lines))
+
+    def test_lazy_line_by_line_datasets(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = get_tokenizer(tmpdirname)
+            dataset = LineByLineTextDataset(tokenizer, file_path=PATH_SAMPLE_TEXT, block_size=8)
+            lazy_dataset = LineByLineTextDataset(tokenizer, file_path=PATH_SAMPLE_TEXT, block_size=8, lazy=True)
+            self.assertEqual(len(dataset), len(lazy_dataset))
+            for i in range(len(dataset)):
+                self.assertListEqual(dataset[i]["input_ids"].tolist(), lazy_dataset[i]["input_ids"].tolist())
+
+            ref_path = os.path.join(tmpdirname, "ref.txt")
+            with open(ref_path, "w", encoding="utf-8") as f:
+                f.write("".join(json.dumps(list(range(i % 3))) + "\n" for i in range(len(dataset))))
+            dataset = LineByLineWithRefDataset(tokenizer, PATH_SAMPLE_TEXT, 8, ref_path)
+            lazy_dataset = LineByLineWithRefDataset(tokenizer, PATH_SAMPLE_TEXT, 8, ref_path, lazy=True)
+            for i in range(len(dataset)):
+                self.assertEqual(str(dataset[i]), str(lazy_dataset[i]))
+            self.assertListEqual(dataset[2]["chinese_ref"].tolist(), [0, 1])
+
+    def test_text_dataset_for_next_sentence_prediction(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = get_tokenizer(tmpdirname)
+            dataset = TextDatasetForNextSentencePrediction(
+                tokenizer, file_path=PATH_SAMPLE_TEXT, block_size=16, cache_dir=tmpdirname
+            )
+            cached_dataset = TextDatasetForNextSentencePrediction(
+                tokenizer, file_path=PATH_SAMPLE_TEXT, block_size=16, cache_dir=tmpdirname
+            )
+            self.assertGreater(len(dataset), 0)
+            self.assertEqual(len(dataset), len(cached_dataset))
+            for i in range(len(dataset)):
+                example = dataset[i]
+                self.assertEqual(str(example), str(cached_dataset[i]))
+                self.assertEqual(example["input_ids"].shape, example["token_type_ids"].shape)
+                self.assertIn(example["next_sentence_label"].item(), [0, 1])
@@ -15,6 +15,7 @@
 
 import copy
 import inspect
+import json
 import os.path
 import random
 import tempfile
@@ -22,7 +23,7 @@ import unittest
 from typing import List, Tuple
 
 from transformers import is_torch_available
-from transformers.file_utils import WEIGHTS_NAME
+from transformers.file_utils import MMAP_WEIGHTS_NAME, WEIGHTS_INDEX_NAME, WEIGHTS_NAME
 from transformers.testing_utils import require_torch, require_torch_multi_gpu, slow, torch_device
 
 
@@ -156,6 +157,123 @@ class ModelTesterMixin:
                 for k in _keys_to_ignore_on_save:
                     self.assertNotIn(k, state_dict_saved)
 
+    def test_save_load_low_cpu_mem_usage(self):
+        config, _ = self.model_tester.prepare_config_and_inputs_for_common()
+
+        for model_class in self.all_model_classes:
+            model = model_class(config)
+            with tempfile.TemporaryDirectory() as tmpdirname:
+                model.save_pretrained(tmpdirname)
+                new_model = model_class.from_pretrained(tmpdirname, low_cpu_mem_usage=True)
+
+            state_dict = model.state_dict()
+            new_state_dict = new_model.state_dict()
+            self.assertListEqual(list(state_dict.keys()), list(new_state_dict.keys()))
+            for key, value in state_dict.items():
+                self.assertTrue(torch.equal(value, new_state_dict[key]), msg=f"{key} of {model_class} differs")
+
+            # the weights of the head missing from a base model checkpoint are initialized
+            configs_no_init = _config_zero_init(config)
+            model = model_class(configs_no_init)
+            if model.base_model is model:
+                continue
+            with tempfile.TemporaryDirectory() as tmpdirname:
+                model.base_model.save_pretrained(tmpdirname)
+                new_model, loading_info = model_class.from_pretrained(
+                    tmpdirname, low_cpu_mem_usage=True, output_loading_info=True
+                )
+            parameters = dict(new_model.named_parameters())
+            for key in loading_info["missing_keys"]:
+                if key in parameters and parameters[key].requires_grad:
+                    self.assertIn(
+                        ((parameters[key].data.mean() * 1e9).round() / 1e9).item(),
+                        [0.0, 1.0],
+                        msg="Parameter {} of model {} seems not properly initialized".format(key, model_class),
+                    )
+
+    def test_save_load_sharded_checkpoint(self):
+        config, _ = self.model_tester.prepare_config_and_inputs_for_common()
+
+        for model_class in self.all_model_classes:
+            model = model_class(config)
+            state_dict = model.state_dict()
+            max_shard_size = sum(value.numel() * value.element_size() for value in state_dict.values()) // 3
+
+            with tempfile.TemporaryDirectory() as tmpdirname:
+                model.save_pretrained(tmpdirname, max_shard_size=max_shard_size, num_threads=2)
+                self.assertFalse(os.path.isfile(os.path.join(tmpdirname, WEIGHTS_NAME)))
+                with open(os.path.join(tmpdirname, WEIGHTS_INDEX_NAME), encoding="utf-8") as f:
+                    index = json.load(f)
+                shard_files = set(index["weight_map"].values())
+                self.assertGreaterEqual(len(shard_files), 3)
+                for shard_file in shard_files:
+                    self.assertTrue(os.path.isfile(os.path.join(tmpdirname, shard_file)))
+
+                for low_cpu_mem_usage in [False, True]:
+                    new_model, loading_info = model_class.from_pretrained(
+                        tmpdirname, low_cpu_mem_usage=low_cpu_mem_usage, output_loading_info=True
+                    )
+                    self.assertListEqual(loading_info["unexpected_keys"], [])
+                    new_state_dict = new_model.state_dict()
+                    for key, value in state_dict.items():
+                        self.assertTrue(torch.equal(value, new_state_dict[key]), msg=f"{key} of {model_class} differs")
+
+                # saving in a single file again removes the shards
+                model.save_pretrained(tmpdirname)
+                self.assertTrue(os.path.isfile(os.path.join(tmpdirname, WEIGHTS_NAME)))
+                self.assertFalse(os.path.isfile(os.path.join(tmpdirname, WEIGHTS_INDEX_NAME)))
+                for shard_file in shard_files:
+                    self.assertFalse(os.path.isfile(os.path.join(tmpdirname, shard_file)))
+
+            # the missing keys of a head model loaded from a sharded base model are the same as with a single file
+            if model.base_model is model:
+                continue
+            with tempfile.TemporaryDirectory() as tmpdirname:
+                model.base_model.save_pretrained(tmpdirname)
+                _, loading_info = model_class.from_pretrained(tmpdirname, output_loading_info=True)
+                model.base_model.save_pretrained(tmpdirname, max_shard_size=max_shard_size)
+                _, sharded_loading_info = model_class.from_pretrained(tmpdirname, output_loading_info=True)
+            self.assertListEqual(sorted(loading_info["missing_keys"]), sorted(sharded_loading_info["missing_keys"]))
+
+    def test_save_load_mmap_format(self):
+        config, _ = self.model_tester.prepare_config_and_inputs_for_common()
+
+        for model_class in self.all_model_classes:
+            model = model_class(config)
+            state_dict = model.state_dict()
+
+            with tempfile.TemporaryDirectory() as tmpdirname:
+                model.save_pretrained(tmpdirname, mmap_format=True)
+                self.assertTrue(os.path.isfile(os.path.join(tmpdirname, MMAP_WEIGHTS_NAME)))
+                self.assertFalse(os.path.isfile(os.path.join(tmpdirname, WEIGHTS_NAME)))
+
+                new_model, loading_info = model_class.from_pretrained(tmpdirname, output_loading_info=True)
+                self.assertListEqual(loading_info["unexpected_keys"], [])
+                new_state_dict = new_model.state_dict()
+                for key, value in state_dict.items():
+                    self.assertTrue(torch.equal(value, new_state_dict[key]), msg=f"{key} of {model_class} differs")
+
+                # the weights are mapped copy-on-write: modifying them does not change the checkpoint
+                with torch.no_grad():
+                    for param in new_model.parameters():
+                        param.add_(1.0)
+                reloaded_state_dict = model_class.from_pretrained(tmpdirname).state_dict()
+                for key, value in state_dict.items():
+                    self.assertTrue(
+                        torch.equal(value, reloaded_state_dict[key]), msg=f"{key} of {model_class} differs"
+                    )
+
+                # saving a mapped model back to where it was loaded from replaces the file it is mapped from
+                new_state_dict = new_model.state_dict()
+                new_model.save_pretrained(tmpdirname, mmap_format=True)
+                reloaded_state_dict = model_class.from_pretrained(tmpdirname).state_dict()
+                for key, value in new_state_dict.items():
+                    if key in (model._keys_to_ignore_on_save or []):
+                        continue
+                    self.assertTrue(
+                        torch.equal(value, reloaded_state_dict[key]), msg=f"{key} of {model_class} differs"
+                    )
+
     def test_initialization(self):
         config, inputs_dict = self.model_tester.prepare_config_and_inputs_for_common()
 
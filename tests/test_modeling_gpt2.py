@@ -458,6 +458,20 @@ class GPT2ModelTest(ModelTesterMixin, GenerationTesterMixin, unittest.TestCase):
         config_and_inputs = self.model_tester.prepare_config_and_inputs(gradient_checkpointing=True)
         self.model_tester.create_and_check_forward_and_backwards(*config_and_inputs)
 
+    def test_gpt2_static_cache_present(self):
+        config, input_ids, *_ = self.model_tester.prepare_config_and_inputs()
+        model = GPT2LMHeadModel(config).to(torch_device).eval()
+        static_cache = model._init_static_cache(input_ids.shape[0], input_ids.shape[1] + 1)
+        outputs = model.transformer(input_ids, past_key_values=static_cache, use_cache=True)
+
+        # the attention layers write into the cache in place and return its layers as they are, without copying them
+        layer_outputs = model.transformer.h[0].attn(
+            outputs.last_hidden_state[:, -1:], layer_past=static_cache.layers[0], use_cache=True
+        )
+        self.assertIs(outputs.past_key_values, static_cache)
+        self.assertIs(layer_outputs[1], static_cache.layers[0])
+        self.assertEqual(static_cache.layers[0].seq_length, input_ids.shape[1] + 1)
+
     @slow
     def test_batch_generation(self):
         model = GPT2LMHeadModel.from_pretrained("gpt2")
@@ -0,0 +1,137 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Team Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a clone of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+
+from transformers import is_torch_available
+from transformers.testing_utils import require_torch
+
+
+if is_torch_available():
+    import torch
+
+    from transformers import (
+        MMAP_WEIGHTS_NAME,
+        WEIGHTS_INDEX_NAME,
+        BertConfig,
+        BertModel,
+        load_mmap_checkpoint,
+        save_mmap_checkpoint,
+    )
+    from transformers.convert_pytorch_checkpoint_to_mmap import convert_pytorch_model_to_mmap
+    from transformers.modeling_mmap_utils import convert_pytorch_checkpoint_to_mmap, is_mmap_checkpoint
+
+
+@require_torch
+class MmapCheckpointTest(unittest.TestCase):
+    def test_save_and_load(self):
+        weight = torch.randn(4, 3)
+        state_dict = OrderedDict(
+            [
+                ("weight", weight),
+                ("tied_weight", weight),
+                ("transposed", torch.randn(3, 5).t()),
+                ("half", torch.randn(7).half()),
+                ("bfloat16", torch.randn(2, 2).to(torch.bfloat16)),
+                ("ids", torch.arange(5)),
+                ("mask", torch.tensor([True, False])),
+                ("scalar", torch.tensor(2.0)),
+                ("empty", torch.zeros(0, 3)),
+            ]
+        )
+        state_dict._metadata = {"": {"version": 1}}
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            checkpoint_file = os.path.join(tmpdirname, "checkpoint.mmap")
+            save_mmap_checkpoint(state_dict, checkpoint_file)
+            self.assertTrue(is_mmap_checkpoint(checkpoint_file))
+
+            loaded = load_mmap_checkpoint(checkpoint_file)
+            self.assertListEqual(list(loaded.keys()), list(state_dict.keys()))
+            self.assertEqual(loaded._metadata, {"": {"version": 1}})
+            for key, value in state_dict.items():
+                self.assertEqual(loaded[key].dtype, value.dtype)
+                self.assertTrue(torch.equal(loaded[key], value), msg=f"{key} differs")
+            # tied tensors are stored once
+            self.assertEqual(loaded["weight"].data_ptr(), loaded["tied_weight"].data_ptr())
+
+    def test_copy_on_write(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            checkpoint_file = os.path.join(tmpdirname, "checkpoint.mmap")
+            save_mmap_checkpoint({"weight": torch.zeros(16)}, checkpoint_file)
+
+            loaded = load_mmap_checkpoint(checkpoint_file)
+            loaded["weight"].add_(1.0)
+            self.assertTrue(torch.equal(loaded["weight"], torch.ones(16)))
+            self.assertTrue(torch.equal(load_mmap_checkpoint(checkpoint_file)["weight"], torch.zeros(16)))
+
+    def test_save_over_mapped_file(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            checkpoint_file = os.path.join(tmpdirname, "checkpoint.mmap")
+            save_mmap_checkpoint({"weight": torch.arange(1024.0), "bias": torch.zeros(3)}, checkpoint_file)
+
+            # the loaded tensors are read from the file while it is saved again
+            loaded = load_mmap_checkpoint(checkpoint_file)
+            loaded["bias"].add_(1.0)
+            save_mmap_checkpoint(loaded, checkpoint_file)
+            self.assertTrue(torch.equal(loaded["weight"], torch.arange(1024.0)))
+            self.assertListEqual(os.listdir(tmpdirname), ["checkpoint.mmap"])
+
+            reloaded = load_mmap_checkpoint(checkpoint_file)
+            self.assertTrue(torch.equal(reloaded["weight"], torch.arange(1024.0)))
+            self.assertTrue(torch.equal(reloaded["bias"], torch.ones(3)))
+
+    def test_convert_pytorch_checkpoint(self):
+        state_dict = {"weight": torch.randn(4, 3), "bias": torch.randn(3)}
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            pytorch_checkpoint_file = os.path.join(tmpdirname, "pytorch_model.bin")
+            mmap_checkpoint_file = os.path.join(tmpdirname, "pytorch_model.mmap")
+            torch.save(state_dict, pytorch_checkpoint_file)
+            self.assertFalse(is_mmap_checkpoint(pytorch_checkpoint_file))
+
+            convert_pytorch_checkpoint_to_mmap(pytorch_checkpoint_file, mmap_checkpoint_file)
+            loaded = load_mmap_checkpoint(mmap_checkpoint_file)
+            for key, value in state_dict.items():
+                self.assertTrue(torch.equal(loaded[key], value))
+
+            with self.assertRaises(ValueError):
+                load_mmap_checkpoint(pytorch_checkpoint_file)
+
+    def test_convert_model_directory_in_place(self):
+        config = BertConfig(
+            vocab_size=99, hidden_size=32, num_hidden_layers=2, num_attention_heads=4, intermediate_size=37
+        )
+        model = BertModel(config)
+        for max_shard_size in [None, 20000]:
+            with tempfile.TemporaryDirectory() as tmpdirname:
+                model.save_pretrained(tmpdirname, max_shard_size=max_shard_size)
+                convert_pytorch_model_to_mmap(tmpdirname, tmpdirname)
+                if max_shard_size is None:
+                    self.assertTrue(os.path.isfile(os.path.join(tmpdirname, MMAP_WEIGHTS_NAME)))
+                else:
+                    with open(os.path.join(tmpdirname, WEIGHTS_INDEX_NAME), encoding="utf-8") as f:
+                        shard_files = set(json.load(f)["weight_map"].values())
+                    self.assertGreater(len(shard_files), 1)
+                    for shard_file in shard_files:
+                        self.assertTrue(is_mmap_checkpoint(os.path.join(tmpdirname, shard_file)))
+
+                new_model = BertModel.from_pretrained(tmpdirname)
+                new_state_dict = new_model.state_dict()
+                for key, value in model.state_dict().items():
+                    self.assertTrue(torch.equal(value, new_state_dict[key]), msg=f"{key} differs")
@@ -1,8 +1,25 @@
+import os
+import tempfile
 import unittest
 
+from transformers import BertConfig, BertTokenizer, is_torch_available
+from transformers.pipelines import (
+    FeatureExtractionPipeline,
+    FillMaskPipeline,
+    QuestionAnsweringPipeline,
+    TextClassificationPipeline,
+)
+from transformers.testing_utils import require_torch
+
 from .test_pipelines_common import MonoInputPipelineCommonMixin
 
 
+if is_torch_available():
+    import torch
+
+    from transformers import BertForMaskedLM, BertForQuestionAnswering, BertForSequenceClassification, BertModel
+
+
 class FeatureExtractionPipelineTests(MonoInputPipelineCommonMixin, unittest.TestCase):
     pipeline_task = "feature-extraction"
     small_models = [
@@ -10,3 +27,94 @@ class FeatureExtractionPipelineTests(MonoInputPipelineCommonMixin, unittest.Test
     ]  # Default model - Models tested without the @slow decorator
     large_models = [None]  # Models tested with the @slow decorator
     mandatory_keys = {}  # Keys which should be in the output
+
+
+@require_torch
+class MicroBatchingPipelineTests(unittest.TestCase):
+    inputs = [
+        "the quick brown fox",
+        "jumps",
+        "over the lazy dog and the quick brown fox jumps again",
+        "the dog",
+        "a fox jumps over the dog",
+    ]
+
+    def setUp(self):
+        vocab_tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "a", "again", "and"]
+        vocab_tokens += ["brown", "dog", "fox", "jumps", "lazy", "over", "quick", "the"]
+        self.tmpdirname = tempfile.mkdtemp()
+        vocab_file = os.path.join(self.tmpdirname, "vocab.txt")
+        with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+            vocab_writer.write("".join([x + "\n" for x in vocab_tokens]))
+        self.tokenizer = BertTokenizer(vocab_file)
+        self.config = BertConfig(
+            vocab_size=len(vocab_tokens),
+            hidden_size=16,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=32,
+            num_labels=3,
+        )
+
+    def test_micro_batches(self):
+        model = BertModel(self.config).eval()
+        nlp = FeatureExtractionPipeline(model=model, tokenizer=self.tokenizer, batch_size=2, max_tokens_per_batch=20)
+        lengths = torch.tensor([6, 3, 13, 4, 8]).numpy()
+        batches = [indices.tolist() for indices in nlp._micro_batches(lengths)]
+        self.assertListEqual(batches, [[2], [4, 0], [3, 1]])
+
+    def test_feature_extraction_matches_full_batch(self):
+        torch.manual_seed(0)
+        model = BertModel(self.config).eval()
+        nlp = FeatureExtractionPipeline(model=model, tokenizer=self.tokenizer)
+        nlp_batched = FeatureExtractionPipeline(model=model, tokenizer=self.tokenizer, batch_size=2)
+
+        expected = nlp(self.inputs)
+        outputs = nlp_batched(self.inputs)
+        lengths = self.tokenizer(self.inputs, padding=True, return_tensors="pt")["attention_mask"].sum(-1)
+
+        self.assertEqual(len(outputs), len(self.inputs))
+        for features, expected_features, length in zip(outputs, expected, lengths.tolist()):
+            self.assertEqual(len(features), len(expected_features))
+            self.assertTrue(
+                torch.allclose(torch.tensor(features[:length]), torch.tensor(expected_features[:length]), atol=1e-5)
+            )
+
+    def test_text_classification_order(self):
+        torch.manual_seed(0)
+        model = BertForSequenceClassification(self.config).eval()
+        nlp = TextClassificationPipeline(model=model, tokenizer=self.tokenizer, return_all_scores=True)
+        nlp_batched = TextClassificationPipeline(
+            model=model, tokenizer=self.tokenizer, return_all_scores=True, max_tokens_per_batch=16
+        )
+
+        expected = nlp(self.inputs)
+        outputs = nlp_batched(self.inputs)
+        for scores, expected_scores in zip(outputs, expected):
+            for score, expected_score in zip(scores, expected_scores):
+                self.assertEqual(score["label"], expected_score["label"])
+                self.assertAlmostEqual(score["score"], expected_score["score"], places=5)
+
+    def test_fill_mask_matches_full_batch(self):
+        torch.manual_seed(0)
+        model = BertForMaskedLM(self.config).eval()
+        inputs = ["the quick brown [MASK]", "[MASK]", "over the lazy dog and the [MASK] brown fox jumps again"]
+        nlp = FillMaskPipeline(model=model, tokenizer=self.tokenizer, top_k=3)
+        nlp_batched = FillMaskPipeline(model=model, tokenizer=self.tokenizer, top_k=3, batch_size=2)
+
+        expected = nlp(inputs)
+        outputs = nlp_batched(inputs)
+        for result, expected_result in zip(outputs, expected):
+            self.assertListEqual([r["token"] for r in result], [r["token"] for r in expected_result])
+            for r, expected_r in zip(result, expected_result):
+                self.assertAlmostEqual(r["score"], expected_r["score"], places=5)
+
+    def test_unsupported_batch_size(self):
+        model = BertForQuestionAnswering(self.config)
+        with self.assertRaises(ValueError):
+            QuestionAnsweringPipeline(model=model, tokenizer=self.tokenizer, batch_size=2)
+
+    def test_invalid_batch_size(self):
+        model = BertModel(self.config)
+        with self.assertRaises(ValueError):
+            FeatureExtractionPipeline(model=model, tokenizer=self.tokenizer, batch_size=0)
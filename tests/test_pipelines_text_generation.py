@@ -1,10 +1,21 @@
+import os
+import tempfile
 import unittest
+import unittest.mock
 
-from transformers import pipeline
+from transformers import BertTokenizer, CTRLConfig, GPT2Config, XLNetConfig, is_torch_available, pipeline
+from transformers.pipelines import TextGenerationPipeline
+from transformers.testing_utils import require_torch
 
 from .test_pipelines_common import MonoInputPipelineCommonMixin
 
 
+if is_torch_available():
+    import torch
+
+    from transformers import CTRLLMHeadModel, GPT2LMHeadModel, TransfoXLConfig, TransfoXLLMHeadModel, XLNetLMHeadModel
+
+
 class TextGenerationPipelineTests(MonoInputPipelineCommonMixin, unittest.TestCase):
     pipeline_task = "text-generation"
     pipeline_running_kwargs = {"prefix": "This is "}
@@ -27,3 +38,70 @@ class TextGenerationPipelineTests(MonoInputPipelineCommonMixin, unittest.TestCas
         self.assertEqual(type(outputs[0][0]["generated_text"]), str)
         self.assertEqual(list(outputs[1][0].keys()), ["generated_text"])
         self.assertEqual(type(outputs[1][0]["generated_text"]), str)
+
+
+@require_torch
+class BatchedTextGenerationPipelineTests(unittest.TestCase):
+    prompts = ["the quick brown fox", "a dog", "over the lazy dog and the fox", "the dog jumps"]
+
+    def setUp(self):
+        vocab_tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "a", "again", "and"]
+        vocab_tokens += ["brown", "dog", "fox", "jumps", "lazy", "over", "quick", "the"]
+        self.tmpdirname = tempfile.mkdtemp()
+        vocab_file = os.path.join(self.tmpdirname, "vocab.txt")
+        with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+            vocab_writer.write("".join([x + "\n" for x in vocab_tokens]))
+        self.tokenizer = BertTokenizer(vocab_file)
+        self.vocab_size = len(vocab_tokens)
+
+    def _check_batched_generation(self, model, expected_num_generate_calls, **generate_kwargs):
+        torch.manual_seed(0)
+        model.eval()
+        nlp = TextGenerationPipeline(model=model, tokenizer=self.tokenizer)
+        nlp_batched = TextGenerationPipeline(model=model, tokenizer=self.tokenizer, batch_size=3)
+        generate_kwargs.update(prefix="", max_length=12, do_sample=False, return_tensors=True)
+
+        expected = nlp(self.prompts, **generate_kwargs)
+        with unittest.mock.patch.object(model, "generate", wraps=model.generate) as mock_generate:
+            outputs = nlp_batched(self.prompts, **generate_kwargs)
+            self.assertEqual(mock_generate.call_count, expected_num_generate_calls)
+
+        self.assertListEqual(outputs, expected)
+
+    def test_gpt2_batched_generation(self):
+        config = GPT2Config(vocab_size=self.vocab_size, n_embd=16, n_layer=2, n_head=2, n_positions=32, n_ctx=32)
+        self._check_batched_generation(GPT2LMHeadModel(config), expected_num_generate_calls=2)
+
+    def test_gpt2_batched_generation_eos_and_min_length(self):
+        config = GPT2Config(vocab_size=self.vocab_size, n_embd=16, n_layer=2, n_head=2, n_positions=32, n_ctx=32)
+        model = GPT2LMHeadModel(config)
+        # Only "the quick brown fox" and "over the lazy dog and the fox" are at least min_length long
+        self._check_batched_generation(
+            model, expected_num_generate_calls=3, eos_token_id=13, pad_token_id=0, min_length=4
+        )
+
+    def test_ctrl_batched_generation(self):
+        config = CTRLConfig(
+            vocab_size=self.vocab_size, n_embd=16, n_layer=2, n_head=2, dff=32, n_positions=32, n_ctx=32
+        )
+        self._check_batched_generation(CTRLLMHeadModel(config), expected_num_generate_calls=2)
+
+    def test_xlnet_batched_generation(self):
+        config = XLNetConfig(vocab_size=self.vocab_size, d_model=16, n_layer=2, n_head=2, d_inner=32)
+        self._check_batched_generation(XLNetLMHeadModel(config), expected_num_generate_calls=2)
+
+    def test_transfo_xl_batches_same_length_prompts(self):
+        config = TransfoXLConfig(
+            vocab_size=self.vocab_size,
+            cutoffs=[8],
+            d_model=16,
+            d_embed=16,
+            n_head=2,
+            d_head=8,
+            d_inner=32,
+            div_val=1,
+            n_layer=2,
+            mem_len=16,
+        )
+        # "a dog" and "the dog jumps" are the only prompts sharing a length, but they end up in different batches
+        self._check_batched_generation(TransfoXLLMHeadModel(config), expected_num_generate_calls=4)
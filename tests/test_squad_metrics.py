@@ -0,0 +1,90 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Team Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a clone of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from transformers import BertTokenizer, SquadExample, SquadFeatureStore, squad_convert_examples_to_features
+from transformers.data.metrics.squad_metrics import compute_predictions_logits, select_best_spans
+from transformers.data.processors.squad import SquadResult
+
+
+class SquadMetricsTest(unittest.TestCase):
+    def test_select_best_spans(self):
+        start_scores = np.array([[0.0, 3.0, 1.0, 2.0], [5.0, 0.0, 0.0, 0.0]])
+        end_scores = np.array([[0.0, 1.0, 3.0, 2.0], [0.0, 0.0, 0.0, 5.0]])
+        start_mask = np.array([[True, True, True, True], [False, True, True, True]])
+
+        feature_indexes, starts, ends, scores = select_best_spans(
+            start_scores, end_scores, max_answer_length=2, start_mask=start_mask
+        )
+        # Spans longer than 2 tokens, ending before they start or starting on a masked token are discarded
+        self.assertListEqual(scores[:4].tolist(), [6.0, 5.0, 5.0, 4.0])
+        self.assertListEqual(feature_indexes[:4].tolist(), [0, 1, 1, 0])
+        self.assertListEqual(starts[:4].tolist(), [1, 2, 3, 1])
+        self.assertListEqual(ends[:4].tolist(), [2, 3, 3, 1])
+        self.assertTrue(np.all((ends >= starts) & (ends - starts < 2)))
+
+        # Only the 2 best starts and ends of each feature are candidates
+        feature_indexes, starts, ends, scores = select_best_spans(
+            start_scores, end_scores, max_answer_length=2, n_best_size=2, top_k=2
+        )
+        self.assertListEqual(list(zip(feature_indexes, starts, ends)), [(0, 1, 2), (1, 0, 0)])
+        self.assertListEqual(scores.tolist(), [6.0, 5.0])
+
+    def test_compute_predictions_logits(self):
+        context = " ".join(["the cat sat on a mat"] * 6)
+        examples = [SquadExample(f"id_{i}", "where the cat sat", context, None, None, "title") for i in range(3)]
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            vocab_file = os.path.join(tmpdirname, "vocab.txt")
+            with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+                vocab = ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "the", "cat", "sat", "on", "a", "mat", "where"]
+                vocab_writer.write("".join(x + "\n" for x in vocab))
+            tokenizer = BertTokenizer(vocab_file)
+            features = squad_convert_examples_to_features(
+                examples, tokenizer, 24, 8, 8, is_training=False, tqdm_enabled=False
+            )
+
+        rng = np.random.RandomState(0)
+        results = [SquadResult(f.unique_id, rng.randn(24).tolist(), rng.randn(24).tolist()) for f in features]
+        # The answer of the first example is its first "mat"
+        feature = features[0]
+        mat_index = next(i for i in feature.token_to_orig_map if feature.tokens[i] == "mat")
+        results[0].start_logits[mat_index] = results[0].end_logits[mat_index] = 10.0
+
+        predictions = compute_predictions_logits(
+            examples, features, results, 5, 4, True, None, None, None, False, True, 0.0, tokenizer
+        )
+        self.assertEqual(predictions["id_0"], "mat")
+        # Features stored in a store give the same predictions
+        store_predictions = compute_predictions_logits(
+            examples,
+            SquadFeatureStore.from_features(features),
+            results,
+            5,
+            4,
+            True,
+            None,
+            None,
+            None,
+            False,
+            True,
+            0.0,
+            tokenizer,
+        )
+        self.assertEqual(predictions, store_predictions)
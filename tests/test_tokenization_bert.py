@@ -197,6 +197,33 @@ class BertTokenizationTest(TokenizerTesterMixin, unittest.TestCase):
 
         self.assertListEqual(tokenizer.tokenize("unwantedX running"), ["[UNK]", "runn", "##ing"])
 
+    def test_basic_tokenizer_special_characters(self):
+        tokenizer = BasicTokenizer()
+
+        # Control characters are removed, whitespace characters split words and CJK characters are split apart
+        self.assertListEqual(
+            tokenizer.tokenize("a\x00b\ufffdc\u200bd\u3000e\u00a0f\u4e2d\u6587g\U00020000"),
+            ["abcd", "e", "f", "\u4e2d", "\u6587", "g", "\U00020000"],
+        )
+        # Unassigned characters are removed, even in the CJK blocks
+        self.assertListEqual(tokenizer.tokenize("a\ufae4b"), ["ab"])
+        # Punctuation is split from words, lower cased tokens are checked against the tokens not to split again
+        self.assertListEqual(
+            tokenizer.tokenize("\u00bfQu\u00e9? ^$` \u00ab[UNK]\u00bb [Mask]", never_split=["[mask]"]),
+            ["\u00bf", "que", "?", "^", "$", "`", "\u00ab", "[", "unk", "]", "\u00bb", "[mask]"],
+        )
+
+    def test_wordpiece_tokenizer_longest_match(self):
+        vocab_tokens = ["[UNK]", "a", "ab", "abcd", "##b", "##c", "##cd", "##cde", "##e"]
+        vocab = {token: i for i, token in enumerate(vocab_tokens)}
+        tokenizer = WordpieceTokenizer(vocab=vocab, unk_token="[UNK]")
+
+        self.assertListEqual(tokenizer.tokenize("abcde abc abcdef ##b"), ["abcd", "##e", "ab", "##c", "[UNK]", "##b"])
+
+        # The pieces added to the vocabulary are taken into account
+        vocab["##ef"] = len(vocab)
+        self.assertListEqual(tokenizer.tokenize("abcdef"), ["abcd", "##ef"])
+
     def test_is_whitespace(self):
         self.assertTrue(_is_whitespace(" "))
         self.assertTrue(_is_whitespace("\t"))
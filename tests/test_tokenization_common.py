@@ -525,6 +525,19 @@ class TokenizerTesterMixin:
 
                 self.assertEqual(text_2, output_text)
 
+    def test_incremental_decoder(self):
+        tokenizers = self.get_tokenizers(do_lower_case=False)
+        for tokenizer in tokenizers:
+            with self.subTest(f"{tokenizer.__class__.__name__}"):
+                input_text, _ = self.get_input_output_texts(tokenizer)
+                ids = tokenizer.encode(input_text)
+                expected_text = tokenizer.decode(ids, clean_up_tokenization_spaces=False)
+
+                decoder = tokenizer.incremental_decoder()
+                deltas = [decoder.put(token_id) for token_id in ids]
+                deltas.append(decoder.end())
+                self.assertEqual("".join(deltas), expected_text)
+
     @require_tokenizers
     def test_encode_decode_with_spaces(self):
         tokenizers = self.get_tokenizers(do_lower_case=False)
@@ -12,15 +12,26 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import os
 import pickle
+import tempfile
 import unittest
 from typing import Callable, Optional
 
 import numpy as np
 
-from transformers import BatchEncoding, BertTokenizer, BertTokenizerFast, PreTrainedTokenizer, TensorType, TokenSpan
+from transformers import (
+    AddedToken,
+    BatchEncoding,
+    BertTokenizer,
+    BertTokenizerFast,
+    PreTrainedTokenizer,
+    TensorType,
+    TokenSpan,
+)
 from transformers.models.gpt2.tokenization_gpt2 import GPT2Tokenizer
 from transformers.testing_utils import CaptureStderr, require_flax, require_tf, require_tokenizers, require_torch, slow
+from transformers.tokenization_utils import BPECache, Trie, bpe_merge
 
 
 class TokenizerUtilsTest(unittest.TestCase):
@@ -252,3 +263,152 @@ class TokenizerUtilsTest(unittest.TestCase):
         batch = tokenizer.pad(features, padding=True, return_tensors="tf")
         self.assertTrue(isinstance(batch["input_ids"], tf.Tensor))
         self.assertEqual(batch["input_ids"].numpy().tolist(), [[0, 1, 2, tokenizer.pad_token_id], [0, 1, 2, 3]])
+
+    def test_trie(self):
+        trie = Trie(["[CLS]", "extra_id_1", "extra_id_100", ""])
+        self.assertEqual(trie.longest_match("[CLS] This is a extra_id_100", 0), 5)
+        self.assertEqual(trie.longest_match("[CLS] This is a extra_id_100", 16), 28)
+        self.assertEqual(trie.longest_match("[CLS] This is a extra_id_1", 16), 26)
+        self.assertIsNone(trie.longest_match("[CLS] This is a extra_id_100", 1))
+        self.assertIsNone(trie.longest_match("[CL", 0))
+
+    def test_split_on_added_tokens(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            vocab_file = os.path.join(tmpdirname, "vocab.txt")
+            with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+                vocab_writer.write("".join(x + "\n" for x in ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]", "a", "b"]))
+            tokenizer = BertTokenizer(vocab_file)
+
+        tokenizer.add_tokens(["ab", "abab", "bb"])
+        # The longest added token is kept, whatever the order the tokens were added in
+        self.assertEqual(tokenizer.tokenize("a ababab [SEP]bb"), ["a", "abab", "ab", "[SEP]", "bb"])
+        # Added tokens are lowercased, but not the special tokens
+        self.assertEqual(tokenizer.tokenize("AB[SEP]"), ["ab", "[SEP]"])
+
+        tokenizer.add_special_tokens(
+            {
+                "additional_special_tokens": [
+                    AddedToken("[E]", lstrip=False, rstrip=False),
+                    AddedToken("[W]", single_word=True),
+                ]
+            }
+        )
+        self.assertEqual(tokenizer.tokenize("a [E] b"), ["a", "[E]", "b"])
+        self.assertEqual(tokenizer.tokenize("a [W] b"), ["a", "[W]", "b"])
+        # A single word token does not match inside a word
+        self.assertEqual(tokenizer.tokenize("a[W]b"), ["a", "[UNK]", "[UNK]", "[UNK]", "b"])
+
+        # The tokens added directly to `unique_no_split_tokens` are taken into account too
+        self.assertEqual(tokenizer.tokenize("bab"), ["b", "ab"])
+        tokenizer.unique_no_split_tokens.append("ba")
+        self.assertEqual(tokenizer.tokenize("bab"), ["ba", "b"])
+
+    def test_batch_pad(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            vocab_file = os.path.join(tmpdirname, "vocab.txt")
+            with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+                vocab_writer.write("".join(x + "\n" for x in ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]", "a", "b"]))
+            tokenizer = BertTokenizer(vocab_file)
+
+        features = [
+            {"input_ids": [1, 5, 2], "token_type_ids": [0, 0, 0], "special_tokens_mask": [1, 0, 1], "label": 0},
+            {
+                "input_ids": [1, 5, 6, 6, 2],
+                "token_type_ids": [0, 0, 1, 1, 1],
+                "special_tokens_mask": [1, 0, 0, 0, 1],
+                "label": 1,
+            },
+        ]
+        batch = tokenizer.pad(features, pad_to_multiple_of=3)
+        self.assertEqual(batch["input_ids"], [[1, 5, 2, 3, 3, 3], [1, 5, 6, 6, 2, 3]])
+        self.assertEqual(batch["attention_mask"], [[1, 1, 1, 0, 0, 0], [1, 1, 1, 1, 1, 0]])
+        self.assertEqual(batch["token_type_ids"], [[0, 0, 0, 0, 0, 0], [0, 0, 1, 1, 1, 0]])
+        self.assertEqual(batch["special_tokens_mask"], [[1, 0, 1, 1, 1, 1], [1, 0, 0, 0, 1, 1]])
+        self.assertEqual(batch["label"], [0, 1])
+
+        tokenizer.padding_side = "left"
+        batch = tokenizer.pad(features, padding="max_length", max_length=6, return_tensors="np")
+        self.assertEqual(batch["input_ids"].tolist(), [[3, 3, 3, 1, 5, 2], [3, 1, 5, 6, 6, 2]])
+        self.assertEqual(batch["attention_mask"].tolist(), [[0, 0, 0, 1, 1, 1], [0, 1, 1, 1, 1, 1]])
+        self.assertEqual(batch["special_tokens_mask"].tolist(), [[1, 1, 1, 1, 0, 1], [1, 1, 0, 0, 0, 1]])
+
+        # Sequences longer than `max_length` are left as they are
+        batch = tokenizer.pad(features, padding="max_length", max_length=4)
+        self.assertEqual(batch["input_ids"], [[3, 1, 5, 2], [1, 5, 6, 6, 2]])
+        self.assertEqual(batch["attention_mask"], [[0, 1, 1, 1], [1, 1, 1, 1, 1]])
+
+    def test_truncate_sequences_longest_first(self):
+        tokenizer = PreTrainedTokenizer()
+        ids, pair_ids = list(range(10)), list(range(10, 16))
+        # Removes tokens from the first sequence until both have the same length, then from both in turn, starting
+        # with the second one
+        self.assertEqual(
+            tokenizer.truncate_sequences(ids, pair_ids, num_tokens_to_remove=7, stride=1),
+            ([0, 1, 2, 3, 4], [10, 11, 12, 13], [8, 9, 8, 7, 6, 15, 5, 14]),
+        )
+        self.assertEqual(
+            tokenizer.truncate_sequences(pair_ids, ids, num_tokens_to_remove=6),
+            ([10, 11, 12, 13, 14], [0, 1, 2, 3, 4], [9, 8, 7, 6, 5, 15]),
+        )
+        self.assertEqual(
+            tokenizer.truncate_sequences(ids, num_tokens_to_remove=3, stride=2),
+            ([0, 1, 2, 3, 4, 5, 6], None, [7, 8, 9, 8, 7]),
+        )
+        # No more tokens are removed once the sequences are empty
+        self.assertEqual(tokenizer.truncate_sequences([0, 1], [2], num_tokens_to_remove=5), ([], [], [1, 2, 0]))
+
+    def test_bpe_cache(self):
+        cache = BPECache(max_size=2)
+        cache["a"] = "a"
+        cache["b"] = "b"
+        self.assertEqual(cache.get("a"), "a")
+        # "b" is now the least recently used word
+        cache["c"] = "c"
+
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn("b", cache)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "c")
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.assertAlmostEqual(cache.hit_rate, 2 / 3)
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+        with self.assertRaises(ValueError):
+            BPECache(max_size=0)
+
+    def test_bpe_merge(self):
+        bpe_ranks = {("a", "a"): 0, ("b", "c"): 1, ("a", "bc"): 2, ("aa", "bc"): 3, ("aa", "aa"): 4}
+        # Merges are applied by rank, from left to right among the occurrences of the same pair
+        self.assertEqual(bpe_merge("aaa", bpe_ranks), ("aa", "a"))
+        self.assertEqual(bpe_merge("aaaa", bpe_ranks), ("aaaa",))
+        self.assertEqual(bpe_merge("aaaaa", bpe_ranks), ("aaaa", "a"))
+        self.assertEqual(bpe_merge("aabc", bpe_ranks), ("aabc",))
+        self.assertEqual(bpe_merge("abcbc", bpe_ranks), ("abc", "bc"))
+        self.assertEqual(bpe_merge(("a", "bc", "bc"), bpe_ranks), ("abc", "bc"))
+        self.assertEqual(bpe_merge("c", bpe_ranks), ("c",))
+        self.assertEqual(bpe_merge("", bpe_ranks), ())
+
+    def test_batch_encode_plus_num_proc(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            vocab_file = os.path.join(tmpdirname, "vocab.txt")
+            with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+                vocab_writer.write("".join(x + "\n" for x in ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]", "a", "b"]))
+            tokenizer = BertTokenizer(vocab_file)
+
+        texts = [" ".join(["a", "b", "c"] * (i % 7)) for i in range(300)]
+        pairs = [(text, "b a") for text in texts]
+        for batch, kwargs in [
+            (texts, {"padding": True}),
+            (texts, {"truncation": True, "max_length": 8, "return_overflowing_tokens": True}),
+            (pairs, {"padding": "max_length", "max_length": 24, "return_special_tokens_mask": True}),
+        ]:
+            expected = tokenizer(batch, **kwargs)
+            # The number of processes is capped so that each of them gets enough examples
+            for num_proc in [2, 8]:
+                self.assertEqual(tokenizer(batch, num_proc=num_proc, **kwargs).data, expected.data)
+            # Small batches are encoded in the current process
+            self.assertEqual(
+                tokenizer.batch_encode_plus(batch[:10], num_proc=2, **kwargs).data,
+                tokenizer(batch[:10], **kwargs).data,
+            )
@@ -0,0 +1,150 @@
+# coding=utf-8
+# Copyright 2020 The HuggingFace Team Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a clone of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from transformers import BertTokenizer, is_torch_available
+from transformers.data.tokenized_cache import (
+    RaggedArray,
+    TokenizedDatasetCache,
+    TokenizedDatasetCacheWriter,
+    cache_fingerprint,
+    tokenizer_fingerprint,
+)
+from transformers.testing_utils import require_torch
+
+
+if is_torch_available():
+    from transformers import LineByLineTextDataset, TextDataset
+
+
+PATH_SAMPLE_TEXT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "sample_text.txt")
+
+
+def get_tokenizer(tmpdirname):
+    vocab_file = os.path.join(tmpdirname, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+        vocab_writer.write(
+            "".join(x + "\n" for x in ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]", "the", "a", "##s"])
+        )
+    return BertTokenizer(vocab_file)
+
+
+class TokenizedCacheTest(unittest.TestCase):
+    def test_ragged_array(self):
+        array = RaggedArray.from_sequences([[1, 2, 3], [], [4, 5]])
+        self.assertEqual(len(array), 3)
+        self.assertEqual(array.values.dtype, np.int32)
+        self.assertListEqual(array.lengths.tolist(), [3, 0, 2])
+        self.assertListEqual(array[0].tolist(), [1, 2, 3])
+        self.assertListEqual(array[-1].tolist(), [4, 5])
+        self.assertListEqual([x.tolist() for x in array[1:]], [[], [4, 5]])
+        with self.assertRaises(IndexError):
+            array[3]
+
+    def test_tokenizer_fingerprint(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = get_tokenizer(tmpdirname)
+            fingerprint = tokenizer_fingerprint(tokenizer)
+            self.assertEqual(fingerprint, tokenizer_fingerprint(get_tokenizer(tmpdirname)))
+
+            tokenizer.add_tokens(["new_token"])
+            self.assertNotEqual(tokenizer_fingerprint(tokenizer), fingerprint)
+            self.assertNotEqual(
+                tokenizer_fingerprint(BertTokenizer(os.path.join(tmpdirname, "vocab.txt"), do_lower_case=False)),
+                fingerprint,
+            )
+
+            with open(os.path.join(tmpdirname, "vocab.txt"), "a", encoding="utf-8") as vocab_writer:
+                vocab_writer.write("an\n")
+            self.assertNotEqual(
+                tokenizer_fingerprint(BertTokenizer(os.path.join(tmpdirname, "vocab.txt"))), fingerprint
+            )
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = get_tokenizer(tmpdirname)
+            fingerprint = cache_fingerprint(tokenizer, PATH_SAMPLE_TEXT, max_length=12)
+            self.assertNotEqual(fingerprint, cache_fingerprint(tokenizer, PATH_SAMPLE_TEXT, max_length=16))
+
+            cache = TokenizedDatasetCache(tmpdirname, "cached_test", fingerprint)
+            self.assertFalse(cache.exists())
+            cache.save(
+                {"input_ids": [[1, 5, 2], [1, 2]], "label": [0.5, 1.5]}, metadata={"num_labels": 1}, objects={"a": [1]}
+            )
+            self.assertTrue(cache.exists())
+
+            columns = cache.load()
+            self.assertIsInstance(columns["input_ids"].values, np.memmap)
+            self.assertListEqual([x.tolist() for x in columns["input_ids"]], [[1, 5, 2], [1, 2]])
+            self.assertListEqual(columns["label"].tolist(), [0.5, 1.5])
+            self.assertEqual(cache.metadata, {"num_labels": 1})
+            self.assertEqual(cache.load_object("a"), [1])
+
+    def test_writer(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            cache = TokenizedDatasetCache(tmpdirname, "cached_test", "0" * 64)
+            writer = TokenizedDatasetCacheWriter(cache)
+            writer.write(
+                {
+                    "input_ids": np.array([[1, 5], [1, 6]], dtype=np.int32),
+                    "mask": np.ones((2, 3), dtype=np.int8),
+                    "label": np.array([0.5, 1.5]),
+                }
+            )
+            # The rows of the input ids do not have the same length anymore, so they are stored ragged
+            writer.write(
+                {
+                    "input_ids": RaggedArray.from_sequences([[1, 2, 3]]),
+                    "mask": np.zeros((1, 3), dtype=np.int8),
+                    "label": np.array([2.5]),
+                }
+            )
+            with self.assertRaises(ValueError):
+                writer.write({"label": np.array([3.5])})
+            self.assertFalse(cache.exists())
+            writer.close(metadata={"num_labels": 1})
+
+            self.assertEqual(len(writer), 3)
+            columns = cache.load()
+            self.assertListEqual([x.tolist() for x in columns["input_ids"]], [[1, 5], [1, 6], [1, 2, 3]])
+            self.assertEqual(columns["mask"].dtype, np.int8)
+            self.assertListEqual(columns["mask"].tolist(), [[1, 1, 1], [1, 1, 1], [0, 0, 0]])
+            self.assertListEqual(columns["label"].tolist(), [0.5, 1.5, 2.5])
+            self.assertEqual(cache.metadata, {"num_labels": 1})
+
+    @require_torch
+    def test_language_modeling_datasets(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = get_tokenizer(tmpdirname)
+            for dataset_class in [TextDataset, LineByLineTextDataset]:
+                dataset = dataset_class(tokenizer, file_path=PATH_SAMPLE_TEXT, block_size=8, cache_dir=tmpdirname)
+                cached_dataset = dataset_class(
+                    tokenizer, file_path=PATH_SAMPLE_TEXT, block_size=8, cache_dir=tmpdirname
+                )
+                self.assertIsInstance(cached_dataset.examples, RaggedArray)
+                self.assertEqual(len(dataset), len(cached_dataset))
+                for i in [0, len(dataset) - 1]:
+                    self.assertEqual(str(dataset[i]), str(cached_dataset[i]))
+
+                # Adding tokens to the tokenizer invalidates the cache
+                tokenizer.add_tokens([f"new_token_{len(tokenizer)}"])
+                num_caches = len(os.listdir(tmpdirname))
+                dataset_class(tokenizer, file_path=PATH_SAMPLE_TEXT, block_size=8, cache_dir=tmpdirname)
+                self.assertGreater(len(os.listdir(tmpdirname)), num_caches)
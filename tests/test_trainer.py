@@ -21,7 +21,7 @@ import unittest
 import numpy as np
 
 from transformers import AutoTokenizer, EvaluationStrategy, PretrainedConfig, TrainingArguments, is_torch_available
-from transformers.file_utils import WEIGHTS_NAME
+from transformers.file_utils import WEIGHTS_INDEX_NAME, WEIGHTS_NAME
 from transformers.testing_utils import (
     get_tests_dir,
     require_datasets,
@@ -448,6 +448,71 @@ class TrainerIntegrationTest(unittest.TestCase):
             self.assertTrue(np.array_equal(2 * expected + 1, seen[: expected.shape[0]]))
             self.assertTrue(np.all(seen[expected.shape[0] :] == -100))
 
+    def test_max_tokens_per_batch(self):
+        class DynamicShapesTokensDataset(DynamicShapesDataset):
+            def __getitem__(self, i):
+                result = super().__getitem__(i)
+                result["input_ids"] = np.ones(self.xs[i].shape, dtype=np.int64)
+                return result
+
+        def pad_collator(features):
+            max_length = max(len(feature["input_x"]) for feature in features)
+            return {
+                key: torch.tensor(
+                    np.stack(
+                        [np.pad(f[key], (0, max_length - len(f[key])), constant_values=pad_value) for f in features]
+                    )
+                )
+                for key, pad_value in (("input_x", 0), ("labels", -100))
+            }
+
+        dataset = DynamicShapesTokensDataset(batch_size=self.batch_size)
+        model = RegressionModel(a=2, b=1)
+        args = TrainingArguments("./regression", max_tokens_per_batch=48, num_train_epochs=2)
+        trainer = Trainer(model, args, train_dataset=dataset, eval_dataset=dataset, data_collator=pad_collator)
+
+        for batch in trainer.get_eval_dataloader():
+            self.assertLessEqual(batch["input_x"].numel(), 48)
+
+        # Predictions are returned in the order of the dataset
+        preds = trainer.predict(dataset)
+        for expected, seen in zip(dataset.ys, preds.label_ids):
+            self.assertTrue(np.array_equal(expected, seen[: expected.shape[0]]))
+        for expected, seen in zip(dataset.xs, preds.predictions):
+            self.assertTrue(np.allclose(2 * expected + 1, seen[: expected.shape[0]]))
+
+        # The number of steps follows the number of batches
+        train_output = trainer.train()
+        self.assertEqual(train_output.global_step, 2 * len(trainer.get_train_dataloader()))
+
+        # The loss of each batch is weighted by its number of samples
+        average_batch_size = trainer.get_train_dataloader().batch_sampler.average_batch_size
+        self.assertEqual(trainer._average_train_batch_size, average_batch_size)
+        batch = next(iter(trainer.get_train_dataloader()))
+        loss = trainer.training_step(trainer.model, batch)
+        expected_loss = trainer.model(**batch)[0] * batch["input_x"].shape[0] / average_batch_size
+        self.assertAlmostEqual(loss.item(), expected_loss.item(), places=5)
+
+        args = TrainingArguments(
+            "./regression", max_tokens_per_batch=48, dataloader_drop_last=True, dataloader_num_workers=1
+        )
+        trainer = Trainer(model, args, train_dataset=dataset, eval_dataset=dataset, data_collator=pad_collator)
+        for dataloader in [trainer.get_train_dataloader(), trainer.get_test_dataloader(dataset)]:
+            self.assertTrue(dataloader.batch_sampler.drop_last)
+            self.assertEqual(dataloader.num_workers, 1)
+
+        class SizedIterableTokensDataset(IterableDataset):
+            def __len__(self):
+                return len(dataset)
+
+            def __iter__(self):
+                return (dataset[i] for i in range(len(dataset)))
+
+        # Iterable datasets cannot be batched by a batch sampler, even if they have a length
+        trainer = Trainer(model, args, train_dataset=SizedIterableTokensDataset(), data_collator=pad_collator)
+        batch = next(iter(trainer.get_train_dataloader()))
+        self.assertEqual(batch["input_x"].shape[0], args.train_batch_size)
+
     @require_datasets
     def test_trainer_with_datasets(self):
         import datasets
@@ -521,6 +586,22 @@ class TrainerIntegrationTest(unittest.TestCase):
             trainer.train()
             self.check_saved_checkpoints(tmpdir, 5, int(self.n_epochs * 64 / self.batch_size), False)
 
+    def test_save_sharded_checkpoints(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            trainer = get_regression_trainer(
+                output_dir=tmpdir, save_steps=5, save_max_shard_size="4B", save_num_threads=2
+            )
+            trainer.train()
+            for step in range(5, int(self.n_epochs * 64 / self.batch_size), 5):
+                checkpoint = os.path.join(tmpdir, f"checkpoint-{step}")
+                self.assertTrue(os.path.isfile(os.path.join(checkpoint, WEIGHTS_INDEX_NAME)))
+                self.assertFalse(os.path.isfile(os.path.join(checkpoint, WEIGHTS_NAME)))
+
+            trainer.save_model()
+            model = RegressionPreTrainedModel.from_pretrained(tmpdir)
+            self.assertEqual(model.a.item(), trainer.model.a.item())
+            self.assertEqual(model.b.item(), trainer.model.b.item())
+
     def test_gradient_accumulation(self):
         # Training with half the batch size but accumulation steps as 2 should give the same results.
         trainer = get_regression_trainer(
@@ -22,7 +22,16 @@ from transformers.testing_utils import require_torch
 
 
 if is_torch_available():
-    from transformers.trainer_pt_utils import DistributedTensorGatherer
+    import torch
+
+    from transformers.trainer_pt_utils import (
+        DistributedLengthGroupedSampler,
+        DistributedTensorGatherer,
+        LengthGroupedSampler,
+        ShardedIterableDataset,
+        TokenBudgetBatchSampler,
+        get_length_grouped_indices,
+    )
 
 
 @require_torch
@@ -56,3 +65,121 @@ class TrainerUtilsTest(unittest.TestCase):
         self.assertTrue(np.array_equal(result[0], predictions))
         self.assertTrue(np.array_equal(result[1][0], predictions))
         self.assertTrue(np.array_equal(result[1][1], predictions))
+
+    def test_get_length_grouped_indices(self):
+        # Get some inputs of random lengths
+        lengths = torch.randint(0, 25, (100,)).tolist()
+        # Put one bigger than the others to check it ends up in first position
+        lengths[32] = 50
+
+        indices = get_length_grouped_indices(lengths, 4)
+        # The biggest element should be first
+        self.assertEqual(lengths[indices[0]], 50)
+        # The indices should be a permutation of range(100)
+        self.assertEqual(list(sorted(indices)), list(range(100)))
+
+    def test_length_grouped_sampler(self):
+        dataset = [{"input_ids": list(range(length))} for length in torch.randint(1, 25, (100,)).tolist()]
+        dataset[7]["input_ids"] = list(range(50))
+        sampler = LengthGroupedSampler(dataset, 4)
+
+        indices = list(sampler)
+        self.assertEqual(len(sampler), 100)
+        self.assertEqual(indices[0], 7)
+        self.assertEqual(list(sorted(indices)), list(range(100)))
+        # Lengths are computed once and cached
+        self.assertEqual(len(sampler.lengths), 100)
+
+        with self.assertRaises(ValueError):
+            list(LengthGroupedSampler([list(range(5))], 4))
+
+    def test_distributed_length_grouped_sampler(self):
+        lengths = torch.randint(0, 25, (101,)).tolist()
+        dataset = list(range(101))
+        samplers = [
+            DistributedLengthGroupedSampler(dataset, 4, num_replicas=2, rank=rank, lengths=lengths)
+            for rank in range(2)
+        ]
+        indices = [list(sampler) for sampler in samplers]
+
+        # Each process gets the same number of samples, covering the whole dataset
+        self.assertEqual([len(sampler) for sampler in samplers], [51, 51])
+        self.assertEqual(set(indices[0] + indices[1]), set(range(101)))
+        # The shuffling only depends on the epoch
+        self.assertEqual(list(samplers[0]), indices[0])
+        samplers[0].set_epoch(1)
+        self.assertNotEqual(list(samplers[0]), indices[0])
+
+    def test_token_budget_batch_sampler(self):
+        lengths = torch.randint(1, 25, (100,)).tolist()
+        lengths[7] = 50
+        sampler = TokenBudgetBatchSampler(list(range(100)), 40, lengths=lengths)
+
+        batches = list(sampler)
+        self.assertEqual(len(batches), len(sampler))
+        self.assertEqual(list(sorted(sum(batches, []))), list(range(100)))
+        for batch in batches:
+            # A sample longer than the budget gets a batch of its own
+            self.assertTrue(len(batch) * max(lengths[i] for i in batch) <= 40 or batch == [7])
+        # The batches are the same for all epochs, only their order changes
+        sampler.set_epoch(1)
+        self.assertEqual(sorted(list(sampler)), sorted(batches))
+        self.assertNotEqual(list(sampler), batches)
+
+        # Without shuffling, batches are yielded by increasing lengths
+        sampler = TokenBudgetBatchSampler(list(range(100)), 40, lengths=lengths, shuffle=False)
+        indices = sum(list(sampler), [])
+        self.assertEqual([lengths[i] for i in indices], sorted(lengths))
+
+    def test_distributed_token_budget_batch_sampler(self):
+        lengths = torch.randint(1, 25, (101,)).tolist()
+        samplers = [
+            TokenBudgetBatchSampler(list(range(101)), 40, lengths=lengths, num_replicas=3, rank=rank)
+            for rank in range(3)
+        ]
+        batches = [list(sampler) for sampler in samplers]
+
+        # Each process gets the same number of batches, covering the whole dataset
+        self.assertEqual(len(set(len(sampler) for sampler in samplers)), 1)
+        self.assertEqual(set(len(b) for b in batches), {len(samplers[0])})
+        self.assertEqual(set(sum(batches[0] + batches[1] + batches[2], [])), set(range(101)))
+
+    def test_token_budget_batch_sampler_drop_last(self):
+        # The 3 samples of length 10 fill their batch, the 2 samples of length 20 leave room for a third one
+        lengths = [10, 20, 10, 10, 20]
+        sampler = TokenBudgetBatchSampler(list(range(5)), 60, lengths=lengths, shuffle=False)
+        self.assertEqual(list(sampler), [[0, 2, 3], [1, 4]])
+        self.assertEqual(sampler.average_batch_size, 2.5)
+
+        sampler = TokenBudgetBatchSampler(list(range(5)), 60, lengths=lengths, shuffle=False, drop_last=True)
+        self.assertEqual(list(sampler), [[0, 2, 3]])
+
+        # In distributed training, the batches in excess are dropped instead of repeated
+        lengths = torch.randint(1, 25, (101,)).tolist()
+        samplers = [
+            TokenBudgetBatchSampler(list(range(101)), 40, lengths=lengths, num_replicas=3, rank=rank, drop_last=True)
+            for rank in range(3)
+        ]
+        batches = sum([list(sampler) for sampler in samplers], [])
+        self.assertEqual(len(batches), 3 * len(samplers[0]))
+        self.assertEqual(len(sum(batches, [])), len(set(sum(batches, []))))
+
+    def test_sharded_iterable_dataset(self):
+        datasets = [ShardedIterableDataset(list(range(101)), num_replicas=3, rank=rank) for rank in range(3)]
+        samples = [list(dataset) for dataset in datasets]
+
+        # Each process gets the same number of samples, covering the whole dataset
+        self.assertEqual([len(sample) for sample in samples], [34, 34, 34])
+        self.assertEqual([len(dataset) for dataset in datasets], [34, 34, 34])
+        self.assertEqual(set(sum(samples, [])), set(range(101)))
+        # The shuffling only depends on the epoch
+        self.assertEqual(list(datasets[0]), samples[0])
+        datasets[0].set_epoch(1)
+        self.assertNotEqual(list(datasets[0]), samples[0])
+
+        # The workers of a data loader split the shard of their process
+        dataloader = torch.utils.data.DataLoader(datasets[1], batch_size=None, num_workers=2)
+        self.assertEqual(sorted(dataloader), sorted(samples[1]))
+
+        dataset = ShardedIterableDataset(list(range(10)), shuffle=False, num_replicas=4, rank=3)
+        self.assertEqual(list(dataset), [3, 7, 1])